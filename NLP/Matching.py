@@ -15,18 +15,23 @@ from functools import wraps
 import numpy as np
 import pandas as pd
 
+from columnar import read_table, write_table
+
 warnings.filterwarnings('ignore')
 
-# Config paths
-BASE_DIR = Path.cwd()
-EMBEDDINGS_DIR = BASE_DIR / "NLP"/ "embeddings"
-OUTPUT_DIR = BASE_DIR / "NLP" / "match_results"
+# Config paths (relativi allo script: gira con cwd=NLP o importato dal DAG)
+BASE_DIR = Path(__file__).resolve().parent
+EMBEDDINGS_DIR = BASE_DIR / "embeddings"
+OUTPUT_DIR = BASE_DIR / "match_results"
 
 # Config params
 TOP_K = 20
 QUALITY_THRESHOLDS = {'excellent': 0.5, 'good': 0.3}
 LATENCY_THRESHOLD_MS = 400
 
+# reranker_input: Parquet (+ CSV), vedi columnar.py
+RERANKER_COLUMN_TYPES = {'rank': 'int64', 'cosine_similarity': 'float64'}
+
 
 def track_latency(func):
     """Decorator per tracking latency delle operazioni."""
@@ -89,11 +94,11 @@ def cosine_similarity_batch(query: np.ndarray, corpus: np.ndarray) -> np.ndarray
     return (query @ corpus.T).squeeze()
 
 
-def validate_embeddings(cv_df: pd.DataFrame, jd_df: pd.DataFrame):
+def validate_embeddings(cv_embeddings: np.ndarray, jd_embeddings: np.ndarray):
     """Verifica compatibilità embeddings CV-JD."""
     # Check dimensioni
-    cv_sample = json.loads(cv_df['embedding_vector'].iloc[0])
-    jd_sample = json.loads(jd_df['embedding_vector'].iloc[0])
+    cv_sample = cv_embeddings[0]
+    jd_sample = jd_embeddings[0]
     
     if len(cv_sample) != len(jd_sample):
         raise ValueError(f"Dimension mismatch: CV={len(cv_sample)}, JD={len(jd_sample)}")
@@ -106,15 +111,24 @@ def validate_embeddings(cv_df: pd.DataFrame, jd_df: pd.DataFrame):
 
 
 @track_latency
-def load_embeddings(csv_path: Path) -> Tuple[pd.DataFrame, np.ndarray]:
-    """Carica embeddings da CSV."""
-    df = pd.read_csv(csv_path)
+def load_embeddings(path: Path, id_column: str) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Carica embeddings (Parquet, o CSV se assente): solo id, vettore e testo.
+    I vettori sono liste float32 nel Parquet, stringhe JSON nel CSV.
+    """
+    df = read_table(path, columns=[id_column, 'embedding_vector', 'text_content'])
     
-    embeddings = []
-    for emb_str in df['embedding_vector']:
-        embeddings.append(np.array(json.loads(emb_str)))
+    embeddings = stack_embeddings(df.pop('embedding_vector'))
     
-    return df, np.vstack(embeddings)
+    return df, embeddings
+
+
+def stack_embeddings(vectors: pd.Series) -> np.ndarray:
+    """Matrice float32 dei vettori (array, liste o stringhe JSON)."""
+    return np.vstack([
+        np.asarray(json.loads(v) if isinstance(v, str) else v, dtype=np.float32)
+        for v in vectors
+    ])
 
 
 def get_quality_label(score: float) -> str:
@@ -219,7 +233,7 @@ def prepare_reranker_data(
 
 
 def save_results(results: Dict, output_dir: Path):
-    """Salva risultati matching in JSON e CSV per reranker."""
+    """Salva risultati matching in JSON."""
     
     # JSON output
     json_output = {
@@ -254,20 +268,20 @@ def save_results(results: Dict, output_dir: Path):
     return json_path
 
 
-def main():
-    """Main execution."""
-    
-    # Setup
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    
-    # Load data
-    print("Loading embeddings...")
-    (cv_df, cv_embeddings), _ = load_embeddings(EMBEDDINGS_DIR / "cv_embeddings.csv")
-    (jd_df, jd_embeddings), _ = load_embeddings(EMBEDDINGS_DIR / "jd_embeddings.csv")
-    print(f"Loaded {len(cv_df)} CVs and {len(jd_df)} JDs")
+def run_matching(
+    cv_df: pd.DataFrame,
+    cv_embeddings: np.ndarray,
+    jd_df: pd.DataFrame,
+    jd_embeddings: np.ndarray
+) -> Dict:
+    """
+    Matching su dati gia' in memoria (da main() o dallo stage del DAG):
+    salva i risultati e restituisce il riepilogo.
+    """
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # Validate
-    validate_embeddings(cv_df, jd_df)
+    validate_embeddings(cv_embeddings, jd_embeddings)
     
     # Execute matching
     print(f"Matching with TOP_K={TOP_K}...")
@@ -278,8 +292,7 @@ def main():
     
     # Prepare reranker data
     reranker_df = prepare_reranker_data(results, cv_df, jd_df)
-    reranker_path = OUTPUT_DIR / "reranker_input.csv"
-    reranker_df.to_csv(reranker_path, index=False)
+    write_table(reranker_df, OUTPUT_DIR / "reranker_input", RERANKER_COLUMN_TYPES)
     
     # Summary stats
     quality_counts = {'excellent': 0, 'good': 0, 'weak': 0}
@@ -293,6 +306,26 @@ def main():
     print(f"  Quality: EXC={quality_counts['excellent']}, GOOD={quality_counts['good']}, WEAK={quality_counts['weak']}")
     print(f"  Latency p95: {p95:.1f}ms ({'PASS' if sla_passed else 'FAIL'})")
     print(f"  Output: {OUTPUT_DIR}/")
+    
+    return {
+        'jds': len(jd_df),
+        'cvs': len(cv_df),
+        'quality': quality_counts,
+        'p95_ms': p95,
+        'output': str(json_path)
+    }
+
+
+def main():
+    """Main execution."""
+    
+    # Load data
+    print("Loading embeddings...")
+    (cv_df, cv_embeddings), _ = load_embeddings(EMBEDDINGS_DIR / "cv_embeddings", 'user_id')
+    (jd_df, jd_embeddings), _ = load_embeddings(EMBEDDINGS_DIR / "jd_embeddings", 'jd_id')
+    print(f"Loaded {len(cv_df)} CVs and {len(jd_df)} JDs")
+    
+    run_matching(cv_df, cv_embeddings, jd_df, jd_embeddings)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+"""
+columnar.py
+Lettura/scrittura delle tabelle scambiate tra gli stage della pipeline NLP.
+
+Ogni tabella e' identificata da un path senza estensione (es.
+Dataset/cv_dataset; il path .csv storico e' accettato) e scritta come:
+- <base>.parquet  schema esplicito, compressione zstd (se pyarrow e' installato)
+- <base>.csv      copia leggibile (NLP_EXPORT_CSV=1, default) o unico formato
+                  quando pyarrow manca
+
+I lettori preferiscono il Parquet e leggono solo le colonne richieste
+(proiezione), senza parsing del testo ne' inferenza dei tipi; il CSV resta
+il fallback, anche per i file prodotti prima di questo modulo.
+
+Le tabelle derivate aggiornate per chiave (normalizzazione, embeddings) sono
+invece partizionate: <base>/part-<p>.parquet, con la partizione ricavata
+dall'hash della chiave, e l'indice <base>/_partitions.json (colonne, tipi,
+righe e sha256 di ogni partizione). Un aggiornamento legge e riscrive solo le
+partizioni delle chiavi cambiate (write_partitions/read_partitions); la copia
+CSV leggibile e' prodotta su richiesta (export_csv). read_table legge allo
+stesso modo tabelle partizionate e non.
+
+Tipi delle colonne: "string", "bool", "float64", "int64", "vector" (lista di
+float32, es. embedding). Le colonne non dichiarate sono "string".
+"""
+
+import hashlib
+import importlib.util
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+EXPORT_CSV = os.getenv("NLP_EXPORT_CSV", "1") != "0"
+COMPRESSION = "zstd"
+# Numero di partizioni delle tabelle partizionate (cambiarlo le fa ricostruire per intero)
+PARTITIONS = int(os.getenv("NLP_TABLE_PARTITIONS", "16"))
+PARTITION_INDEX = "_partitions.json"
+
+_TRUE = {True, "True", "true", "1", 1}
+_FALSE = {False, "False", "false", "0", 0}
+
+
+def table_base(path: Path) -> Path:
+    """Path della tabella senza estensione (accetta anche il vecchio path .csv)."""
+    path = Path(path)
+    return path.with_suffix("") if path.suffix in (".parquet", ".csv") else path
+
+
+def tag_types(columns: Iterable[str]) -> Dict[str, str]:
+    """Le colonne tag_* dinamiche sono booleane (True o null)."""
+    return {c: "bool" for c in columns if c.startswith("tag_")}
+
+
+def _arrow_type(kind: str):
+    import pyarrow as pa
+
+    return {
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "float64": pa.float64(),
+        "int64": pa.int64(),
+        "vector": pa.list_(pa.float32()),
+    }[kind]
+
+
+def _is_null(value) -> bool:
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False  # liste/array
+
+
+def _coerce(series: pd.Series, kind: str) -> list:
+    """Valori della colonna convertiti al tipo dichiarato (null dove non convertibili)."""
+    if kind == "string":
+        return [None if _is_null(v) else str(v) for v in series]
+    if kind == "bool":
+        return [True if v in _TRUE else False if v in _FALSE else None
+                for v in (None if _is_null(v) else v for v in series)]
+    if kind in ("float64", "int64"):
+        numbers = pd.to_numeric(series, errors="coerce")
+        if kind == "int64":
+            return [None if pd.isna(v) else int(v) for v in numbers]
+        return [None if pd.isna(v) else float(v) for v in numbers]
+    if kind == "vector":
+        return [None if _is_null(v) else json.loads(v) if isinstance(v, str) else
+                v.tolist() if hasattr(v, 'tolist') else list(v) for v in series]
+    raise ValueError(f"Tipo di colonna sconosciuto: {kind}")
+
+
+def coerce_frame(df: pd.DataFrame, types: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Colonne convertite ai tipi dichiarati, come le rilegge read_table dal Parquet."""
+    types = types or {}
+    return pd.DataFrame({c: _coerce(df[c], types.get(c, "string")) for c in df.columns},
+                        index=df.index, columns=df.columns)
+
+
+def _csv_frame(df: pd.DataFrame, types: Dict[str, str]) -> pd.DataFrame:
+    """Nel CSV i vettori restano stringhe JSON, come in passato."""
+    vectors = [c for c in df.columns if types.get(c) == "vector"]
+    if not vectors:
+        return df
+    df = df.copy()
+    for column in vectors:
+        df[column] = [v if isinstance(v, str) or _is_null(v) else
+                      json.dumps(v.tolist() if hasattr(v, 'tolist') else [float(x) for x in v])
+                      for v in df[column]]
+    return df
+
+
+class TableWriter:
+    """Scrive una tabella a blocchi di DataFrame (stesse colonne in ogni blocco)."""
+
+    def __init__(self, base: Path, columns: List[str], types: Optional[Dict[str, str]] = None,
+                 export_csv: Optional[bool] = None):
+        self.base = table_base(base)
+        self.base.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = list(columns)
+        self.types = {c: (types or {}).get(c, "string") for c in self.columns}
+        self.parquet = PARQUET_AVAILABLE
+        self.csv = (EXPORT_CSV if export_csv is None else export_csv) or not self.parquet
+        self.rows = 0
+        self.paths: List[Path] = []
+
+        self._parquet_writer = None
+        self._schema = None
+        self._csv_header = True
+        self._tmp = {}
+        if self.parquet:
+            import pyarrow as pa
+
+            self._schema = pa.schema([pa.field(c, _arrow_type(self.types[c])) for c in self.columns])
+        for ext in self.formats:
+            self._tmp[ext] = self.base.with_name(f"{self.base.name}.{ext}.tmp")
+
+    @property
+    def formats(self) -> List[str]:
+        return (["parquet"] if self.parquet else []) + (["csv"] if self.csv else [])
+
+    def write(self, df: pd.DataFrame):
+        df = df.reindex(columns=self.columns)
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            arrays = [pa.array(_coerce(df[c], self.types[c]), type=field.type)
+                      for c, field in zip(self.columns, self._schema)]
+            table = pa.Table.from_arrays(arrays, schema=self._schema)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(str(self._tmp["parquet"]), self._schema,
+                                                        compression=COMPRESSION)
+            self._parquet_writer.write_table(table)
+        if self.csv:
+            _csv_frame(df, self.types).to_csv(
+                self._tmp["csv"], index=False, encoding='utf-8',
+                mode='w' if self._csv_header else 'a', header=self._csv_header,
+            )
+            self._csv_header = False
+        self.rows += len(df)
+
+    def close(self) -> List[Path]:
+        """Completa i file (scritti in .tmp e rinominati) e restituisce i path."""
+        if self.rows == 0:
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        for ext, tmp in self._tmp.items():
+            final = self.base.with_name(f"{self.base.name}.{ext}")
+            tmp.replace(final)
+            self.paths.append(final)
+        return self.paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+            for tmp in self._tmp.values():
+                tmp.unlink(missing_ok=True)
+
+
+def write_table(df: pd.DataFrame, base: Path, types: Optional[Dict[str, str]] = None,
+                export_csv: Optional[bool] = None) -> List[Path]:
+    """Scrive un DataFrame come tabella (Parquet e/o CSV)."""
+    with TableWriter(base, list(df.columns), types, export_csv) as writer:
+        writer.write(df)
+    return writer.paths
+
+
+def partition_of(key: str, partitions: int = PARTITIONS) -> str:
+    """Partizione di una chiave, stabile tra i processi (sha1, non hash())."""
+    return "%03d" % (int(hashlib.sha1(str(key).encode('utf-8')).hexdigest()[:8], 16) % partitions)
+
+
+def partition_index(base: Path) -> Optional[Dict]:
+    """Indice della tabella partizionata (None se la tabella non e' partizionata)."""
+    try:
+        with open(table_base(base) / PARTITION_INDEX, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, NotADirectoryError, ValueError):
+        return None
+
+
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_partitions(df: pd.DataFrame, base: Path, key_fn: Callable[[Dict], str],
+                     types: Optional[Dict[str, str]] = None,
+                     partitions: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Scrive df come tabella partizionata per chiave (key_fn ricava la chiave da
+    una riga). Con partitions=None la tabella e' riscritta per intero;
+    altrimenti df contiene tutte le righe di quelle partizioni, che sono
+    sostituite (o rimosse se vuote) lasciando intatte le altre. L'indice e'
+    scritto per ultimo. Restituisce le partizioni scritte.
+    """
+    directory = table_base(base)
+    directory.mkdir(parents=True, exist_ok=True)
+    columns = [str(c) for c in df.columns]
+    types = {c: t for c, t in (types or {}).items() if c in columns}
+    index = None if partitions is None else partition_index(directory)
+    if partitions is not None and (index is None or index["columns"] != columns
+                                   or index["partitions"] != PARTITIONS):
+        raise ValueError(f"Aggiornamento parziale di {directory} con schema diverso: va riscritta per intero")
+
+    groups: Dict[str, List[int]] = {}
+    for i, row in enumerate(df.to_dict(orient='records')):
+        groups.setdefault(partition_of(key_fn(row)), []).append(i)
+    if partitions is None:
+        touched = {p.stem[len("part-"):] for p in directory.glob("part-*")} | set(groups)
+        files: Dict[str, Dict] = {}
+        # La tabella non partizionata o la copia CSV di prima non sono piu' aggiornate
+        for path in (directory.with_name(directory.name + ".parquet"), directory.with_name(directory.name + ".csv")):
+            path.unlink(missing_ok=True)
+    else:
+        touched = set(partitions)
+        files = dict(index["files"])
+        outside = set(groups) - touched
+        if outside:
+            raise ValueError(f"Righe di partizioni non indicate: {sorted(outside)}")
+
+    for partition in sorted(touched):
+        part = directory / f"part-{partition}"
+        for path in table_files(part):
+            path.unlink()
+        files.pop(partition, None)
+        rows = groups.get(partition)
+        if rows:
+            [path] = write_table(df.iloc[rows], part, types, export_csv=False)
+            files[partition] = {"file": path.name, "rows": len(rows), "sha256": _file_digest(path)}
+
+    tmp = directory / (PARTITION_INDEX + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({"partitions": PARTITIONS, "columns": columns, "types": types,
+                   "files": dict(sorted(files.items()))}, f, indent=1)
+    tmp.replace(directory / PARTITION_INDEX)
+    return sorted(touched)
+
+
+def read_partitions(base: Path, partitions: Optional[Iterable[str]] = None,
+                    columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Righe delle partizioni indicate (tutte se None), in ordine di partizione."""
+    directory = table_base(base)
+    index = partition_index(directory)
+    if index is None:
+        raise FileNotFoundError(f"Tabella partizionata non trovata: {directory}")
+    files = index["files"]
+    wanted = sorted(files) if partitions is None else sorted(set(partitions) & set(files))
+    frames = [_read_file(directory / files[p]["file"], columns) for p in wanted]
+    if not frames:
+        return pd.DataFrame(columns=[c for c in index["columns"] if columns is None or c in columns])
+    return pd.concat(frames, ignore_index=True)
+
+
+def export_csv(base: Path) -> Path:
+    """Copia CSV leggibile di una tabella (<base>.csv), su richiesta invece che a ogni run."""
+    base = table_base(base)
+    index = partition_index(base)
+    df = read_table(base)
+    path = base.with_name(base.name + ".csv")
+    tmp = base.with_name(base.name + ".csv.tmp")
+    _csv_frame(df, index["types"] if index else {}).to_csv(tmp, index=False, encoding='utf-8')
+    tmp.replace(path)
+    return path
+
+
+def table_path(base: Path) -> Optional[Path]:
+    """File da leggere per la tabella: Parquet se presente e leggibile, altrimenti CSV."""
+    base = table_base(base)
+    parquet = base.with_name(base.name + ".parquet")
+    csv = base.with_name(base.name + ".csv")
+    if PARQUET_AVAILABLE and parquet.exists():
+        if not csv.exists() or parquet.stat().st_mtime >= csv.stat().st_mtime:
+            return parquet
+    if csv.exists():
+        return csv
+    return None
+
+
+def table_files(base: Path) -> List[Path]:
+    """File presenti della tabella (Parquet e/o CSV; l'indice, con le impronte delle partizioni, se partizionata)."""
+    base = table_base(base)
+    if partition_index(base) is not None:
+        return [base / PARTITION_INDEX]
+    return [p for p in (base.with_name(base.name + ".parquet"), base.with_name(base.name + ".csv")) if p.exists()]
+
+
+def table_exists(base: Path) -> bool:
+    return partition_index(base) is not None or table_path(base) is not None
+
+
+def read_table(base: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Legge una tabella, solo le colonne indicate (se presenti).
+
+    Le colonne "vector" lette da Parquet sono array numpy; dal CSV stringhe JSON.
+    Una tabella partizionata e' letta per intero (vedi read_partitions).
+    """
+    if partition_index(base) is not None:
+        return read_partitions(base, columns=columns)
+    path = table_path(base)
+    if path is None:
+        raise FileNotFoundError(f"Tabella non trovata: {base}(.parquet|.csv)")
+    return _read_file(path, columns)
+
+
+def _read_file(path: Path, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    if path.suffix == ".parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pq.read_schema(str(path))
+        wanted = None if columns is None else [c for c in columns if c in schema.names]
+        df = pq.read_table(str(path), columns=wanted).to_pandas()
+        # Booleani come bool Python/None (come dal CSV), anche senza null
+        for field in schema:
+            if field.name in df.columns and pa.types.is_boolean(field.type):
+                df[field.name] = df[field.name].astype(object).where(df[field.name].notna(), None)
+        return df
+    if columns is None:
+        return pd.read_csv(path)
+    wanted = set(columns)
+    return pd.read_csv(path, usecols=lambda c: c in wanted)
@@ -1,26 +1,62 @@
 """
 json_to_csv_processor.py
-Converte file JSON CV in un dataset CSV tabulare
+Converte file JSON CV in un dataset tabulare (SQLite indicizzato + export Parquet/CSV)
 Con controllo duplicati e pulizia utenti eliminati
 MODIFICATO: aggiunto supporto per tag dinamici
+MODIFICATO: legge anche i segmenti NDJSON del backend (solo quelli non ancora consumati)
+MODIFICATO: cartelle di staging partizionate per giorno (<cvs>/<YYYY-MM-DD>/)
 """
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 from datetime import datetime
 import pandas as pd
 
+try:
+    import orjson
+    json_loads = orjson.loads
+    JSON_DECODER = "orjson"
+except ImportError:  # orjson opzionale: stesso risultato, decoder piu' lento
+    json_loads = json.loads
+    JSON_DECODER = "json"
+
+from cv_segments import SegmentCheckpoint, SegmentRecord, read_index
+from columnar import tag_types
+from dataset_store import DB_FILENAME, DatasetStore
+
 
 INPUT_FOLDER = "/var/lib/docker/piazzati-data/cvs"
 OUTPUT_FOLDER = "Dataset"
 OUTPUT_FILENAME = "cv_dataset.csv"
+SEGMENTS_SUBFOLDER = "segments"
+PROCESSED_FOLDER = "cvs_processed"
+PARTITION_FORMAT = "%Y-%m-%d"
+CHECKPOINT_FILENAME = "cv_segments_checkpoint.json"
+# Thread di lettura/decodifica dei JSON (I/O-bound, il decoder rilascia poco il GIL)
+INGEST_WORKERS = int(os.getenv("CV_INGEST_WORKERS", min(8, (os.cpu_count() or 1) * 2)))
+
+CV_BASE_COLUMNS = [
+    'user_id', 'source_file', 'processed_at', 'document_id', 'document_type', 'file_sha256',
+    'pi_full_name', 'pi_email', 'pi_phone', 'pi_address', 'pi_city', 'pi_country',
+    'pi_postal_code', 'pi_linkedin', 'pi_github', 'pi_website', 'summary',
+    'experience', 'education', 'skills', 'languages', 'certifications', 'projects',
+    'pref_desired_roles', 'pref_preferred_locations', 'pref_remote_preference',
+    'pref_salary_expectation', 'pref_availability'
+]
 
 ARRAY_SEP = " | "
 LIST_SEP = ", "
 
 
+def staged_json_files(input_path: Path) -> List[Path]:
+    """JSON dei CV nella cartella di staging e nelle sue partizioni per giorno."""
+    return sorted([*input_path.glob("*.json"), *input_path.glob("*/*.json")])
+
+
 def get_active_user_ids(input_path: Path) -> Set[str]:
     """
     Estrae tutti gli user_id dai file JSON presenti nella cartella.
@@ -28,7 +64,7 @@ def get_active_user_ids(input_path: Path) -> Set[str]:
     """
     active_users = set()
 
-    json_files = list(input_path.glob("*.json"))
+    json_files = staged_json_files(input_path)
 
     for json_file in json_files:
         try:
@@ -60,7 +96,7 @@ def discover_all_tags(input_path: Path) -> Set[str]:
     """
     all_tags = set()
     
-    json_files = list(input_path.glob("*.json"))
+    json_files = staged_json_files(input_path)
     
     for json_file in json_files:
         try:
@@ -164,6 +200,93 @@ def extract_identifiers_from_json(json_path: Path) -> Tuple[str, str]:
         return '', ''
 
 
+@dataclass
+class StagedDoc:
+    """
+    Un CV in ingresso (file JSON o record di segmento) letto una sola volta:
+    identificatori, tag e riga piatta (senza colonne tag) estratti insieme.
+    """
+    item: object
+    name: str
+    user_id: str = ''
+    sha256: str = ''
+    tag_names: Set[str] = field(default_factory=set)
+    tags_section: Dict = field(default_factory=dict)
+    row: Optional[Dict] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_index(cls, record: SegmentRecord) -> "StagedDoc":
+        """Solo identificatori e tag dall'indice del segmento: il record non viene letto."""
+        return cls(item=record, name=record.name, user_id=record.user_id,
+                   sha256=record.file_sha256, tag_names=set(record.tags))
+
+
+def ingest_one(item) -> StagedDoc:
+    """Legge e decodifica un CV una volta sola ed estrae tutto cio' che serve."""
+    doc = StagedDoc(item=item, name=item.name)
+    try:
+        if isinstance(item, SegmentRecord):
+            with open(item.segment, 'rb') as f:
+                f.seek(item.offset)
+                data = json_loads(f.read(item.length))
+            source_file = (data.get('batch_metadata') or {}).get('staging_name') or item.name
+        else:
+            data = json_loads(item.read_bytes())
+            source_file = item.name
+
+        doc.user_id = str(data.get('user_id', '')) if data.get('user_id') else ''
+        doc.sha256 = str(data.get('file_sha256', '')) if data.get('file_sha256') else ''
+        tags_section = data.get('Tags') or data.get('tags') or {}
+        if isinstance(tags_section, dict):
+            doc.tags_section = tags_section
+            doc.tag_names = set(tags_section)
+        doc.row = json_to_base_row(data, source_file)
+    except Exception as e:
+        doc.error = str(e)
+    return doc
+
+
+def ingest_all(items: list, workers: int = INGEST_WORKERS) -> List[StagedDoc]:
+    """ingest_one su tutti gli elementi in un thread pool, a blocchi (ordine preservato)."""
+    if len(items) < 2 or workers <= 1:
+        return [ingest_one(item) for item in items]
+    # Un task per blocco, non per file: evita l'overhead di un future per CV
+    size = max(1, -(-len(items) // (workers * 4)))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [doc for chunk in pool.map(lambda c: [ingest_one(item) for item in c], chunks) for doc in chunk]
+
+
+def consumed_segments(segments: List[Path], docs: List[StagedDoc]) -> List[Path]:
+    """
+    Segmenti da marcare consumati: quelli senza record in errore. Un segmento
+    con record in errore resta pendente, come un file JSON in errore resta
+    nello staging, ed e' riletto al run successivo (i record gia' scritti sono
+    saltati per SHA).
+    """
+    failed = {doc.item.segment for doc in docs if doc.error and isinstance(doc.item, SegmentRecord)}
+    if failed:
+        print(f"  Segmenti con record in errore, lasciati da rileggere: {len(failed)}")
+    return [segment for segment in segments if segment not in failed]
+
+
+def archive_staged(item, processed_folder: Path):
+    """
+    Sposta i file JSON in cvs_processed/<giorno> (la partizione di origine, o
+    oggi per i file in radice); i record dei segmenti sono marcati dal checkpoint.
+    """
+    if isinstance(item, Path):
+        try:
+            datetime.strptime(item.parent.name, PARTITION_FORMAT)
+            day = item.parent.name
+        except ValueError:
+            day = datetime.now().strftime(PARTITION_FORMAT)
+        target = processed_folder / day
+        target.mkdir(exist_ok=True)
+        item.rename(target / item.name)
+
+
 def flatten_personal_info(data: Dict) -> Dict:
     if not data:
         data = {}
@@ -364,12 +487,55 @@ def flatten_preferences(data: Dict) -> Dict:
     }
 
 
+def cv_row_key(row: Dict) -> str:
+    """Chiave del dataset: user_id, altrimenti sha256 / document_id / file sorgente."""
+    for column, prefix in (('user_id', ''), ('file_sha256', 'sha:'), ('document_id', 'doc:')):
+        value = row.get(column)
+        if value is not None and str(value).strip() and str(value) != 'nan':
+            return f"{prefix}{value}"
+    return f"file:{row.get('source_file', '')}"
+
+
+def open_cv_store(output_path: Path, csv_path: Path) -> DatasetStore:
+    """Store del dataset CV; al primo avvio importa il CSV esistente."""
+    store = DatasetStore(output_path / DB_FILENAME, 'cv_dataset', index_columns=('file_sha256',))
+    if store.version() == 0 and csv_path.exists():
+        imported = store.import_dataframe(pd.read_csv(csv_path, encoding='utf-8', dtype=str), cv_row_key)
+        print(f"  Importato dataset CSV esistente: {imported} righe")
+    return store
+
+
+def dataset_columns(store: DatasetStore) -> List[str]:
+    """Colonne del dataset esportato: base + tag in ordine alfabetico (tutti quelli del dataset, non solo del batch)."""
+    return CV_BASE_COLUMNS + sorted(c for c in store.columns() if c.startswith('tag_'))
+
+
+def export_dataset(output_dir: str = OUTPUT_FOLDER, output_file: str = OUTPUT_FILENAME) -> Path:
+    """Esporta su richiesta il dataset completo (Parquet + CSV) per chi lo legge per intero."""
+    output_path = Path(output_dir)
+    full_output_path = output_path / output_file
+    store = open_cv_store(output_path, full_output_path)
+    try:
+        cols = dataset_columns(store)
+        store.export_table(full_output_path, cols, tag_types(cols[len(CV_BASE_COLUMNS):]))  # testo + tag booleani
+    finally:
+        store.close()
+    return full_output_path
+
+
 def json_to_row(data: Dict, source_file: str, all_known_tags: Set[str]) -> Dict:
     """
     Converte un JSON completo in una riga CSV piatta.
     
     MODIFICATO: aggiunto parametro all_known_tags per gestire tag dinamici
     """
+    row = json_to_base_row(data, source_file)
+    row.update(flatten_tags(data, all_known_tags))
+    return row
+
+
+def json_to_base_row(data: Dict, source_file: str) -> Dict:
+    """Riga CSV piatta senza le colonne tag (che dipendono da tutti i CV del batch)."""
     row = {
         'user_id': data.get('user_id', ''),
         'source_file': source_file,
@@ -390,9 +556,6 @@ def json_to_row(data: Dict, source_file: str, all_known_tags: Set[str]) -> Dict:
     row['projects'] = concatenate_projects(data.get('projects', []))
 
     row.update(flatten_preferences(data.get('preferences')))
-    
-    # NOVITÀ: aggiungiamo i tag dinamici
-    row.update(flatten_tags(data, all_known_tags))
 
     return row
 
@@ -401,26 +564,45 @@ def process_files(input_dir: str, output_dir: str, output_file: str):
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     full_output_path = output_path / output_file
-    processed_folder = input_path.parent / "cvs_processed"
+    processed_folder = input_path.parent / PROCESSED_FOLDER
     processed_folder.mkdir(exist_ok=True)
 
     if not input_path.exists():
         print(f"Errore: cartella {input_dir} non trovata")
         return False
 
-    processed_folder = input_path.parent / "cvs_processed"
-    processed_folder.mkdir(exist_ok=True)
-    json_files = list(input_path.glob("*.json"))
+    json_files = staged_json_files(input_path)
 
-    if not json_files:
+    # Segmenti sigillati non ancora consumati: identificatori e tag dall'indice
+    checkpoint = SegmentCheckpoint(output_path / CHECKPOINT_FILENAME)
+    segments = checkpoint.pending(input_path / SEGMENTS_SUBFOLDER)
+    segment_records = [record for segment in segments for record in read_index(segment)]
+
+    if not json_files and not segment_records:
         print(f"Nessun file JSON trovato in {input_dir}")
+        if segments:
+            checkpoint.mark(segments)
+            checkpoint.save()
         return False
 
     print(f"Trovati {len(json_files)} file JSON")
+    print(f"Trovati {len(segment_records)} CV in {len(segments)} segmenti nuovi")
+
+    # Unica lettura di ogni file JSON: identificatori, tag e riga insieme
+    print(f"\nLettura CV ({INGEST_WORKERS} thread, decoder {JSON_DECODER})...")
+    docs = ingest_all(json_files)
+    docs.extend(StagedDoc.from_index(record) for record in segment_records)
+
+    errors = [(doc.name, doc.error) for doc in docs if doc.error]
+    for name, error in errors:
+        print(f"  ERRORE: {name} - {error}")
+    staged_docs = docs
+    docs = [doc for doc in docs if not doc.error]
     
-    # NOVITÀ: scopriamo tutti i tag prima di processare
-    print(f"\nDiscovery tag dinamici...")
-    all_known_tags = discover_all_tags(input_path)
+    # NOVITÀ: tag dinamici raccolti durante la lettura
+    all_known_tags = set()
+    for doc in docs:
+        all_known_tags.update(doc.tag_names)
     
     if all_known_tags:
         print(f"  Tag trovati: {sorted(all_known_tags)}")
@@ -429,168 +611,123 @@ def process_files(input_dir: str, output_dir: str, output_file: str):
         print(f"  Nessun tag trovato nei JSON")
 
     # print(f"\nControllo utenti eliminati...")
-    # active_user_ids = get_active_user_ids(input_path)
+    # active_user_ids = {doc.user_id for doc in docs if doc.user_id}
     # print(f"  Utenti attivi nei JSON: {len(active_user_ids)}")
-    # removed_count = clean_deleted_users(full_output_path, active_user_ids)
+    # removed_count = len(store.delete_missing(active_user_ids, keep=lambda key: ':' in key))
 
     print(f"\nControllo duplicati nel dataset esistente...")
-    existing_sha256, user_id_to_index = get_existing_identifiers(full_output_path)
-
-    if existing_sha256 or user_id_to_index:
-        print(f"  SHA256 unici: {len(existing_sha256)}")
-        print(f"  User ID unici: {len(user_id_to_index)}")
+    store = open_cv_store(output_path, full_output_path)
+    # Lookup per indice solo degli identificatori del batch, senza caricare il dataset
+    existing_sha256 = store.existing_values('file_sha256', (doc.sha256 for doc in docs))
+    existing_user_ids = store.existing_keys(doc.user_id for doc in docs)
+
+    if store.count():
+        print(f"  Righe nel dataset: {store.count()}")
+        print(f"  SHA256 gia' presenti: {len(existing_sha256)}")
+        print(f"  User ID gia' presenti: {len(existing_user_ids)}")
     else:
         print(f"  Nessun dataset esistente")
 
-    print(f"\nAnalisi file JSON...")
+    print(f"\nAnalisi CV...")
 
-    files_to_add = []
-    files_to_update = []
-    files_skipped_sha = []
-    files_skipped_both = []
-    files_no_identifiers = []
+    docs_to_add = []
+    docs_to_update = []
+    skipped_sha = []
+    skipped_both = []
+    no_identifiers = []
 
-    for json_file in json_files:
-        user_id, sha256 = extract_identifiers_from_json(json_file)
+    for doc in docs:
+        user_id, sha256 = doc.user_id, doc.sha256
 
         if not user_id and not sha256:
-            files_no_identifiers.append(json_file.name)
-            files_to_add.append(json_file)
+            no_identifiers.append(doc.name)
+            docs_to_add.append(doc)
 
         elif sha256 and sha256 in existing_sha256:
-            files_skipped_sha.append((json_file.name, user_id, sha256))
-            print(f"  SKIP (SHA duplicato): {json_file.name}")
-            # Sposta il file in cvs_processed
-            json_file.rename(processed_folder / json_file.name)
+            skipped_sha.append((doc.name, user_id, sha256))
+            print(f"  SKIP (SHA duplicato): {doc.name}")
 
-        elif user_id and user_id in user_id_to_index:
+        elif user_id and user_id in existing_user_ids:
             if sha256 and sha256 not in existing_sha256:
-                files_to_update.append((json_file, user_id, sha256, user_id_to_index[user_id]))
-                print(f"  UPDATE: {json_file.name} -> {user_id}")
-                # Sposta il file in cvs_processed
-                json_file.rename(processed_folder / json_file.name)
+                docs_to_update.append(doc)
+                print(f"  UPDATE: {doc.name} -> {user_id}")
             else:
-                files_skipped_both.append((json_file.name, user_id, sha256))
-                print(f"  SKIP (duplicato): {json_file.name}")
-                # Sposta il file in cvs_processed
-                json_file.rename(processed_folder / json_file.name)
+                skipped_both.append((doc.name, user_id, sha256))
+                print(f"  SKIP (duplicato): {doc.name}")
         else:
-            files_to_add.append(json_file)
+            docs_to_add.append(doc)
 
     print(f"\nRisultato:")
-    print(f"  Nuovi: {len(files_to_add)}")
-    print(f"  Da aggiornare: {len(files_to_update)}")
-    print(f"  Saltati: {len(files_skipped_sha) + len(files_skipped_both)}")
-    if files_no_identifiers:
-        print(f"  Senza identificatori: {len(files_no_identifiers)}")
-
-    if not files_to_add and not files_to_update:
+    print(f"  Nuovi: {len(docs_to_add)}")
+    print(f"  Da aggiornare: {len(docs_to_update)}")
+    print(f"  Saltati: {len(skipped_sha) + len(skipped_both)}")
+    if no_identifiers:
+        print(f"  Senza identificatori: {len(no_identifiers)}")
+
+    if not docs_to_add and not docs_to_update:
+        for doc in docs:
+            archive_staged(doc.item, processed_folder)
         print("\nNessun file da processare")
+        checkpoint.mark(consumed_segments(segments, staged_docs))
+        checkpoint.save()
         return True
 
-    rows_to_add = []
-    errors = []
-
-    if files_to_add:
-        print(f"\nProcessamento {len(files_to_add)} nuovi CV...")
-
-        for json_file in files_to_add:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                # MODIFICATO: passiamo all_known_tags
-                row = json_to_row(data, json_file.name, all_known_tags)
-                rows_to_add.append(row)
+    # I record dei segmenti da scrivere sono letti ora, una sola volta, per offset
+    pending = [doc for doc in docs_to_add if doc.row is None]
+    pending += [doc for doc in docs_to_update if doc.row is None]
+    for doc, result in zip(pending, ingest_all([doc.item for doc in pending])):
+        doc.row, doc.tags_section, doc.error = result.row, result.tags_section, result.error
+        if doc.error:
+            errors.append((doc.name, doc.error))
+            print(f"  ERRORE: {doc.name} - {doc.error}")
 
-                user_id = row['user_id'] or 'N/A'
-                print(f"  {json_file.name} -> {user_id}")
-
-                # Sposta il file in cvs_processed
-                json_file.rename(processed_folder / json_file.name)
-
-            except Exception as e:
-                errors.append((json_file.name, str(e)))
-                print(f"  ERRORE: {json_file.name} - {e}")
+    rows_to_add = []
+    for doc in docs_to_add:
+        if doc.error:
+            continue
+        row = dict(doc.row)
+        row.update(flatten_tags({'Tags': doc.tags_section}, all_known_tags))
+        rows_to_add.append(row)
+        print(f"  {doc.name} -> {row['user_id'] or 'N/A'}")
 
     rows_to_update = []
+    for doc in docs_to_update:
+        if doc.error:
+            continue
+        row = dict(doc.row)
+        row.update(flatten_tags({'Tags': doc.tags_section}, all_known_tags))
+        rows_to_update.append(row)
 
-    if files_to_update:
-        print(f"\nAggiornamento {len(files_to_update)} CV esistenti...")
-
-        for json_file, user_id, sha256, row_index in files_to_update:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+    if not rows_to_add and not rows_to_update and not store.count():
+        print("Nessuna riga da salvare")
+        return False
 
-                # MODIFICATO: passiamo all_known_tags
-                row = json_to_row(data, json_file.name, all_known_tags)
-                rows_to_update.append((row_index, row))
+    # Upsert per chiave: solo le righe nuove o aggiornate sono scritte
+    store.upsert_many((cv_row_key(row), row) for row in rows_to_add + rows_to_update)
 
-                print(f"  {json_file.name} -> {user_id}")
+    # MODIFICATO: ordine colonne ora include i tag dinamici
+    cols = dataset_columns(store)
+    tag_cols = cols[len(CV_BASE_COLUMNS):]
 
-            except Exception as e:
-                errors.append((json_file.name, str(e)))
-                print(f"  ERRORE: {json_file.name} - {e}")
-            else:
-                # Sposta il file in cvs_processed SOLO dopo averlo letto e processato
-                json_file.rename(processed_folder / json_file.name)
-
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    if full_output_path.exists():
-        existing_df = pd.read_csv(full_output_path, encoding='utf-8')
-
-        for row_index, row_data in rows_to_update:
-            for col, value in row_data.items():
-                if col in existing_df.columns:
-                    existing_df.at[row_index, col] = value
-                else:
-                    # NOVITÀ: se la colonna non esiste (nuovo tag), la creiamo
-                    existing_df[col] = None
-                    existing_df.at[row_index, col] = value
-
-        if rows_to_add:
-            new_df = pd.DataFrame(rows_to_add)
-            final_df = pd.concat([existing_df, new_df], ignore_index=True)
-        else:
-            final_df = existing_df
-    else:
-        if rows_to_add:
-            final_df = pd.DataFrame(rows_to_add)
-        else:
-            print("Nessuna riga da salvare")
-            return False
+    # Nessuna riesportazione completa: gli stage a valle leggono le modifiche dallo store
+    # (export_dataset() esporta la tabella su richiesta)
 
-    # MODIFICATO: ordine colonne ora include i tag dinamici
-    base_cols = [
-        'user_id', 'source_file', 'processed_at', 'document_id', 'document_type', 'file_sha256',
-        'pi_full_name', 'pi_email', 'pi_phone', 'pi_address', 'pi_city', 'pi_country',
-        'pi_postal_code', 'pi_linkedin', 'pi_github', 'pi_website', 'summary',
-        'experience', 'education', 'skills', 'languages', 'certifications', 'projects',
-        'pref_desired_roles', 'pref_preferred_locations', 'pref_remote_preference',
-        'pref_salary_expectation', 'pref_availability'
-    ]
-    
-    # Aggiungiamo le colonne tag in ordine alfabetico
-    tag_cols = sorted([f"tag_{tag}" for tag in all_known_tags])
-    
-    # Colonne finali: base + tag
-    cols = base_cols + tag_cols
-    
-    # Manteniamo solo le colonne che esistono effettivamente nel DataFrame
-    existing_cols = [c for c in cols if c in final_df.columns]
-    final_df = final_df[existing_cols]
+    # Sposta in cvs_processed SOLO i file letti e processati (saltati inclusi)
+    for doc in docs:
+        if not doc.error:
+            archive_staged(doc.item, processed_folder)
 
-    final_df.to_csv(full_output_path, index=False, encoding='utf-8')
+    # I segmenti sono consumati solo dopo che il dataset e' stato scritto, e solo se letti per intero
+    checkpoint.mark(consumed_segments(segments, staged_docs))
+    checkpoint.save()
 
-    print(f"\nCompletato: {full_output_path}")
+    print(f"\nCompletato: {store.db_path} ({store.table})")
     print(f"Nuove righe: {len(rows_to_add)}")
     print(f"Righe aggiornate: {len(rows_to_update)}")
     # if removed_count > 0:
     #     print(f"Righe eliminate: {removed_count}")
-    print(f"Totale righe: {len(final_df)}")
-    print(f"Colonne totali: {len(final_df.columns)} (di cui {len(tag_cols)} colonne tag)")
+    print(f"Totale righe: {store.count()}")
+    print(f"Colonne totali: {len(cols)} (di cui {len(tag_cols)} colonne tag)")
 
     if errors:
         print(f"\nErrori: {len(errors)}")
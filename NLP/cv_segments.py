@@ -0,0 +1,105 @@
+"""
+cv_segments.py
+Lettura dei segmenti NDJSON append-only scritti dal backend
+(backend/app/services/cv_segment_store.py, che descrive il formato).
+
+Un consumer (es. cv_json_to_dataset_processor) legge solo i segmenti sigillati
+(con marker .commit) che non ha ancora consumato; l'elenco dei segmenti
+consumati e' salvato in un checkpoint JSON accanto al dataset che alimenta.
+I segmenti possono stare in sottocartelle per giorno (segments/<YYYY-MM-DD>/);
+dopo il consumo staging_archive.py li compatta in archivi e li dimentica.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx"
+COMMIT_SUFFIX = ".commit"
+
+
+class SegmentRecord(NamedTuple):
+    """Riferimento a un record di un segmento, dall'indice degli offset."""
+    segment: Path
+    offset: int
+    length: int
+    document_id: str
+    user_id: str
+    file_sha256: str
+    tags: List[str]
+
+    @property
+    def name(self) -> str:
+        return f"{self.segment.name}:{self.offset}"
+
+    def load(self) -> Dict:
+        with open(self.segment, 'rb') as f:
+            f.seek(self.offset)
+            return json.loads(f.read(self.length))
+
+
+def committed_bytes(segment: Path) -> Optional[int]:
+    try:
+        with open(segment.with_name(segment.name + COMMIT_SUFFIX), 'r', encoding='utf-8') as f:
+            return json.load(f)['bytes']
+    except FileNotFoundError:
+        return None
+
+
+def segment_files(directory: Path) -> List[Path]:
+    """Segmenti della cartella e delle sue partizioni per giorno, in ordine di creazione."""
+    if not directory.exists():
+        return []
+    pattern = f"seg-*{SEGMENT_SUFFIX}"
+    return sorted([*directory.glob(pattern), *directory.glob(f"*/{pattern}")], key=lambda p: p.name)
+
+
+def committed_segments(directory: Path) -> List[Path]:
+    """Segmenti sigillati, in ordine di creazione."""
+    return [s for s in segment_files(directory) if committed_bytes(s) is not None]
+
+
+def read_index(segment: Path) -> Iterator[SegmentRecord]:
+    """Record del segmento letti dall'indice, senza aprire i dati."""
+    size = committed_bytes(segment)
+    with open(segment.with_name(segment.name + INDEX_SUFFIX), 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 6:
+                continue
+            offset, length = int(fields[0]), int(fields[1])
+            if offset + length > size:
+                break
+            yield SegmentRecord(segment, offset, length, fields[2], fields[3], fields[4],
+                                [t for t in fields[5].split(',') if t])
+
+
+class SegmentCheckpoint:
+    """Segmenti gia' consumati da un consumer."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.consumed: Set[str] = set()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.consumed = set(json.load(f).get('consumed', []))
+
+    def pending(self, directory: Path) -> List[Path]:
+        return [s for s in segment_files(directory)
+                if s.name not in self.consumed and committed_bytes(s) is not None]
+
+    def mark(self, segments: List[Path]):
+        self.consumed.update(s.name for s in segments)
+
+    def forget(self, names: Iterable[str]):
+        """Rimuove dal checkpoint i segmenti archiviati e cancellati."""
+        self.consumed.difference_update(names)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'consumed': sorted(self.consumed)}, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,336 @@
+"""
+dataset_store.py
+Dataset CV/JD mantenuti in SQLite, indicizzati per chiave (user_id / jd_id).
+
+Invece di ricaricare l'intero CSV, patcharlo cella per cella e riscriverlo:
+- upsert e cancellazioni toccano solo le righe interessate (chiave primaria);
+- ogni scrittura ha una versione crescente, le cancellazioni restano come
+  tombstone: gli stage a valle leggono solo le modifiche con changes_since()
+  a partire dal proprio watermark (watermark()/set_watermark()); pending()
+  le raccoglie per chiave e apply_changes() le applica a una tabella derivata
+  partizionata per chiave (normalizzazione ed embeddings, vedi
+  pipeline_dag.py), riscrivendo solo le partizioni delle chiavi cambiate;
+- chi legge il dataset per intero fuori dalla pipeline (script standalone,
+  analisi) lo esporta su richiesta con export_table(): Parquet + CSV (vedi
+  columnar.py) scritti in streaming, a blocchi, solo se il dataset e' cambiato.
+
+Le righe sono salvate come JSON: le colonne possono cambiare nel tempo (tag
+dinamici); l'elenco delle colonne viste e' tenuto nei metadati.
+"""
+
+import json
+import math
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import pandas as pd
+
+from columnar import (PARTITIONS, TableWriter, partition_index, partition_of, read_partitions, table_base,
+                      write_partitions)
+
+DB_FILENAME = "datasets.sqlite3"
+_IN_CHUNK = 500
+_EXPORT_CHUNK = 5000
+# cv_dataset e jd_dataset girano in parallelo (pipeline_dag) sullo stesso file:
+# chi trova il lock di scrittura dell'altro attende invece di fallire con "database is locked"
+_BUSY_TIMEOUT = 60
+
+
+def _clean(value):
+    """NaN/NaT di pandas -> None, cosi' il JSON resta valido."""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, 'item'):  # scalari numpy
+        return value.item()
+    return value
+
+
+@dataclass
+class ChangeSet:
+    """Modifiche lette da uno stage a valle: stato finale di ogni chiave cambiata dopo since."""
+    consumer: str
+    since: int
+    version: int
+    rows: Dict[str, Dict] = field(default_factory=dict)
+    deleted: Set[str] = field(default_factory=set)
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self.deleted)
+
+
+class DatasetStore:
+    """Una tabella di dataset (es. cv_dataset) in un file SQLite."""
+
+    def __init__(self, db_path: Path, table: str, index_columns: Tuple[str, ...] = ()):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.table = table
+        self.index_columns = tuple(index_columns)
+
+        self.conn = sqlite3.connect(str(self.db_path), timeout=_BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        extra = "".join(f", {c} TEXT" for c in self.index_columns)
+        with self.conn:
+            self.conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                f"key TEXT PRIMARY KEY, version INTEGER NOT NULL, deleted INTEGER NOT NULL DEFAULT 0, "
+                f"updated_at REAL NOT NULL, row TEXT{extra})"
+            )
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_version ON {table}(version)")
+            for column in self.index_columns:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table}({column})")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS dataset_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def close(self):
+        self.conn.close()
+
+    # -- metadati ---------------------------------------------------------------
+
+    def _meta(self, name: str, default=None):
+        row = self.conn.execute("SELECT value FROM dataset_meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _set_meta(self, name: str, value):
+        self.conn.execute(
+            "INSERT INTO dataset_meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, json.dumps(value)),
+        )
+
+    def columns(self) -> List[str]:
+        """Colonne viste finora, in ordine di prima comparsa."""
+        return self._meta(f"columns:{self.table}", [])
+
+    def version(self) -> int:
+        return self.conn.execute(f"SELECT COALESCE(MAX(version), 0) FROM {self.table}").fetchone()[0]
+
+    def watermark(self, consumer: str) -> int:
+        """Ultima versione letta da uno stage a valle (0 = mai)."""
+        return self._meta(f"watermark:{self.table}:{consumer}", 0)
+
+    def set_watermark(self, consumer: str, version: int):
+        with self.conn:
+            self._set_meta(f"watermark:{self.table}:{consumer}", version)
+
+    def pending(self, consumer: str) -> ChangeSet:
+        """
+        Modifiche non ancora lette da consumer, fino alla versione corrente.
+        Il watermark va avanzato (set_watermark(consumer, changes.version)) solo
+        dopo aver scritto il risultato, cosi' un run fallito le rilegge.
+        """
+        since = self.watermark(consumer)
+        changes = ChangeSet(consumer, since, self.version())
+        for key, row, version in self.changes_since(since):
+            if version > changes.version:
+                break  # scritte dopo la lettura della versione: al prossimo run
+            if row is None:
+                changes.deleted.add(key)
+            else:
+                changes.rows[key] = row
+        return changes
+
+    # -- scritture --------------------------------------------------------------
+
+    def upsert_many(self, rows: Iterable[Tuple[str, Dict]]) -> int:
+        """Inserisce o sostituisce le righe per chiave, in una transazione con una nuova versione."""
+        now = time.time()
+        columns = self.columns()
+        known = set(columns)
+        count = 0
+        placeholders = ", ".join("?" for _ in range(5 + len(self.index_columns)))
+        updates = ", ".join(
+            ["version = excluded.version", "deleted = 0", "updated_at = excluded.updated_at", "row = excluded.row"]
+            + [f"{c} = excluded.{c}" for c in self.index_columns]
+        )
+        sql = (
+            f"INSERT INTO {self.table} (key, version, deleted, updated_at, row"
+            f"{''.join(', ' + c for c in self.index_columns)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(key) DO UPDATE SET {updates}"
+        )
+        with self.conn:
+            version = self.version() + 1
+            for key, row in rows:
+                row = {k: _clean(v) for k, v in row.items()}
+                for column in row:
+                    if column not in known:
+                        known.add(column)
+                        columns.append(column)
+                indexed = [None if row.get(c) is None else str(row.get(c)) for c in self.index_columns]
+                self.conn.execute(sql, [key, version, 0, now, json.dumps(row, ensure_ascii=False, default=str)] + indexed)
+                count += 1
+            self._set_meta(f"columns:{self.table}", columns)
+        return count
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Cancella le righe lasciando un tombstone (visibile in changes_since)."""
+        keys = list(keys)
+        if not keys:
+            return 0
+        with self.conn:
+            version = self.version() + 1
+            removed = 0
+            for i in range(0, len(keys), _IN_CHUNK):
+                chunk = keys[i:i + _IN_CHUNK]
+                marks = ", ".join("?" for _ in chunk)
+                removed += self.conn.execute(
+                    f"UPDATE {self.table} SET deleted = 1, row = NULL, version = ?, updated_at = ? "
+                    f"WHERE deleted = 0 AND key IN ({marks})",
+                    [version, time.time()] + chunk,
+                ).rowcount
+        return removed
+
+    def delete_missing(self, active_keys: Set[str], keep: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """Cancella le righe la cui chiave non e' tra quelle attive (keep(key) le esclude)."""
+        live = [k for (k,) in self.conn.execute(f"SELECT key FROM {self.table} WHERE deleted = 0")]
+        missing = [k for k in live if k not in active_keys and not (keep and keep(k))]
+        self.delete_many(missing)
+        return missing
+
+    def import_dataframe(self, df: pd.DataFrame, key_fn: Callable[[Dict], str]) -> int:
+        """Carica un dataset esistente (es. il vecchio CSV) mantenendo l'ordine delle righe."""
+        records = df.to_dict(orient='records')
+        return self.upsert_many((key_fn(r), r) for r in records)
+
+    # -- letture ----------------------------------------------------------------
+
+    def count(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self.table} WHERE deleted = 0").fetchone()[0]
+
+    def existing_keys(self, candidates: Iterable[str]) -> Set[str]:
+        return self._existing("key", candidates)
+
+    def existing_values(self, column: str, candidates: Iterable[str]) -> Set[str]:
+        if column not in self.index_columns:
+            raise ValueError(f"Colonna non indicizzata: {column}")
+        return self._existing(column, candidates)
+
+    def _existing(self, column: str, candidates: Iterable[str]) -> Set[str]:
+        values = [c for c in set(candidates) if c]
+        found = set()
+        for i in range(0, len(values), _IN_CHUNK):
+            chunk = values[i:i + _IN_CHUNK]
+            marks = ", ".join("?" for _ in chunk)
+            found.update(v for (v,) in self.conn.execute(
+                f"SELECT {column} FROM {self.table} WHERE deleted = 0 AND {column} IN ({marks})", chunk
+            ))
+        return found
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            f"SELECT row FROM {self.table} WHERE key = ? AND deleted = 0", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def changes_since(self, version: int) -> Iterator[Tuple[str, Optional[Dict], int]]:
+        """(key, riga o None se cancellata, versione) delle modifiche dopo version."""
+        cursor = self.conn.execute(
+            f"SELECT key, row, deleted, version FROM {self.table} WHERE version > ? ORDER BY version, rowid",
+            (version,),
+        )
+        for key, row, deleted, row_version in cursor:
+            yield key, None if deleted else json.loads(row), row_version
+
+    def keys(self) -> List[str]:
+        """Chiavi attive nell'ordine di inserimento (lo stesso di rows())."""
+        return [k for (k,) in self.conn.execute(f"SELECT key FROM {self.table} WHERE deleted = 0 ORDER BY rowid")]
+
+    def rows(self) -> Iterator[Dict]:
+        """Righe attive nell'ordine di inserimento."""
+        for (row,) in self.conn.execute(f"SELECT row FROM {self.table} WHERE deleted = 0 ORDER BY rowid"):
+            yield json.loads(row)
+
+    def to_dataframe(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        return pd.DataFrame(list(self.rows()), columns=columns or self.columns())
+
+    def export_table(self, path: Path, columns: List[str], types: Optional[Dict[str, str]] = None,
+                     force: bool = False) -> bool:
+        """
+        Esporta la tabella completa (Parquet + CSV, vedi columnar.py; solo le
+        colonne indicate, nell'ordine dato) se il dataset e' cambiato
+        dall'ultima esportazione. Su richiesta: la pipeline non la legge.
+        Restituisce True se scritta.
+        """
+        base = table_base(path)
+        version = self.version()
+        state = {"version": version, "columns": columns, "types": types or {}}
+        writer = TableWriter(base, columns, types)
+        outputs = [base.with_name(f"{base.name}.{ext}") for ext in writer.formats]
+        if not force and all(p.exists() for p in outputs) and self._meta(f"export:{self.table}:{base.name}") == state:
+            return False
+
+        batch: List[Dict] = []
+        with writer:
+            for row in self.rows():
+                batch.append(row)
+                if len(batch) >= _EXPORT_CHUNK:
+                    writer.write(pd.DataFrame(batch, columns=columns))
+                    batch.clear()
+            if batch:
+                writer.write(pd.DataFrame(batch, columns=columns))
+
+        with self.conn:
+            self._set_meta(f"export:{self.table}:{base.name}", state)
+        return True
+
+
+def merge_changes(previous: pd.DataFrame, changed: pd.DataFrame, changes: ChangeSet,
+                  key_fn: Callable[[Dict], str], order: List[str]) -> Optional[pd.DataFrame]:
+    """
+    Tabella derivata aggiornata con le modifiche: le righe di previous non
+    cambiate ne' cancellate piu' le righe changed (gia' trasformate, possono
+    mancarne di scartate), nell'ordine delle chiavi del dataset (order).
+
+    key_fn ricava la chiave del dataset da una riga della tabella derivata.
+    Restituisce None se previous non corrisponde al dataset (chiavi duplicate
+    o non piu' presenti): la tabella va ricostruita per intero.
+    """
+    position = {key: i for i, key in enumerate(order)}
+    previous_keys = [key_fn(row) for row in previous.to_dict(orient='records')]
+    keep = pd.Series([key not in changes.rows and key not in changes.deleted for key in previous_keys],
+                     index=previous.index, dtype=bool)
+    kept_keys = [key for key, kept in zip(previous_keys, keep) if kept]
+    changed_keys = [key_fn(row) for row in changed.to_dict(orient='records')]
+    keys = kept_keys + changed_keys
+    if len(set(keys)) != len(keys) or any(key not in position for key in keys):
+        return None
+
+    merged = pd.concat([previous[keep], changed], ignore_index=True) if len(changed) else previous[keep]
+    ranks = sorted(range(len(keys)), key=lambda i: position[keys[i]])
+    return merged.iloc[ranks].reset_index(drop=True)
+
+
+def apply_changes(base: Path, changed: pd.DataFrame, changes: ChangeSet, key_fn: Callable[[Dict], str],
+                  keys: List[str], types: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Applica le modifiche a una tabella derivata partizionata per chiave
+    (columnar.write_partitions): legge, unisce con merge_changes() e riscrive
+    solo le partizioni delle chiavi cambiate o cancellate. keys sono le chiavi
+    del dataset nell'ordine dello store (keys()).
+
+    Restituisce False, senza scrivere, se la tabella non corrisponde al
+    dataset (o alle colonne di changed): va ricostruita per intero.
+    """
+    index = partition_index(base)
+    if index is None or index["partitions"] != PARTITIONS:
+        return False
+    touched = {partition_of(key) for key in list(changes.rows) + list(changes.deleted)}
+    if not touched:
+        return True
+    previous = read_partitions(base, touched)
+    order = [key for key in keys if partition_of(key) in touched]
+    merged = merge_changes(previous, changed, changes, key_fn, order)
+    if merged is None or [str(c) for c in merged.columns] != index["columns"]:
+        return False
+    write_partitions(merged, base, key_fn, types, touched)
+    return True
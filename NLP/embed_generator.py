@@ -3,17 +3,24 @@
 import json
 import hashlib
 import logging
+import sqlite3
 import sys
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import warnings
 
 import pandas as pd
 import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from columnar import coerce_frame, partition_index, read_table, table_exists, write_partitions
+from cv_json_to_dataset_processor import cv_row_key
+from dataset_store import DatasetStore, apply_changes
+from jd_json_to_dataset_processor import jd_row_key
+
 warnings.filterwarnings('ignore')
 
 if '__file__' in globals():
@@ -29,14 +36,40 @@ JD_INPUT = DATASET_DIR / "jd_dataset_normalized.csv"
 CV_OUTPUT = EMBEDDINGS_DIR / "cv_embeddings.csv"
 JD_OUTPUT = EMBEDDINGS_DIR / "jd_embeddings.csv"
 METADATA_OUTPUT = EMBEDDINGS_DIR / "embedding_metadata.json"
+EMBEDDING_CACHE = EMBEDDINGS_DIR / "embedding_cache.sqlite3"
 
 MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
 MODEL_DIM = 384
 BATCH_SIZE = 32
+# Testi codificati tra un checkpoint e l'altro nella cache degli embeddings
+CHECKPOINT_EVERY = int(os.getenv("EMBED_CHECKPOINT_EVERY", "512"))
 
 CV_FIELDS = ["summary", "experience", "skills"]
 JD_FIELDS = ["title", "description", "requirements", "nice_to_have"]
 
+# Watermark nel DatasetStore degli embeddings aggiornati per chiave (uno per modello)
+EMBEDDINGS_CONSUMER = f"embeddings:{MODEL_NAME}"
+
+# Embeddings salvati come lista di float32 nel Parquet (JSON nel CSV)
+EMBEDDING_COLUMN_TYPES = {'embedding_vector': 'vector', 'model_dim': 'int64'}
+CV_EMBEDDING_COLUMNS = [
+    'user_id',
+    'document_type',
+    'embedding_vector',
+    'text_content',
+    'model_name',
+    'model_dim',
+    'created_at',
+    'text_hash'
+]
+JD_EMBEDDING_COLUMNS = ['jd_id'] + CV_EMBEDDING_COLUMNS[1:]
+
+# Modello condiviso tra CV e JD (e tra i rami del DAG in pipeline_dag.py):
+# caricato una sola volta; encode serializzato, torch usa gia' tutti i core
+_model = None
+_model_lock = threading.Lock()
+_encode_lock = threading.Lock()
+
 LOG_DIR = BASE_DIR / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "embed_generator.log"
@@ -138,10 +171,13 @@ def compute_drift_metrics(embeddings: np.ndarray) -> Dict:
 
 
 def load_model() -> SentenceTransformer:
-    logger.info(f"Loading model: {MODEL_NAME}")
-    model = SentenceTransformer(MODEL_NAME)
-    logger.info(f"Model loaded on device: {model.device}")
-    return model
+    global _model
+    with _model_lock:
+        if _model is None:
+            logger.info(f"Loading model: {MODEL_NAME}")
+            _model = SentenceTransformer(MODEL_NAME)
+            logger.info(f"Model loaded on device: {_model.device}")
+        return _model
 
 
 def generate_embeddings(
@@ -150,24 +186,103 @@ def generate_embeddings(
     batch_size: int = BATCH_SIZE
 ) -> np.ndarray:
 
-    embeddings = model.encode(
-        texts,
-        batch_size=batch_size,
-        show_progress_bar=True,
-        convert_to_numpy=True,
-        normalize_embeddings=True
-    )
+    with _encode_lock:
+        embeddings = model.encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=True,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
 
     return embeddings
 
 
-def process_cv_dataset() -> Tuple[pd.DataFrame, Dict]:
+class EmbeddingCache:
+    """
+    Vettori gia' calcolati per (modello, text_hash), in SQLite.
+
+    Fa da checkpoint dell'encode: i vettori sono salvati ogni CHECKPOINT_EVERY
+    testi, quindi un run interrotto riprende da dove si era fermato, e i testi
+    invariati tra un batch e l'altro non sono ricodificati.
+    """
+
+    def __init__(self, path: Path, model_name: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.conn = sqlite3.connect(str(path), timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            marks = ", ".join("?" for _ in chunk)
+            for text_hash, blob in self.conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                [self.model_name] + chunk,
+            ):
+                found[text_hash] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, hashes: List[str], vectors: np.ndarray):
+        now = datetime.now().timestamp()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, np.asarray(v, dtype=np.float32).tobytes(), now) for h, v in zip(hashes, vectors)],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def embed_texts(texts: List[str], hashes: List[str]) -> np.ndarray:
+    """Embeddings dei testi: dalla cache se gia' calcolati, altrimenti encode a blocchi con checkpoint."""
+    cache = EmbeddingCache(EMBEDDING_CACHE, MODEL_NAME)
+    try:
+        found = cache.get_many(hashes)
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in found:
+                missing.setdefault(text_hash, text)
+        logger.info(f"Embedding cache: {len(hashes) - sum(h in missing for h in hashes)} hit, "
+                    f"{len(missing)} texts to encode")
+
+        if missing:
+            model = load_model()
+            todo = list(missing.items())
+            for start in range(0, len(todo), CHECKPOINT_EVERY):
+                chunk = todo[start:start + CHECKPOINT_EVERY]
+                vectors = generate_embeddings([text for _, text in chunk], model)
+                cache.put_many([h for h, _ in chunk], vectors)
+                found.update(zip((h for h, _ in chunk), vectors))
+                logger.info(f"Checkpoint: {min(start + CHECKPOINT_EVERY, len(todo))}/{len(todo)} encoded")
+    finally:
+        cache.close()
+
+    if not hashes:
+        return np.empty((0, MODEL_DIM), dtype=np.float32)
+    return np.vstack([found[h] for h in hashes])
+
+
+def process_cv_dataset(df: Optional[pd.DataFrame] = None) -> Tuple[pd.DataFrame, Dict]:
     logger.info("Processing CV dataset")
 
-    if not CV_INPUT.exists():
+    if df is not None:
+        df = df[['user_id'] + CV_FIELDS].reset_index(drop=True)
+    elif not table_exists(CV_INPUT):
         raise FileNotFoundError(f"CV dataset not found: {CV_INPUT}")
-
-    df = pd.read_csv(CV_INPUT)
+    else:
+        # Solo le colonne usate per il testo
+        df = read_table(CV_INPUT, columns=['user_id'] + CV_FIELDS)
     logger.info(f"Loaded {len(df)} CVs")
 
     df['text_content'] = df.apply(concatenate_cv_fields, axis=1)
@@ -181,12 +296,10 @@ def process_cv_dataset() -> Tuple[pd.DataFrame, Dict]:
         logger.warning(f"Skipping {empty_mask.sum()} empty JDs")
         df = df[~empty_mask].reset_index(drop=True)
 
-    texts = df['text_content'].tolist()
-    model = load_model()
-    embeddings = generate_embeddings(texts, model)
-
     df['text_hash'] = df['text_content'].apply(compute_text_hash)
-    df['embedding_vector'] = [json.dumps(emb.tolist()) for emb in embeddings]
+    embeddings = embed_texts(df['text_content'].tolist(), df['text_hash'].tolist())
+
+    df['embedding_vector'] = list(embeddings)
     df['model_name'] = MODEL_NAME
     df['model_dim'] = MODEL_DIM
     df['created_at'] = datetime.now().isoformat()
@@ -201,10 +314,12 @@ def process_cv_dataset() -> Tuple[pd.DataFrame, Dict]:
     return df, stats
 
 
-def process_jd_dataset() -> Tuple[pd.DataFrame, Dict]:
+def process_jd_dataset(df: Optional[pd.DataFrame] = None) -> Tuple[pd.DataFrame, Dict]:
     logger.info("Processing JD dataset")
 
-    if not JD_INPUT.exists():
+    if df is not None:
+        df = df[['jd_id'] + JD_FIELDS].reset_index(drop=True)
+    elif not table_exists(JD_INPUT):
         logger.warning(f"JD dataset not found: {JD_INPUT}")
         # Restituisci DataFrame vuoto e stats nulle
         empty_stats = {
@@ -217,8 +332,8 @@ def process_jd_dataset() -> Tuple[pd.DataFrame, Dict]:
             "empty_skipped": 0
         }
         return pd.DataFrame(), empty_stats
-
-    df = pd.read_csv(JD_INPUT)
+    else:
+        df = read_table(JD_INPUT, columns=['jd_id'] + JD_FIELDS)
     logger.info(f"Loaded {len(df)} JDs")
 
     if df.empty:
@@ -254,12 +369,10 @@ def process_jd_dataset() -> Tuple[pd.DataFrame, Dict]:
         }
         return df, empty_stats
 
-    texts = df['text_content'].tolist()
-    model = load_model()
-    embeddings = generate_embeddings(texts, model)
-
     df['text_hash'] = df['text_content'].apply(compute_text_hash)
-    df['embedding_vector'] = [json.dumps(emb.tolist()) for emb in embeddings]
+    embeddings = embed_texts(df['text_content'].tolist(), df['text_hash'].tolist())
+
+    df['embedding_vector'] = list(embeddings)
     df['model_name'] = MODEL_NAME
     df['model_dim'] = MODEL_DIM
     df['created_at'] = datetime.now().isoformat()
@@ -278,14 +391,68 @@ def save_embeddings(
     df: pd.DataFrame,
     output_path: Path,
     id_column: str,
-    columns_to_save: List[str]
+    columns_to_save: List[str],
+    key_fn: Callable[[Dict], str]
 ):
+    """Riscrive per intero la tabella degli embeddings, partizionata per chiave del dataset (key_fn)."""
     df_output = df[columns_to_save].copy()
     df_output = df_output.sort_values(by=id_column).reset_index(drop=True)
-    df_output.to_csv(output_path, index=False)
+    write_partitions(df_output, output_path, key_fn, EMBEDDING_COLUMN_TYPES)
     logger.info(f"Saved {len(df_output)} embeddings to {output_path}")
 
 
+def _update_embeddings(store: DatasetStore, full_df: pd.DataFrame, process: Callable, output_path: Path,
+                       id_column: str, fields: List[str], columns: List[str],
+                       key_fn: Callable[[Dict], str]) -> Tuple[pd.DataFrame, Dict]:
+    """
+    Embeddings delle sole righe del dataset cambiate dal watermark
+    (DatasetStore.pending), sostituiti per chiave nella tabella partizionata:
+    sono lette e riscritte solo le partizioni toccate (apply_changes); le
+    righe cancellate sono rimosse. Al primo run, o se la tabella precedente
+    non corrisponde al dataset, embeddings di tutto full_df (il dataset
+    normalizzato). Restituisce la tabella completa, per il matching.
+    """
+    changes = store.pending(EMBEDDINGS_CONSUMER)
+    df = None
+    if changes.since and partition_index(output_path) is not None:
+        logger.info(f"Incremental {store.table} embeddings: {len(changes.rows)} changed, "
+                    f"{len(changes.deleted)} deleted")
+        changed = pd.DataFrame(columns=columns)
+        if changes.rows:
+            rows = pd.DataFrame(list(changes.rows.values()), columns=[id_column] + fields)
+            processed, _ = process(coerce_frame(rows))
+            if len(processed):
+                changed = processed[columns]
+        if not len(changes) or apply_changes(output_path, changed, changes, key_fn, store.keys(),
+                                             EMBEDDING_COLUMN_TYPES):
+            df = read_table(output_path)
+            vectors = (np.vstack([json.loads(v) if isinstance(v, str) else v for v in df['embedding_vector']])
+                       if len(df) else np.empty((0, MODEL_DIM), dtype=np.float32))
+            stats = compute_drift_metrics(vectors)
+            stats['count'] = len(df)
+            stats['empty_skipped'] = store.count() - len(df)
+        else:
+            logger.warning(f"{output_path} does not match the dataset, regenerating all embeddings")
+
+    if df is None:
+        df, stats = process(full_df)
+        save_embeddings(df, output_path, id_column, columns, key_fn)
+    store.set_watermark(EMBEDDINGS_CONSUMER, changes.version)
+    return df, stats
+
+
+def update_cv_embeddings(store: DatasetStore, cv_normalized: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """process_cv_dataset + save_embeddings incrementali, dal DatasetStore del dataset CV."""
+    return _update_embeddings(store, cv_normalized, process_cv_dataset, CV_OUTPUT,
+                              'user_id', CV_FIELDS, CV_EMBEDDING_COLUMNS, cv_row_key)
+
+
+def update_jd_embeddings(store: DatasetStore, jd_normalized: pd.DataFrame) -> Tuple[pd.DataFrame, Dict]:
+    """process_jd_dataset + save_embeddings incrementali, dal DatasetStore del dataset JD."""
+    return _update_embeddings(store, jd_normalized, process_jd_dataset, JD_OUTPUT,
+                              'jd_id', JD_FIELDS, JD_EMBEDDING_COLUMNS, jd_row_key)
+
+
 def save_metadata(cv_stats: Dict, jd_stats: Dict):
 
     def convert_to_native(obj):
@@ -351,17 +518,7 @@ def main():
 
         # === CV FLOW ===
         cv_df, cv_stats = process_cv_dataset()
-        cv_columns = [
-            'user_id',
-            'document_type',
-            'embedding_vector',
-            'text_content',
-            'model_name',
-            'model_dim',
-            'created_at',
-            'text_hash'
-        ]
-        save_embeddings(cv_df, CV_OUTPUT, 'user_id', cv_columns)
+        save_embeddings(cv_df, CV_OUTPUT, 'user_id', CV_EMBEDDING_COLUMNS, cv_row_key)
 
         # === JD FLOW ===
         # Normalizza JD dataset
@@ -378,17 +535,7 @@ def main():
 
         # Genera embeddings JD
         jd_df, jd_stats = process_jd_dataset()
-        jd_columns = [
-            'jd_id',
-            'document_type',
-            'embedding_vector',
-            'text_content',
-            'model_name',
-            'model_dim',
-            'created_at',
-            'text_hash'
-        ]
-        save_embeddings(jd_df, JD_OUTPUT, 'jd_id', jd_columns)
+        save_embeddings(jd_df, JD_OUTPUT, 'jd_id', JD_EMBEDDING_COLUMNS, jd_row_key)
 
         save_metadata(cv_stats, jd_stats)
 
@@ -64,6 +64,17 @@ if errorlevel 1 (
 echo [OK] python-dateutil installato
 echo.
 
+REM Installa pyarrow (tabelle Parquet tra gli stage, vedi columnar.py)
+echo [INFO] Installazione pyarrow...
+python -m pip install pyarrow --quiet
+if errorlevel 1 (
+    echo [ERRORE] Impossibile installare pyarrow
+    pause
+    exit /b 1
+)
+echo [OK] pyarrow installato
+echo.
+
 REM ============================================================================
 REM DIPENDENZE EMBEDDING GENERATOR
 REM ============================================================================
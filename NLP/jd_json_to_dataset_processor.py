@@ -9,7 +9,7 @@ Original file is located at
 
 """
 jd_to_csv_processor.py
-Converte file JSON JD in un dataset CSV tabulare
+Converte file JSON JD in un dataset tabulare (SQLite indicizzato + export Parquet/CSV)
 Con controllo duplicati e pulizia JD eliminate
 """
 
@@ -20,11 +20,25 @@ from typing import List, Dict, Set
 from datetime import datetime
 import pandas as pd
 
+from dataset_store import DB_FILENAME, DatasetStore
+
 
 INPUT_FOLDER = "/var/lib/docker/piazzati-data/jds"
 OUTPUT_FOLDER = "Dataset"
 OUTPUT_FILENAME = "jd_dataset.csv"
 
+JD_COLUMNS = [
+    'jd_id', 'source_file', 'processed_at', 'title', 'department',
+    'location_city', 'location_country', 'location_remote',
+    'description', 'requirements', 'nice_to_have',
+    'constraints_visa', 'constraints_relocation', 'constraints_seniority', 'constraints_languages',
+    'dei_gender_target', 'dei_underrepresented_target',
+    'salary_min', 'salary_max', 'salary_currency', 'contract'
+]
+
+# Colonne non di testo (le altre sono stringhe)
+JD_COLUMN_TYPES = {'salary_min': 'float64', 'salary_max': 'float64'}
+
 ARRAY_SEP = " | "
 LIST_SEP = ", "
 
@@ -243,6 +257,43 @@ def json_to_row(data: Dict, source_file: str) -> Dict:
     return row
 
 
+def jd_row_key(row: Dict) -> str:
+    """Chiave del dataset: jd_id, altrimenti il file sorgente."""
+    jd_id = row.get('jd_id')
+    if jd_id is not None and str(jd_id).strip() and str(jd_id) != 'nan':
+        return str(jd_id)
+    return f"file:{row.get('source_file', '')}"
+
+
+def same_content(stored: Dict, row: Dict) -> bool:
+    """True se la riga salvata e' uguale alla nuova (a meno di processed_at)."""
+    if stored is None:
+        return False
+    keys = (set(stored) | set(row)) - {'processed_at'}
+    return all(stored.get(k) == row.get(k) for k in keys)
+
+
+def open_jd_store(output_path: Path, csv_path: Path) -> DatasetStore:
+    """Store del dataset JD; al primo avvio importa il CSV esistente."""
+    store = DatasetStore(output_path / DB_FILENAME, 'jd_dataset')
+    if store.version() == 0 and csv_path.exists():
+        imported = store.import_dataframe(pd.read_csv(csv_path, encoding='utf-8', dtype=str), jd_row_key)
+        print(f"  Importato dataset CSV esistente: {imported} righe")
+    return store
+
+
+def export_dataset(output_dir: str = OUTPUT_FOLDER, output_file: str = OUTPUT_FILENAME) -> Path:
+    """Esporta su richiesta il dataset completo (Parquet + CSV) per chi lo legge per intero."""
+    output_path = Path(output_dir)
+    full_output_path = output_path / output_file
+    store = open_jd_store(output_path, full_output_path)
+    try:
+        store.export_table(full_output_path, JD_COLUMNS, JD_COLUMN_TYPES)
+    finally:
+        store.close()
+    return full_output_path
+
+
 def process_files(input_dir: str, output_dir: str, output_file: str):
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -260,135 +311,91 @@ def process_files(input_dir: str, output_dir: str, output_file: str):
 
     print(f"Trovati {len(json_files)} file JSON")
 
+    # Ogni file e' letto una sola volta
+    rows = []
+    errors = []
+    for json_file in json_files:
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rows.append(json_to_row(data, json_file.name))
+        except Exception as e:
+            errors.append((json_file.name, str(e)))
+            print(f"  ERRORE: {json_file.name} - {e}")
+
+    store = open_jd_store(output_path, full_output_path)
+
     print(f"\nControllo JD eliminate...")
-    active_jd_ids = get_active_jd_ids(input_path)
+    active_jd_ids = {jd_row_key(row) for row in rows if row['jd_id']}
     print(f"  JD attive nei JSON: {len(active_jd_ids)}")
 
-    removed_count = clean_deleted_jds(full_output_path, active_jd_ids)
+    # Solo le righe delle JD sparite diventano tombstone (righe senza jd_id mantenute)
+    deleted_jds = store.delete_missing(active_jd_ids, keep=lambda key: key.startswith('file:'))
+    removed_count = len(deleted_jds)
+    if deleted_jds:
+        print(f"  JD rimosse: {removed_count}")
+        if removed_count <= 10:
+            for jd_id in deleted_jds:
+                print(f"    - {jd_id}")
+    else:
+        print("  Nessuna JD da rimuovere")
 
     print(f"\nControllo duplicati nel dataset esistente...")
-    jd_id_to_index = get_existing_jd_ids(full_output_path)
+    existing_jd_ids = store.existing_keys(active_jd_ids)
 
-    if jd_id_to_index:
-        print(f"  JD ID unici: {len(jd_id_to_index)}")
+    if store.count():
+        print(f"  JD nel dataset: {store.count()}")
     else:
         print(f"  Nessun dataset esistente")
 
     print(f"\nAnalisi file JSON...")
 
-    files_to_add = []
-    files_to_update = []
-    files_skipped = []
+    rows_to_add = []
+    rows_to_update = []
     files_no_id = []
+    unchanged = 0
 
-    for json_file in json_files:
-        jd_id = extract_jd_id_from_json(json_file)
+    for row in rows:
+        jd_id = jd_row_key(row) if row['jd_id'] else ''
 
         if not jd_id:
-            files_no_id.append(json_file.name)
-            files_to_add.append(json_file)
+            files_no_id.append(row['source_file'])
+            rows_to_add.append(row)
 
-        elif jd_id in jd_id_to_index:
-            files_to_update.append((json_file, jd_id, jd_id_to_index[jd_id]))
-            print(f"  UPDATE: {json_file.name} -> {jd_id}")
+        elif jd_id in existing_jd_ids:
+            if same_content(store.get(jd_id), row):
+                unchanged += 1
+                continue
+            rows_to_update.append(row)
+            print(f"  UPDATE: {row['source_file']} -> {jd_id}")
 
         else:
-            files_to_add.append(json_file)
+            rows_to_add.append(row)
+            print(f"  {row['source_file']} -> {jd_id}")
 
     print(f"\nRisultato:")
-    print(f"  Nuove: {len(files_to_add)}")
-    print(f"  Da aggiornare: {len(files_to_update)}")
+    print(f"  Nuove: {len(rows_to_add)}")
+    print(f"  Da aggiornare: {len(rows_to_update)}")
+    print(f"  Invariate: {unchanged}")
     if files_no_id:
         print(f"  Senza jd_id: {len(files_no_id)}")
 
-    if not files_to_add and not files_to_update:
-        print("\nNessun file da processare")
-        if removed_count > 0:
-            print(f"Dataset aggiornato: {removed_count} righe eliminate")
-        return True
-
-    rows_to_add = []
-    errors = []
-
-    if files_to_add:
-        print(f"\nProcessamento {len(files_to_add)} nuove JD...")
-
-        for json_file in files_to_add:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                row = json_to_row(data, json_file.name)
-                rows_to_add.append(row)
-
-                jd_id = row['jd_id'] or 'N/A'
-                print(f"  {json_file.name} -> {jd_id}")
-
-            except Exception as e:
-                errors.append((json_file.name, str(e)))
-                print(f"  ERRORE: {json_file.name} - {e}")
-
-    rows_to_update = []
-
-    if files_to_update:
-        print(f"\nAggiornamento {len(files_to_update)} JD esistenti...")
-
-        for json_file, jd_id, row_index in files_to_update:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-
-                row = json_to_row(data, json_file.name)
-                rows_to_update.append((row_index, row))
-
-                print(f"  {json_file.name} -> {jd_id}")
-
-            except Exception as e:
-                errors.append((json_file.name, str(e)))
-                print(f"  ERRORE: {json_file.name} - {e}")
-
-    output_path.mkdir(parents=True, exist_ok=True)
-
-    if full_output_path.exists():
-        existing_df = pd.read_csv(full_output_path, encoding='utf-8')
-
-        for row_index, row_data in rows_to_update:
-            for col, value in row_data.items():
-                if col in existing_df.columns:
-                    existing_df.at[row_index, col] = value
-
-        if rows_to_add:
-            new_df = pd.DataFrame(rows_to_add)
-            final_df = pd.concat([existing_df, new_df], ignore_index=True)
-        else:
-            final_df = existing_df
-    else:
-        if rows_to_add:
-            final_df = pd.DataFrame(rows_to_add)
-        else:
-            print("Nessuna riga da salvare")
-            return False
-
-    cols = [
-        'jd_id', 'source_file', 'processed_at', 'title', 'department',
-        'location_city', 'location_country', 'location_remote',
-        'description', 'requirements', 'nice_to_have',
-        'constraints_visa', 'constraints_relocation', 'constraints_seniority', 'constraints_languages',
-        'dei_gender_target', 'dei_underrepresented_target',
-        'salary_min', 'salary_max', 'salary_currency', 'contract'
-    ]
+    if not rows_to_add and not rows_to_update and not store.count():
+        print("Nessuna riga da salvare")
+        return False
 
-    existing_cols = [c for c in cols if c in final_df.columns]
-    final_df = final_df[existing_cols]
+    # Upsert per chiave: solo le righe nuove o aggiornate sono scritte
+    store.upsert_many((jd_row_key(row), row) for row in rows_to_add + rows_to_update)
 
-    final_df.to_csv(full_output_path, index=False, encoding='utf-8')
+    # Nessuna riesportazione completa: gli stage a valle leggono le modifiche dallo store
+    # (export_dataset() esporta la tabella su richiesta)
 
-    print(f"\nCompletato: {full_output_path}")
+    print(f"\nCompletato: {store.db_path} ({store.table})")
     print(f"Nuove righe: {len(rows_to_add)}")
     print(f"Righe aggiornate: {len(rows_to_update)}")
     if removed_count > 0:
         print(f"Righe eliminate: {removed_count}")
-    print(f"Totale righe: {len(final_df)}")
+    print(f"Totale righe: {store.count()}")
 
     if errors:
         print(f"\nErrori: {len(errors)}")
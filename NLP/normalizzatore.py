@@ -5,15 +5,22 @@ Calcola seniority da anni di esperienza reali invece che da keyword nei titoli.
 Normalizza salary in formato leggibile e gestisce tag DE&I.
 """
 
+import hashlib
 import json
 import pandas as pd
 import re
+import threading
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Optional
+from typing import Callable, Dict, List, Set, Tuple, Optional
 from datetime import datetime
 from dateutil import parser
 from collections import defaultdict
 
+from columnar import coerce_frame, partition_index, read_table, table_exists, tag_types, write_partitions
+from cv_json_to_dataset_processor import cv_row_key, dataset_columns
+from dataset_store import DatasetStore, apply_changes
+from jd_json_to_dataset_processor import JD_COLUMN_TYPES, JD_COLUMNS, jd_row_key
+
 # ============================================================================
 # CONFIGURAZIONE
 # ============================================================================
@@ -24,6 +31,7 @@ INPUT_JD = DATASET_DIR / "jd_dataset.csv"
 ONTOLOGY_FILE = DATASET_DIR / "skill_ontology.json"
 
 OUTPUT_DIR = DATASET_DIR / "normalized"
+# Le tabelle sono lette/scritte come Parquet (+ CSV), vedi columnar.py
 OUTPUT_CV = OUTPUT_DIR / "cv_dataset_normalized.csv"
 OUTPUT_JD = OUTPUT_DIR / "jd_dataset_normalized.csv"
 
@@ -53,7 +61,9 @@ class SkillOntology:
         self.cefr_mappings = {k: v for k, v in self.cefr_mappings.items()
                               if not k.startswith('_')}
 
+        # Condivisa dai rami CV e JD, normalizzati in parallelo (pipeline_dag.py)
         self.unmapped_skills = defaultdict(int)
+        self._unmapped_lock = threading.Lock()
         previous_unmapped = self.data.get('unmapped_skills', {}).get('skills', [])
         self.previous_unmapped = {item['skill'] for item in previous_unmapped}
 
@@ -75,7 +85,8 @@ class SkillOntology:
             return self.skill_mappings[skill_lower]
 
         if skill_clean not in self.previous_unmapped:
-            self.unmapped_skills[skill_clean] += 1
+            with self._unmapped_lock:
+                self.unmapped_skills[skill_clean] += 1
 
         return skill_clean.capitalize()
 
@@ -115,17 +126,23 @@ class SkillOntology:
         else:
             return "senior"
 
+    def fingerprint(self) -> str:
+        """Impronta delle mappature (le skill non mappate non cambiano la normalizzazione)."""
+        mappings = [self.skill_mappings, self.seniority_mappings, self.cefr_mappings]
+        return hashlib.sha256(json.dumps(mappings, sort_keys=True).encode('utf-8')).hexdigest()
+
     def save_updated_ontology(self):
         print(f"\nAggiornamento ontologia...")
 
+        with self._unmapped_lock:
+            unmapped = list(self.unmapped_skills.items())
         new_unmapped = [
             {
                 "skill": skill,
                 "frequency": freq,
                 "suggested_canonical": skill.capitalize()
             }
-            for skill, freq in sorted(self.unmapped_skills.items(),
-                                     key=lambda x: x[1], reverse=True)
+            for skill, freq in sorted(unmapped, key=lambda x: x[1], reverse=True)
         ]
 
         existing_unmapped = self.data.get('unmapped_skills', {}).get('skills', [])
@@ -312,22 +329,45 @@ def extract_salary_range(salary_str: str) -> str:
 # NORMALIZZAZIONE DATASET
 # ============================================================================
 
-def normalize_cv_dataset(input_path: Path, output_path: Path, ontology: SkillOntology) -> pd.DataFrame:
+def cv_column_types(df: pd.DataFrame) -> Dict[str, str]:
+    """Colonne non di testo del dataset CV normalizzato."""
+    types = tag_types(df.columns)
+    types['years_of_experience'] = 'float64'
+    return types
+
+
+def normalize_cv_dataset(input_path: Path, output_path: Path, ontology: SkillOntology,
+                         df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """df: dataset gia' in memoria (es. dallo stage precedente del DAG), altrimenti letto da input_path."""
     print(f"\n{'='*80}")
     print(f"NORMALIZZAZIONE DATASET CV")
     print(f"{'='*80}\n")
 
-    print(f"Caricamento: {input_path}")
-    df = pd.read_csv(input_path)
+    if df is None:
+        print(f"Caricamento: {input_path}")
+        df = read_table(input_path)
+    else:
+        df = df.copy()
     print(f"Righe caricate: {len(df)}\n")
 
     if len(df) == 0:
         print("CV dataset vuoto: nessuna normalizzazione necessaria.")
         print(f"Salvataggio: {output_path}")
-        df.to_csv(output_path, index=False)
+        write_partitions(df, output_path, cv_row_key, cv_column_types(df))
         print(f"Salvato\n")
         return df
 
+    df = normalize_cv_frame(df, ontology)
+
+    print(f"Salvataggio: {output_path}")
+    write_partitions(df, output_path, cv_row_key, cv_column_types(df))
+    print(f"Salvato\n")
+
+    return df
+
+
+def normalize_cv_frame(df: pd.DataFrame, ontology: SkillOntology) -> pd.DataFrame:
+    """Aggiunge a df (non vuoto) le colonne normalizzate, senza leggere ne' scrivere tabelle."""
     print("Normalizzazione skills...")
     df['skills_normalized'] = df['skills'].apply(
         lambda x: normalize_skills_string(x, ontology)
@@ -398,28 +438,40 @@ def normalize_cv_dataset(input_path: Path, output_path: Path, ontology: SkillOnt
         print(f"  Nessuna colonna tag trovata")
     print()
 
-    print(f"Salvataggio: {output_path}")
-    df.to_csv(output_path, index=False)
-    print(f"Salvato\n")
-
     return df
 
-def normalize_jd_dataset(input_path: Path, output_path: Path, ontology: SkillOntology) -> pd.DataFrame:
+def normalize_jd_dataset(input_path: Path, output_path: Path, ontology: SkillOntology,
+                         df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """df: dataset gia' in memoria (es. dallo stage precedente del DAG), altrimenti letto da input_path."""
     print(f"\n{'='*80}")
     print(f"NORMALIZZAZIONE DATASET JD")
     print(f"{'='*80}\n")
 
-    print(f"Caricamento: {input_path}")
-    df = pd.read_csv(input_path)
+    if df is None:
+        print(f"Caricamento: {input_path}")
+        df = read_table(input_path)
+    else:
+        df = df.copy()
     print(f"Righe caricate: {len(df)}\n")
 
     if len(df) == 0:
         print("JD dataset vuoto: nessuna normalizzazione necessaria.")
         print(f"Salvataggio: {output_path}")
-        df.to_csv(output_path, index=False)
+        write_partitions(df, output_path, jd_row_key, JD_COLUMN_TYPES)
         print(f"Salvato\n")
         return df
 
+    df = normalize_jd_frame(df, ontology)
+
+    print(f"Salvataggio: {output_path}")
+    write_partitions(df, output_path, jd_row_key, JD_COLUMN_TYPES)
+    print(f"Salvato\n")
+
+    return df
+
+
+def normalize_jd_frame(df: pd.DataFrame, ontology: SkillOntology) -> pd.DataFrame:
+    """Aggiunge a df (non vuoto) le colonne normalizzate, senza leggere ne' scrivere tabelle."""
     print("Normalizzazione requirements...")
     df['requirements_normalized'] = df['requirements'].apply(
         lambda x: normalize_skills_string(x, ontology)
@@ -488,12 +540,63 @@ def normalize_jd_dataset(input_path: Path, output_path: Path, ontology: SkillOnt
             print(f"    {sal_min}-{sal_max} {sal_curr:3} → {norm}")
     print()
 
-    print(f"Salvataggio: {output_path}")
-    df.to_csv(output_path, index=False)
-    print(f"Salvato\n")
+    return df
 
+# ============================================================================
+# NORMALIZZAZIONE INCREMENTALE (pipeline_dag.py)
+# ============================================================================
+
+# Watermark nel DatasetStore, uno per ontologia: con mappature diverse tutte le righe vanno rinormalizzate
+NORMALIZED_CONSUMER = "normalized"
+
+
+def _update_normalized(store: DatasetStore, output_path: Path, ontology: SkillOntology, columns: List[str],
+                       input_types: Dict[str, str], normalize_frame: Callable, normalize_dataset: Callable,
+                       key_fn: Callable[[Dict], str], output_types: Callable) -> pd.DataFrame:
+    """
+    Normalizza solo le righe del dataset cambiate dal watermark (DatasetStore.pending)
+    e le sostituisce per chiave nella tabella normalizzata, partizionata per
+    chiave: sono lette e riscritte solo le partizioni toccate (apply_changes);
+    le righe cancellate sono rimosse. Ricostruisce tutto al primo run, con
+    un'ontologia diversa, con colonne del dataset cambiate (nuovi tag) o se la
+    tabella precedente non corrisponde al dataset. Le skill non mappate
+    raccolte nell'ontologia sono solo quelle delle righe rinormalizzate.
+    """
+    consumer = f"{NORMALIZED_CONSUMER}:{ontology.fingerprint()[:16]}"
+    changes = store.pending(consumer)
+    df = None
+    index = partition_index(output_path) if changes.since else None
+    if index is not None and index["columns"][:len(columns)] == columns:
+        print(f"\nNormalizzazione incrementale {store.table}: {len(changes.rows)} righe cambiate, "
+              f"{len(changes.deleted)} cancellate")
+        changed = pd.DataFrame(columns=index["columns"])
+        if changes.rows:
+            changed = coerce_frame(pd.DataFrame(list(changes.rows.values()), columns=columns), input_types)
+            changed = normalize_frame(changed, ontology)
+        if not len(changes) or apply_changes(output_path, changed, changes, key_fn, store.keys(),
+                                             output_types(changed)):
+            df = read_table(output_path)
+        else:
+            print("  Tabella normalizzata non allineata al dataset: ricostruzione completa")
+    if df is None:
+        dataset = coerce_frame(store.to_dataframe(columns), input_types)
+        df = normalize_dataset(None, output_path, ontology, df=dataset)
+    store.set_watermark(consumer, changes.version)
     return df
 
+
+def update_cv_normalized(store: DatasetStore, output_path: Path, ontology: SkillOntology) -> pd.DataFrame:
+    """normalize_cv_dataset incrementale, dal DatasetStore del dataset CV."""
+    columns = dataset_columns(store)
+    return _update_normalized(store, output_path, ontology, columns, tag_types(columns),
+                              normalize_cv_frame, normalize_cv_dataset, cv_row_key, cv_column_types)
+
+
+def update_jd_normalized(store: DatasetStore, output_path: Path, ontology: SkillOntology) -> pd.DataFrame:
+    """normalize_jd_dataset incrementale, dal DatasetStore del dataset JD."""
+    return _update_normalized(store, output_path, ontology, JD_COLUMNS, JD_COLUMN_TYPES,
+                              normalize_jd_frame, normalize_jd_dataset, jd_row_key, lambda df: JD_COLUMN_TYPES)
+
 # ============================================================================
 # MAIN
 # ============================================================================
@@ -507,12 +610,12 @@ def main():
         print(f"ERRORE: File ontologia non trovato: {ONTOLOGY_FILE}")
         return
 
-    if not INPUT_CV.exists():
-        print(f"ERRORE: CV dataset non trovato: {INPUT_CV}")
+    if not table_exists(INPUT_CV):
+        print(f"ERRORE: CV dataset non trovato: {INPUT_CV} (esportalo con batch_processor.py --export)")
         return
 
-    if not INPUT_JD.exists():
-        print(f"ERRORE: JD dataset non trovato: {INPUT_JD}")
+    if not table_exists(INPUT_JD):
+        print(f"ERRORE: JD dataset non trovato: {INPUT_JD} (esportalo con batch_processor.py --export)")
         return
 
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
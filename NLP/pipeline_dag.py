@@ -0,0 +1,491 @@
+"""
+pipeline_dag.py
+Esecuzione in-process della pipeline NLP come DAG di stage.
+
+Ogni stage e' una funzione chiamata con i risultati delle sue dipendenze come
+argomenti keyword (nome dello stage -> risultato): DataFrame ed embeddings
+passano in memoria da uno stage all'altro, senza rileggere i file intermedi
+(che gli stage continuano a scrivere per gli altri consumer).
+
+- uno stage registrato piu' volte (stesso nome e funzione) esiste una volta
+  sola: es. gli embeddings CV sono calcolati una volta anche se servono sia
+  alla pipeline CV sia al matching;
+- gli stage le cui dipendenze sono pronte partono in parallelo (thread), cosi'
+  i rami CV e JD avanzano insieme;
+- se uno stage fallisce, quelli che ne dipendono sono saltati; gli altri rami
+  proseguono;
+- per ogni stage sono registrati stato e durata (PipelineRun.to_dict()).
+
+Manifest e ripresa: a fine stage e' scritto Dataset/manifests/<stage>.json con
+l'impronta degli input (versione dello stage + impronte dei risultati delle
+dipendenze), l'impronta del risultato e lo sha256 dei file prodotti. Al run
+successivo uno stage con `load` e stessi input, i cui file sono intatti, non
+e' rieseguito: il risultato e' ricaricato dai file (stato "cached"). Gli stage
+lunghi riprendono dal proprio checkpoint (es. cache degli embeddings per
+text_hash in embed_generator.py).
+
+Va eseguito con cwd=NLP: gli script usano path relativi (Dataset/...).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 2
+MANIFEST_DIR = Path("Dataset") / "manifests"
+DONE = ("ok", "cached")
+
+
+def fingerprint(value: Any) -> str:
+    """Impronta sha256 del risultato di uno stage (DataFrame, vettori, tuple, dict, oggetti con fingerprint())."""
+    h = hashlib.sha256()
+
+    def feed(v):
+        if hasattr(v, 'fingerprint'):
+            h.update(b"F" + v.fingerprint().encode())
+        elif isinstance(v, pd.DataFrame):
+            h.update(b"D" + json.dumps([str(c) for c in v.columns]).encode())
+            for column in v.columns:
+                series = v[column]
+                if len(series) and isinstance(series.iloc[0], np.ndarray):
+                    h.update(np.stack(series.tolist()).tobytes())
+                else:
+                    h.update(pd.util.hash_pandas_object(series, index=False).values.tobytes())
+        elif isinstance(v, np.ndarray):
+            h.update(b"A" + str(v.shape).encode() + v.tobytes())
+        elif isinstance(v, (list, tuple)):
+            h.update(b"L%d" % len(v))
+            for item in v:
+                feed(item)
+        elif isinstance(v, dict):
+            h.update(b"M" + json.dumps(v, sort_keys=True, default=_native).encode())
+        else:
+            h.update(b"S" + repr(v).encode())
+
+    feed(value)
+    return h.hexdigest()
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _native(value):
+    """Scalari numpy -> Python per il JSON dei manifest."""
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class ManifestStore:
+    """Manifest dell'ultima esecuzione riuscita di ogni stage."""
+
+    def __init__(self, directory: Path = MANIFEST_DIR):
+        self.directory = Path(directory)
+
+    def read(self, stage: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.directory / f"{stage}.json", 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write(self, stage: str, manifest: Dict[str, Any]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{stage}.json"
+        tmp = path.with_name(path.name + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, default=_native)
+        os.replace(tmp, path)
+
+    def reusable(self, manifest: Optional[Dict[str, Any]], input_fingerprint: str) -> bool:
+        """Stessi input e file prodotti ancora presenti e invariati."""
+        if not manifest or manifest.get("input") != input_fingerprint:
+            return False
+        for path, digest in manifest.get("outputs", {}).items():
+            if not Path(path).exists() or file_digest(Path(path)) != digest:
+                return False
+        return True
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    # Da incrementare quando cambia la logica dello stage (invalida i manifest)
+    version: str = "1"
+    # File prodotti dallo stage (verificati prima di riusarne il risultato)
+    outputs: Optional[Callable[[], List[Path]]] = None
+    # Ricarica il risultato dai file prodotti (riceve il summary del manifest);
+    # senza load lo stage e' sempre rieseguito
+    load: Optional[Callable[[Dict[str, Any]], Any]] = None
+    # Parte JSON del risultato da salvare nel manifest (per load)
+    summarize: Optional[Callable[[Any], Dict[str, Any]]] = None
+
+
+@dataclass
+class StageTiming:
+    status: str = "pending"  # pending | ok | cached | failed | skipped
+    started_at: Optional[str] = None
+    duration_s: float = 0.0
+    error: Optional[str] = None
+    input: Optional[str] = None
+    result: Optional[str] = None
+
+
+@dataclass
+class PipelineRun:
+    started_at: str
+    duration_s: float = 0.0
+    results: Dict[str, Any] = field(default_factory=dict)
+    stages: Dict[str, StageTiming] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return all(t.status in DONE for t in self.stages.values())
+
+    @property
+    def failed(self) -> List[str]:
+        return [name for name, t in self.stages.items() if t.status == "failed"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at,
+            "duration_s": round(self.duration_s, 3),
+            "ok": self.ok,
+            "stages": {
+                name: {
+                    "status": t.status,
+                    "started_at": t.started_at,
+                    "duration_s": round(t.duration_s, 3),
+                    "error": t.error,
+                }
+                for name, t in self.stages.items()
+            },
+        }
+
+
+class StageError(Exception):
+    """Errore di uno stage (la causa e' in __cause__)."""
+
+    def __init__(self, duration_s: float):
+        super().__init__(duration_s)
+        self.duration_s = duration_s
+
+
+class DagRunner:
+    """Registro degli stage ed esecutore del DAG."""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, manifests: Optional[ManifestStore] = None):
+        self.max_workers = max_workers
+        self.manifests = manifests
+        self.stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Sequence[str] = (), **options) -> "DagRunner":
+        """options: version, outputs, load, summarize (vedi Stage)."""
+        stage = Stage(name, fn, tuple(deps), **options)
+        existing = self.stages.get(name)
+        if existing is not None:
+            if existing.fn is fn and existing.deps == stage.deps:
+                return self  # stage condiviso: eseguito una volta sola
+            raise ValueError(f"Stage '{name}' registrato due volte con definizioni diverse")
+        self.stages[name] = stage
+        return self
+
+    def order(self, targets: Optional[Iterable[str]] = None) -> List[str]:
+        """Stage necessari per i target (tutti se None), in ordine topologico."""
+        ordered: List[str] = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if name not in self.stages:
+                raise ValueError(f"Stage sconosciuto: '{name}' (richiesto da {' -> '.join(path) or 'target'})")
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Ciclo nel DAG: {' -> '.join(path + (name,))}")
+            state[name] = "visiting"
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            state[name] = "done"
+            ordered.append(name)
+
+        for name in (self.stages if targets is None else targets):
+            visit(name, ())
+        return ordered
+
+    def run(self, targets: Optional[Iterable[str]] = None, force: bool = False) -> PipelineRun:
+        """force: riesegue tutti gli stage ignorando i manifest (che sono comunque riscritti)."""
+        names = self.order(targets)
+        run = PipelineRun(started_at=datetime.now().isoformat())
+        run.stages = {name: StageTiming() for name in names}
+        start = time.perf_counter()
+
+        pending = list(names)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="nlp-stage") as pool:
+            while pending or running:
+                # In ordine topologico: i salti si propagano in una sola passata
+                for name in list(pending):
+                    stage = self.stages[name]
+                    dep_status = [run.stages[dep].status for dep in stage.deps]
+                    if any(s in ("failed", "skipped") for s in dep_status):
+                        blocked = [d for d in stage.deps if run.stages[d].status in ("failed", "skipped")]
+                        run.stages[name].status = "skipped"
+                        run.stages[name].error = f"dipendenze non riuscite: {', '.join(blocked)}"
+                        logger.warning("Stage %s saltato (%s)", name, run.stages[name].error)
+                        pending.remove(name)
+                    elif all(s in DONE for s in dep_status):
+                        kwargs = {dep: run.results[dep] for dep in stage.deps}
+                        deps = {dep: run.stages[dep].result for dep in stage.deps}
+                        timing = run.stages[name]
+                        timing.started_at = datetime.now().isoformat()
+                        timing.input = fingerprint([stage.name, stage.version, sorted(deps.items())])
+                        running[pool.submit(self._call, stage, kwargs, deps, timing.input, force)] = name
+                        pending.remove(name)
+
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    timing = run.stages[name]
+                    try:
+                        run.results[name], timing.result, timing.duration_s, cached = future.result()
+                        timing.status = "cached" if cached else "ok"
+                        if cached:
+                            logger.info("Stage %s invariato, risultato ricaricato in %.2fs", name, timing.duration_s)
+                        else:
+                            logger.info("Stage %s completato in %.2fs", name, timing.duration_s)
+                    except StageError as e:
+                        timing.status = "failed"
+                        timing.duration_s = e.duration_s
+                        timing.error = f"{type(e.__cause__).__name__}: {e.__cause__}"
+                        logger.error("Stage %s fallito dopo %.2fs: %s", name, e.duration_s, timing.error,
+                                     exc_info=e.__cause__)
+
+        run.duration_s = time.perf_counter() - start
+        return run
+
+    def _call(self, stage: Stage, kwargs: Dict[str, Any], deps: Dict[str, str], input_fingerprint: str,
+              force: bool) -> Tuple[Any, str, float, bool]:
+        """Esegue (o ricarica) lo stage; restituisce (risultato, impronta, durata, ricaricato)."""
+        start = time.perf_counter()
+        try:
+            manifest = self.manifests.read(stage.name) if self.manifests else None
+            if not force and stage.load and self.manifests and self.manifests.reusable(manifest, input_fingerprint):
+                result = stage.load(manifest.get("summary") or {})
+                return result, manifest["result"], time.perf_counter() - start, True
+
+            logger.info("Stage %s avviato", stage.name)
+            result = stage.fn(**kwargs)
+            result_fingerprint = fingerprint(result)
+            if self.manifests:
+                outputs = stage.outputs() if stage.outputs else []
+                self.manifests.write(stage.name, {
+                    "stage": stage.name,
+                    "version": stage.version,
+                    "input": input_fingerprint,
+                    "deps": deps,
+                    "result": result_fingerprint,
+                    "outputs": {str(p): file_digest(p) for p in outputs if p.exists()},
+                    "summary": stage.summarize(result) if stage.summarize else None,
+                    "completed_at": datetime.now().isoformat(),
+                    "duration_s": round(time.perf_counter() - start, 3),
+                })
+        except Exception as e:
+            raise StageError(time.perf_counter() - start) from e
+        return result, result_fingerprint, time.perf_counter() - start, False
+
+
+# ============================================================================
+# STAGE DELLA PIPELINE NLP
+# ============================================================================
+
+# Gli stage di dataset restituiscono solo la versione dello store: normalizzazione
+# ed embeddings leggono dallo store le righe cambiate dal proprio watermark
+
+def _cv_store():
+    import cv_json_to_dataset_processor as cvp
+
+    output = Path(cvp.OUTPUT_FOLDER)
+    return closing(cvp.open_cv_store(output, output / cvp.OUTPUT_FILENAME))
+
+
+def _jd_store():
+    import jd_json_to_dataset_processor as jdp
+
+    output = Path(jdp.OUTPUT_FOLDER)
+    return closing(jdp.open_jd_store(output, output / jdp.OUTPUT_FILENAME))
+
+
+def _dataset_version(store) -> Dict[str, Any]:
+    return {"table": store.table, "version": store.version(), "rows": store.count()}
+
+
+def cv_dataset():
+    import cv_json_to_dataset_processor as cvp
+
+    cvp.process_files(cvp.INPUT_FOLDER, cvp.OUTPUT_FOLDER, cvp.OUTPUT_FILENAME)
+    with _cv_store() as store:
+        return _dataset_version(store)
+
+
+def staging_archived(cv_dataset):
+    # Dopo la lettura dello staging: compatta i file consumati, in parallelo alla normalizzazione
+    import staging_archive
+
+    return staging_archive.run()
+
+
+def jd_dataset():
+    import jd_json_to_dataset_processor as jdp
+
+    jdp.process_files(jdp.INPUT_FOLDER, jdp.OUTPUT_FOLDER, jdp.OUTPUT_FILENAME)
+    with _jd_store() as store:
+        return _dataset_version(store)
+
+
+def ontology():
+    import normalizzatore as nz
+
+    nz.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    return nz.SkillOntology(nz.ONTOLOGY_FILE)
+
+
+def cv_normalized(ontology, cv_dataset):
+    import normalizzatore as nz
+
+    with _cv_store() as store:
+        return nz.update_cv_normalized(store, nz.OUTPUT_CV, ontology)
+
+
+def jd_normalized(ontology, jd_dataset):
+    import normalizzatore as nz
+
+    with _jd_store() as store:
+        return nz.update_jd_normalized(store, nz.OUTPUT_JD, ontology)
+
+
+def ontology_saved(ontology, **normalized):
+    # Dopo tutte le normalizzazioni: le skill non mappate sono raccolte da entrambe
+    ontology.save_updated_ontology()
+
+
+def cv_embeddings(cv_normalized):
+    import embed_generator as eg
+
+    eg.setup_directories()
+    with _cv_store() as store:
+        return eg.update_cv_embeddings(store, cv_normalized)
+
+
+def jd_embeddings(jd_normalized):
+    import embed_generator as eg
+
+    eg.setup_directories()
+    with _jd_store() as store:
+        return eg.update_jd_embeddings(store, jd_normalized)
+
+
+def embedding_metadata(cv_embeddings, jd_embeddings):
+    import embed_generator as eg
+
+    eg.save_metadata(cv_embeddings[1], jd_embeddings[1])
+
+
+def matching(cv_embeddings, jd_embeddings):
+    import Matching
+
+    cv_df, jd_df = cv_embeddings[0], jd_embeddings[0]
+    return Matching.run_matching(
+        cv_df[['user_id', 'text_content']], Matching.stack_embeddings(cv_df['embedding_vector']),
+        jd_df[['jd_id', 'text_content']], Matching.stack_embeddings(jd_df['embedding_vector']),
+    )
+
+
+def _table_stage(path: Path) -> Dict[str, Any]:
+    """Opzioni di uno stage che produce una tabella (columnar.py): file e ricarica."""
+    from columnar import read_table, table_files
+
+    return {
+        "outputs": lambda: table_files(path),
+        "load": lambda summary: read_table(path),
+    }
+
+
+def _embedding_stage(path: Path) -> Dict[str, Any]:
+    """Come _table_stage, con le statistiche degli embeddings nel manifest."""
+    options = _table_stage(path)
+    load_table = options["load"]
+    options["load"] = lambda summary: (load_table(summary), summary["stats"])
+    options["summarize"] = lambda result: {"stats": result[1]}
+    return options
+
+
+def _matching_stage(output_dir: Path) -> Dict[str, Any]:
+    from columnar import table_files
+
+    return {
+        "outputs": lambda: [output_dir / "jd_cv_matches.json"] + table_files(output_dir / "reranker_input"),
+        "load": lambda summary: summary["result"],
+        "summarize": lambda result: {"result": result},
+    }
+
+
+def build_nlp_pipeline(branches: Sequence[str] = ("cv", "jd"), max_workers: int = MAX_WORKERS,
+                       manifests: Optional[ManifestStore] = None) -> DagRunner:
+    """
+    DAG della pipeline: dataset -> normalizzazione -> embeddings per ogni ramo
+    ("cv", "jd"); con entrambi i rami anche metadata degli embeddings e matching.
+    Il ramo CV compatta anche i file di staging gia' consumati (staging_archive).
+
+    Gli stage di dataset (gia' incrementali) e quelli leggeri sono sempre
+    eseguiti; normalizzazione, embeddings e matching sono riusati dai manifest
+    quando i loro input non cambiano. Quando cambiano, normalizzazione ed
+    embeddings elaborano solo le righe cambiate dal proprio watermark nel
+    DatasetStore e riscrivono solo le partizioni delle loro tabelle che le
+    contengono (columnar.write_partitions).
+    """
+    unknown = set(branches) - {"cv", "jd"}
+    if unknown:
+        raise ValueError(f"Rami sconosciuti: {sorted(unknown)}")
+
+    import embed_generator as eg
+    import Matching
+    import normalizzatore as nz
+
+    dag = DagRunner(max_workers=max_workers, manifests=manifests or ManifestStore())
+    dag.add("ontology", ontology)
+    if "cv" in branches:
+        dag.add("cv_dataset", cv_dataset)
+        dag.add("staging_archived", staging_archived, ["cv_dataset"])
+        dag.add("cv_normalized", cv_normalized, ["ontology", "cv_dataset"],
+                **_table_stage(nz.OUTPUT_CV))
+        dag.add("cv_embeddings", cv_embeddings, ["cv_normalized"], **_embedding_stage(eg.CV_OUTPUT))
+    if "jd" in branches:
+        dag.add("jd_dataset", jd_dataset)
+        dag.add("jd_normalized", jd_normalized, ["ontology", "jd_dataset"],
+                **_table_stage(nz.OUTPUT_JD))
+        dag.add("jd_embeddings", jd_embeddings, ["jd_normalized"], **_embedding_stage(eg.JD_OUTPUT))
+    dag.add("ontology_saved", ontology_saved, ["ontology"] + [f"{b}_normalized" for b in branches])
+    if "cv" in branches and "jd" in branches:
+        dag.add("embedding_metadata", embedding_metadata, ["cv_embeddings", "jd_embeddings"])
+        dag.add("matching", matching, ["cv_embeddings", "jd_embeddings"], **_matching_stage(Matching.OUTPUT_DIR))
+    return dag
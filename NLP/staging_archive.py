@@ -0,0 +1,275 @@
+"""
+staging_archive.py
+Compattazione e retention dei CV gia' processati.
+
+Dopo il batch restano su disco i segmenti NDJSON consumati (marcati nel
+checkpoint di cv_json_to_dataset_processor) e i JSON spostati in
+cvs_processed/<giorno>/. compact() li fonde in un archivio per giorno:
+
+    cvs_archive/<YYYY-MM-DD>/part-<timestamp>.ndjson.gz    un CV per riga
+    cvs_archive/manifest.sqlite3                            archivi e file sorgente
+
+Sono compattati solo i giorni precedenti a oggi, cosi' ogni giorno produce di
+norma un solo archivio e le cartelle di staging contengono solo file recenti.
+Ordine delle operazioni (un crash in qualunque punto e' recuperato al run
+successivo): archivio scritto in un file temporaneo e rinominato, archivio e
+sorgenti registrati nel manifest in una transazione, sorgenti cancellate e
+dimenticate dal checkpoint. Archivi non registrati (crash prima del manifest)
+sono rimossi, sorgenti registrate ma non cancellate sono cancellate.
+
+La retention (apply_retention, CV_ARCHIVE_RETENTION_DAYS; 0 = conserva tutto)
+sceglie gli archivi scaduti dal manifest, per giorno, senza stat dei file.
+
+Gira come stage della pipeline (pipeline_dag.staging_archived), quindi sotto
+il lock dei run; da riga di comando va usato a pipeline ferma:
+    python staging_archive.py [--retention-days N]
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cv_segments import COMMIT_SUFFIX, INDEX_SUFFIX, SegmentCheckpoint, committed_bytes, segment_files
+
+ARCHIVE_FOLDER = "cvs_archive"
+MANIFEST_FILENAME = "manifest.sqlite3"
+PARTITION_FORMAT = "%Y-%m-%d"
+RETENTION_DAYS = int(os.getenv("CV_ARCHIVE_RETENTION_DAYS", 0))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    day TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archives_day ON archives (day);
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    archive TEXT NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sources_pending ON sources (deleted);
+"""
+
+
+class ArchiveManifest:
+    """Manifest SQLite degli archivi: path relativi alla cartella dati (padre di cvs/)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), timeout=30)
+        self.conn.executescript(_SCHEMA)
+
+    def archives(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT path FROM archives")]
+
+    def record(self, archive: str, day: str, records: int, size: int, sources: List[str]):
+        with self.conn:
+            self.conn.execute("INSERT INTO archives (path, day, records, bytes, created_at) VALUES (?, ?, ?, ?, ?)",
+                              (archive, day, records, size, time.time()))
+            self.conn.executemany("INSERT OR REPLACE INTO sources (source, archive) VALUES (?, ?)",
+                                  [(source, archive) for source in sources])
+
+    def undeleted_sources(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT source FROM sources WHERE deleted = 0")]
+
+    def mark_deleted(self, sources: List[str]):
+        with self.conn:
+            self.conn.executemany("UPDATE sources SET deleted = 1 WHERE source = ?", [(s,) for s in sources])
+
+    def expired(self, before_day: str) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT path FROM archives WHERE day < ?", (before_day,))]
+
+    def drop(self, archives: List[str]):
+        with self.conn:
+            for archive in archives:
+                self.conn.execute("DELETE FROM sources WHERE archive = ?", (archive,))
+                self.conn.execute("DELETE FROM archives WHERE path = ?", (archive,))
+
+    def close(self):
+        self.conn.close()
+
+
+def _is_day(name: str) -> bool:
+    try:
+        datetime.strptime(name, PARTITION_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def _partition_day(path: Path) -> Optional[str]:
+    """Giorno della partizione che contiene il file (None se in radice)."""
+    return path.parent.name if _is_day(path.parent.name) else None
+
+
+def _segment_day(segment: Path) -> str:
+    """Giorno di creazione del segmento: dalla partizione o dal nome seg-<created_ns>-..."""
+    day = _partition_day(segment)
+    if day is None:
+        created_ns = int(segment.name.split('-')[1])
+        day = datetime.fromtimestamp(created_ns / 1e9).strftime(PARTITION_FORMAT)
+    return day
+
+
+def _segment_files(segment: Path) -> List[Path]:
+    return [segment, segment.with_name(segment.name + INDEX_SUFFIX), segment.with_name(segment.name + COMMIT_SUFFIX)]
+
+
+def _unlink(root: Path, sources: List[str]):
+    for source in sources:
+        path = root / source
+        files = _segment_files(path) if path.name.startswith("seg-") else [path]
+        for file in files:
+            file.unlink(missing_ok=True)
+
+
+def _write_archive(path: Path, segments: List[Path], json_files: List[Path]) -> Tuple[int, int]:
+    """Scrive l'archivio gzip (via file temporaneo); ritorna (record, byte non compressi)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    records = size = 0
+    with gzip.open(tmp, 'wb') as out:
+        for segment in segments:
+            remaining = committed_bytes(segment)
+            with open(segment, 'rb') as f:
+                for line in f:
+                    if remaining <= 0:
+                        break
+                    line = line[:remaining]
+                    remaining -= len(line)
+                    out.write(line if line.endswith(b'\n') else line + b'\n')
+                    records += 1
+                    size += len(line)
+        for json_file in json_files:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                line = json.dumps(json.load(f), ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+            out.write(line)
+            records += 1
+            size += len(line)
+    os.replace(tmp, path)
+    return records, size
+
+
+def _remove_empty_partitions(directories: List[Path], today: str):
+    for directory in directories:
+        if not directory.exists():
+            continue
+        for partition in directory.iterdir():
+            if partition.is_dir() and _is_day(partition.name) and partition.name < today:
+                try:
+                    partition.rmdir()
+                except OSError:
+                    pass  # non vuota
+
+
+def compact(input_folder: str, checkpoint_path: Path, segments_subfolder: str = "segments",
+            processed_folder: str = "cvs_processed", today: Optional[date] = None) -> Dict[str, int]:
+    """
+    Fonde in archivi giornalieri i segmenti consumati e i JSON processati dei
+    giorni precedenti a oggi, poi li cancella. Ritorna i conteggi del run.
+    """
+    input_path = Path(input_folder)
+    root = input_path.parent
+    archive_root = root / ARCHIVE_FOLDER
+    today_str = (today or date.today()).strftime(PARTITION_FORMAT)
+    summary = {"archives": 0, "records": 0, "segments": 0, "json_files": 0, "recovered": 0}
+
+    with closing(ArchiveManifest(archive_root / MANIFEST_FILENAME)) as manifest:
+        checkpoint = SegmentCheckpoint(checkpoint_path)
+
+        # Run precedente interrotto: archivi senza manifest, sorgenti archiviate ma non cancellate
+        known = set(manifest.archives())
+        for orphan in [*archive_root.glob("*/part-*.ndjson.gz"), *archive_root.glob("*/part-*.ndjson.gz.tmp")]:
+            if orphan.relative_to(root).as_posix() not in known:
+                orphan.unlink()
+        leftovers = manifest.undeleted_sources()
+        if leftovers:
+            _unlink(root, leftovers)
+            checkpoint.forget(Path(s).name for s in leftovers)
+            checkpoint.save()
+            manifest.mark_deleted(leftovers)
+            summary["recovered"] = len(leftovers)
+
+        by_day: Dict[str, Tuple[List[Path], List[Path]]] = defaultdict(lambda: ([], []))
+        for segment in segment_files(input_path / segments_subfolder):
+            day = _segment_day(segment)
+            if segment.name in checkpoint.consumed and day < today_str and committed_bytes(segment) is not None:
+                by_day[day][0].append(segment)
+        processed = root / processed_folder
+        for json_file in [*processed.glob("*.json"), *processed.glob("*/*.json")]:
+            day = _partition_day(json_file)
+            if day is None:  # cvs_processed piatta delle versioni precedenti
+                by_day[today_str][1].append(json_file)
+            elif day < today_str:
+                by_day[day][1].append(json_file)
+
+        for day, (segments, json_files) in sorted(by_day.items()):
+            archive = archive_root / day / f"part-{time.time_ns():020d}.ndjson.gz"
+            records, size = _write_archive(archive, segments, json_files)
+            sources = [p.relative_to(root).as_posix() for p in segments + json_files]
+            manifest.record(archive.relative_to(root).as_posix(), day, records, size, sources)
+
+            _unlink(root, sources)
+            checkpoint.forget(s.name for s in segments)
+            checkpoint.save()
+            manifest.mark_deleted(sources)
+
+            summary["archives"] += 1
+            summary["records"] += records
+            summary["segments"] += len(segments)
+            summary["json_files"] += len(json_files)
+            print(f"  Archivio {archive.relative_to(root)}: {records} CV "
+                  f"({len(segments)} segmenti, {len(json_files)} JSON)")
+
+    _remove_empty_partitions([input_path, input_path / segments_subfolder, root / processed_folder], today_str)
+    return summary
+
+
+def apply_retention(input_folder: str, retention_days: int = RETENTION_DAYS,
+                    today: Optional[date] = None) -> int:
+    """Cancella gli archivi di giorni piu' vecchi di retention_days (scelti dal manifest); 0 = nessuno."""
+    if retention_days <= 0:
+        return 0
+    root = Path(input_folder).parent
+    archive_root = root / ARCHIVE_FOLDER
+    cutoff = ((today or date.today()) - timedelta(days=retention_days)).strftime(PARTITION_FORMAT)
+    with closing(ArchiveManifest(archive_root / MANIFEST_FILENAME)) as manifest:
+        expired = manifest.expired(cutoff)
+        for archive in expired:
+            (root / archive).unlink(missing_ok=True)
+        manifest.drop(expired)
+    _remove_empty_partitions([archive_root], cutoff)
+    if expired:
+        print(f"  Retention: rimossi {len(expired)} archivi precedenti al {cutoff}")
+    return len(expired)
+
+
+def run(retention_days: int = RETENTION_DAYS) -> Dict[str, int]:
+    """Compattazione + retention sulle cartelle di cv_json_to_dataset_processor."""
+    import cv_json_to_dataset_processor as cvp
+
+    summary = compact(cvp.INPUT_FOLDER, Path(cvp.OUTPUT_FOLDER) / cvp.CHECKPOINT_FILENAME,
+                      cvp.SEGMENTS_SUBFOLDER, cvp.PROCESSED_FOLDER)
+    summary["expired_archives"] = apply_retention(cvp.INPUT_FOLDER, retention_days)
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compattazione e retention dei CV processati")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS,
+                        help="Giorni di archivi da conservare (0 = tutti)")
+    args = parser.parse_args()
+    print(run(args.retention_days))
@@ -1,33 +1,45 @@
-import tempfile
+import asyncio
+import logging
 import time
-import uuid
-from pathlib import Path
+import traceback as _tb
+from functools import partial
 
 from ..parsers.ollama_cv_parser import OllamaCVParser
-from ..utils.parsing_display import display_parsing_results
+from ..parsers.pipeline import PROFILES as PARSER_PROFILES
 from ..services.cv_batch_storage import get_batch_storage
+from ..services.parse_executor import ExecutorSaturated, ParseTimeout, get_parse_executor
+from ..services.parse_dedup import dedup_key, get_parse_deduplicator
+from ..services.parse_progress import estimate_progress, get_stage_history
+from ..services.pipeline_jobs import get_pipeline_job_manager
+from ..services.task_store import get_task_store
+from ..services.task_watch import get_task_watcher
+from ..utils.uploads import UploadTooLarge, remove_upload, save_upload
+from ..core.config import settings
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     File,
     Form,
     HTTPException,
+    Request,
     UploadFile,
 )
 import json
 import importlib.util
-from fastapi.responses import JSONResponse
-from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 
 router = APIRouter(prefix="/parse", tags=["parse"])
+logger = logging.getLogger(__name__)
+
+PARSE_RETRY_AFTER_SECONDS = 30
+# Task event stream: max silence between events (store reads: services/task_watch.py)
+SSE_HEARTBEAT_SECONDS = 10
 
 
 # Lazy singleton parser to avoid re-init per request
 _parser: OllamaCVParser = None
 
-# In-memory storage for task results (in production, use Redis/DB)
-_task_results = {}
 
 
 def get_parser() -> OllamaCVParser:
@@ -37,6 +49,61 @@ def get_parser() -> OllamaCVParser:
     return _parser
 
 
+def _store_task_result(task_id: str, filename: str, future):
+    """Record the outcome of a pooled parse job (runs on the executor's thread)."""
+    try:
+        _write_task_result(task_id, filename, future)
+    except Exception:
+        logger.exception("Could not store result of task %s", task_id)
+
+
+def _on_task_done(filename: str, task_id: str, future):
+    _store_task_result(task_id, filename, future)
+
+
+async def _wait_for_task(task_id: str, timeout: int, poll_seconds: float = 1.0):
+    """Wait for a task running in another process to be stored as finished."""
+    deadline = time.time() + timeout
+    task_store = get_task_store()
+    while time.time() < deadline:
+        record = await run_in_threadpool(task_store.get, task_id) or {}
+        if record.get("status") == "completed":
+            return record
+        if record.get("status") != "processing":
+            raise RuntimeError(record.get("error") or f"Task {task_id} {record.get('status', 'not found')}")
+        await asyncio.sleep(poll_seconds)
+    raise ParseTimeout(f"Task {task_id} still running after {timeout}s")
+
+
+def _write_task_result(task_id: str, filename: str, future):
+    task_store = get_task_store()
+    started_at = (task_store.get(task_id) or {}).get("started_at", time.time())
+    error = future.exception()
+    if error is None:
+        outcome = future.result()
+        get_stage_history().record(outcome["result"].get("pipeline_stats"))
+        task_store.put(task_id, {
+            "status": "completed",
+            "started_at": started_at,
+            "completed_at": time.time(),
+            "filename": filename,
+            "result": outcome["result"],
+            "summary": outcome["summary"]
+        })
+        logger.info("Background parse finished: %s", task_id)
+    else:
+        task_store.put(task_id, {
+            "status": "failed",
+            "started_at": started_at,
+            "failed_at": time.time(),
+            "filename": filename,
+            "error": str(error) or error.__class__.__name__,
+            "timed_out": isinstance(error, ParseTimeout),
+            "traceback": "".join(_tb.format_exception(error))
+        })
+        logger.warning("Background parse failed: %s - %s", task_id, error)
+
+
 @router.get("/status")
 async def get_parser_status():
     """Check parser and LLM status."""
@@ -47,6 +114,9 @@ async def get_parser_status():
         "base_url": getattr(parser, 'base_url', 'unknown'),
         "model": getattr(parser, 'model', 'unknown')
     }
+
+    llm_cache = getattr(parser, 'llm_cache', None)
+    llm_status["llm_cache"] = llm_cache.stats() if llm_cache else None
     
     # Test Ollama connectivity
     try:
@@ -60,7 +130,8 @@ async def get_parser_status():
     return {
         "parser_initialized": parser is not None,
         "parser_version": "v1.7.4 FINAL",
-        "llm_status": llm_status
+        "llm_status": llm_status,
+        "parse_pool": get_parse_executor().stats()
     }
 
 
@@ -72,6 +143,7 @@ async def reinitialize_llm(base_url: str = "http://host.docker.internal:11434"):
     try:
         # Create new parser instance with updated base_url
         _parser = OllamaCVParser(model="llama3.2:3b", base_url=base_url)
+        get_parse_executor().reconfigure(base_url=base_url)
         
         status = {
             "success": True,
@@ -95,30 +167,77 @@ async def reinitialize_llm(base_url: str = "http://host.docker.internal:11434"):
         }
 
 
+def _with_progress(record: dict) -> dict:
+    """Task record plus elapsed time and per-stage progress/ETA."""
+    if "started_at" in record:
+        record["elapsed_seconds"] = round(time.time() - record["started_at"], 1)
+    if record.get("status") == "processing":
+        view = estimate_progress(record, get_stage_history())
+        record["progress"] = view
+        record["estimated_remaining"] = view["eta_seconds"]
+    return record
+
+
 @router.get("/task/{task_id}")
 async def get_task_status(task_id: str):
     """Get the status of a background parsing task."""
-    if task_id not in _task_results:
+    result = await run_in_threadpool(get_task_store().get, task_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    result = _task_results[task_id].copy()
-    
-    # Add elapsed time info
-    if "started_at" in result:
-        elapsed = time.time() - result["started_at"]
-        result["elapsed_seconds"] = round(elapsed, 1)
-        
-        if result["status"] == "processing":
-            result["estimated_remaining"] = max(0, 180 - elapsed)  # Estimate 3 minutes total
-    
-    return result
+    return await run_in_threadpool(_with_progress, result)
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.get("/task/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """Server-sent events for a parsing task.
+
+    Emits "progress" events (stage, percent, eta_seconds) when the running
+    stage changes, and at least every SSE_HEARTBEAT_SECONDS; then one
+    "completed" or "failed" event with the full task record, and closes.
+    One stream replaces repeated polling of GET /task/{task_id}; all the
+    streams of a task share one store read, backed off while it is idle.
+    """
+    task_store = get_task_store()
+    if await run_in_threadpool(task_store.get, task_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def events():
+        async with get_task_watcher().subscribe(task_id) as watch:
+            seen, last_stage, last_sent = 0, None, time.time()
+            while not await request.is_disconnected():
+                seen, record = await watch.next(seen, last_sent + SSE_HEARTBEAT_SECONDS - time.time())
+                if seen == 0:
+                    continue
+                if record is None:
+                    yield _sse("error", {"detail": "Task not found"})
+                    return
+                if record.get("status") != "processing":
+                    yield _sse(record.get("status", "unknown"), await run_in_threadpool(_with_progress, record))
+                    return
+
+                view = await run_in_threadpool(estimate_progress, record, get_stage_history())
+                now = time.time()
+                stage = (view["stage"], view.get("completed_stages"))
+                if stage != last_stage or now - last_sent >= SSE_HEARTBEAT_SECONDS:
+                    yield _sse("progress", view)
+                    last_stage, last_sent = stage, now
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/batch/stats")
-async def get_batch_stats():
-    """Get statistics about CV files saved for batch processing."""
+async def get_batch_stats(detailed: bool = False):
+    """Get statistics about CV files saved for batch processing (detailed: also segment state)."""
     batch_storage = get_batch_storage()
-    stats = batch_storage.get_batch_stats()
+    stats = await run_in_threadpool(batch_storage.get_batch_stats, detailed)
     
     return {
         "batch_processing": {
@@ -132,63 +251,67 @@ async def get_batch_stats():
 @router.post("/batch/process")
 async def trigger_batch_processing(
     date: str = None,
-    background_tasks: BackgroundTasks = None
+    end_date: str = None,
+    force: bool = False,
 ):
     """
-    Trigger batch processing della pipeline NLP per una data specifica.
+    Trigger batch processing della pipeline NLP per una data o un range di date.
     Se date non specificata, processa i CV di oggi.
+
+    La pipeline gira in un processo figlio: lo stato e' nel task store
+    (GET /task/{task_id}), l'output su GET /batch/jobs/{task_id}/log. Un trigger
+    per un range gia' in coda o in esecuzione restituisce lo stesso task_id.
     """
-    if background_tasks is None:
-        raise HTTPException(status_code=500, detail="Background tasks unavailable")
-    
-    process_date = date or datetime.now().strftime("%Y-%m-%d")
-    task_id = f"batch_{process_date}_{int(time.time())}"
-    
-    def _batch_processing():
-        try:
-            print(f"🚀 Avvio batch processing per data: {process_date}")
-            
-            # Import del batch processor
-            import subprocess
-            import sys
-            
-            # Path dello script batch processor
-            script_path = Path(__file__).parent.parent.parent / "batch_processor.py"
-            
-            if not script_path.exists():
-                raise FileNotFoundError(f"Batch processor script non trovato: {script_path}")
-            
-            # Esegui batch processing
-            result = subprocess.run([
-                sys.executable, str(script_path), 
-                "--process-date", process_date
-            ], capture_output=True, text=True, timeout=3600)  # 1 ora timeout
-            
-            if result.returncode == 0:
-                print(f"✅ Batch processing completato per {process_date}")
-                print(f"Output: {result.stdout}")
-            else:
-                print(f"❌ Batch processing fallito per {process_date}")
-                print(f"Errore: {result.stderr}")
-                
-        except Exception as e:
-            print(f"❌ Errore batch processing: {e}")
-            import traceback
-            traceback.print_exc()
-    
-    background_tasks.add_task(_batch_processing)
-    
+    start = date or datetime.now().strftime("%Y-%m-%d")
+    end = end_date or start
+    try:
+        if datetime.fromisoformat(start).date() > datetime.fromisoformat(end).date():
+            raise HTTPException(status_code=400, detail="date must be <= end_date")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    task_id, deduplicated = await get_pipeline_job_manager().start(start, end, force=force)
+    record = await run_in_threadpool(get_task_store().get, task_id) or {}
+
     return JSONResponse(
         status_code=202,
         content={
-            "message": f"Batch processing avviato per {process_date}",
+            "message": f"Batch processing avviato per {start}" + (f" - {end}" if end != start else ""),
             "task_id": task_id,
-            "date": process_date,
-            "status": "processing"
+            "date": start,
+            "end_date": end,
+            "status": record.get("status", "queued"),
+            "deduplicated": deduplicated,
         }
     )
 
 
+async def _pipeline_job(task_id: str) -> dict:
+    record = await run_in_threadpool(get_task_store().get, task_id)
+    if not record or record.get("kind") != "pipeline":
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return record
+
+
+@router.get("/batch/jobs/{task_id}/log")
+async def stream_batch_log(task_id: str, lines: int = 100, follow: bool = True):
+    """Output of a batch job: the last ``lines`` lines, then (follow) new lines until the job ends."""
+    await _pipeline_job(task_id)
+    return StreamingResponse(
+        get_pipeline_job_manager().follow_log(task_id, lines=lines, follow=follow),
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/batch/jobs/{task_id}/cancel")
+async def cancel_batch_job(task_id: str):
+    """Cancel a queued or running batch job (the pipeline process is terminated)."""
+    await _pipeline_job(task_id)
+    record = await get_pipeline_job_manager().cancel(task_id)
+    return {"task_id": task_id, "status": record.get("status"), "cancel_requested": True}
+
+
 MULTIPART_AVAILABLE = importlib.util.find_spec("multipart") is not None
 
 
@@ -197,147 +320,97 @@ if MULTIPART_AVAILABLE:
     async def upload_and_parse(
         file: UploadFile = File(...),
         background: bool = True,
-        background_tasks: BackgroundTasks = None,
+        profile: str | None = None,
         user_id: str | None = Form(None),
         Tags: str | None = Form(None),
     ):
         """Upload a PDF and parse it.
 
-        If background=True the task will be scheduled and a 202 returned
-        with a "task_id". Otherwise the parsing will be done synchronously
-        and the parsed document returned.
+        Parsing runs in the worker process pool. If background=True a 202
+        is returned with a "task_id"; otherwise the request waits for the
+        worker and the parsed document is returned. Returns 429 when all
+        workers are busy and the queue is full. ``profile`` selects the parser
+        post-processing profile ("full" or "fast"). An upload identical to one
+        being parsed (or parsed recently) reuses that job's "task_id".
         """
         if file.content_type not in ("application/pdf",):
             raise HTTPException(status_code=400, detail="Only PDF uploads are accepted")
+        if profile is not None and profile not in PARSER_PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown profile, expected one of {sorted(PARSER_PROFILES)}")
 
-        tmp_dir = Path(tempfile.gettempdir()) / "piazzati_parsing"
-        tmp_dir.mkdir(parents=True, exist_ok=True)
-
-        dest = tmp_dir / f"upload_{file.filename}_{int(time.time())}.pdf"
-        content = await file.read()
-        dest.write_bytes(content)
+        # Stream to disk in chunks, hashing and enforcing the size limit on the way
+        try:
+            upload = await run_in_threadpool(save_upload, file.file, settings.MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        finally:
+            await file.close()
+        dest = upload.path
+
+        # optional metadata coming from the form (malformed tags are ignored)
+        parsed_tags = None
+        if Tags:
+            try:
+                parsed_tags = json.loads(Tags)
+            except Exception:
+                parsed_tags = None
+            if not isinstance(parsed_tags, dict):
+                parsed_tags = None
+
+        # Identical uploads attach to the job already parsing (or parsed) them;
+        # otherwise parsing runs in the worker process pool, rejected when saturated
+        executor = get_parse_executor()
+        key = dedup_key(upload.sha256, profile, user_id, parsed_tags)
+
+        def start(task_id: str):
+            return executor.submit(
+                str(dest), file.filename, user_id=user_id, tags=parsed_tags, profile=profile,
+                file_hash=upload.sha256, task_id=task_id,
+            )
 
-        parser = get_parser()
+        try:
+            handle = await run_in_threadpool(
+                get_parse_deduplicator().submit,
+                key,
+                start,
+                {"started_at": time.time(), "filename": file.filename},
+                partial(_on_task_done, file.filename),
+            )
+        except ExecutorSaturated as e:
+            remove_upload(dest)
+            raise HTTPException(
+                status_code=429,
+                detail=f"Parser busy, retry later ({e})",
+                headers={"Retry-After": str(PARSE_RETRY_AFTER_SECONDS)},
+            )
+        except Exception:
+            remove_upload(dest)
+            raise
+        if handle.deduplicated:
+            remove_upload(dest)
 
         if background:
-            # schedule
-            task_id = str(uuid.uuid4())
-
-            def _bg():
-                try:
-                    # Store initial status
-                    _task_results[task_id] = {
-                        "status": "processing",
-                        "started_at": time.time(),
-                        "filename": file.filename
-                    }
-                    
-                    # run parser
-                    doc = parser.parse(str(dest))
-                    # attach optional metadata if provided
-                    try:
-                        if user_id:
-                            doc.user_id = user_id
-                        if Tags:
-                            try:
-                                doc.tags = json.loads(Tags)
-                            except Exception:
-                                # fallback: ignore malformed tags
-                                pass
-                    except Exception:
-                        pass
-
-                    # Save to batch processing storage
-                    batch_storage = get_batch_storage()
-                    json_path = batch_storage.save_parsed_cv(doc, file.filename)
-                    print(f"📦 CV salvato per batch NLP: {json_path}")
-
-                    # Store successful result
-                    parsed_data = (
-                        doc.model_dump()
-                        if hasattr(doc, "model_dump")
-                        else getattr(doc, "dict", lambda: {})()
-                    )
-                    
-                    _task_results[task_id] = {
-                        "status": "completed",
-                        "started_at": _task_results[task_id]["started_at"],
-                        "completed_at": time.time(),
-                        "filename": file.filename,
-                        "result": jsonable_encoder(parsed_data),
-                        "summary": display_parsing_results(doc)
-                    }
-                    
-                    print(f"Background parse finished: {task_id} (user_id={getattr(doc, 'user_id', None)})")
-                except Exception as e:
-                    # Store error result
-                    import traceback as _tb
-                    _task_results[task_id] = {
-                        "status": "failed",
-                        "started_at": _task_results.get(task_id, {}).get("started_at", time.time()),
-                        "failed_at": time.time(),
-                        "filename": file.filename,
-                        "error": str(e),
-                        "traceback": _tb.format_exc()
-                    }
-                    print(f"Background parse failed: {task_id} - {e}")
-
-            if background_tasks is None:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Background tasks unavailable",
-                )
-
-            background_tasks.add_task(_bg)
-            return JSONResponse(status_code=202, content={"task_id": task_id})
+            return JSONResponse(
+                status_code=202,
+                content={"task_id": handle.task_id, "deduplicated": handle.deduplicated},
+            )
         else:
-            # Synchronous parsing path. Wrap in try/except to return
-            # helpful traceback during local development.
+            # Synchronous path: wait for the worker without blocking the event loop.
+            # Errors include the traceback to help during local development.
             try:
-                doc = parser.parse(str(dest))
-
-                # attach optional metadata coming from the form
-                if user_id:
-                    try:
-                        doc.user_id = user_id
-                    except Exception:
-                        pass
-
-                if Tags:
-                    try:
-                        parsed_tags = json.loads(Tags)
-                        if isinstance(parsed_tags, dict):
-                            doc.tags = parsed_tags
-                    except Exception:
-                        # ignore malformed tags
-                        pass
-
-                # Save to batch processing storage
-                batch_storage = get_batch_storage()
-                json_path = batch_storage.save_parsed_cv(doc, file.filename)
-                print(f"📦 CV salvato per batch NLP: {json_path}")
-
-                text_summary = display_parsing_results(doc)
-                parsed = (
-                    doc.model_dump()
-                    if hasattr(doc, "model_dump")
-                    else getattr(doc, "dict", lambda: {})()
-                )
-
-                # Ensure all values (e.g. datetimes) are JSON-serializable
+                if handle.future is not None:
+                    outcome = await asyncio.wrap_future(handle.future)
+                else:
+                    outcome = await _wait_for_task(handle.task_id, executor.job_timeout)
                 return JSONResponse(
                     status_code=200,
-                    content={"parsed": jsonable_encoder(parsed), "summary": text_summary},
+                    content={"parsed": outcome["result"], "summary": outcome["summary"]},
                 )
+            except ParseTimeout as e:
+                return JSONResponse(status_code=504, content={"error": str(e)})
             except Exception as e:
-                # Development helper: include traceback in response body so the
-                # frontend / curl can show the error without opening server logs.
-                import traceback as _tb
-
-                tb = _tb.format_exc()
-                # Log to server console as well
-                print("Synchronous parse failed:", str(e))
-                print(tb)
+                tb = "".join(_tb.format_exception(e))
+                logger.error("Synchronous parse failed: %s\n%s", e, tb)
                 return JSONResponse(
                     status_code=500,
                     content={"error": str(e), "traceback": tb},
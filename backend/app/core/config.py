@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -6,6 +7,34 @@ class Settings(BaseSettings):
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     WORKER_TIMEOUT: int = int(os.getenv("WORKER_TIMEOUT", 300))
     MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", 4))
+    # Parse jobs waiting for a worker before uploads are rejected with 429
+    PARSE_QUEUE_SIZE: int = int(os.getenv("PARSE_QUEUE_SIZE", 8))
+    # Parse task status/results: sqlite:///..., postgresql://... or redis://...
+    # (empty = SQLite file in the temp dir, shared by the uvicorn workers)
+    TASK_STORE_URL: str = os.getenv("TASK_STORE_URL", "")
+    TASK_RESULT_TTL: int = int(os.getenv("TASK_RESULT_TTL", 24 * 3600))
+    # Uploads above this size are rejected with 413 while streaming
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+    # Identical uploads (same hash, profile, user and tags) reuse a completed
+    # parse for this many seconds; 0 only coalesces jobs still in flight
+    PARSE_RESULT_REUSE_SECONDS: int = int(os.getenv("PARSE_RESULT_REUSE_SECONDS", 600))
+    # Staging of parsed CVs for the NLP batch: "segments" (append-only NDJSON
+    # segments under <dir>/segments) or "json" (legacy, one file per CV)
+    CV_BATCH_DIR: str = os.getenv("CV_BATCH_DIR", "/opt/piazzati/backend/NLP/data/cvs")
+    CV_STAGING_FORMAT: str = os.getenv("CV_STAGING_FORMAT", "segments")
+    # An open segment is sealed (and picked up by cron_scripts/micro_batch_ingest.py)
+    # at most this many seconds after its first record
+    CV_SEGMENT_MAX_AGE_SECONDS: int = int(os.getenv("CV_SEGMENT_MAX_AGE_SECONDS", 10))
+    # NLP batch runs triggered from the API (POST /api/parse/batch/process)
+    PIPELINE_BATCH_SCRIPT: str = os.getenv(
+        "PIPELINE_BATCH_SCRIPT",
+        str(Path(__file__).resolve().parents[2] / "cron_scripts" / "batch_processor.py"),
+    )
+    PIPELINE_JOB_TIMEOUT: int = int(os.getenv("PIPELINE_JOB_TIMEOUT", 3600))
+    # Runs of one uvicorn worker executed at the same time (the others wait queued)
+    PIPELINE_MAX_CONCURRENT_JOBS: int = int(os.getenv("PIPELINE_MAX_CONCURRENT_JOBS", 1))
+    # Output of each run (<task_id>.log); empty = directory in the temp dir
+    PIPELINE_LOG_DIR: str = os.getenv("PIPELINE_LOG_DIR", "")
     # Aggiungi qui altre variabili d'ambiente se servono
 
 settings = Settings()
@@ -0,0 +1,92 @@
+"""
+Logging setup for the backend.
+
+Application loggers (``app.*``) write to a ``QueueHandler``; a single
+``QueueListener`` thread does the actual (blocking) stream I/O, so request and
+parser threads never serialize on stdout. Messages use ``%``-style arguments
+so they are only formatted when the level is enabled.
+
+Environment:
+    LOG_LEVEL         level of the ``app`` logger (default INFO)
+    PARSER_LOG_LEVEL  level of ``app.parsers`` (default: LOG_LEVEL)
+    LOG_FORMAT        "json" (one JSON object per line) or "text" (default)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+# Attributes present on every LogRecord; anything else came from ``extra=``
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, ``extra=`` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+def _level(value: Optional[str], default: int) -> int:
+    if not value:
+        return default
+    level = logging.getLevelName(value.upper())
+    return level if isinstance(level, int) else default
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> logging.Logger:
+    """
+    Attach the queue-backed handler to the ``app`` logger (idempotent).
+
+    Returns:
+        The ``app`` logger.
+    """
+    global _listener
+
+    app_logger = logging.getLogger("app")
+    with _lock:
+        app_level = _level(level or os.getenv("LOG_LEVEL"), logging.INFO)
+        app_logger.setLevel(app_level)
+        logging.getLogger("app.parsers").setLevel(_level(os.getenv("PARSER_LOG_LEVEL"), app_level))
+
+        if _listener is not None:
+            return app_logger
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        if (fmt or os.getenv("LOG_FORMAT", "text")).lower() == "json":
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(
+                logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+            )
+
+        log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        app_logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    return app_logger
@@ -33,3 +33,33 @@ active_users = meter.create_up_down_counter(
     description="Number of active users tracked by custom counter",
     unit="1",
 )
+llm_cache_requests = meter.create_counter(
+    "piazzati_parser_llm_cache_requests_total",
+    description="Parser LLM response cache lookups by result (hit/miss)",
+    unit="1",
+)
+parser_stage_duration = meter.create_histogram(
+    "piazzati_parser_stage_duration_seconds",
+    description="CV parser pipeline stage wall time in seconds",
+    unit="s",
+)
+parser_stage_llm_calls = meter.create_histogram(
+    "piazzati_parser_stage_llm_calls",
+    description="LLM requests issued per CV parser pipeline stage",
+    unit="1",
+)
+parse_jobs = meter.create_counter(
+    "piazzati_parse_jobs_total",
+    description="CV parse jobs by outcome (completed/failed/timeout/rejected)",
+    unit="1",
+)
+parse_jobs_in_flight = meter.create_up_down_counter(
+    "piazzati_parse_jobs_in_flight",
+    description="CV parse jobs queued or running in the worker pool",
+    unit="1",
+)
+parse_dedup = meter.create_counter(
+    "piazzati_parse_dedup_total",
+    description="Uploads served by an existing parse job (inflight/reused)",
+    unit="1",
+)
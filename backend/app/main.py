@@ -9,18 +9,26 @@ from fastapi.staticfiles import StaticFiles
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.psycopg2 import Psycopg2Instrumentor
 from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+from .core.logging_config import configure_logging
 from .core.metrics import meter, tracer
 from .core.service_endpoints import router as service_router
+from .core.config import settings
+from .utils.uploads import UploadSizeLimit
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 
+configure_logging()
+
 app = FastAPI(title="PiazzaTi Backend", version="1.0.0")
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 # Register parsing API router (PDF -> parsed JSON)
 app.include_router(parse_router, prefix="/api")
 
+# Oversized uploads are rejected before the multipart body is parsed and spooled
+app.add_middleware(UploadSizeLimit, max_bytes=settings.MAX_UPLOAD_BYTES, paths=("/api/parse/upload",))
+
 # Register embeddings API router (CSV processing & similarity search)
 app.include_router(embeddings_router, prefix="/api")
 
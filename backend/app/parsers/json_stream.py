@@ -0,0 +1,107 @@
+"""
+Incremental JSON validation for streamed LLM output.
+
+The parser asks Ollama for a single top-level JSON object. When the response is
+consumed token by token we can tell exactly when that object closes (and stop
+the generation there) or notice that the output is malformed long before the
+model reaches ``num_predict``.
+"""
+
+import json
+from typing import Any, Dict, List
+
+
+class StreamingJSONError(ValueError):
+    """Raised when a streamed response cannot be a valid JSON object."""
+
+
+# Characters that may appear outside string literals in a JSON document
+# (structural tokens, numbers and the literals true/false/null).
+_JSON_BARE_CHARS = set(' \t\r\n{}[],:0123456789+-.eEtruefalsn')
+_CLOSING = {'}': '{', ']': '['}
+
+
+class IncrementalJSONObject:
+    """
+    Accumulates streamed chunks and tracks the nesting of a top-level object.
+
+    Text before the first ``{`` (e.g. "Here is the JSON:" or a markdown fence)
+    is tolerated up to ``max_preamble_chars``. Anything after the closing brace
+    is ignored.
+    """
+
+    def __init__(self, max_preamble_chars: int = 200):
+        self.max_preamble_chars = max_preamble_chars
+        self.complete = False
+        self._chars: List[str] = []
+        self._stack: List[str] = []
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._preamble = 0
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Feed a chunk of streamed text.
+
+        Returns:
+            True once the top-level object has been closed.
+
+        Raises:
+            StreamingJSONError: if the text cannot be a JSON object.
+        """
+        if self.complete or not chunk:
+            return self.complete
+
+        for ch in chunk:
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._stack.append(ch)
+                    self._chars.append(ch)
+                elif not ch.isspace():
+                    self._preamble += 1
+                    if self._preamble > self.max_preamble_chars:
+                        raise StreamingJSONError("No JSON object found in LLM output")
+                continue
+
+            self._chars.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._stack.append(ch)
+            elif ch in _CLOSING:
+                if not self._stack or self._stack[-1] != _CLOSING[ch]:
+                    raise StreamingJSONError(f"Unbalanced '{ch}' at offset {len(self._chars) - 1}")
+                self._stack.pop()
+                if not self._stack:
+                    self.complete = True
+                    return True
+            elif ch not in _JSON_BARE_CHARS:
+                raise StreamingJSONError(f"Unexpected character {ch!r} at offset {len(self._chars) - 1}")
+
+        return False
+
+    @property
+    def text(self) -> str:
+        """Text of the object received so far (from the opening brace)."""
+        return ''.join(self._chars)
+
+    def result(self) -> Dict[str, Any]:
+        """Decode the completed object."""
+        if not self.complete:
+            raise StreamingJSONError("JSON object is not complete")
+        try:
+            return json.loads(self.text)
+        except json.JSONDecodeError as e:
+            raise StreamingJSONError(f"Invalid JSON: {e}") from e
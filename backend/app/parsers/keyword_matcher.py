@@ -0,0 +1,133 @@
+"""
+Single-pass multi-keyword matching for the heuristic skills fallback.
+
+An Aho–Corasick automaton is built once over the skill keywords *and* the
+negation phrases ("no experience with ", "non conosco ", ...). One linear scan
+of the CV text then yields every keyword occurrence and tells whether it is
+directly preceded by a negation phrase, which replaces one ``str.count`` per
+keyword plus eleven substring searches per hit.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+NEGATION_PREFIXES = (
+    'no experience with ',
+    'no knowledge of ',
+    "don't know ",
+    'do not know ',
+    'not familiar with ',
+    'never used ',
+    'no ',
+    'non conosco ',
+    'nessuna esperienza con ',
+    'mai usato ',
+    'non ho esperienza con ',
+)
+
+
+class AhoCorasick:
+    """Aho–Corasick automaton reporting (pattern_id, end) for every occurrence."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str):
+        pid = len(self.patterns)
+        self.patterns.append(pattern)
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pid)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (pattern_id, end_offset) for all (overlapping) occurrences."""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                for pid in out[node]:
+                    yield pid, i + 1
+
+
+@dataclass
+class KeywordHits:
+    count: int = 0
+    negated: bool = False
+    first_pos: int = -1
+
+
+class SkillKeywordMatcher:
+    """Finds skill keywords, their counts and negation context in one scan."""
+
+    def __init__(self, keywords: Iterable[str], whole_word_keywords: Optional[Set[str]] = None):
+        self.keywords = sorted(set(keywords))
+        self.whole_word_keywords = set(whole_word_keywords or ())
+        self._n_keywords = len(self.keywords)
+        self._automaton = AhoCorasick(self.keywords + list(NEGATION_PREFIXES))
+
+    def scan(self, text_lower: str) -> Dict[str, KeywordHits]:
+        """
+        Scan lowercase text once.
+
+        Returns:
+            keyword -> KeywordHits (only keywords that occur)
+        """
+        hits: Dict[str, KeywordHits] = {}
+        negation_ends: Set[int] = set()
+        keyword_starts: List[Tuple[str, int]] = []
+        n = len(text_lower)
+
+        for pid, end in self._automaton.iter_matches(text_lower):
+            if pid >= self._n_keywords:
+                negation_ends.add(end)
+                continue
+            keyword = self.keywords[pid]
+            start = end - len(keyword)
+            if keyword in self.whole_word_keywords and (
+                (start > 0 and text_lower[start - 1].isalnum()) or (end < n and text_lower[end].isalnum())
+            ):
+                continue
+            keyword_starts.append((keyword, start))
+
+        # Negation phrases always end before the keyword they negate, so they
+        # are all known once the scan is over.
+        for keyword, start in keyword_starts:
+            h = hits.get(keyword)
+            if h is None:
+                h = hits[keyword] = KeywordHits(first_pos=start)
+            h.count += 1
+            if start in negation_ends:
+                h.negated = True
+
+        return hits
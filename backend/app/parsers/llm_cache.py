@@ -0,0 +1,145 @@
+"""
+Prompt-level response cache for deterministic parser LLM calls.
+
+Every parser call runs with temperature=0.0, so (model, options, prompt) fully
+determines the output. Responses are stored in a local SQLite file (WAL mode)
+shared by all parser workers on the host, with a TTL and a maximum number of
+entries (least recently used entries are evicted first).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..core.metrics import llm_cache_requests
+
+
+class LLMResponseCache:
+    """SQLite-backed cache: sha256(model, options, prompt) -> response."""
+
+    _EVICT_EVERY = 100  # run TTL/size eviction every N writes
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.path = Path(
+            path
+            or os.getenv("PARSER_LLM_CACHE_PATH")
+            or Path(tempfile.gettempdir()) / "piazzati_llm_cache.sqlite3"
+        )
+        self.ttl_seconds = ttl_seconds or int(os.getenv("PARSER_LLM_CACHE_TTL", 7 * 24 * 3600))
+        self.max_entries = max_entries or int(os.getenv("PARSER_LLM_CACHE_MAX_ENTRIES", 20000))
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                       key TEXT PRIMARY KEY,
+                       response TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       last_used REAL NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, options: Dict[str, Any], prompt: str) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps({"model": model, "options": options}, sort_keys=True).encode("utf-8"))
+        h.update(b"\0")
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, model: str, options: Dict[str, Any], prompt: str) -> Optional[str]:
+        key = self.make_key(model, options, prompt)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds),
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        llm_cache_requests.add(1, {"result": "miss" if row is None else "hit"})
+        return row[0] if row is not None else None
+
+    def set(self, model: str, options: Dict[str, Any], prompt: str, response: str):
+        if not response:
+            return
+        key = self.make_key(model, options, prompt)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+        except sqlite3.Error:
+            return
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self._EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                removed = conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+                ).rowcount
+                removed += conn.execute(
+                    """DELETE FROM llm_cache WHERE key IN (
+                           SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,),
+                ).rowcount
+            return removed
+        except sqlite3.Error:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process."""
+        total = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
@@ -0,0 +1,113 @@
+"""
+Async Ollama client used by the parser for independent prompts.
+
+A single pooled ``httpx.AsyncClient`` (keep-alive) lives on a dedicated event
+loop thread, so synchronous callers (the parser runs in worker threads) can
+fan out several prompts at once. Concurrency is bounded by a semaphore sized
+like Ollama's ``OLLAMA_NUM_PARALLEL``: more in-flight requests than that would
+only queue inside Ollama.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+
+class AsyncOllamaClient:
+    """Pooled, concurrency-bounded client for Ollama's /api/generate."""
+
+    def __init__(
+        self,
+        model: str,
+        base_url: str,
+        options: Optional[Dict[str, Any]] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.model = model
+        self.base_url = base_url.rstrip('/')
+        self.options = dict(options or {})
+        self.max_concurrency = max_concurrency or int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+        self.timeout = timeout or float(os.getenv("PARSER_LLM_TIMEOUT", "120"))
+
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    # ------------------------------------------------------------------
+    # Event loop management
+    # ------------------------------------------------------------------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="ollama-async-client", daemon=True
+                )
+                thread.start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    async def _open(self):
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+            keepalive_expiry=60.0,
+        )
+        self._client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=self.timeout)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    def close(self):
+        """Close the HTTP pool and stop the loop thread."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+
+    async def agenerate(self, prompt: str, timeout: Optional[float] = None) -> str:
+        """Run one non-streaming completion."""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": self.options,
+        }
+        async with self._semaphore:
+            response = await self._client.post(
+                "/api/generate", json=payload, timeout=timeout or self.timeout
+            )
+        response.raise_for_status()
+        return response.json().get("response", "")
+
+    async def agenerate_many(self, prompts: List[str], timeout: Optional[float] = None) -> List[Optional[str]]:
+        """Run prompts concurrently; failed calls yield None."""
+        results = await asyncio.gather(
+            *(self.agenerate(p, timeout) for p in prompts), return_exceptions=True
+        )
+        return [r if isinstance(r, str) else None for r in results]
+
+    # ------------------------------------------------------------------
+    # Sync bridge
+    # ------------------------------------------------------------------
+
+    def generate_many(self, prompts: List[str], timeout: Optional[float] = None) -> List[Optional[str]]:
+        """Blocking wrapper around agenerate_many for threaded callers."""
+        if not prompts:
+            return []
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self.agenerate_many(prompts, timeout), loop)
+        return future.result()
@@ -23,28 +23,34 @@ from ..schemas.parsed_document import (
     SkillSource,
     Span,
 )
+from .json_stream import IncrementalJSONObject, StreamingJSONError
+from .keyword_matcher import SkillKeywordMatcher
+from . import patterns
+from ..core.metrics import tracer
+from .pipeline import DEFAULT_PROFILE, Pipeline, PipelineStats, Stage, StageStats, count_llm_calls, track_stage
+from .ollama_async_client import AsyncOllamaClient
+from .llm_cache import LLMResponseCache
+from .prompt_budget import PAGE_BREAK, PromptBudgeter, clean_ocr_noise
+from .text_index import DocumentTextIndex, TextIndexCache
 
 from langchain_ollama import OllamaLLM as Ollama
 
 import os
 import time
-import re
 import json
 import uuid
 import hashlib
+import logging
 from pathlib import Path
-from typing import Optional, Dict, List, Tuple, Set
+from typing import Callable, Optional, Dict, List, Tuple, Set
 from datetime import datetime
 
-print("="*80)
-print("STEP 5: Creating Parser v1.7.4 FINAL (Complete)")
-print("="*80)
+logger = logging.getLogger(__name__)
 
 # ========================================================================
 # IMPORTS
 # ========================================================================
 import time
-import re
 import json
 import uuid
 import hashlib
@@ -63,32 +69,95 @@ from langchain_community.llms import Ollama
 class OllamaCVParser:
     """Parser v1.7.4 with enhanced description generation."""
 
-    def __init__(self, model: str = "llama3.2:3b", base_url: str = None):
+    def __init__(self, model: str = "llama3.2:3b", base_url: str = None, stream_extraction: bool = None,
+                 llm_cache: Optional[LLMResponseCache] = None, profile: Optional[str] = None):
         self.model = model
+        # Post-processing profile: "full" (default) or "fast" (no LLM descriptions)
+        self.profile = profile or os.getenv("PARSER_PROFILE", DEFAULT_PROFILE)
+        self.PIPELINE.stages_for(self.profile)  # validate early
         self.base_url = (
             base_url or os.getenv("OLLAMA_BASE_URL") or "http://localhost:11434"
         )
-        print(f"Initializing parser v1.7.4 FINAL...")
-        print(f"  Using Ollama base_url: {self.base_url}")
+        # Streaming extraction stops decoding as soon as the JSON object closes
+        if stream_extraction is None:
+            stream_extraction = os.getenv("PARSER_STREAM_EXTRACTION", "1").lower() not in ("0", "false", "no")
+        self.stream_extraction = stream_extraction
+        self.llm_options = {
+            "temperature": 0.0,
+            "num_predict": 12000,
+            "top_k": 10,
+            "top_p": 0.9,
+            "repeat_penalty": 1.1,
+        }
+        logger.debug("Initializing parser v1.7.4 FINAL (base_url: %s)", self.base_url)
         try:
-            self.llm = Ollama(
-                model=model,
-                base_url=self.base_url,
-                temperature=0.0,
-                num_predict=12000,
-                top_k=10,
-                top_p=0.9,
-                repeat_penalty=1.1,
-            )
-            print(f"  ✅ LLM client initialized successfully (model: {model})")
+            self.llm = Ollama(model=model, base_url=self.base_url, **self.llm_options)
+            logger.debug("LLM client initialized (model: %s)", model)
         except Exception as e:
-            print(f"  ❌ Failed to initialize Ollama client: {e}")
+            logger.error("Failed to initialize Ollama client: %s", e)
             self.llm = None
 
+        # Pooled async client for independent prompts (enrichment fan-out)
+        self.async_llm = AsyncOllamaClient(model=model, base_url=self.base_url, options=self.llm_options)
+
+        # Token budget for the CV text in the extraction prompt
+        self.prompt_budgeter = PromptBudgeter()
+
+        # Deterministic calls (temperature=0) are cached by prompt hash
+        self.llm_cache = llm_cache
+        if self.llm_cache is None and os.getenv("PARSER_LLM_CACHE", "1").lower() not in ("0", "false", "no"):
+            try:
+                self.llm_cache = LLMResponseCache()
+                logger.debug("LLM cache: %s", self.llm_cache.path)
+            except Exception as e:
+                logger.warning("LLM cache disabled: %s", e)
+
+        # Per-document text index (shared by spans, sections, job context)
+        self.text_indexes = TextIndexCache()
+
         self._init_language_database()
         self._init_certification_database()
         self._init_skill_keywords()
-        print(f"SUCCESS: Parser v1.7.4 FINAL ready")
+        logger.info("Parser v1.7.4 FINAL ready (model: %s, profile: %s)", self.model, self.profile)
+
+
+    # ========================================================================
+    # LLM CALLS (cached)
+    # ========================================================================
+
+    def _cache_get(self, prompt: str) -> Optional[str]:
+        if self.llm_cache is None or self.llm_options.get("temperature") != 0.0:
+            return None
+        return self.llm_cache.get(self.model, self.llm_options, prompt)
+
+
+    def _cache_set(self, prompt: str, response: Optional[str]):
+        if self.llm_cache is not None and response and self.llm_options.get("temperature") == 0.0:
+            self.llm_cache.set(self.model, self.llm_options, prompt, response)
+
+
+    def _invoke_llm(self, prompt: str) -> str:
+        """Blocking LLM call through the response cache."""
+        cached = self._cache_get(prompt)
+        if cached is not None:
+            return cached
+        count_llm_calls()
+        response = self.llm.invoke(prompt)
+        self._cache_set(prompt, response)
+        return response
+
+
+    def _invoke_llm_many(self, prompts: List[str]) -> List[Optional[str]]:
+        """Concurrent LLM calls (async client) through the response cache."""
+        responses = [self._cache_get(p) for p in prompts]
+        misses = [i for i, r in enumerate(responses) if r is None]
+        if misses:
+            count_llm_calls(len(misses))
+            fresh = self.async_llm.generate_many([prompts[i] for i in misses])
+            for i, response in zip(misses, fresh):
+                responses[i] = response
+                self._cache_set(prompts[i], response)
+        return responses
 
 
     def _init_language_database(self):
@@ -129,6 +198,18 @@ class OllamaCVParser:
             'wordpress', 'shopify'
         }
 
+        # Canonical display names for ontology aliases (e.g. 'js' -> 'JavaScript')
+        self.skill_canonical_names = {}
+        ontology_keywords = self._load_ontology_skill_keywords()
+        for alias, canonical in ontology_keywords.items():
+            self.skill_canonical_names.setdefault(alias, canonical)
+
+        # Ontology aliases are often short ('ts', 'go'): match them as whole words only
+        self.skill_matcher = SkillKeywordMatcher(
+            self.skill_keywords | set(ontology_keywords),
+            whole_word_keywords=set(ontology_keywords) - self.skill_keywords,
+        )
+
         self.soft_skills_exclude = {
             'gestione stress', 'decision-making', 'empatia',
             'comunicazione', 'leadership', 'lavoro di squadra',
@@ -150,61 +231,80 @@ class OllamaCVParser:
 
 
 
-    def parse(self, file_path: str) -> ParsedDocument:
-        """Parse CV with automatic format detection."""
+    def parse(
+        self,
+        file_path: str,
+        profile: Optional[str] = None,
+        file_hash: Optional[str] = None,
+        progress: Optional[Callable[[str, StageStats], None]] = None,
+    ) -> ParsedDocument:
+        """
+        Parse CV with automatic format detection.
+
+        Args:
+            file_path: PDF path
+            profile: post-processing profile ("full"/"fast"), defaults to the parser's
+            file_hash: SHA-256 of the file if already known (e.g. computed while uploading)
+            progress: called as progress(event, stage) on stage start/end/skip
+        """
         file_path = Path(file_path)
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
 
-        print(f"\n{'='*80}")
-        print(f"PARSING: {file_path.name}")
-        print(f"{'='*80}")
-
-        # Steps 0-1: Hash, OCR
-        print("\n[0/16] Hash...")
-        file_hash = self._compute_file_hash(str(file_path))
-        print(f"✓ {file_hash[:16]}")
-
-        print("\n[1/16] OCR...")
-        full_text = self._extract_text_from_pdf(str(file_path), max_pages=10)
-        print(f"✓ {len(full_text)} chars")
-
-        # Clean OCR text
-        print("\n[1.5/16] Cleaning OCR...")
-        full_text = self._clean_ocr_text(full_text)
-        print(f"✓ Cleaned")
-
-        # Detect format
-        print("\n[2/16] Format detection...")
-        is_europass = self._detect_europass_format(full_text)
-
-        if is_europass:
-            print("      ✓ EUROPASS format detected")
-            extracted_data = self._parse_europass_cv(full_text)
-        else:
-            print("      ✓ Standard format detected")
-            print("\n[2.5/16] LLM Extraction...")
-            extracted_data = self._extract_with_robust_llm(full_text)
-
-        # Step 3: Metadata
-        extracted_data.document_id = str(uuid.uuid4())
-        extracted_data.file_sha256 = file_hash
-        extracted_data.file_name = file_path.name
-        extracted_data.full_text = full_text
-        extracted_data.parsing_method = f"{'europass' if is_europass else 'standard'}_v1.7.4_{self.model}"
-        extracted_data.parsed_at = datetime.now()
-
-        # POST-PROCESSING
-        print("\n" + "="*80)
-        print("POST-PROCESSING")
-        print("="*80)
+        profile = profile or self.profile
+        self.PIPELINE.stages_for(profile)
+        stats = PipelineStats(profile=profile, listener=progress)
 
-        self._run_postprocessing(extracted_data)
-
-        print(f"\n{'='*80}")
-        print(f" COMPLETE v1.7.4 ({'EUROPASS' if is_europass else 'STANDARD'})")
-        print(f"{'='*80}")
+        with tracer.start_as_current_span("cv_parser.parse") as span:
+            span.set_attribute("parser.profile", profile)
+            span.set_attribute("parser.model", self.model)
+            logger.debug("Parsing %s (profile: %s)", file_path.name, profile)
 
+            # Hash, OCR
+            if not file_hash:
+                with track_stage(stats, "hash"):
+                    file_hash = self._compute_file_hash(str(file_path))
+            else:
+                stats.skip("hash", "precomputed")
+            logger.debug("Hash: %.16s", file_hash)
+
+            with track_stage(stats, "ocr"):
+                full_text = self._extract_text_from_pdf(str(file_path), max_pages=10)
+                logger.debug("OCR: %d chars", len(full_text))
+                full_text = self._clean_ocr_text(full_text)
+                self._text_index(full_text)
+
+            # Format detection + extraction
+            with track_stage(stats, "extraction"):
+                is_europass = self._detect_europass_format(full_text)
+
+                if is_europass:
+                    logger.debug("EUROPASS format detected")
+                    extracted_data = self._parse_europass_cv(full_text)
+                else:
+                    logger.debug("Standard format detected")
+                    extracted_data = self._extract_with_robust_llm(full_text)
+
+            # Metadata
+            extracted_data.document_id = str(uuid.uuid4())
+            extracted_data.file_sha256 = file_hash
+            extracted_data.file_name = file_path.name
+            extracted_data.full_text = full_text
+            extracted_data.parsing_method = f"{'europass' if is_europass else 'standard'}_v1.7.4_{self.model}"
+            extracted_data.parsed_at = datetime.now()
+
+            # Post-processing
+            self._run_postprocessing(extracted_data, stats)
+
+            span.set_attribute("parser.format", "europass" if is_europass else "standard")
+            span.set_attribute("parser.total_ms", stats.total_ms)
+            span.set_attribute("parser.llm_calls", stats.llm_calls)
+
+        logger.info(
+            "Parsed %s (%s, profile %s) in %.0f ms, %d LLM calls",
+            file_path.name, "europass" if is_europass else "standard", profile,
+            stats.total_ms, stats.llm_calls,
+        )
         return extracted_data
 
 
@@ -256,26 +356,16 @@ class OllamaCVParser:
 
     def _parse_europass_cv(self, text: str) -> ParsedDocument:
         """Parse Europass CV with field-based extraction."""
-        print("      Using Europass parser...")
-
         doc = ParsedDocument(document_type=DocumentType.cv, parsed_at=datetime.now())
 
-        print("        Personal info...")
         doc.personal_info = self._extract_europass_personal_info(text)
-
-        print("        Experience...")
         doc.experience = self._extract_europass_experience(text)
-        print(f"          → {len(doc.experience)} entries")
-
-        print("        Education...")
         doc.education = self._extract_europass_education(text)
-        print(f"          → {len(doc.education)} entries")
-
-        print("        Languages...")
         doc.languages = self._extract_europass_languages(text)
-        print(f"          → {len(doc.languages)} languages")
-
-        print("      ✓ Europass parsing complete")
+        logger.debug(
+            "Europass: %d experiences, %d education, %d languages",
+            len(doc.experience), len(doc.education), len(doc.languages),
+        )
         return doc
 
 
@@ -283,11 +373,7 @@ class OllamaCVParser:
         """Extract personal info from Europass."""
         info = PersonalInfo()
 
-        section_match = re.search(
-            r'INFORMAZIONI PERSONALI(.*?)(?:ESPERIENZA LAVORATIVA|ISTRUZIONE)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        section_match = patterns.EUROPASS_PERSONAL_SECTION.search(text)
 
         if not section_match:
             return info
@@ -317,7 +403,7 @@ class OllamaCVParser:
                 address = lines[i + 1].strip()
                 if address and len(address) > 10:
                     info.address = address
-                    city_match = re.search(r'-\s*([A-Z][a-zA-Z\s]+)\s*\(', address)
+                    city_match = patterns.EUROPASS_ADDRESS_CITY.search(address)
                     if city_match:
                         info.city = city_match.group(1).strip()
 
@@ -328,17 +414,13 @@ class OllamaCVParser:
         """Extract experience from Europass."""
         experiences = []
 
-        section_match = re.search(
-            r'ESPERIENZA LAVORATIVA(.*?)(?:ISTRUZIONE E FORMAZIONE|CAPACITA)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        section_match = patterns.EUROPASS_EXPERIENCE_SECTION.search(text)
 
         if not section_match:
             return experiences
 
         section = section_match.group(1)
-        entries = re.split(r'\*\s*Date\s*\(da\s*[-–]\s*a\)', section)
+        entries = patterns.EUROPASS_ENTRY_SPLIT.split(section)
 
         for entry in entries[1:]:
             exp = Experience()
@@ -349,7 +431,7 @@ class OllamaCVParser:
 
             # Dates
             if lines[0]:
-                date_match = re.search(r'(\d{4})\s*[-–]\s*(\d{4}|in corso)', lines[0], re.IGNORECASE)
+                date_match = patterns.EUROPASS_DATE_RANGE.search(lines[0])
                 if date_match:
                     exp.start_date = date_match.group(1)
                     end = date_match.group(2)
@@ -361,7 +443,7 @@ class OllamaCVParser:
                     if i + 1 < len(lines):
                         company = lines[i + 1]
                         exp.company = company
-                        city_match = re.search(r'-\s*([A-Z][a-zA-Z]+)\s*\(', company)
+                        city_match = patterns.EUROPASS_COMPANY_CITY.search(company)
                         if city_match:
                             exp.city = city_match.group(1)
                     break
@@ -379,7 +461,7 @@ class OllamaCVParser:
                     if i + 1 < len(lines):
                         resp_text = ' '.join(lines[i + 1:i + 4])
                         if resp_text:
-                            resp_list = re.split(r'[;,]\s*', resp_text)
+                            resp_list = patterns.RESPONSIBILITY_SPLIT.split(resp_text)
                             exp.responsibilities = [r.strip() for r in resp_list if len(r.strip()) > 10][:5]
                     break
 
@@ -393,17 +475,13 @@ class OllamaCVParser:
         """Extract education from Europass."""
         educations = []
 
-        section_match = re.search(
-            r'ISTRUZIONE E FORMAZIONE(.*?)(?:CAPACITA|ALTRE LINGUA|$)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        section_match = patterns.EUROPASS_EDUCATION_SECTION.search(text)
 
         if not section_match:
             return educations
 
         section = section_match.group(1)
-        entries = re.split(r'\*\s*Date\s*\(da\s*[-–]\s*a\)', section)
+        entries = patterns.EUROPASS_ENTRY_SPLIT.split(section)
 
         for entry in entries[1:]:
             edu = Education()
@@ -414,7 +492,7 @@ class OllamaCVParser:
 
             # Year
             if lines[0]:
-                year_match = re.search(r'(\d{4})', lines[0])
+                year_match = patterns.FOUR_DIGITS.search(lines[0])
                 if year_match:
                     edu.graduation_year = int(year_match.group(1))
 
@@ -433,7 +511,7 @@ class OllamaCVParser:
                     break
 
             # GPA
-            gpa_match = re.search(r'(\d{2,3})/(\d{2,3})', entry)
+            gpa_match = patterns.GPA.search(entry)
             if gpa_match:
                 edu.gpa = gpa_match.group(0)
 
@@ -447,11 +525,7 @@ class OllamaCVParser:
         """Extract languages from Europass."""
         languages = []
 
-        section_match = re.search(
-            r'ALTRE LINGUA(.*?)(?:CAPACITA|$)',
-            text,
-            re.IGNORECASE | re.DOTALL
-        )
+        section_match = patterns.EUROPASS_LANGUAGES_SECTION.search(text)
 
         if not section_match:
             return languages
@@ -494,17 +568,75 @@ class OllamaCVParser:
 
     def _extract_with_robust_llm(self, text: str) -> ParsedDocument:
         """Extract with LLM (standard format)."""
-        print("      Extracting with LLM...")
-        prompt = self._get_robust_prompt(text[:8000])
+        prompt = self._get_robust_prompt(self._budget_cv_text(text))
 
         try:
-            response = self.llm.invoke(prompt)
-            data = self._parse_json_response(response)
-            print("      ✓ Success")
+            cached = self._cache_get(prompt)
+            if cached is not None:
+                data = self._parse_json_response(cached)
+            elif self.stream_extraction and hasattr(self.llm, 'stream'):
+                data = self._extract_streaming(prompt)
+            else:
+                count_llm_calls()
+                response = self.llm.invoke(prompt)
+                self._cache_set(prompt, response)
+                data = self._parse_json_response(response)
+            logger.debug("LLM extraction done")
             return data
         except Exception as e:
-            print(f"      ✗ LLM failed: {str(e)[:50]}")
+            logger.warning("LLM extraction failed: %.50s", e)
+            return self._create_empty_document()
+
+
+    def _extract_streaming(self, prompt: str) -> ParsedDocument:
+        """
+        Consume the Ollama token stream and stop once the JSON object closes.
+
+        Malformed output aborts the stream early instead of waiting for
+        num_predict tokens. Closing the generator drops the HTTP connection,
+        which makes Ollama stop decoding.
+        """
+        obj = IncrementalJSONObject()
+        count_llm_calls()
+        stream = self.llm.stream(prompt)
+        chunks = 0
+        try:
+            for chunk in stream:
+                chunks += 1
+                if obj.feed(chunk):
+                    break
+        except StreamingJSONError as e:
+            logger.warning("Malformed stream after %s chunks: %s", chunks, e)
             return self._create_empty_document()
+        finally:
+            stream.close()
+
+        if not obj.complete:
+            # Generation ended before the object closed: best-effort parse
+            logger.warning("Stream ended with incomplete JSON (%s chunks)", chunks)
+            return self._parse_json_response(obj.text)
+
+        logger.debug("JSON closed after %s chunks", chunks)
+        self._cache_set(prompt, obj.text)
+        try:
+            return self._dict_to_document(obj.result())
+        except StreamingJSONError:
+            return self._parse_json_response(obj.text)
+
+
+    def _budget_cv_text(self, text: str) -> str:
+        """
+        Prepare CV text for the extraction prompt within the token budget.
+
+        OCR noise is removed first; if the text is still over budget, sections
+        are kept by priority (experience, skills, languages, ...) rather than
+        cutting the tail of the CV.
+        """
+        cleaned = clean_ocr_noise(text)
+        fitted = self.prompt_budgeter.fit(cleaned, self._locate_sections(cleaned))
+        count = self.prompt_budgeter.count_tokens
+        logger.debug("Prompt text: %s → %s tokens (budget %s)", count(text), count(fitted), self.prompt_budgeter.budget_tokens)
+        return fitted
 
 
     def _get_robust_prompt(self, text: str) -> str:
@@ -542,15 +674,15 @@ JSON:"""
         try:
             data_dict = json.loads(response)
             return self._dict_to_document(data_dict)
-        except:
+        except Exception:
             pass
 
-        json_match = re.search(r'\{.*\}', response, re.DOTALL)
+        json_match = patterns.JSON_OBJECT.search(response)
         if json_match:
             try:
                 data_dict = json.loads(json_match.group(0))
                 return self._dict_to_document(data_dict)
-            except:
+            except Exception:
                 pass
 
         return self._create_empty_document()
@@ -597,74 +729,76 @@ JSON:"""
     # POST-PROCESSING (consolidated)
     # ========================================================================
 
-    def _run_postprocessing(self, data: ParsedDocument):
-        """Run all post-processing modules."""
+    PIPELINE = Pipeline([
+        Stage("education_fallback", "_extract_education_fallback",
+              inputs=("full_text", "education"), outputs=("education",),
+              when=lambda d: len(d.education) == 0),
+        Stage("languages_fallback", "_extract_languages_fallback",
+              inputs=("full_text", "languages"), outputs=("languages",),
+              when=lambda d: len(d.languages) == 0),
+        Stage("language_levels", "_validate_and_enrich_language_levels",
+              inputs=("languages",), outputs=("languages",)),
+        Stage("skills", "_filter_and_enrich_skills",
+              inputs=("skills", "full_text"), outputs=("skills",)),
+        Stage("certifications", "_deduplicate_certifications",
+              inputs=("certifications",), outputs=("certifications",)),
+        Stage("summary_fallback", "_extract_summary_fallback",
+              inputs=("full_text", "summary"), outputs=("summary",),
+              when=lambda d: not d.summary),
+        Stage("descriptions", "_enrich_experience_descriptions_enhanced",
+              inputs=("experience", "full_text"), outputs=("experience",),
+              profiles=frozenset({"full"})),
+        Stage("country", "_enrich_country_info",
+              inputs=("personal_info",), outputs=("personal_info",)),
+        Stage("current_jobs", "_detect_is_current_jobs",
+              inputs=("experience",), outputs=("experience",)),
+        Stage("dates", "_clean_date_fields",
+              inputs=("experience", "education", "certifications"),
+              outputs=("experience", "education", "certifications")),
+        Stage("spans", "_extract_all_spans",
+              inputs=("full_text", "personal_info", "experience", "education", "skills", "languages",
+                      "certifications", "summary_span"),
+              outputs=("all_spans",)),
+        Stage("confidence", "_compute_confidence",
+              inputs=("full_text", "personal_info", "experience", "education", "skills", "languages"),
+              outputs=("gdpr_consent", "confidence_score", "section_confidence", "warnings")),
+    ])
+
+
+    # Stages run by parse() before the post-processing pipeline
+    PARSE_STAGES = ("hash", "ocr", "extraction")
+
+    @classmethod
+    def stage_plan(cls, profile: str) -> List[str]:
+        """Names of the stages parse() goes through with this profile, in order."""
+        return list(cls.PARSE_STAGES) + [s.name for s in cls.PIPELINE.stages_for(profile)]
+
+
+    def _run_postprocessing(self, data: ParsedDocument, stats: Optional[PipelineStats] = None) -> PipelineStats:
+        """Run the post-processing pipeline for the selected profile."""
+        stats = stats or PipelineStats(profile=self.profile)
+        self.PIPELINE.run(self, data, stats)
+        data.pipeline_stats = stats.to_dict()
 
-        # Education fallback
-        print("\n[4/16] Education fallback...")
-        if len(data.education) == 0:
-            self._extract_education_fallback(data)
-        print(f"      ✓ {len(data.education)} entries")
+        if data.warnings:
+            logger.debug("%d warnings", len(data.warnings))
+        return stats
 
-        # Languages fallback
-        print("\n[5/16] Languages fallback...")
-        if len(data.languages) == 0:
-            self._extract_languages_fallback(data)
-        print(f"      ✓ {len(data.languages)} languages")
-
-        # Language levels validation
-        print("\n[5.5/16] Language levels...")
-        self._validate_and_enrich_language_levels(data)
-
-        # Skills filtering
-        print("\n[6/16] Skills (IMPROVED)...")
-        self._filter_and_enrich_skills(data)
-        print(f"      ✓ {len(data.skills)} skills")
-
-        # Certifications deduplication
-        print("\n[7/16] Certifications...")
-        self._deduplicate_certifications(data)
-        print(f"      ✓ {len(data.certifications)} certs")
-
-        # Summary fallback
-        print("\n[8/16] Summary...")
-        if not data.summary:
-            self._extract_summary_fallback(data)
-        if data.summary:
-            print(f"      ✓ {len(data.summary)} chars")
-
-        # ENHANCED: Experience descriptions enrichment
-        print("\n[9/16] Descriptions (ENHANCED)...")
-        self._enrich_experience_descriptions_enhanced(data)
-
-        # Country enrichment
-        print("\n[10/16] Country...")
-        self._enrich_country_info(data)
-
-        # Current jobs detection
-        print("\n[11/16] Current jobs...")
-        self._detect_is_current_jobs(data)
-
-        # Date cleaning
-        print("\n[11.5/16] Date cleaning...")
-        self._clean_date_fields(data)
-
-        # Spans extraction
-        print("\n[12/16] Spans (ENHANCED)...")
+
+    def _extract_all_spans(self, data: ParsedDocument):
+        """Spans extraction + collection from nested sections."""
         self._extract_spans_enhanced(data)
         data.collect_all_spans()
-        print(f"      ✓ {len(data.all_spans)} spans")
+        logger.debug("Collected %d spans", len(data.all_spans))
+
 
-        # Confidence computation
-        print("\n[13/16] Confidence...")
+    def _compute_confidence(self, data: ParsedDocument):
+        """GDPR flag, missing sections and confidence scores."""
         data.gdpr_consent = 'gdpr' in data.full_text[-2000:].lower() if data.full_text else False
         data.detect_missing_sections()
         data.compute_section_confidence()
         data.detect_low_confidence_sections_v2()
-        print(f"✓ {data.confidence_score:.2f}")
-
-        if data.warnings:
-            print(f"  {len(data.warnings)} warnings")
+        logger.debug("Confidence: %.2f", data.confidence_score)
 
 
     # ========================================================================
@@ -682,51 +816,200 @@ JSON:"""
         4. Quality validation (reject bad outputs)
         5. Retry mechanism (2 attempts)
         6. Multi-strategy generation
+        7. Single batched LLM request for all jobs, per-item fallback only
+           for entries failing validation
         """
         if len(data.experience) == 0:
-            print("      No experiences to enrich")
+            logger.debug("No experiences to enrich")
             return
 
-        print(f"      Processing {len(data.experience)} experiences...")
+        logger.debug("Processing %s experiences...", len(data.experience))
 
         enriched_count = 0
         improved_count = 0
         skipped_count = 0
         max_process = 10  # Performance limit
+        total = min(max_process, len(data.experience))
 
+        # Collect experiences needing a description
+        pending = []
         for i, exp in enumerate(data.experience[:max_process]):
-            # Check if needs enrichment
             if exp.description:
                 if self._is_high_quality_description(exp.description):
-                    print(f"        [{i+1}/{min(max_process, len(data.experience))}] {exp.title[:30]}: Skip (high quality)")
+                    logger.debug("[%d/%d] %.30s: Skip (high quality)", i + 1, total, exp.title)
                     skipped_count += 1
                     continue
-                else:
-                    print(f"        [{i+1}/{min(max_process, len(data.experience))}] {exp.title[:30]}: Improving...")
-                    action = "improve"
+                logger.debug("[%d/%d] %.30s: Improving...", i + 1, total, exp.title)
+                pending.append((i, exp, "improve"))
             else:
-                print(f"        [{i+1}/{min(max_process, len(data.experience))}] {exp.title[:30]}: Generating...")
-                action = "generate"
+                logger.debug("[%d/%d] %.30s: Generating...", i + 1, total, exp.title)
+                pending.append((i, exp, "generate"))
+
+        # One structured request for all of them (per-item only on failure)
+        batched = {}
+        if len(pending) > 1:
+            batched = self._generate_descriptions_batched(data, [(i, exp) for i, exp, _ in pending])
+            logger.debug("Batch: %s/%s valid", len(batched), len(pending))
 
-            # Try to generate description (with retry)
-            description = self._generate_description_with_retry(data, exp)
+        # Per-item fallback for failed entries, run concurrently
+        missing = [(i, exp) for i, exp, _ in pending if i not in batched]
+        if missing:
+            batched.update(self._generate_descriptions_concurrent(data, missing))
+
+        for i, exp, action in pending:
+            description = batched.get(i)
 
             if description:
                 exp.description = description
                 if action == "improve":
                     improved_count += 1
-                    print(f"          ✓ Improved ({len(description)} chars)")
+                    logger.debug("[%s] Improved (%s chars)", i+1, len(description))
                 else:
                     enriched_count += 1
-                    print(f"          ✓ Generated ({len(description)} chars)")
+                    logger.debug("[%s] Generated (%s chars)", i+1, len(description))
             else:
-                print(f"          ✗ Failed")
+                logger.warning("Description generation failed for experience %d", i + 1)
 
         total_processed = enriched_count + improved_count
         if total_processed > 0:
-            print(f"      ✓ Generated: {enriched_count}, Improved: {improved_count}, Skipped: {skipped_count}")
+            logger.debug("Generated: %s, Improved: %s, Skipped: %s", enriched_count, improved_count, skipped_count)
         else:
-            print(f"      ✓ Skipped: {skipped_count} (all high quality)")
+            logger.debug("Skipped: %s (all high quality)", skipped_count)
+
+
+    def _generate_descriptions_batched(self, data: ParsedDocument, items: List[Tuple[int, Experience]]) -> Dict[int, str]:
+        """
+        Generate descriptions for several experiences with a single LLM call.
+
+        The model answers with a JSON array of {"id", "description"} objects.
+        Only descriptions passing cleaning and quality validation are returned;
+        missing ids are left to the per-item fallback.
+
+        Returns:
+            Dict experience index -> description
+        """
+        blocks = []
+        for i, exp in items:
+            context = self._extract_job_context_enhanced(data.full_text, exp)
+            if context and len(context) >= 100:
+                details = f"CONTEXT FROM CV:\n{context[:500]}"
+            elif exp.responsibilities:
+                details = "KEY RESPONSIBILITIES:\n" + "\n".join(f"- {r[:120]}" for r in exp.responsibilities[:4])
+            else:
+                details = "No further details."
+            blocks.append(f"[{i}] JOB TITLE: {exp.title}\nCOMPANY: {exp.company or 'N/A'}\n{details}")
+
+        jobs_text = "\n\n".join(blocks)
+        prompt = f"""Generate a professional job description (150-300 characters) for EACH job below.
+
+JOBS:
+{jobs_text}
+
+For each job write a concise summary covering the main responsibilities and key achievements (if mentioned). Start directly, no prefix.
+
+OUTPUT: ONLY a valid JSON array with one object per job, using the job number as id:
+[{{"id": 0, "description": "..."}}]
+
+JSON:"""
+
+        try:
+            response = self._invoke_llm(prompt)
+        except Exception:
+            return {}
+
+        entries = self._parse_json_array(response)
+        wanted = {i for i, _ in items}
+        results = {}
+        for entry in entries:
+            if not isinstance(entry, dict):
+                continue
+            try:
+                idx = int(entry.get('id'))
+            except (TypeError, ValueError):
+                continue
+            if idx not in wanted or idx in results:
+                continue
+            raw = entry.get('description')
+            desc = self._clean_llm_description(raw) if isinstance(raw, str) else None
+            if desc and self._validate_description_quality(desc):
+                results[idx] = desc
+
+        return results
+
+
+    def _generate_descriptions_concurrent(self, data: ParsedDocument, items: List[Tuple[int, Experience]]) -> Dict[int, str]:
+        """
+        Per-item description generation with the 3-tier fallback, fanned out.
+
+        Each round sends one prompt per remaining experience through the async
+        client (bounded by OLLAMA_NUM_PARALLEL); experiences whose output fails
+        validation move on to the next strategy in the following round:
+        context -> responsibilities -> minimal.
+
+        Returns:
+            Dict experience index -> description
+        """
+        if self.async_llm is None:
+            results = {}
+            for i, exp in items:
+                desc = self._generate_description_with_retry(data, exp)
+                if desc:
+                    results[i] = desc
+            return results
+
+        strategies = {}
+        for i, exp in items:
+            tiers = []
+            context = self._extract_job_context_enhanced(data.full_text, exp)
+            if context and len(context) >= 100:
+                tiers.append(('context', self._context_description_prompt(exp, context)))
+            if exp.responsibilities:
+                tiers.append(('responsibilities', self._responsibilities_description_prompt(exp)))
+            tiers.append(('minimal', self._minimal_description_prompt(exp)))
+            strategies[i] = tiers
+
+        results = {}
+        remaining = [i for i, _ in items]
+        while remaining:
+            batch = [(i, *strategies[i].pop(0)) for i in remaining]
+            responses = self._invoke_llm_many([prompt for _, _, prompt in batch])
+
+            remaining = []
+            for (i, strategy, _), response in zip(batch, responses):
+                desc = self._clean_llm_description(response)
+                if strategy == 'minimal':
+                    valid = bool(desc) and len(desc) >= 50
+                else:
+                    valid = bool(desc) and self._validate_description_quality(desc)
+                if valid:
+                    results[i] = desc
+                elif strategies[i]:
+                    remaining.append(i)
+
+        return results
+
+
+    def _parse_json_array(self, response: str) -> List:
+        """Parse a JSON array from an LLM response (empty list on failure)."""
+        if not response:
+            return []
+        response = response.strip()
+
+        try:
+            parsed = json.loads(response)
+            return parsed if isinstance(parsed, list) else []
+        except ValueError:
+            pass
+
+        array_match = patterns.JSON_ARRAY.search(response)
+        if array_match:
+            try:
+                parsed = json.loads(array_match.group(0))
+                return parsed if isinstance(parsed, list) else []
+            except ValueError:
+                pass
+
+        return []
 
 
     def _is_high_quality_description(self, description: str) -> bool:
@@ -764,7 +1047,7 @@ JSON:"""
             return False
 
         # Check for specific details (numbers or technical terms)
-        has_numbers = bool(re.search(r'\d+', description))
+        has_numbers = bool(patterns.HAS_DIGIT.search(description))
         has_specifics = len(description.split()) > 20  # More than 20 words
 
         return has_specifics
@@ -820,11 +1103,12 @@ JSON:"""
         if not text or not exp.title:
             return None
 
-        text_lower = text.lower()
+        index = self._text_index(text)
+        text_lower = index.text_lower
 
         # Strategy 1: Exact match (title + company)
         if exp.title and exp.company:
-            title_idx = text_lower.find(exp.title.lower())
+            title_idx = index.find(exp.title)
             if title_idx != -1:
                 window = text_lower[title_idx:title_idx + 300]
                 company_clean = exp.company.split('-')[0].strip() if '-' in exp.company else exp.company
@@ -834,7 +1118,7 @@ JSON:"""
 
         # Strategy 2: Title only
         if exp.title:
-            title_idx = text_lower.find(exp.title.lower())
+            title_idx = index.find(exp.title)
             if title_idx != -1:
                 end_idx = min(title_idx + 800, len(text))
                 return text[title_idx:end_idx]
@@ -842,7 +1126,7 @@ JSON:"""
         # Strategy 3: Company only (less reliable)
         if exp.company:
             company_clean = exp.company.split('-')[0].strip() if '-' in exp.company else exp.company
-            company_idx = text_lower.find(company_clean.lower())
+            company_idx = index.find(company_clean)
             if company_idx != -1:
                 end_idx = min(company_idx + 600, len(text))
                 return text[company_idx:end_idx]
@@ -856,7 +1140,16 @@ JSON:"""
 
         Uses LLM with context + structured data.
         """
-        prompt = f"""Generate a professional job description (150-300 characters).
+        try:
+            response = self._invoke_llm(self._context_description_prompt(exp, context))
+            return self._clean_llm_description(response)
+        except Exception:
+            return None
+
+
+    def _context_description_prompt(self, exp: Experience, context: str) -> str:
+        """Prompt for context-based description generation."""
+        return f"""Generate a professional job description (150-300 characters).
 
 JOB TITLE: {exp.title}
 COMPANY: {exp.company or 'N/A'}
@@ -872,12 +1165,6 @@ OUTPUT: Single paragraph, 150-300 chars. Start directly, no prefix.
 
 DESCRIPTION:"""
 
-        try:
-            response = self.llm.invoke(prompt)
-            return self._clean_llm_description(response)
-        except:
-            return None
-
 
     def _generate_from_responsibilities(self, exp: Experience) -> Optional[str]:
         """
@@ -888,9 +1175,18 @@ DESCRIPTION:"""
         if not exp.responsibilities or len(exp.responsibilities) == 0:
             return None
 
+        try:
+            response = self._invoke_llm(self._responsibilities_description_prompt(exp))
+            return self._clean_llm_description(response)
+        except Exception:
+            return None
+
+
+    def _responsibilities_description_prompt(self, exp: Experience) -> str:
+        """Prompt for responsibilities-based description generation."""
         resp_text = "\n".join(f"- {r[:120]}" for r in exp.responsibilities[:4])
 
-        prompt = f"""Generate a professional job description (150-300 characters).
+        return f"""Generate a professional job description (150-300 characters).
 
 JOB TITLE: {exp.title}
 COMPANY: {exp.company or 'N/A'}
@@ -902,12 +1198,6 @@ Write a concise summary of the role. Single paragraph, 150-300 chars. No prefix.
 
 DESCRIPTION:"""
 
-        try:
-            response = self.llm.invoke(prompt)
-            return self._clean_llm_description(response)
-        except:
-            return None
-
 
     def _generate_minimal(self, exp: Experience) -> Optional[str]:
         """
@@ -915,7 +1205,16 @@ DESCRIPTION:"""
 
         Last resort when no other data available.
         """
-        prompt = f"""Generate a brief professional job description (100-200 characters).
+        try:
+            response = self._invoke_llm(self._minimal_description_prompt(exp))
+            return self._clean_llm_description(response)
+        except Exception:
+            return None
+
+
+    def _minimal_description_prompt(self, exp: Experience) -> str:
+        """Prompt for minimal (title + company) description generation."""
+        return f"""Generate a brief professional job description (100-200 characters).
 
 JOB TITLE: {exp.title}
 COMPANY: {exp.company or 'Company'}
@@ -924,12 +1223,6 @@ Write a one-sentence summary of typical responsibilities for this role. 100-200
 
 DESCRIPTION:"""
 
-        try:
-            response = self.llm.invoke(prompt)
-            return self._clean_llm_description(response)
-        except:
-            return None
-
 
     def _clean_llm_description(self, response: str) -> Optional[str]:
         """
@@ -959,8 +1252,8 @@ DESCRIPTION:"""
                 desc_lower = desc.lower()
 
         # Remove markdown
-        desc = re.sub(r'\*\*(.+?)\*\*', r'\1', desc)
-        desc = re.sub(r'^[\*\-\•]\s+', '', desc)
+        desc = patterns.MARKDOWN_BOLD.sub(r'\1', desc)
+        desc = patterns.LEADING_BULLET.sub('', desc)
 
         # Capitalize first letter
         if desc and desc[0].islower():
@@ -1029,15 +1322,33 @@ DESCRIPTION:"""
         llm_count = len(data.skills)
 
         if llm_count < 5:
-            print(f"      ⚠️  Low skill count ({llm_count}), using heuristic fallback...")
+            logger.debug("Low skill count (%d), using heuristic fallback", llm_count)
             added = self._add_heuristic_skills(data)
-            print(f"      ✓ Added {added} heuristic skills (total: {len(data.skills)})")
+            logger.debug("Added %s heuristic skills (total: %s)", added, len(data.skills))
         else:
-            print(f"      ✓ LLM skills sufficient ({llm_count}), skipping heuristic")
+            logger.debug("LLM skills sufficient (%s), skipping heuristic", llm_count)
 
         data.skills = data.skills[:15]
 
 
+    def _load_ontology_skill_keywords(self) -> Dict[str, str]:
+        """Load alias -> canonical skill names from skill_ontology.json (opt-in)."""
+        path = os.getenv("PARSER_SKILL_ONTOLOGY_PATH")
+        if not path:
+            return {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                mappings = json.load(f).get("skill_mappings", {})
+        except (OSError, ValueError) as e:
+            logger.warning("Skill ontology not loaded (%s)", e)
+            return {}
+        return {
+            alias.lower(): canonical
+            for alias, canonical in mappings.items()
+            if not alias.startswith("_") and isinstance(canonical, str)
+        }
+
+
     def _add_heuristic_skills(self, data: ParsedDocument) -> int:
         """Add skills via heuristic with context checking."""
         if not data.full_text:
@@ -1047,51 +1358,36 @@ DESCRIPTION:"""
         existing = {s.name.lower() for s in data.skills}
         added_count = 0
 
-        for keyword in self.skill_keywords:
+        # One scan: occurrence counts + negation context for every keyword
+        hits = self.skill_matcher.scan(text_lower)
+
+        for keyword, hit in sorted(hits.items(), key=lambda kv: kv[1].first_pos):
             if len(data.skills) >= 15:
                 break
 
-            count = text_lower.count(keyword)
-            if count < 3:
+            if hit.count < 3 or hit.negated:
                 continue
 
-            if keyword in existing:
+            canonical = self.skill_canonical_names.get(keyword)
+            if keyword in existing or (canonical and canonical.lower() in existing):
                 continue
 
-            if self._has_negation_context(text_lower, keyword):
-                continue
-
-            skill_name = keyword.upper() if len(keyword) <= 5 else keyword.title()
+            if canonical:
+                skill_name = canonical
+            else:
+                skill_name = keyword.upper() if len(keyword) <= 5 else keyword.title()
             data.skills.append(Skill(
                 name=skill_name,
                 source=SkillSource.heuristic,
                 confidence=0.6
             ))
             existing.add(keyword)
+            existing.add(skill_name.lower())
             added_count += 1
 
         return added_count
 
 
-    def _has_negation_context(self, text_lower: str, keyword: str) -> bool:
-        """Check if keyword appears with negation."""
-        negation_patterns = [
-            f'no experience with {keyword}',
-            f'no knowledge of {keyword}',
-            f"don't know {keyword}",
-            f"do not know {keyword}",
-            f"not familiar with {keyword}",
-            f"never used {keyword}",
-            f"no {keyword}",
-            f"non conosco {keyword}",
-            f"nessuna esperienza con {keyword}",
-            f"mai usato {keyword}",
-            f"non ho esperienza con {keyword}",
-        ]
-
-        return any(pattern in text_lower for pattern in negation_patterns)
-
-
     # ========================================================================
     # ENHANCED SPANS EXTRACTION (from v1.7.2)
     # ========================================================================
@@ -1099,32 +1395,31 @@ DESCRIPTION:"""
     def _extract_spans_enhanced(self, data: ParsedDocument):
         """Extract text spans for explainability (XAI)."""
         if not data.full_text:
-            print("      No text for spans")
+            logger.debug("No text for spans")
             return
 
-        print("      Extracting spans...")
 
-        text = data.full_text
-        text_lower = text.lower()
+        index = self._text_index(data.full_text)
         spans_count = 0
 
-        spans_count += self._extract_personal_info_spans(data, text, text_lower)
-        spans_count += self._extract_experience_spans(data, text, text_lower)
-        spans_count += self._extract_education_spans(data, text, text_lower)
-        spans_count += self._extract_skills_spans(data, text, text_lower)
-        spans_count += self._extract_languages_spans(data, text, text_lower)
-        spans_count += self._extract_certifications_spans(data, text, text_lower)
+        spans_count += self._extract_personal_info_spans(data, index)
+        spans_count += self._extract_experience_spans(data, index)
+        spans_count += self._extract_education_spans(data, index)
+        spans_count += self._extract_skills_spans(data, index)
+        spans_count += self._extract_languages_spans(data, index)
+        spans_count += self._extract_certifications_spans(data, index)
 
-        print(f"      ✓ Extracted {spans_count} spans")
+        logger.debug("Extracted %s spans", spans_count)
 
 
-    def _extract_personal_info_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_personal_info_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract personal info spans."""
+        text = index.text
         count = 0
         pi = data.personal_info
 
         if pi.email and len(pi.email) > 5:
-            idx = text_lower.find(pi.email.lower())
+            idx = index.find(pi.email)
             if idx != -1:
                 data.all_spans.append(Span(
                     start=idx, end=idx + len(pi.email),
@@ -1144,7 +1439,7 @@ DESCRIPTION:"""
                 count += 1
 
         if pi.full_name and len(pi.full_name) > 5:
-            idx = text_lower.find(pi.full_name.lower())
+            idx = index.find(pi.full_name)
             if idx != -1:
                 data.all_spans.append(Span(
                     start=idx, end=idx + len(pi.full_name),
@@ -1154,7 +1449,7 @@ DESCRIPTION:"""
                 count += 1
 
         if pi.city and len(pi.city) > 3:
-            idx = text_lower.find(pi.city.lower())
+            idx = index.find(pi.city)
             if idx != -1:
                 data.all_spans.append(Span(
                     start=idx, end=idx + len(pi.city),
@@ -1166,13 +1461,14 @@ DESCRIPTION:"""
         return count
 
 
-    def _extract_experience_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_experience_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract experience spans."""
+        text = index.text
         count = 0
 
         for i, exp in enumerate(data.experience[:5]):
             if exp.title and len(exp.title) > 5:
-                idx = text_lower.find(exp.title.lower())
+                idx = index.find(exp.title)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(exp.title),
@@ -1183,7 +1479,7 @@ DESCRIPTION:"""
 
             if exp.company and len(exp.company) > 5:
                 company_clean = exp.company.split('-')[0].strip() if '-' in exp.company else exp.company
-                idx = text_lower.find(company_clean.lower())
+                idx = index.find(company_clean)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(company_clean),
@@ -1195,13 +1491,14 @@ DESCRIPTION:"""
         return count
 
 
-    def _extract_education_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_education_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract education spans."""
+        text = index.text
         count = 0
 
         for i, edu in enumerate(data.education[:3]):
             if edu.degree and len(edu.degree) > 10:
-                idx = text_lower.find(edu.degree.lower())
+                idx = index.find(edu.degree)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(edu.degree),
@@ -1211,7 +1508,7 @@ DESCRIPTION:"""
                     count += 1
 
             if edu.institution and len(edu.institution) > 10:
-                idx = text_lower.find(edu.institution.lower())
+                idx = index.find(edu.institution)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(edu.institution),
@@ -1223,13 +1520,14 @@ DESCRIPTION:"""
         return count
 
 
-    def _extract_skills_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_skills_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract skills spans."""
+        text = index.text
         count = 0
 
         for i, skill in enumerate(data.skills[:10]):
             if skill.name and len(skill.name) > 3:
-                idx = text_lower.find(skill.name.lower())
+                idx = index.find(skill.name)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(skill.name),
@@ -1241,13 +1539,14 @@ DESCRIPTION:"""
         return count
 
 
-    def _extract_languages_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_languages_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract languages spans."""
+        text = index.text
         count = 0
 
         for i, lang in enumerate(data.languages):
             if lang.name and len(lang.name) > 4:
-                idx = text_lower.find(lang.name.lower())
+                idx = index.find(lang.name)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(lang.name),
@@ -1259,13 +1558,14 @@ DESCRIPTION:"""
         return count
 
 
-    def _extract_certifications_spans(self, data: ParsedDocument, text: str, text_lower: str) -> int:
+    def _extract_certifications_spans(self, data: ParsedDocument, index: DocumentTextIndex) -> int:
         """Extract certifications spans."""
+        text = index.text
         count = 0
 
         for i, cert in enumerate(data.certifications[:5]):
             if cert.name and len(cert.name) > 5:
-                idx = text_lower.find(cert.name.lower())
+                idx = index.find(cert.name)
                 if idx != -1:
                     data.all_spans.append(Span(
                         start=idx, end=idx + len(cert.name),
@@ -1274,10 +1574,10 @@ DESCRIPTION:"""
                     ))
                     count += 1
                 else:
-                    acronym_match = re.match(r'^([A-Z\-]+)', cert.name)
+                    acronym_match = patterns.LEADING_ACRONYM.match(cert.name)
                     if acronym_match:
                         acronym = acronym_match.group(1)
-                        idx = text_lower.find(acronym.lower())
+                        idx = index.find(acronym)
                         if idx != -1:
                             data.all_spans.append(Span(
                                 start=idx, end=idx + len(acronym),
@@ -1295,7 +1595,6 @@ DESCRIPTION:"""
 
     def _clean_date_fields(self, data: ParsedDocument):
         """Clean date fields (remove parentheses content)."""
-        print("      Cleaning dates...")
 
         cleaned_count = 0
 
@@ -1327,9 +1626,9 @@ DESCRIPTION:"""
                     cleaned_count += 1
 
         if cleaned_count > 0:
-            print(f"      ✓ Cleaned {cleaned_count} dates")
+            logger.debug("Cleaned %s dates", cleaned_count)
         else:
-            print(f"      ✓ No dates to clean")
+            logger.debug("No dates to clean")
 
 
     def _clean_single_date(self, date_str: str) -> str:
@@ -1337,7 +1636,7 @@ DESCRIPTION:"""
         if not date_str or not isinstance(date_str, str):
             return date_str
 
-        cleaned = re.sub(r'\s*\([^)]*\)', '', date_str)
+        cleaned = patterns.DATE_PARENTHESES.sub('', date_str)
         cleaned = cleaned.strip().rstrip(',-;')
 
         return cleaned if cleaned else date_str
@@ -1365,13 +1664,13 @@ DESCRIPTION:"""
                     year = None
 
                     for part in parts:
-                        year_match = re.search(r'\b(19|20)\d{2}\b', part)
+                        year_match = patterns.YEAR.search(part)
                         if year_match:
                             year = int(year_match.group(0))
                             break
 
                     gpa = None
-                    gpa_match = re.search(r'(\d{2,3})/(\d{2,3})', line)
+                    gpa_match = patterns.GPA.search(line)
                     if gpa_match:
                         gpa = gpa_match.group(0)
 
@@ -1391,7 +1690,7 @@ DESCRIPTION:"""
 
         if '|' in lang_section:
             for segment in lang_section.split('|'):
-                match = re.match(r'([A-Za-zàèéìòù\s]+):\s*([^\n\|]{3,100})', segment.strip())
+                match = patterns.LANGUAGE_PROFICIENCY.match(segment.strip())
                 if match:
                     lang_name = match.group(1).strip()
                     prof = match.group(2).strip()
@@ -1410,7 +1709,6 @@ DESCRIPTION:"""
         if len(data.languages) == 0:
             return
 
-        print("      Validating levels...")
 
         valid_cefr = {'C2', 'C1', 'B2', 'B1', 'A2', 'A1'}
 
@@ -1431,11 +1729,10 @@ DESCRIPTION:"""
             original = lang.level
 
             if not lang.level:
-                for cefr in valid_cefr:
-                    if re.search(rf'\b{cefr.lower()}\b|\({cefr.lower()}\)', prof_lower):
-                        lang.level = cefr
-                        enriched += 1
-                        break
+                cefr_match = patterns.CEFR_LEVEL.search(prof_lower)
+                if cefr_match:
+                    lang.level = cefr_match.group(1).upper()
+                    enriched += 1
 
                 if not lang.level:
                     for kw, lv in level_map.items():
@@ -1451,14 +1748,14 @@ DESCRIPTION:"""
 
         levels_set = sum(1 for l in data.languages if l.level)
         if enriched > 0:
-            print(f"      ✓ Enriched {enriched}, {levels_set}/{len(data.languages)} total")
+            logger.debug("Enriched %s, %s/%s total", enriched, levels_set, len(data.languages))
 
 
     def _deduplicate_certifications(self, data: ParsedDocument):
         """Deduplicate certifications."""
         groups = {}
         for cert in data.certifications:
-            acronym_match = re.match(r'^([A-Z\-]+)', cert.name)
+            acronym_match = patterns.LEADING_ACRONYM.match(cert.name)
             key = acronym_match.group(1).lower().replace('-', '') if acronym_match else cert.name.lower()
 
             if key not in groups:
@@ -1516,22 +1813,40 @@ DESCRIPTION:"""
                 exp.end_date = None
 
 
+    SECTION_INDICATORS = {
+        'summary': ['profilo professionale', 'professional profile', 'professional summary', 'about me', 'riepilogo'],
+        'experience': ['esperienza', 'experience'],
+        'education': ['formazione', 'education', 'istruzione'],
+        'skills': ['competenze', 'skills'],
+        'languages': ['lingue', 'languages'],
+        'certifications': ['certificazioni', 'certifications'],
+        'projects': ['progetti', 'projects'],
+    }
+
+
     def _find_section(self, text, indicators):
         """Find section."""
+        span = self._find_section_span(text, indicators)
+        if span is None:
+            return None
+        return text[span[0]:span[1]]
+
+
+    def _find_section_span(self, text, indicators, max_len: Optional[int] = 3000) -> Optional[Tuple[int, int]]:
+        """Find section (start, end) offsets."""
         if not text:
             return None
-        text_lower = text.lower()
-        for ind in indicators:
-            idx = text_lower.find(ind)
-            if idx != -1:
-                end = len(text)
-                next_secs = ['esperienza', 'experience', 'formazione', 'education', 'competenze', 'skills', 'certificazioni', 'lingue', 'progetti']
-                for sec in next_secs:
-                    next_idx = text_lower.find(sec, idx + len(ind) + 10)
-                    if next_idx != -1 and next_idx < end:
-                        end = next_idx
-                return text[idx:min(end, idx + 3000)]
-        return None
+        return self._text_index(text).section_span(indicators, max_len=max_len)
+
+
+    def _locate_sections(self, text) -> List[Tuple[str, int, int]]:
+        """Locate all known sections as (name, start, end)."""
+        return self._text_index(text).sections(self.SECTION_INDICATORS)
+
+
+    def _text_index(self, text: str) -> DocumentTextIndex:
+        """Index for this text, built once and shared by all passes."""
+        return self.text_indexes.get(text)
 
 
     def _create_empty_document(self):
@@ -1555,14 +1870,14 @@ DESCRIPTION:"""
             images = convert_from_path(path, dpi=200)[:max_pages]
             text = ""
             for i, img in enumerate(images, 1):
-                print(f"  Page {i}/{len(images)}...")
-                text += pytesseract.image_to_string(img, lang='eng+ita') + "\n\n"
+                logger.debug("Page %s/%s...", i, len(images))
+                # One form feed per page (tesseract's own separator): clean_ocr_noise counts pages by it
+                text += pytesseract.image_to_string(img, lang='eng+ita').rstrip(PAGE_BREAK) + PAGE_BREAK + "\n\n"
             return text.strip()
         except Exception as e:
             return f"[OCR ERROR: {e}]"
 
 
-print("="*80)
 """
 ===============================================================================
 CELLA 6: VALIDATION & DISPLAY FUNCTIONS
@@ -1570,10 +1885,6 @@ CELLA 6: VALIDATION & DISPLAY FUNCTIONS
 Helper functions per validazione qualità e display risultati.
 """
 
-print("="*80)
-print("STEP 6: Creating Validation & Display Functions")
-print("="*80)
-
 
 def display_parsing_results(result: ParsedDocument, verbose: bool = True):
     """
@@ -1850,13 +2161,3 @@ def print_validation_report(report: dict):
         print("\n[OVERALL STATUS]: FAIL (critical issues found)")
 
 
-print("SUCCESS: Validation & display functions created")
-print("  * display_parsing_results()")
-print("  * compute_extraction_stats()")
-print("  * validate_parsing_quality()")
-print("  * print_validation_report()")
-
-print("\n" + "="*80)
-print("VALIDATION FUNCTIONS READY")
-print("="*80)
-
@@ -0,0 +1,66 @@
+"""
+Precompiled regular expressions used by OllamaCVParser.
+
+Patterns are compiled once at import time instead of inside the per-field
+loops (``re`` has an internal cache, but every call still pays the cache
+lookup, and dynamically built patterns such as the per-level CEFR regexes
+evict each other). Where several patterns were tried in sequence they are
+merged into a single alternation.
+"""
+
+import re
+
+# ---------------------------------------------------------------------------
+# Europass
+# ---------------------------------------------------------------------------
+
+EUROPASS_PERSONAL_SECTION = re.compile(
+    r'INFORMAZIONI PERSONALI(.*?)(?:ESPERIENZA LAVORATIVA|ISTRUZIONE)',
+    re.IGNORECASE | re.DOTALL,
+)
+EUROPASS_EXPERIENCE_SECTION = re.compile(
+    r'ESPERIENZA LAVORATIVA(.*?)(?:ISTRUZIONE E FORMAZIONE|CAPACITA)',
+    re.IGNORECASE | re.DOTALL,
+)
+EUROPASS_EDUCATION_SECTION = re.compile(
+    r'ISTRUZIONE E FORMAZIONE(.*?)(?:CAPACITA|ALTRE LINGUA|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+EUROPASS_LANGUAGES_SECTION = re.compile(
+    r'ALTRE LINGUA(.*?)(?:CAPACITA|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+EUROPASS_ENTRY_SPLIT = re.compile(r'\*\s*Date\s*\(da\s*[-–]\s*a\)')
+EUROPASS_DATE_RANGE = re.compile(r'(\d{4})\s*[-–]\s*(\d{4}|in corso)', re.IGNORECASE)
+EUROPASS_ADDRESS_CITY = re.compile(r'-\s*([A-Z][a-zA-Z\s]+)\s*\(')
+EUROPASS_COMPANY_CITY = re.compile(r'-\s*([A-Z][a-zA-Z]+)\s*\(')
+RESPONSIBILITY_SPLIT = re.compile(r'[;,]\s*')
+
+# ---------------------------------------------------------------------------
+# Dates, years, grades
+# ---------------------------------------------------------------------------
+
+FOUR_DIGITS = re.compile(r'(\d{4})')
+YEAR = re.compile(r'\b(19|20)\d{2}\b')
+GPA = re.compile(r'(\d{2,3})/(\d{2,3})')
+DATE_PARENTHESES = re.compile(r'\s*\([^)]*\)')
+
+# ---------------------------------------------------------------------------
+# Languages / certifications
+# ---------------------------------------------------------------------------
+
+# Any CEFR level as a standalone token, "(b2)" included; one search replaces
+# one regex per level (text is lowercased by the caller)
+CEFR_LEVEL = re.compile(r'\b([abc][12])\b')
+LANGUAGE_PROFICIENCY = re.compile(r'([A-Za-zàèéìòù\s]+):\s*([^\n\|]{3,100})')
+LEADING_ACRONYM = re.compile(r'^([A-Z\-]+)')
+
+# ---------------------------------------------------------------------------
+# LLM output
+# ---------------------------------------------------------------------------
+
+JSON_OBJECT = re.compile(r'\{.*\}', re.DOTALL)
+JSON_ARRAY = re.compile(r'\[.*\]', re.DOTALL)
+HAS_DIGIT = re.compile(r'\d+')
+MARKDOWN_BOLD = re.compile(r'\*\*(.+?)\*\*')
+LEADING_BULLET = re.compile(r'^[\*\-\•]\s+')
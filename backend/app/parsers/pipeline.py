@@ -0,0 +1,182 @@
+"""
+Declarative stage pipeline for CV post-processing.
+
+Each ``Stage`` names the parser method it runs, the ParsedDocument fields it
+reads and writes, the profiles it belongs to and an optional run condition.
+``Pipeline.run`` executes the stages selected by a profile and records, per
+stage, wall time and the number of LLM requests issued (cache hits excluded):
+
+- into ``ParsedDocument.pipeline_stats`` (returned with the parse result);
+- into the Prometheus histograms ``piazzati_parser_stage_duration_seconds``
+  and ``piazzati_parser_stage_llm_calls``;
+- as attributes of an OpenTelemetry span per stage (``cv_parser.<stage>``);
+- to the optional ``PipelineStats.listener`` (stage start/end/skip events,
+  used to report task progress).
+
+Profiles:
+    full  every stage (default)
+    fast  skips LLM description enrichment
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from ..core.metrics import parser_stage_duration, parser_stage_llm_calls, tracer
+from ..schemas.parsed_document import ParsedDocument
+
+logger = logging.getLogger(__name__)
+
+PROFILES: FrozenSet[str] = frozenset({"fast", "full"})
+DEFAULT_PROFILE = "full"
+
+
+@dataclass
+class StageStats:
+    name: str
+    status: str = "ok"  # ok | skipped | error
+    duration_ms: float = 0.0
+    llm_calls: int = 0
+    reason: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = {
+            "name": self.name,
+            "status": self.status,
+            "duration_ms": round(self.duration_ms, 2),
+            "llm_calls": self.llm_calls,
+        }
+        if self.reason:
+            out["reason"] = self.reason
+        return out
+
+
+@dataclass
+class PipelineStats:
+    profile: str
+    stages: List[StageStats] = field(default_factory=list)
+    # listener(event, stage) with event in start/end/skipped, for progress reporting
+    listener: Optional[Callable[[str, StageStats], None]] = field(default=None, repr=False, compare=False)
+
+    def notify(self, event: str, stage: StageStats):
+        if self.listener is None:
+            return
+        try:
+            self.listener(event, stage)
+        except Exception:
+            logger.warning("Stage listener failed on %s/%s", event, stage.name, exc_info=True)
+
+    def skip(self, name: str, reason: str):
+        stage = StageStats(name=name, status="skipped", reason=reason)
+        self.stages.append(stage)
+        self.notify("skipped", stage)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(s.duration_ms for s in self.stages)
+
+    @property
+    def llm_calls(self) -> int:
+        return sum(s.llm_calls for s in self.stages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "profile": self.profile,
+            "total_ms": round(self.total_ms, 2),
+            "llm_calls": self.llm_calls,
+            "stages": [s.to_dict() for s in self.stages],
+        }
+
+
+_current_stage: ContextVar[Optional[StageStats]] = ContextVar("parser_current_stage", default=None)
+
+
+def count_llm_calls(n: int = 1):
+    """Attribute n LLM requests to the stage running in this context."""
+    stats = _current_stage.get()
+    if stats is not None and n:
+        stats.llm_calls += n
+
+
+@contextmanager
+def track_stage(stats: PipelineStats, name: str) -> Iterator[StageStats]:
+    """Time a block as a stage and collect the LLM calls made inside it."""
+    stage = StageStats(name=name)
+    token = _current_stage.set(stage)
+    stats.notify("start", stage)
+    with tracer.start_as_current_span(f"cv_parser.{name}") as span:
+        start = time.perf_counter()
+        try:
+            yield stage
+        except Exception:
+            stage.status = "error"
+            raise
+        finally:
+            stage.duration_ms = (time.perf_counter() - start) * 1000
+            _current_stage.reset(token)
+            stats.stages.append(stage)
+            stats.notify("end", stage)
+
+            span.set_attribute("parser.stage", name)
+            span.set_attribute("parser.profile", stats.profile)
+            span.set_attribute("parser.stage.status", stage.status)
+            span.set_attribute("parser.stage.duration_ms", stage.duration_ms)
+            span.set_attribute("parser.stage.llm_calls", stage.llm_calls)
+
+            attributes = {"stage": name, "profile": stats.profile}
+            parser_stage_duration.record(stage.duration_ms / 1000, attributes)
+            parser_stage_llm_calls.record(stage.llm_calls, attributes)
+            logger.debug("Stage %s: %s in %.1f ms, %d LLM calls", name, stage.status, stage.duration_ms, stage.llm_calls)
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One post-processing step (``method`` is an OllamaCVParser method name)."""
+
+    name: str
+    method: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    profiles: FrozenSet[str] = PROFILES
+    when: Optional[Callable[[ParsedDocument], bool]] = None
+
+
+class Pipeline:
+    """Ordered stages, filtered by profile."""
+
+    def __init__(self, stages: List[Stage]):
+        schema_fields = getattr(ParsedDocument, "model_fields", None) or ParsedDocument.__fields__
+        known = set(schema_fields)
+        for stage in stages:
+            unknown = (set(stage.inputs) | set(stage.outputs)) - known
+            if unknown:
+                raise ValueError(f"Stage '{stage.name}' declares unknown fields: {sorted(unknown)}")
+            if not stage.profiles <= PROFILES:
+                raise ValueError(f"Stage '{stage.name}' declares unknown profiles: {sorted(stage.profiles - PROFILES)}")
+        self.stages = list(stages)
+
+    def stages_for(self, profile: str) -> List[Stage]:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown parser profile '{profile}' (expected one of {sorted(PROFILES)})")
+        return [s for s in self.stages if profile in s.profiles]
+
+    def run(self, parser, data: ParsedDocument, stats: PipelineStats) -> PipelineStats:
+        selected = {s.name for s in self.stages_for(stats.profile)}
+
+        for stage in self.stages:
+            if stage.name not in selected:
+                stats.skip(stage.name, f"profile={stats.profile}")
+                logger.debug("Stage %s: skipped (%s profile)", stage.name, stats.profile)
+                continue
+            if stage.when is not None and not stage.when(data):
+                stats.skip(stage.name, "condition")
+                logger.debug("Stage %s: skipped (not needed)", stage.name)
+                continue
+
+            with track_stage(stats, stage.name):
+                getattr(parser, stage.method)(data)
+
+        return stats
@@ -0,0 +1,184 @@
+"""
+Token budgeting for the CV text sent to the extraction prompt.
+
+Instead of a hard ``text[:8000]`` cut (which drops the CV tail, usually skills
+and languages) the text is:
+
+1. cleaned of OCR noise: page markers, headers/footers at the top or bottom
+   of every page of a CV with three or more pages (pages are separated by form
+   feeds, as in the OCR output), lines without any letters or digits, runs of
+   blank lines;
+2. split into sections (the parser provides the section spans);
+3. filled in priority order: first every section that fits whole, then the
+   top lines of the remaining ones; the result keeps document order.
+
+Token counts come from the model's HuggingFace tokenizer when
+``PARSER_TOKENIZER`` is set and ``transformers`` is installed, otherwise from
+a conservative word-piece estimate.
+"""
+
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PAGE_MARKER_RE = re.compile(
+    r'^\s*(?:-\s*\d+\s*-|(?:page|pagina|pag\.?)\s*\d+(?:\s*(?:of|di|/)\s*\d+)?|\d+\s*/\s*\d+)\s*$',
+    re.IGNORECASE,
+)
+_HAS_ALNUM_RE = re.compile(r'\w')
+_SPACES_RE = re.compile(r'[ \t]{2,}')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_TOKEN_PIECES_RE = re.compile(r'\w+|[^\w\s]')
+
+PAGE_BREAK = '\f'
+# Lines at the top and bottom of a page where headers/footers are looked for
+EDGE_LINES = 2
+
+# Lower value = kept first when the budget is tight
+SECTION_PRIORITY = {
+    'header': 0,
+    'experience': 1,
+    'skills': 2,
+    'languages': 3,
+    'education': 4,
+    'certifications': 5,
+    'summary': 6,
+    'projects': 7,
+}
+_DEFAULT_PRIORITY = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE estimate: short words are one token, long ones ~4 chars/token."""
+    return sum(
+        1 if len(piece) <= 4 else math.ceil(len(piece) / 4)
+        for piece in _TOKEN_PIECES_RE.findall(text)
+    )
+
+
+def load_token_counter(tokenizer_name: Optional[str] = None) -> Callable[[str], int]:
+    """Return a token counting function for the configured tokenizer."""
+    tokenizer_name = tokenizer_name or os.getenv("PARSER_TOKENIZER")
+    if tokenizer_name:
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning("Tokenizer '%s' unavailable (%s), using estimate", tokenizer_name, e)
+    return estimate_tokens
+
+
+def clean_ocr_noise(text: str) -> str:
+    """
+    Remove page artefacts and, with three or more pages, headers/footers: short
+    lines among the first or last EDGE_LINES lines of about every page (a
+    quarter of the pages may lack them, e.g. a cover page). Skills, employers
+    and titles repeated in the body of the pages are kept.
+    """
+    pages = [[_SPACES_RE.sub(' ', line).strip() for line in page.split('\n')]
+             for page in text.split(PAGE_BREAK) if page.strip()]
+
+    noise = set()
+    if len(pages) >= 3:
+        on_pages = Counter()
+        for lines in pages:
+            content = [line for line in lines if line]
+            edges = content[:EDGE_LINES] + content[-EDGE_LINES:]
+            on_pages.update({line for line in edges if len(line) <= 80})
+        min_pages = len(pages) - len(pages) // 4
+        noise = {line for line, n in on_pages.items() if n >= min_pages}
+
+    kept = []
+    for line in (line for lines in pages for line in lines + ['']):
+        if line in noise or _PAGE_MARKER_RE.match(line):
+            continue
+        if line and not _HAS_ALNUM_RE.search(line):
+            continue
+        kept.append(line)
+
+    return _BLANK_LINES_RE.sub('\n\n', '\n'.join(kept)).strip()
+
+
+class PromptBudgeter:
+    """Fits CV text into a token budget, keeping high-priority sections."""
+
+    def __init__(self, budget_tokens: Optional[int] = None, count_tokens: Optional[Callable[[str], int]] = None):
+        self.budget_tokens = budget_tokens or int(os.getenv("PARSER_PROMPT_TOKEN_BUDGET", 2500))
+        self.count_tokens = count_tokens or load_token_counter()
+
+    def fit(self, text: str, sections: List[Tuple[str, int, int]]) -> str:
+        """
+        Fit text into the budget.
+
+        Args:
+            text: cleaned CV text
+            sections: (name, start, end) spans found in ``text``
+
+        Returns:
+            Text of at most ``budget_tokens`` tokens, in document order.
+        """
+        if self.count_tokens(text) <= self.budget_tokens:
+            return text
+
+        segments = self._segments(text, sections)
+        order = sorted(
+            range(len(segments)),
+            key=lambda i: (SECTION_PRIORITY.get(segments[i][0], _DEFAULT_PRIORITY), i),
+        )
+
+        remaining = self.budget_tokens
+        kept = {}
+        # Pass 1: whole sections, by priority (short tail sections survive a
+        # long experience section)
+        for i in order:
+            tokens = self.count_tokens(segments[i][1])
+            if tokens <= remaining:
+                kept[i] = segments[i][1]
+                remaining -= tokens
+        # Pass 2: fill what is left with the top of the remaining sections
+        for i in order:
+            if remaining <= 0:
+                break
+            if i in kept:
+                continue
+            segment = self._truncate(segments[i][1], remaining)
+            if segment:
+                kept[i] = segment
+                remaining -= self.count_tokens(segment)
+
+        return '\n'.join(kept[i] for i in sorted(kept))
+
+    def _segments(self, text: str, sections: List[Tuple[str, int, int]]) -> List[Tuple[str, str]]:
+        """Split text into (name, segment) pieces covering the whole text."""
+        spans = sorted((start, end, name) for name, start, end in sections if end > start)
+        segments = []
+        pos = 0
+        for start, end, name in spans:
+            if start < pos:  # overlapping detections: keep the earlier one
+                continue
+            if start > pos:
+                segments.append(('header' if pos == 0 else 'other', text[pos:start]))
+            segments.append((name, text[start:end]))
+            pos = end
+        if pos < len(text):
+            segments.append(('header' if pos == 0 else 'other', text[pos:]))
+        return [(name, seg.strip('\n')) for name, seg in segments if seg.strip()]
+
+    def _truncate(self, segment: str, max_tokens: int) -> str:
+        """Keep whole lines from the top of a segment within max_tokens."""
+        out = []
+        used = 0
+        for line in segment.split('\n'):
+            tokens = self.count_tokens(line) + 1
+            if used + tokens > max_tokens:
+                break
+            out.append(line)
+            used += tokens
+        return '\n'.join(out).strip()
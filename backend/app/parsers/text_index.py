@@ -0,0 +1,152 @@
+"""
+Per-document text index shared by the post-processing passes.
+
+Span extraction, section lookup and job-context lookup all search the same CV
+text for many short values. The index is built once per document and holds:
+
+- the lowercased text and line start offsets;
+- a trigram -> sorted positions map: a lookup only verifies the positions of
+  the rarest trigram of the needle instead of rescanning the whole text;
+- memoized find and section results.
+
+``find`` has the same semantics as ``str.find`` on the lowercased text.
+"""
+
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NGRAM = 3
+
+# Headings that close the previous section (see OllamaCVParser._find_section)
+NEXT_SECTION_MARKERS = (
+    'esperienza', 'experience', 'formazione', 'education', 'competenze',
+    'skills', 'certificazioni', 'lingue', 'progetti',
+)
+
+
+class DocumentTextIndex:
+    """Lowercased text + line offsets + trigram positions for one document."""
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.text_lower = self.text.lower()
+
+        self.line_starts = [0]
+        self.line_starts.extend(i + 1 for i, ch in enumerate(self.text_lower) if ch == '\n')
+
+        grams: Dict[str, List[int]] = defaultdict(list)
+        tl = self.text_lower
+        for i in range(len(tl) - NGRAM + 1):
+            grams[tl[i:i + NGRAM]].append(i)
+        self._grams = dict(grams)
+
+        self._find_cache: Dict[Tuple[str, int], int] = {}
+        self._section_cache: Dict[Tuple[Tuple[str, ...], Optional[int]], Optional[Tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def line_of(self, pos: int) -> int:
+        """0-based line number containing offset pos."""
+        return bisect.bisect_right(self.line_starts, pos) - 1
+
+    def find(self, needle: str, start: int = 0) -> int:
+        """Case-insensitive ``str.find``: lowest index >= start, or -1."""
+        if not needle:
+            return -1
+        needle = needle.lower()
+        key = (needle, start)
+        cached = self._find_cache.get(key)
+        if cached is not None:
+            return cached
+
+        idx = self._find(needle, start)
+        self._find_cache[key] = idx
+        return idx
+
+    def _find(self, needle: str, start: int) -> int:
+        if len(needle) < NGRAM:
+            return self.text_lower.find(needle, start)
+
+        # Anchor on the rarest trigram of the needle
+        best_offset, best_positions = 0, None
+        for offset in range(len(needle) - NGRAM + 1):
+            positions = self._grams.get(needle[offset:offset + NGRAM])
+            if positions is None:
+                return -1
+            if best_positions is None or len(positions) < len(best_positions):
+                best_offset, best_positions = offset, positions
+
+        tl = self.text_lower
+        i = bisect.bisect_left(best_positions, start + best_offset)
+        for pos in best_positions[i:]:
+            candidate = pos - best_offset
+            if tl.startswith(needle, candidate):
+                return candidate
+        return -1
+
+    def contains(self, needle: str) -> bool:
+        return self.find(needle) != -1
+
+    def section_span(self, indicators: Iterable[str], max_len: Optional[int] = 3000) -> Optional[Tuple[int, int]]:
+        """
+        (start, end) of the first indicator found, ending at the next heading.
+
+        Same rules as the former ``_find_section``: the section ends at the
+        earliest NEXT_SECTION_MARKERS hit at least 10 chars after the heading,
+        capped at max_len characters.
+        """
+        key = (tuple(indicators), max_len)
+        if key in self._section_cache:
+            return self._section_cache[key]
+
+        span = None
+        for ind in key[0]:
+            idx = self.find(ind)
+            if idx != -1:
+                end = len(self.text)
+                for sec in NEXT_SECTION_MARKERS:
+                    next_idx = self.find(sec, idx + len(ind) + 10)
+                    if next_idx != -1 and next_idx < end:
+                        end = next_idx
+                span = (idx, end if max_len is None else min(end, idx + max_len))
+                break
+
+        self._section_cache[key] = span
+        return span
+
+    def sections(self, indicators_by_name: Dict[str, Iterable[str]]) -> List[Tuple[str, int, int]]:
+        """All sections found as (name, start, end)."""
+        found = []
+        for name, indicators in indicators_by_name.items():
+            span = self.section_span(indicators, max_len=None)
+            if span:
+                found.append((name, span[0], span[1]))
+        return found
+
+
+class TextIndexCache:
+    """Small thread-safe LRU of indexes keyed by the document text."""
+
+    def __init__(self, maxsize: int = 4):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, DocumentTextIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> DocumentTextIndex:
+        text = text or ""
+        with self._lock:
+            index = self._items.get(text)
+            if index is not None:
+                self._items.move_to_end(text)
+                return index
+
+        index = DocumentTextIndex(text)
+        with self._lock:
+            self._items[text] = index
+            self._items.move_to_end(text)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return index
@@ -177,6 +177,8 @@ class ParsedDocument(BaseModel):
     parsing_method: Optional[str] = None
     confidence_score: float = 0.0
     section_confidence: dict = Field(default_factory=dict)
+    # Per-stage wall time / LLM calls recorded by the parser pipeline
+    pipeline_stats: Dict[str, Any] = Field(default_factory=dict)
 
     parsed_at: Optional[datetime] = None
 
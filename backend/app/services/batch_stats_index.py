@@ -0,0 +1,208 @@
+"""
+Sidecar index of the CVs saved for the NLP batch, backing ``get_batch_stats``.
+
+Computing the statistics from the staging directory means a glob of every
+file plus an open/parse per listed CV on each call. Instead the storage layer
+records each save (and each cleanup) in a small SQLite file next to the
+staged CVs (``<cvs>/batch_stats.sqlite3``)::
+
+    entries       one row per saved CV: name, location, user_id, saved_at, bytes, ready, skills_count
+    user_counts   CVs per user_id
+    counters      total_files, total_bytes, processing_ready, users
+
+Counters are updated in the same transaction as the entry, and only when the
+entry is new or actually removed, so saves from several processes (API and
+parse workers) and repeated removals never double count. Reading the stats
+is a handful of primary-key lookups plus the last N entries by ``saved_at``.
+The entries are also the manifest used by retention (``saved_before``): CVs
+to drop are found by ``saved_at`` and ``location``, without stat calls.
+
+The counts describe CVs saved by the storage layer: files archived by the NLP
+batch stay counted until ``cleanup_old_files`` removes them. An index created
+next to an existing staging directory is filled once from its files and
+committed segments (``rebuild``).
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "batch_stats.sqlite3"
+COUNTERS = ("total_files", "total_bytes", "processing_ready", "users")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    saved_at REAL NOT NULL,
+    bytes INTEGER NOT NULL,
+    ready INTEGER NOT NULL,
+    skills_count INTEGER NOT NULL,
+    location TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS entries_saved_at ON entries (saved_at);
+CREATE TABLE IF NOT EXISTS user_counts (user_id TEXT PRIMARY KEY, files INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+@dataclass
+class BatchEntry:
+    """One saved CV, as counted by the index."""
+
+    name: str
+    user_id: str
+    saved_at: float
+    bytes: int
+    ready: bool
+    skills_count: int
+    # Where the CV is staged: "<day>/<file>.json" (relative to the staging directory) or "<segment>:<offset>"
+    location: str = ""
+
+    @classmethod
+    def from_cv_data(cls, name: str, cv_data: Dict[str, Any], size: int, saved_at: Optional[float] = None,
+                     location: str = "") -> "BatchEntry":
+        metadata = cv_data.get("batch_metadata") or {}
+        return cls(
+            name=name,
+            user_id=str(cv_data.get("user_id") or "unknown"),
+            saved_at=time.time() if saved_at is None else saved_at,
+            bytes=size,
+            ready=bool(metadata.get("ready_for_batch", False)),
+            skills_count=len(cv_data.get("skills") or []),
+            location=location,
+        )
+
+
+class BatchStatsIndex:
+    """Incremental counters of the staged CVs (thread- and process-safe)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}
+        if "location" not in columns:  # index created before locations were recorded
+            self._conn.execute("ALTER TABLE entries ADD COLUMN location TEXT NOT NULL DEFAULT ''")
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE: writers of other processes wait instead of failing mid-update."""
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _bump(conn, name: str, delta: int):
+        if delta:
+            conn.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, delta),
+            )
+
+    def _add_locked(self, conn, entry: BatchEntry) -> bool:
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO entries (name, location, user_id, saved_at, bytes, ready, skills_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (entry.name, entry.location, entry.user_id, entry.saved_at, entry.bytes, int(entry.ready),
+             entry.skills_count),
+        ).rowcount
+        if not inserted:
+            return False
+        new_user = conn.execute(
+            "INSERT OR IGNORE INTO user_counts (user_id, files) VALUES (?, 0)", (entry.user_id,)
+        ).rowcount
+        conn.execute("UPDATE user_counts SET files = files + 1 WHERE user_id = ?", (entry.user_id,))
+        self._bump(conn, "total_files", 1)
+        self._bump(conn, "total_bytes", entry.bytes)
+        self._bump(conn, "processing_ready", int(entry.ready))
+        self._bump(conn, "users", new_user)
+        return True
+
+    def add(self, entry: BatchEntry) -> bool:
+        """Count a saved CV; False if an entry with the same name was already counted."""
+        with self._lock, self._transaction() as conn:
+            return self._add_locked(conn, entry)
+
+    def remove(self, names: Iterable[str]) -> int:
+        """Uncount removed CVs (names never counted are ignored); returns how many were removed."""
+        removed = 0
+        with self._lock, self._transaction() as conn:
+            for name in names:
+                row = conn.execute("SELECT user_id, bytes, ready FROM entries WHERE name = ?", (name,)).fetchone()
+                if row is None:
+                    continue
+                user_id, size, ready = row
+                conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+                conn.execute("UPDATE user_counts SET files = files - 1 WHERE user_id = ?", (user_id,))
+                gone = conn.execute("DELETE FROM user_counts WHERE user_id = ? AND files <= 0", (user_id,)).rowcount
+                self._bump(conn, "total_files", -1)
+                self._bump(conn, "total_bytes", -size)
+                self._bump(conn, "processing_ready", -ready)
+                self._bump(conn, "users", -gone)
+                removed += 1
+        return removed
+
+    def saved_before(self, cutoff: float) -> List[Tuple[str, str]]:
+        """(name, location) of the CVs saved before the cutoff timestamp, oldest first."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, location FROM entries WHERE saved_at < ? ORDER BY saved_at", (cutoff,)
+            ).fetchall()
+
+    def initialized(self) -> bool:
+        return self._conn.execute("SELECT 1 FROM counters WHERE name = 'initialized'").fetchone() is not None
+
+    def rebuild(self, entries: Iterable[BatchEntry]) -> int:
+        """Fill a new index from the CVs already staged; no-op once initialized (by any process)."""
+        with self._lock, self._transaction() as conn:
+            if conn.execute("SELECT 1 FROM counters WHERE name = 'initialized'").fetchone():
+                return 0
+            added = sum(self._add_locked(conn, entry) for entry in entries)
+            conn.execute("INSERT INTO counters (name, value) VALUES ('initialized', ?)", (int(time.time()),))
+        logger.info("Batch stats index built from %d staged CVs", added)
+        return added
+
+    def stats(self, latest: int = 10) -> Dict[str, Any]:
+        """Counters, the ``latest`` most recent entries (newest first) and the counts of their users."""
+        with self._lock:
+            counters = dict(self._conn.execute(
+                f"SELECT name, value FROM counters WHERE name IN ({','.join('?' * len(COUNTERS))})", COUNTERS
+            ).fetchall())
+            rows = self._conn.execute(
+                "SELECT name, user_id, saved_at, bytes, skills_count FROM entries "
+                "ORDER BY saved_at DESC LIMIT ?", (latest,)
+            ).fetchall()
+            users = sorted({row[1] for row in rows})
+            files_by_user = dict(self._conn.execute(
+                f"SELECT user_id, files FROM user_counts WHERE user_id IN ({','.join('?' * len(users))})", users
+            ).fetchall()) if users else {}
+
+        latest_files: List[Dict[str, Any]] = [
+            {"filename": name, "user_id": user_id, "saved_at": saved_at, "bytes": size, "skills_count": skills}
+            for name, user_id, saved_at, size, skills in rows
+        ]
+        return {
+            **{name: counters.get(name, 0) for name in COUNTERS},
+            "files_by_user": files_by_user,
+            "latest_files": latest_files,
+        }
+
+    def close(self):
+        self._conn.close()
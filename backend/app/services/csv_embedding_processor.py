@@ -15,6 +15,7 @@ import json
 import uuid
 import os
 import pandas as pd
+from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
 import numpy as np
@@ -110,19 +111,57 @@ class CSVEmbeddingProcessor:
             validate_documents: Check if document_id exists before storing embedding
             batch_size: Number of records to process in each batch
             
+        Returns:
+            Processing results summary
+        """
+        if not os.path.exists(csv_file_path):
+            raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
+        
+        # Read CSV file
+        df = pd.read_csv(csv_file_path)
+        print(f"📁 Processing CSV file: {csv_file_path}")
+        
+        results = self.process_dataframe(
+            df,
+            skip_existing=skip_existing,
+            validate_documents=validate_documents,
+            batch_size=batch_size
+        )
+        
+        # Mark file as processed
+        self._mark_file_processed(csv_file_path, results)
+        
+        return results
+    
+    def process_dataframe(
+        self,
+        df: pd.DataFrame,
+        skip_existing: bool = True,
+        validate_documents: bool = True,
+        batch_size: int = 100,
+        replace_existing: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Store the embeddings of a DataFrame (same formats as the CSV files) in PostgreSQL.
+        
+        Vectors may be JSON/comma-separated strings (CSV) or lists/arrays
+        (Parquet tables and in-memory results of the NLP pipeline).
+        
+        Args:
+            df: Rows to store
+            skip_existing: Skip embeddings that already exist in DB
+            validate_documents: Check if document_id exists before storing embedding
+            batch_size: Number of records to process in each batch
+            replace_existing: Overwrite the vector of existing embeddings
+                (e.g. a re-uploaded CV) instead of skipping them
+            
         Returns:
             Processing results summary
         """
         session = self.session or next(get_db())
         
         try:
-            if not os.path.exists(csv_file_path):
-                raise FileNotFoundError(f"CSV file not found: {csv_file_path}")
-            
-            # Read CSV file
-            df = pd.read_csv(csv_file_path)
-            print(f"📁 Processing CSV file: {csv_file_path}")
-            print(f"📊 Total rows in CSV: {len(df)}")
+            print(f"📊 Total rows: {len(df)}")
             
             # Detect CSV format and validate columns
             csv_format = self._detect_csv_format(df)
@@ -163,7 +202,7 @@ class CSVEmbeddingProcessor:
                     try:
                         # Extract data from row based on format
                         document_id = str(row[id_col]).strip()
-                        embedding_str = str(row[embedding_col]).strip()
+                        embedding_value = row[embedding_col]
                         model_name = str(row.get('model_name', 'colleague-script-v1.0')).strip()
                         
                         # Handle colleague format: user_id -> generate UUID for document_id
@@ -180,7 +219,7 @@ class CSVEmbeddingProcessor:
                                 results['error_details'].append(f"Invalid user_id format: {document_id}")
                                 continue
                             # Generate a consistent UUID for this user_id
-                            doc_uuid = uuid.uuid5(uuid.NAMESPACE_OID, document_id)
+                            doc_uuid = self.user_document_id(document_id[len("USER_"):])
                         else:
                             # Standard format - expect UUID
                             try:
@@ -198,19 +237,24 @@ class CSVEmbeddingProcessor:
                                 continue
                         
                         # Check if embedding already exists (optional)
-                        if skip_existing:
-                            existing = session.query(Embedding).filter(
-                                Embedding.document_id == doc_uuid,
-                                Embedding.is_active == True
-                            ).first()
+                        existing = None
+                        if skip_existing or replace_existing:
+                            query = session.query(Embedding).filter(Embedding.document_id == doc_uuid)
+                            if not replace_existing:
+                                query = query.filter(Embedding.is_active == True)
+                            # Replacing also revives a deactivated embedding (one row per document)
+                            existing = query.first()
                             
-                            if existing:
+                            if existing and not replace_existing:
                                 results['skipped'] += 1
                                 continue
                         
                         # Parse embedding vector
                         try:
-                            embedding_vector = self._parse_embedding_vector(embedding_str)
+                            if isinstance(embedding_value, str):
+                                embedding_vector = self._parse_embedding_vector(embedding_value)
+                            else:
+                                embedding_vector = [float(x) for x in embedding_value]
                         except ValueError as e:
                             results['errors'] += 1
                             results['error_details'].append(f"Embedding parse error for {document_id}: {e}")
@@ -223,6 +267,17 @@ class CSVEmbeddingProcessor:
                             results['error_details'].append(f"Unsupported vector dimension {vector_dim} for {document_id}")
                             continue
                         
+                        if existing is not None:
+                            # Update in place (one embedding per document)
+                            existing.embedding = embedding_vector
+                            existing.model_name = model_name
+                            existing.model_dim = vector_dim
+                            existing.is_active = True
+                            existing.updated_at = datetime.now()
+                            batch_embeddings.append(existing)
+                            results['processed'] += 1
+                            continue
+                        
                         # Create embedding object
                         new_embedding = Embedding(
                             id=uuid.uuid4(),
@@ -273,9 +328,6 @@ class CSVEmbeddingProcessor:
                 if len(results['error_details']) > 5:
                     print(f"   ... and {len(results['error_details']) - 5} more errors")
             
-            # Mark file as processed
-            self._mark_file_processed(csv_file_path, results)
-            
             return results
             
         except Exception as e:
@@ -286,6 +338,35 @@ class CSVEmbeddingProcessor:
             if not self.session:  # Close session only if we created it
                 session.close()
     
+    @staticmethod
+    def user_document_id(user_id: str) -> uuid.UUID:
+        """Document UUID of a user's CV embedding (colleague format rows are keyed by user_id)."""
+        return uuid.uuid5(uuid.NAMESPACE_OID, f"USER_{str(user_id).strip()}")
+
+    def deactivate_user_embeddings(self, user_ids: List[str]) -> int:
+        """
+        Soft delete (deactivate) the CV embeddings of users removed from the dataset.
+
+        Returns:
+            Number of embeddings deactivated
+        """
+        session = self.session or next(get_db())
+        try:
+            document_ids = [self.user_document_id(user_id) for user_id in user_ids]
+            deactivated = session.query(Embedding).filter(
+                Embedding.document_id.in_(document_ids),
+                Embedding.is_active == True
+            ).update({Embedding.is_active: False, Embedding.updated_at: datetime.now()},
+                     synchronize_session=False)
+            session.commit()
+            return deactivated
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            if not self.session:
+                session.close()
+
     def _mark_file_processed(self, csv_file_path: str, results: Dict[str, Any]):
         """Log processed file to avoid reprocessing."""
         self._ensure_log_dir()
@@ -424,40 +505,58 @@ def watch_and_process_csv_directory(
     """
     Watch a directory for new CSV files and process them automatically.
     
+    Files are processed as soon as they are written (filesystem events via
+    watchfiles); without watchfiles the directory is polled every
+    check_interval seconds.
+    
     Args:
         watch_directory: Directory to monitor
         file_pattern: Pattern for CSV files to process
-        check_interval: Check interval in seconds
+        check_interval: Polling interval in seconds (fallback without watchfiles)
     """
     import time
+    from fnmatch import fnmatch
+    
+    try:
+        from watchfiles import Change, watch
+    except ImportError:
+        watch = None
     
     print(f"👀 Watching directory: {watch_directory}")
     print(f"🔍 Looking for files matching: {file_pattern}")
-    print(f"⏰ Check interval: {check_interval} seconds")
+    if watch is not None:
+        print("⚡ Mode: filesystem events")
+    else:
+        print(f"⏰ Check interval: {check_interval} seconds (watchfiles not installed)")
     print("Press Ctrl+C to stop watching...\n")
     
     processor = CSVEmbeddingProcessor()
     
+    def process_pending():
+        try:
+            results = processor.process_directory(
+                watch_directory, 
+                file_pattern, 
+                skip_processed=True
+            )
+            if results['files_processed'] > 0:
+                print(f"🔄 Processed {results['files_processed']} new files")
+        except Exception as e:
+            print(f"❌ Error during directory watch: {e}")
+    
+    def is_new_csv(change, path: str) -> bool:
+        return change != Change.deleted and fnmatch(os.path.basename(path), file_pattern)
+    
     try:
-        while True:
-            try:
-                results = processor.process_directory(
-                    watch_directory, 
-                    file_pattern, 
-                    skip_processed=True
-                )
-                
-                if results['files_processed'] > 0:
-                    print(f"🔄 Processed {results['files_processed']} new files")
-                
+        # Files written while the watcher was down
+        process_pending()
+        if watch is not None:
+            for _ in watch(watch_directory, watch_filter=is_new_csv):
+                process_pending()
+        else:
+            while True:
                 time.sleep(check_interval)
-                
-            except KeyboardInterrupt:
-                print("\n👋 Stopping file watcher...")
-                break
-            except Exception as e:
-                print(f"❌ Error during directory watch: {e}")
-                time.sleep(check_interval)  # Continue watching despite errors
+                process_pending()
                 
     except KeyboardInterrupt:
         print("\n✅ File watcher stopped")
@@ -1,17 +1,35 @@
 """
 Servizio per gestire il salvataggio dei JSON parsati per il batch processing NLP.
 Organizza i CV in cartelle per data e user_id per facilitare il processing periodico.
+
+Con CV_STAGING_FORMAT="segments" (default) i CV sono accodati a segmenti NDJSON
+append-only (vedi cv_segment_store); con "json" un file per CV come in passato.
+In entrambi i casi i file stanno in una sottocartella per giorno
+(<cvs>/<YYYY-MM-DD>/*.json, <cvs>/segments/<YYYY-MM-DD>/seg-*), cosi' nessuna
+cartella cresce senza limite; i file gia' processati sono compattati in
+archivi giornalieri da NLP/staging_archive.py.
+
+Le statistiche (get_batch_stats) vengono da un indice SQLite accanto ai CV
+(batch_stats_index), aggiornato a ogni salvataggio e cleanup: la cartella di
+staging non viene mai scansionata per rispondere. Lo stesso indice guida la
+retention (cleanup_old_files), senza stat dei file.
 """
 
 import json
 import os
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 import hashlib
 import uuid
 
+from ..core.config import settings
 from ..schemas.parsed_document import ParsedDocument
+from .batch_stats_index import INDEX_FILENAME, BatchEntry, BatchStatsIndex
+from .cv_segment_store import PARTITION_FORMAT, CVSegmentStore
+
+# CV piu' recenti riportati nelle statistiche
+LATEST_FILES = 10
 
 
 class CVBatchStorage:
@@ -20,11 +38,26 @@ class CVBatchStorage:
     Organizza i file per data e utente per facilitare il processing periodico.
     """
     
-    def __init__(self):
-        # Path base per i JSON del modulo NLP - tutti i file in /opt/piazzati/backend/NLP/data/cvs
-        self.base_path = Path("/opt/piazzati/backend/NLP/data/cvs")
+    def __init__(self, base_path: Optional[Path] = None, staging_format: Optional[str] = None):
+        # Path base per i JSON del modulo NLP - default /opt/piazzati/backend/NLP/data/cvs
+        self.base_path = Path(base_path or settings.CV_BATCH_DIR)
         self.base_path.mkdir(parents=True, exist_ok=True)
-        print(f"📁 CVBatchStorage inizializzato: {self.base_path}")
+        self.staging_format = staging_format or settings.CV_STAGING_FORMAT
+
+        self.segments: Optional[CVSegmentStore] = None
+        if self.staging_format == "segments":
+            self.segments = CVSegmentStore(
+                self.base_path / "segments",
+                max_age_seconds=settings.CV_SEGMENT_MAX_AGE_SECONDS,
+                partitioned=True,
+            )
+            self.segments.recover_orphans()
+
+        # Contatori incrementali per get_batch_stats; al primo avvio riempiti dai CV gia' presenti
+        self.stats_index = BatchStatsIndex(self.base_path / INDEX_FILENAME)
+        if not self.stats_index.initialized():
+            self.stats_index.rebuild(self._staged_entries())
+        print(f"📁 CVBatchStorage inizializzato: {self.base_path} ({self.staging_format})")
     
     def save_parsed_cv(self, doc: ParsedDocument, original_filename: Optional[str] = None) -> str:
         """
@@ -35,21 +68,31 @@ class CVBatchStorage:
             original_filename: Nome file originale (opzionale)
             
         Returns:
-            str: Path del file JSON salvato
+            str: Path del file JSON salvato ("<segmento>:<offset>" con i segmenti)
         """
         try:
             # Genera metadata per il file
             file_info = self._generate_file_info(doc, original_filename)
             
-            # Salva direttamente nella cartella base
-            json_path = self.base_path / file_info["filename"]
-            
             # Prepara i dati per il salvataggio
             cv_data = self._prepare_cv_data(doc, file_info)
+
+            if self.segments is not None:
+                locator, size = self.segments.append_sized(cv_data)
+                self._count_saved(file_info["filename"], cv_data, size, locator)
+                print(f"💾 CV accodato per batch processing: {locator}")
+                return locator
+
+            # Salva nella partizione del giorno
+            partition = self.base_path / datetime.now().strftime(PARTITION_FORMAT)
+            partition.mkdir(exist_ok=True)
+            json_path = partition / file_info["filename"]
             
             # Salva il JSON
             with open(json_path, 'w', encoding='utf-8') as f:
                 json.dump(cv_data, f, indent=2, ensure_ascii=False, default=str)
+            self._count_saved(json_path.name, cv_data, json_path.stat().st_size,
+                              json_path.relative_to(self.base_path).as_posix())
             
             print(f"💾 CV salvato per batch processing: {json_path.name}")
             print(f"   User: {cv_data.get('user_id', 'N/A')} | Skills: {len(cv_data.get('skills', []))}")
@@ -86,8 +129,6 @@ class CVBatchStorage:
             "original_filename": original_filename
         }
     
-    # Rimossa logica sottocartelle per data
-    
     def _sanitize_filename(self, filename: str) -> str:
         """Pulisce il nome file rimuovendo caratteri non sicuri."""
         if not filename:
@@ -122,6 +163,7 @@ class CVBatchStorage:
             "batch_metadata": {
                 "saved_at": datetime.now().isoformat(),
                 "original_filename": file_info["original_filename"],
+                "staging_name": file_info["filename"],
                 "processing_version": "1.0",
                 "ready_for_batch": True
             }
@@ -136,8 +178,53 @@ class CVBatchStorage:
         
         return cv_data
     
-    def get_batch_stats(self) -> Dict[str, Any]:
-        """Ottieni statistiche sui CV salvati per batch processing (senza sottocartelle per data)."""
+    def _count_saved(self, name: str, cv_data: Dict[str, Any], size: int, location: str):
+        """Aggiorna l'indice delle statistiche (un errore qui non fa fallire il salvataggio)."""
+        try:
+            self.stats_index.add(BatchEntry.from_cv_data(name, cv_data, size, location=location))
+        except Exception as e:
+            print(f"⚠️ Statistiche batch non aggiornate per {name}: {e}")
+
+    def _staged_entries(self) -> Iterator[BatchEntry]:
+        """CV gia' presenti nello staging (file JSON e segmenti sigillati), per costruire l'indice."""
+        def saved_at(data: Dict[str, Any], fallback: float) -> float:
+            try:
+                return datetime.fromisoformat(data["batch_metadata"]["saved_at"]).timestamp()
+            except Exception:
+                return fallback
+
+        for json_file in [*self.base_path.glob("*.json"), *self.base_path.glob("*/*.json")]:
+            try:
+                stat = json_file.stat()
+                data = json.loads(json_file.read_bytes())
+                yield BatchEntry.from_cv_data(json_file.name, data, stat.st_size, saved_at(data, stat.st_mtime),
+                                              json_file.relative_to(self.base_path).as_posix())
+            except Exception:
+                continue
+        if self.segments is not None:
+            for segment in self.segments.committed_segments():
+                mtime = segment.stat().st_mtime
+                offset = 0
+                with open(segment, 'rb') as f:
+                    for line in f:
+                        try:
+                            data = json.loads(line)
+                        except ValueError:
+                            data = None
+                        if data is not None:
+                            locator = f"{segment.name}:{offset}"
+                            name = (data.get('batch_metadata') or {}).get('staging_name') or locator
+                            yield BatchEntry.from_cv_data(name, data, len(line), saved_at(data, mtime), locator)
+                        offset += len(line)
+
+    def get_batch_stats(self, detailed: bool = False) -> Dict[str, Any]:
+        """
+        Ottieni statistiche sui CV salvati per batch processing, dall'indice incrementale.
+
+        files_by_user riporta i conteggi degli utenti dei CV in latest_files
+        (i piu' recenti, dal piu' nuovo). Con detailed=True anche lo stato dei
+        segmenti, che richiede una scansione della cartella.
+        """
         stats = {
             "total_files": 0,
             "files_by_user": {},
@@ -145,47 +232,42 @@ class CVBatchStorage:
             "processing_ready": 0
         }
         try:
-            json_files = list(self.base_path.glob("*.json"))
-            stats["total_files"] = len(json_files)
-            for json_file in json_files[-10:]:  # Ultimi 10 file
-                try:
-                    with open(json_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    user_id = data.get('user_id', 'unknown')
-                    stats["files_by_user"][user_id] = stats["files_by_user"].get(user_id, 0) + 1
-                    if data.get('batch_metadata', {}).get('ready_for_batch', False):
-                        stats["processing_ready"] += 1
-                    stats["latest_files"].append({
-                        "filename": json_file.name,
-                        "user_id": user_id,
-                        "skills_count": len(data.get('skills', []))
-                    })
-                except Exception:
-                    continue
+            stats.update(self.stats_index.stats(latest=LATEST_FILES))
+            if detailed and self.segments is not None:
+                stats["segments"] = self.segments.stats()
         except Exception as e:
             print(f"❌ Errore calcolo statistiche batch: {e}")
         return stats
     
     def cleanup_old_files(self, days_to_keep: int = 30) -> int:
         """
-        Pulisce file JSON più vecchi di N giorni nella cartella base.
-        Restituisce il numero di file rimossi.
+        Dimentica i CV salvati più di N giorni fa, scelti dall'indice (data di
+        salvataggio, non mtime), e rimuove i loro file JSON se ancora in staging.
+        I segmenti contengono molti CV: li rimuove la compattazione dopo il consumo.
+        Restituisce il numero di CV rimossi.
         """
-        removed_count = 0
-        cutoff_date = datetime.now() - timedelta(days=days_to_keep)
+        cutoff = (datetime.now() - timedelta(days=days_to_keep)).timestamp()
         try:
-            for json_file in self.base_path.glob("*.json"):
-                try:
-                    file_mtime = datetime.fromtimestamp(json_file.stat().st_mtime)
-                    if file_mtime < cutoff_date:
-                        json_file.unlink()
-                        removed_count += 1
-                        print(f"🗑️ Rimossa file obsoleto: {json_file.name}")
-                except Exception:
-                    continue
+            expired = self.stats_index.saved_before(cutoff)
         except Exception as e:
             print(f"❌ Errore cleanup file: {e}")
-        return removed_count
+            return 0
+
+        for name, location in expired:
+            path = self.base_path / (location or name)
+            if path.suffix != ".json":
+                continue
+            try:
+                path.unlink(missing_ok=True)
+                print(f"🗑️ Rimossa file obsoleto: {path.name}")
+            except Exception:
+                continue
+        if expired:
+            try:
+                self.stats_index.remove(name for name, _ in expired)
+            except Exception as e:
+                print(f"⚠️ Statistiche batch non aggiornate dopo il cleanup: {e}")
+        return len(expired)
 
 
 # Singleton instance
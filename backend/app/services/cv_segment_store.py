@@ -0,0 +1,264 @@
+"""
+Append-only segment store for parsed CVs awaiting the NLP batch.
+
+One pretty-printed JSON file per CV in a flat directory makes every batch pay
+a directory listing plus an open/parse per CV. Records are instead appended,
+as compact JSON lines, to rotating segment files under ``<cvs>/segments``, in
+one subdirectory per day when ``partitioned`` (``<cvs>/segments/<YYYY-MM-DD>/``)::
+
+    seg-<created_ns>-<writer>.ndjson          one record per line
+    seg-<created_ns>-<writer>.ndjson.idx      per record: offset, length, document_id,
+                                              user_id, file_sha256, tag names (tab separated)
+    seg-<created_ns>-<writer>.ndjson.commit   JSON marker, written atomically on seal:
+                                              {"records", "bytes", "sha256", "committed_at"}
+
+Every writer process (API worker, parse worker) owns its segments, so no
+cross-process locking is needed. A segment is sealed when it reaches
+``max_records``/``max_bytes``, after ``max_age_seconds`` without being sealed,
+or at process exit. Readers only consume sealed segments and only their first
+``bytes`` bytes. Segments left unsealed by a crashed writer are recovered
+(truncated to the last complete record and sealed) by ``recover_orphans``.
+Segments consumed by the NLP batch are merged into daily archives and removed
+by ``NLP/staging_archive.py``, so each directory only holds recent segments.
+
+The reader side used by the NLP batch is ``NLP/cv_segments.py``; keep the two
+in sync when changing the layout.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".ndjson"
+INDEX_SUFFIX = ".idx"
+COMMIT_SUFFIX = ".commit"
+PARTITION_FORMAT = "%Y-%m-%d"
+
+
+def _writer_id() -> str:
+    host = re.sub(r"[^A-Za-z0-9]", "", socket.gethostname())[:16] or "host"
+    return f"{host}{os.getpid()}"
+
+
+def _write_atomic(path: Path, payload: Dict[str, Any]):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _index_line(offset: int, length: int, record: Dict[str, Any]) -> str:
+    tags = record.get("Tags") or record.get("tags") or {}
+    fields = [
+        str(offset),
+        str(length),
+        str(record.get("document_id") or ""),
+        str(record.get("user_id") or ""),
+        str(record.get("file_sha256") or ""),
+        ",".join(sorted(tags)) if isinstance(tags, dict) else "",
+    ]
+    return "\t".join(f.replace("\t", " ").replace("\n", " ") for f in fields) + "\n"
+
+
+def committed_bytes(segment: Path) -> Optional[int]:
+    """Size covered by the segment's commit marker (None while unsealed)."""
+    try:
+        with open(segment.with_name(segment.name + COMMIT_SUFFIX), encoding="utf-8") as f:
+            return json.load(f)["bytes"]
+    except FileNotFoundError:
+        return None
+
+
+def read_segment(segment: Path) -> Iterator[Dict[str, Any]]:
+    """Records of a sealed segment, in append order."""
+    size = committed_bytes(segment)
+    if size is None:
+        raise ValueError(f"Segment not committed: {segment.name}")
+    with open(segment, "rb") as f:
+        data = f.read(size)
+    for line in data.splitlines():
+        if line:
+            yield json.loads(line)
+
+
+def segment_files(directory: Path) -> List[Path]:
+    """Segments in the directory and in its day partitions, oldest first."""
+    pattern = f"seg-*{SEGMENT_SUFFIX}"
+    return sorted(list(directory.glob(pattern)) + list(directory.glob(f"*/{pattern}")), key=lambda p: p.name)
+
+
+class CVSegmentStore:
+    """Writer of one process's segments (thread-safe)."""
+
+    def __init__(
+        self,
+        directory: Path,
+        max_records: int = 1000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_age_seconds: float = 60.0,
+        partitioned: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.partitioned = partitioned
+
+        self._lock = threading.Lock()
+        self._writer = _writer_id()
+        self._segment: Optional[Path] = None
+        self._data = None
+        self._index = None
+        self._records = 0
+        self._size = 0
+        self._digest = None
+        self._timer: Optional[threading.Timer] = None
+        atexit.register(self.seal)
+
+    # -- writing -----------------------------------------------------------
+
+    def _open(self):
+        directory = self.directory
+        if self.partitioned:
+            directory = directory / time.strftime(PARTITION_FORMAT)
+            directory.mkdir(parents=True, exist_ok=True)
+        self._segment = directory / f"seg-{time.time_ns():020d}-{self._writer}{SEGMENT_SUFFIX}"
+        self._data = open(self._segment, "ab")
+        self._index = open(self._segment.with_name(self._segment.name + INDEX_SUFFIX), "a", encoding="utf-8")
+        self._records = 0
+        self._size = 0
+        self._digest = hashlib.sha256()
+
+    def append(self, record: Dict[str, Any]) -> str:
+        """
+        Append one record.
+
+        Returns:
+            Locator "<segment name>:<offset>"
+        """
+        return self.append_sized(record)[0]
+
+    def append_sized(self, record: Dict[str, Any]) -> Tuple[str, int]:
+        """Append one record; returns (locator, bytes written)."""
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8") + b"\n"
+        with self._lock:
+            if self._segment is None:
+                self._open()
+            offset = self._size
+            self._data.write(line)
+            self._data.flush()
+            self._index.write(_index_line(offset, len(line), record))
+            self._index.flush()
+            self._digest.update(line)
+            self._records += 1
+            self._size += len(line)
+            locator = f"{self._segment.name}:{offset}"
+
+            if self._records >= self.max_records or self._size >= self.max_bytes:
+                self._seal_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_age_seconds, self.seal)
+                self._timer.daemon = True
+                self._timer.start()
+        return locator, len(line)
+
+    def seal(self) -> Optional[str]:
+        """Seal the open segment, if any; returns its name."""
+        with self._lock:
+            return self._seal_locked()
+
+    def _seal_locked(self) -> Optional[str]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._segment is None:
+            return None
+
+        segment, self._segment = self._segment, None
+        os.fsync(self._data.fileno())
+        self._data.close()
+        self._index.close()
+        _write_atomic(segment.with_name(segment.name + COMMIT_SUFFIX), {
+            "records": self._records,
+            "bytes": self._size,
+            "sha256": self._digest.hexdigest(),
+            "committed_at": time.time(),
+        })
+        logger.debug("Sealed segment %s (%d records)", segment.name, self._records)
+        return segment.name
+
+    # -- maintenance -------------------------------------------------------
+
+    def recover_orphans(self, max_idle_seconds: Optional[float] = None) -> int:
+        """Seal unsealed segments idle for longer than max_idle_seconds (crashed writers)."""
+        max_idle = max_idle_seconds if max_idle_seconds is not None else self.max_age_seconds * 10
+        cutoff = time.time() - max_idle
+        recovered = 0
+        for segment in segment_files(self.directory):
+            if segment == self._segment or committed_bytes(segment) is not None:
+                continue
+            try:
+                if segment.stat().st_mtime >= cutoff:
+                    continue
+                self._recover(segment)
+                recovered += 1
+            except OSError as e:
+                logger.warning("Could not recover segment %s: %s", segment.name, e)
+        if recovered:
+            logger.info("Recovered %d orphan segments", recovered)
+        return recovered
+
+    def _recover(self, segment: Path):
+        data = segment.read_bytes()
+        data = data[:data.rfind(b"\n") + 1]  # drop a torn last record
+        digest = hashlib.sha256(data)
+        records = 0
+        with open(segment.with_name(segment.name + INDEX_SUFFIX), "w", encoding="utf-8") as index:
+            offset = 0
+            for line in data.splitlines(keepends=True):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = {}
+                index.write(_index_line(offset, len(line), record))
+                offset += len(line)
+                records += 1
+        _write_atomic(segment.with_name(segment.name + COMMIT_SUFFIX), {
+            "records": records,
+            "bytes": len(data),
+            "sha256": digest.hexdigest(),
+            "committed_at": time.time(),
+        })
+
+    def stats(self) -> Dict[str, Any]:
+        segments = segment_files(self.directory)
+        committed_records = 0
+        committed = 0
+        for segment in segments:
+            try:
+                with open(segment.with_name(segment.name + COMMIT_SUFFIX), encoding="utf-8") as f:
+                    committed_records += json.load(f)["records"]
+                committed += 1
+            except FileNotFoundError:
+                continue
+        return {
+            "segments": len(segments),
+            "committed_segments": committed,
+            "committed_records": committed_records,
+        }
+
+    def committed_segments(self) -> List[Path]:
+        return [s for s in segment_files(self.directory) if committed_bytes(s) is not None]
@@ -0,0 +1,184 @@
+"""
+Coalescing of identical parse requests.
+
+Frontend retries and double clicks upload the same PDF several times; each
+copy would run its own OCR and LLM chain. Uploads are keyed by file SHA-256,
+parser profile, user and tags:
+
+- if a job with the same key is in flight, the upload attaches to its
+  ``task_id`` (same process: to its future as well);
+- if one completed less than ``PARSE_RESULT_REUSE_SECONDS`` ago, its stored
+  result is reused;
+- failed jobs are never reused;
+- a "processing" record whose owner process has exited, or that started
+  longer ago than any job can run (``stale_seconds``), belongs to a dead job:
+  it is marked failed and a new job is started.
+
+The key -> task_id alias lives in the task store, so uvicorn workers sharing
+the store also share in-flight jobs. It is registered before the job starts,
+so a store error never leaves a job running without its alias.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import parse_dedup
+from .task_store import TaskStore, get_task_store, owner_gone, task_owner
+
+logger = logging.getLogger(__name__)
+
+_ALIAS_PREFIX = "dedup:"
+# Alias ids must fit the task_id column (64 chars) with the prefix; 192 bits of the key
+_ALIAS_KEY_CHARS = 48
+
+
+def _alias(key: str) -> str:
+    return _ALIAS_PREFIX + key[:_ALIAS_KEY_CHARS]
+
+
+def default_stale_seconds() -> int:
+    """Longest a job can take: wait behind a full queue, then run to the worker timeout."""
+    return settings.WORKER_TIMEOUT * (settings.PARSE_QUEUE_SIZE // settings.MAX_WORKERS + 2)
+
+
+def dedup_key(
+    file_hash: str,
+    profile: Optional[str] = None,
+    user_id: Optional[str] = None,
+    tags: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Key of uploads that would produce the same parse result."""
+    raw = json.dumps(
+        [file_hash, profile or "", user_id or "", tags or {}],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ParseHandle:
+    """Job serving an upload: a new one, one in flight or a stored result."""
+
+    task_id: str
+    future: Optional[Future] = None
+    record: Optional[Dict[str, Any]] = None
+    deduplicated: bool = False
+
+
+class ParseDeduplicator:
+    """Single-flight registry of parse jobs keyed by dedup_key()."""
+
+    def __init__(self, store: TaskStore, reuse_seconds: Optional[int] = None,
+                 stale_seconds: Optional[int] = None):
+        self.store = store
+        self.reuse_seconds = settings.PARSE_RESULT_REUSE_SECONDS if reuse_seconds is None else reuse_seconds
+        self.stale_seconds = default_stale_seconds() if stale_seconds is None else stale_seconds
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Tuple[str, Future]] = {}
+
+    def _existing(self, key: str) -> Optional[ParseHandle]:
+        local = self._in_flight.get(key)
+        if local is not None and not local[1].done():
+            return ParseHandle(task_id=local[0], future=local[1], deduplicated=True)
+
+        alias = self.store.get(_alias(key))
+        if not alias:
+            return None
+        record = self.store.get(alias["task_id"])
+        if not record:
+            return None
+        status = record.get("status")
+        if status == "processing":
+            if self._stale(key, alias["task_id"], record):
+                logger.warning("Task %s abandoned by its worker, starting a new parse", alias["task_id"])
+                self.store.update(alias["task_id"], status="failed", failed_at=time.time(),
+                                  error="Parse job abandoned (worker exited or timed out)")
+                return None
+            return ParseHandle(task_id=alias["task_id"], record=record, deduplicated=True)
+        if status == "completed" and time.time() - record.get("completed_at", 0) <= self.reuse_seconds:
+            return ParseHandle(task_id=alias["task_id"], record=record, deduplicated=True)
+        return None
+
+    def _stale(self, key: str, task_id: str, record: Dict[str, Any]) -> bool:
+        """A processing record whose job cannot be running any more."""
+        if time.time() - record.get("started_at", time.time()) > self.stale_seconds:
+            return True
+        owner = record.get("owner")
+        if owner == task_owner():
+            # Ours: running only if still registered (not a previous process with the same pid)
+            local = self._in_flight.get(key)
+            return local is None or local[0] != task_id
+        return owner_gone(owner)
+
+    def submit(
+        self,
+        key: str,
+        start: Callable[[str], Future],
+        record: Dict[str, Any],
+        on_done: Optional[Callable[[str, Future], None]] = None,
+    ) -> ParseHandle:
+        """
+        Attach to the job registered under key, or start one.
+
+        Args:
+            start: start(task_id) schedules the job and returns its future (may raise)
+            record: initial task record of a new job ("processing")
+            on_done: called as on_done(task_id, future) when a new job ends,
+                before the job stops being visible as in flight
+        """
+        with self._lock:
+            existing = self._existing(key)
+            if existing is not None:
+                reused = existing.record is not None and existing.record.get("status") == "completed"
+                parse_dedup.add(1, {"outcome": "reused" if reused else "inflight"})
+                logger.info("Upload coalesced with task %s", existing.task_id)
+                return existing
+
+            # Record and alias exist before the job starts: the worker reports progress
+            # into the record, and a failing store write leaves no job running
+            task_id = str(uuid.uuid4())
+            self.store.put(task_id, {"started_at": time.time(), **record, "status": "processing",
+                                     "dedup_key": key, "owner": task_owner()})
+            self.store.put(_alias(key), {"status": "alias", "task_id": task_id})
+            try:
+                future = start(task_id)
+            except BaseException:
+                self.store.delete(_alias(key))
+                self.store.delete(task_id)
+                raise
+            self._in_flight[key] = (task_id, future)
+
+        future.add_done_callback(lambda f: self._finish(key, task_id, f, on_done))
+        return ParseHandle(task_id=task_id, future=future)
+
+    def _finish(self, key: str, task_id: str, future: Future, on_done):
+        try:
+            if on_done is not None:
+                on_done(task_id, future)
+        finally:
+            with self._lock:
+                current = self._in_flight.get(key)
+                if current is not None and current[0] == task_id:
+                    del self._in_flight[key]
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+
+_deduplicator: Optional[ParseDeduplicator] = None
+
+
+def get_parse_deduplicator() -> ParseDeduplicator:
+    """Ottieni istanza singleton del deduplicatore di parsing."""
+    global _deduplicator
+    if _deduplicator is None:
+        _deduplicator = ParseDeduplicator(get_task_store())
+    return _deduplicator
@@ -0,0 +1,283 @@
+"""
+Process pool for CV parsing.
+
+OCR and the regex-heavy post-processing are CPU bound: run in the API's
+threadpool they hold the GIL and slow down every other request. Parse jobs
+run instead in a pool of worker processes (``spawn`` context, one
+``OllamaCVParser`` per worker):
+
+- at most ``MAX_WORKERS`` jobs run at once and ``PARSE_QUEUE_SIZE`` more may
+  wait; beyond that ``submit`` raises ``ExecutorSaturated`` (HTTP 429);
+- every job has a timeout (``WORKER_TIMEOUT``), enforced inside the worker
+  with SIGALRM so a stuck job frees its worker and its task ends "failed";
+- a worker killed outright (OOM, segfault in a native library) breaks the
+  whole pool: its jobs fail with ``BrokenProcessPool`` and the next job
+  starts a fresh pool.
+"""
+
+import logging
+import multiprocessing
+import signal
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..core.metrics import parse_jobs, parse_jobs_in_flight
+from ..utils.uploads import cleanup_stale_uploads, remove_upload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "llama3.2:3b"
+
+
+class ExecutorSaturated(RuntimeError):
+    """All workers are busy and the wait queue is full."""
+
+
+class ParseTimeout(BaseException):
+    """
+    A job exceeded its time budget.
+
+    Raised by SIGALRM wherever the parser happens to be: deriving from
+    BaseException keeps it out of the parser's ``except Exception``
+    fallbacks, so the job fails instead of completing with a partial document.
+    """
+
+
+# ---------------------------------------------------------------------------
+# Worker side
+# ---------------------------------------------------------------------------
+
+_worker_parsers: Dict[Tuple[str, str], Any] = {}
+
+
+def _init_worker():
+    from ..core.logging_config import configure_logging
+
+    configure_logging()
+    # Workers must not react to the terminal's Ctrl+C: the parent shuts them down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _get_worker_parser(model: str, base_url: str):
+    """Parser of this worker process, created on first use."""
+    key = (model, base_url)
+    parser = _worker_parsers.get(key)
+    if parser is None:
+        from ..parsers.ollama_cv_parser import OllamaCVParser
+
+        parser = OllamaCVParser(model=model, base_url=base_url)
+        _worker_parsers[key] = parser
+    return parser
+
+
+def _on_alarm(signum, frame):
+    raise ParseTimeout("parse job timed out")
+
+
+def _run_with_timeout(timeout: int, fn: Callable, *args):
+    """Run fn(*args) in the worker, raising ParseTimeout after timeout seconds."""
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.alarm(max(1, int(timeout)))
+    try:
+        return fn(*args)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def parse_job(
+    file_path: str,
+    filename: str,
+    model: str,
+    base_url: str,
+    user_id: Optional[str] = None,
+    tags: Optional[Dict[str, Any]] = None,
+    profile: Optional[str] = None,
+    file_hash: Optional[str] = None,
+    task_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Parse one PDF inside a worker and store it for the NLP batch.
+
+    The spooled upload is deleted when the job ends, whatever the outcome.
+    With a task_id, the running stage is reported into the task record.
+
+    Returns:
+        {"result": JSON-ready parsed document, "summary": text summary}
+    """
+    from fastapi.encoders import jsonable_encoder
+
+    from ..services.cv_batch_storage import get_batch_storage
+    from ..utils.parsing_display import display_parsing_results
+
+    parser = _get_worker_parser(model, base_url)
+    progress = None
+    if task_id:
+        from ..services.parse_progress import TaskProgressReporter
+        from ..services.task_store import get_task_store
+
+        profile = profile or parser.profile
+        progress = TaskProgressReporter(get_task_store(), task_id, profile, parser.stage_plan(profile))
+    try:
+        doc = parser.parse(file_path, profile=profile, file_hash=file_hash, progress=progress)
+    finally:
+        remove_upload(file_path)
+    if user_id:
+        doc.user_id = user_id
+    if tags:
+        doc.tags = tags
+
+    json_path = get_batch_storage().save_parsed_cv(doc, filename)
+    logger.info("CV saved for NLP batch: %s", json_path)
+
+    parsed = doc.model_dump() if hasattr(doc, "model_dump") else doc.dict()
+    return {"result": jsonable_encoder(parsed), "summary": display_parsing_results(doc)}
+
+
+# ---------------------------------------------------------------------------
+# API side
+# ---------------------------------------------------------------------------
+
+class ParseExecutor:
+    """Bounded, process-based executor for parse jobs."""
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        job_timeout: Optional[int] = None,
+        model: str = DEFAULT_MODEL,
+        base_url: Optional[str] = None,
+    ):
+        self.max_workers = max_workers or settings.MAX_WORKERS
+        self.queue_size = settings.PARSE_QUEUE_SIZE if queue_size is None else queue_size
+        self.job_timeout = job_timeout or settings.WORKER_TIMEOUT
+        self.model = model
+        self.base_url = base_url or settings.OLLAMA_BASE_URL
+
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_size
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+            logger.info("Parse pool started: %d workers, queue %d", self.max_workers, self.queue_size)
+            # Uploads older than the longest possible queue wait + run belong to dead jobs
+            cleanup_stale_uploads(self.job_timeout * (self.queue_size // self.max_workers + 2))
+        return self._pool
+
+    def submit_call(self, fn: Callable, *args, timeout: Optional[int] = None) -> Future:
+        """
+        Run fn(*args) in a worker process (fn must be picklable).
+
+        Raises:
+            ExecutorSaturated: when ``capacity`` jobs are already in flight
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                parse_jobs.add(1, {"status": "rejected"})
+                raise ExecutorSaturated(
+                    f"{self._in_flight} parse jobs in flight (capacity {self.capacity})"
+                )
+            self._in_flight += 1
+            pool = self._get_pool()
+        parse_jobs_in_flight.add(1)
+
+        call = (_run_with_timeout, timeout or self.job_timeout, fn) + args
+        try:
+            try:
+                future = pool.submit(*call)
+            except BrokenProcessPool:
+                # A worker died since the last job: the job never started, retry on a fresh pool
+                self._discard_pool(pool)
+                with self._lock:
+                    pool = self._get_pool()
+                future = pool.submit(*call)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(lambda f: self._release(f, pool))
+        return future
+
+    def submit(
+        self,
+        file_path: str,
+        filename: str,
+        user_id: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        profile: Optional[str] = None,
+        file_hash: Optional[str] = None,
+        task_id: Optional[str] = None,
+    ) -> Future:
+        """Schedule a parse job; the future resolves to parse_job()'s dict."""
+        return self.submit_call(
+            parse_job, file_path, filename, self.model, self.base_url, user_id, tags, profile, file_hash,
+            task_id,
+        )
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """Forget a broken pool, so that the next job starts a new one."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                logger.warning("Parse pool broken by a dead worker, restarting it on the next job")
+
+    def _release(self, future: Optional[Future], pool: Optional[ProcessPoolExecutor] = None):
+        with self._lock:
+            self._in_flight -= 1
+        parse_jobs_in_flight.add(-1)
+        if future is None or future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool) and pool is not None:
+            # The pool terminates its remaining workers itself: only drop the reference
+            self._discard_pool(pool)
+        status = "completed" if error is None else "timeout" if isinstance(error, ParseTimeout) else "failed"
+        parse_jobs.add(1, {"status": status})
+
+    def reconfigure(self, base_url: Optional[str] = None, model: Optional[str] = None):
+        """Point new jobs to another Ollama; running jobs finish on the old pool."""
+        with self._lock:
+            self.base_url = base_url or self.base_url
+            self.model = model or self.model
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "queue_size": self.queue_size,
+            "in_flight": self._in_flight,
+            "job_timeout": self.job_timeout,
+            "saturated": self._in_flight >= self.capacity,
+        }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=not wait)
+
+
+_parse_executor: Optional[ParseExecutor] = None
+
+
+def get_parse_executor() -> ParseExecutor:
+    """Ottieni istanza singleton del parse executor."""
+    global _parse_executor
+    if _parse_executor is None:
+        _parse_executor = ParseExecutor()
+    return _parse_executor
@@ -0,0 +1,140 @@
+"""
+Per-stage progress and ETAs of parse tasks.
+
+The worker running a job reports each stage it enters into the task record
+(``progress``); the API turns that into a percentage and an ETA using the
+historical duration of every stage, kept per profile in the task store as an
+exponentially weighted mean of the durations recorded in ``pipeline_stats``
+(the same measurements exported as ``piazzati_parser_stage_duration_seconds``).
+Until enough history exists, stages without data share ``FALLBACK_TOTAL_SECONDS``.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..parsers.pipeline import StageStats
+from .task_store import TaskStore, get_task_store
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_TOTAL_SECONDS = 180.0
+HISTORY_KEY = "stats:stage_durations"
+
+
+class StageDurationHistory:
+    """EWMA of stage durations per profile, stored as one task-store record."""
+
+    def __init__(self, store: TaskStore, alpha: float = 0.2):
+        self.store = store
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        return (self.store.get(HISTORY_KEY) or {}).get("profiles", {})
+
+    def record(self, pipeline_stats: Optional[Dict[str, Any]]):
+        """Fold the stages of one finished parse (``ParsedDocument.pipeline_stats``)."""
+        if not pipeline_stats or not pipeline_stats.get("stages"):
+            return
+        profile = pipeline_stats.get("profile", "full")
+        with self._lock:
+            profiles = self._load()
+            history = profiles.setdefault(profile, {})
+            for stage in pipeline_stats["stages"]:
+                if stage.get("status") != "ok":
+                    continue
+                seconds = stage.get("duration_ms", 0.0) / 1000
+                entry = history.get(stage["name"])
+                if entry is None:
+                    history[stage["name"]] = {"mean_s": seconds, "count": 1}
+                else:
+                    entry["mean_s"] += self.alpha * (seconds - entry["mean_s"])
+                    entry["count"] += 1
+            self.store.put(HISTORY_KEY, {"status": "stats", "profiles": profiles})
+
+    def expected(self, profile: str, plan: List[str]) -> Dict[str, float]:
+        """Expected seconds for every stage of the plan."""
+        history = self._load().get(profile, {})
+        known = {name: history[name]["mean_s"] for name in plan if name in history}
+        missing = [name for name in plan if name not in known]
+        if missing:
+            share = max(0.0, FALLBACK_TOTAL_SECONDS - sum(known.values())) / len(missing)
+            known.update({name: share for name in missing})
+        return known
+
+
+class TaskProgressReporter:
+    """
+    Pipeline listener writing the running stage into the task record.
+
+    Runs in the worker process; one store write per stage actually started.
+    """
+
+    def __init__(self, store: TaskStore, task_id: str, profile: str, plan: List[str]):
+        self.store = store
+        self.task_id = task_id
+        self.profile = profile
+        self.plan = plan
+        self.done: List[str] = []
+
+    def __call__(self, event: str, stage: StageStats):
+        if event == "start":
+            self.store.update(self.task_id, progress={
+                "profile": self.profile,
+                "plan": self.plan,
+                "done": list(self.done),
+                "current": stage.name,
+                "current_started_at": time.time(),
+            })
+        else:
+            self.done.append(stage.name)
+
+
+def estimate_progress(record: Dict[str, Any], history: StageDurationHistory, now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Progress view of a task record.
+
+    Returns:
+        {"stage", "completed_stages", "total_stages", "percent", "eta_seconds"}
+    """
+    now = now or time.time()
+    status = record.get("status")
+    progress = record.get("progress")
+    if status != "processing":
+        return {"stage": status, "percent": 100.0 if status == "completed" else None, "eta_seconds": 0.0}
+    if not progress:
+        # Queued: the worker has not started yet
+        return {"stage": "queued", "completed_stages": 0, "total_stages": None, "percent": 0.0, "eta_seconds": None}
+
+    plan = progress["plan"]
+    done = set(progress["done"])
+    current = progress["current"]
+    expected = history.expected(progress.get("profile", "full"), plan)
+
+    total = sum(expected.values()) or 1.0
+    in_current = now - progress["current_started_at"]
+    remaining = max(0.0, expected.get(current, 0.0) - in_current)
+    remaining += sum(seconds for name, seconds in expected.items() if name not in done and name != current)
+    completed = sum(seconds for name, seconds in expected.items() if name in done)
+    completed += min(in_current, expected.get(current, 0.0))
+
+    return {
+        "stage": current,
+        "completed_stages": len(done),
+        "total_stages": len(plan),
+        "percent": round(min(99.0, 100.0 * completed / total), 1),
+        "eta_seconds": round(remaining, 1),
+    }
+
+
+_history: Optional[StageDurationHistory] = None
+
+
+def get_stage_history() -> StageDurationHistory:
+    """Ottieni istanza singleton dello storico durate degli stage."""
+    global _history
+    if _history is None:
+        _history = StageDurationHistory(get_task_store())
+    return _history
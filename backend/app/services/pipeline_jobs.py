@@ -0,0 +1,357 @@
+"""
+Background runs of the NLP batch pipeline (cron_scripts/batch_processor.py).
+
+The batch runs as a child process started with asyncio, so neither the event
+loop nor a threadpool worker is held for the length of the run:
+
+- single flight: a trigger for a date range whose job is queued or running
+  attaches to that job. The range -> task_id alias lives in the task store,
+  shared by the uvicorn workers, and is claimed atomically (put_if_absent /
+  replace_if). The jobs of one worker run at most
+  ``PIPELINE_MAX_CONCURRENT_JOBS`` at a time, and batch_processor serializes
+  pipeline runs across processes with a file lock;
+- the output is written line by line to ``<PIPELINE_LOG_DIR>/<task_id>.log``
+  (followed by ``follow_log``), the last lines are kept in the task record;
+- status in the task store: queued -> running -> completed | failed | cancelled;
+- cancellation terminates the process group (SIGTERM, then SIGKILL). A cancel
+  received by another worker is seen through a flag in the task store;
+- orphans: a job whose owner worker has exited (or, running, has outlived
+  ``PIPELINE_JOB_TIMEOUT``) is not active any more. Whoever notices it (a
+  trigger, a cancel, a log follower) terminates the recorded process group,
+  which outlives its owner (own session), and marks the job failed or cancelled.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from ..core.config import settings
+from .task_store import TaskStore, get_task_store, owner_gone, task_owner
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = ("queued", "running")
+LOG_TAIL_LINES = 20
+# Interval of task record updates (log tail) and of remote cancel checks
+STORE_UPDATE_SECONDS = 2.0
+KILL_GRACE_SECONDS = 10.0
+LOG_POLL_SECONDS = 0.5
+MAX_LINE_BYTES = 1024 * 1024
+
+_ALIAS_PREFIX = "pipeline:"
+_CANCEL_PREFIX = "pipeline-cancel:"
+
+
+class PipelineJobManager:
+    """Single-flight registry and runner of batch pipeline jobs."""
+
+    def __init__(
+        self,
+        store: TaskStore,
+        script: Optional[str] = None,
+        timeout: Optional[int] = None,
+        log_dir: Optional[str] = None,
+        max_concurrent: Optional[int] = None,
+    ):
+        self.store = store
+        self.script = Path(script or settings.PIPELINE_BATCH_SCRIPT)
+        self.timeout = timeout or settings.PIPELINE_JOB_TIMEOUT
+        self.log_dir = Path(log_dir or settings.PIPELINE_LOG_DIR
+                            or Path(tempfile.gettempdir()) / "piazzati_pipeline_logs")
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.max_concurrent = max_concurrent or settings.PIPELINE_MAX_CONCURRENT_JOBS
+
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._cancel: Dict[str, asyncio.Event] = {}
+
+    # -- API ---------------------------------------------------------------
+
+    async def start(self, start_date: str, end_date: str, force: bool = False) -> Tuple[str, bool]:
+        """
+        Start the batch for a date range, or attach to the job already queued or running for it.
+
+        Returns:
+            (task_id, deduplicated)
+        """
+        key = f"{start_date}:{end_date}"
+        async with self._lock:
+            task_id = f"batch_{start_date}_{end_date}_{uuid.uuid4().hex[:8]}"
+            args = ["--process-range", start_date, end_date] + (["--force"] if force else [])
+            # Owned from now on: not mistaken for an orphan while it is set up
+            self._cancel[task_id] = asyncio.Event()
+            await asyncio.to_thread(self.store.put, task_id, {
+                "status": "queued",
+                "kind": "pipeline",
+                "start_date": start_date,
+                "end_date": end_date,
+                "force": force,
+                "queued_at": time.time(),
+                "owner": task_owner(),
+                "log_path": str(self.log_path(task_id)),
+                "log_tail": [],
+            })
+            existing = await asyncio.to_thread(self._claim, key, task_id)
+            if existing is not None:
+                self._cancel.pop(task_id, None)
+                await asyncio.to_thread(self.store.delete, task_id)
+                logger.info("Batch trigger for %s attached to job %s", key, existing)
+                return existing, True
+            self._jobs[task_id] = asyncio.create_task(self._run(task_id, args))
+        return task_id, False
+
+    async def cancel(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Request cancellation; returns the task record (None if not a pipeline job)."""
+        record = await asyncio.to_thread(self.store.get, task_id)
+        if not record or record.get("kind") != "pipeline":
+            return None
+        if record.get("status") not in ACTIVE:
+            return record
+        if await asyncio.to_thread(self._orphaned, task_id, record):
+            return await asyncio.to_thread(self._reap, task_id, record, "cancelled")
+
+        await asyncio.to_thread(self.store.put, _CANCEL_PREFIX + task_id,
+                                {"status": "cancel", "requested_at": time.time()})
+        event = self._cancel.get(task_id)
+        if event is not None:
+            event.set()
+        if record["status"] == "queued" and task_id not in self._jobs:
+            # Queued in another worker: closed now, its runner sees the status and skips it
+            record = await self._finish(task_id, "cancelled")
+        return record
+
+    def log_path(self, task_id: str) -> Path:
+        return self.log_dir / f"{task_id}.log"
+
+    async def follow_log(self, task_id: str, lines: int = 100, follow: bool = True) -> AsyncIterator[str]:
+        """Last ``lines`` lines of the job output, then (follow) new output until the job ends."""
+        path = self.log_path(task_id)
+        position = 0
+        if path.exists():
+            with open(path, "rb") as f:
+                tail = deque(f, maxlen=lines) if lines > 0 else ()
+                position = f.tell()
+            if tail:
+                yield b"".join(tail).decode("utf-8", "replace")
+        while follow:
+            record = await asyncio.to_thread(self.store.get, task_id) or {}
+            done = record.get("status") not in ACTIVE
+            if not done and await asyncio.to_thread(self._orphaned, task_id, record):
+                await asyncio.to_thread(self._reap, task_id, record, "failed")
+                done = True
+            if path.exists():
+                with open(path, "rb") as f:
+                    f.seek(position)
+                    chunk = f.read()
+                    position = f.tell()
+                if chunk:
+                    yield chunk.decode("utf-8", "replace")
+                    continue
+            if done:
+                return
+            await asyncio.sleep(LOG_POLL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": len(self._jobs), "max_concurrent": self.max_concurrent}
+
+    # -- running -----------------------------------------------------------
+
+    def _claim(self, key: str, task_id: str) -> Optional[str]:
+        """Point the range alias at task_id; returns the active job holding it instead, if any."""
+        alias_id = _ALIAS_PREFIX + key
+        claim = {"status": "alias", "task_id": task_id}
+        while True:
+            alias = self.store.get(alias_id)
+            if alias is None:
+                if self.store.put_if_absent(alias_id, claim):
+                    return None
+                continue  # claimed meanwhile by another worker: look at its job
+            if self._active(alias["task_id"]):
+                return alias["task_id"]
+            if self.store.replace_if(alias_id, alias, claim):
+                return None
+
+    def _active(self, task_id: str) -> bool:
+        record = self.store.get(task_id)
+        if not record or record.get("status") not in ACTIVE:
+            return False
+        if self._orphaned(task_id, record):
+            self._reap(task_id, record, "failed")
+            return False
+        return True
+
+    def _orphaned(self, task_id: str, record: Dict[str, Any]) -> bool:
+        """An active record whose job nobody runs or watches any more."""
+        if task_id in self._cancel:
+            return False  # running (or queued) here
+        if owner_gone(record.get("owner")):
+            return True
+        started_at = record.get("started_at")
+        # A live owner terminates its job at the timeout: past it (plus the kill grace), nobody does
+        return (record.get("status") == "running" and started_at is not None
+                and time.time() > started_at + self.timeout + 2 * KILL_GRACE_SECONDS + STORE_UPDATE_SECONDS)
+
+    def _reap(self, task_id: str, record: Dict[str, Any], status: str) -> Dict[str, Any]:
+        """Terminate an orphaned job's process group (if on this host) and close its record."""
+        pid = record.get("pid")
+        if pid and (record.get("owner") or {}).get("host") == task_owner()["host"]:
+            self._kill_orphan(pid)
+        logger.warning("Batch job %s orphaned (owner %s), marked %s", task_id, record.get("owner"), status)
+        fields = {"error": "Owner worker exited or job timed out"} if status == "failed" else {}
+        updated = self.store.update(task_id, status=status, finished_at=time.time(), orphaned=True, **fields)
+        self.store.delete(_CANCEL_PREFIX + task_id)
+        return updated
+
+    def _kill_orphan(self, pid: int):
+        """SIGTERM, then SIGKILL, to the group of a batch process started by another worker."""
+        if not hasattr(os, "killpg"):
+            return
+        try:
+            # pid reuse: only signal a process that still runs the batch script
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if self.script.name.encode() not in f.read():
+                    return
+        except FileNotFoundError:
+            return  # already gone
+        except OSError:
+            pass  # no procfs
+        deadline = time.time() + KILL_GRACE_SECONDS
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(pid, sig)
+            except ProcessLookupError:
+                return
+            while time.time() < deadline:
+                try:
+                    os.kill(pid, 0)
+                except ProcessLookupError:
+                    return
+                time.sleep(0.1)
+
+    def _cancel_requested(self, task_id: str) -> bool:
+        if self._cancel[task_id].is_set() or self.store.get(_CANCEL_PREFIX + task_id) is not None:
+            return True
+        # Cancelled while queued by a worker that did not own the job
+        return (self.store.get(task_id) or {}).get("status") == "cancelled"
+
+    async def _run(self, task_id: str, args: List[str]):
+        try:
+            async with self._semaphore:
+                if await asyncio.to_thread(self._cancel_requested, task_id):
+                    await self._finish(task_id, "cancelled")
+                    return
+                await self._execute(task_id, args)
+        except Exception as e:
+            logger.exception("Batch job %s failed", task_id)
+            await self._finish(task_id, "failed", error=str(e) or e.__class__.__name__)
+        finally:
+            self._jobs.pop(task_id, None)
+            self._cancel.pop(task_id, None)
+
+    async def _execute(self, task_id: str, args: List[str]):
+        if not self.script.exists():
+            raise FileNotFoundError(f"Batch processor script not found: {self.script}")
+
+        started_at = time.time()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", str(self.script), *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            cwd=str(self.script.parent),
+            start_new_session=True,
+            limit=MAX_LINE_BYTES,
+        )
+        await asyncio.to_thread(self.store.update, task_id, status="running", started_at=started_at,
+                                pid=process.pid)
+        logger.info("Batch job %s started (pid %d): %s", task_id, process.pid, " ".join(args))
+
+        tail: deque = deque(maxlen=LOG_TAIL_LINES)
+        outcome = None
+        with open(self.log_path(task_id), "w", encoding="utf-8") as log:
+            reader = asyncio.create_task(self._pump(process.stdout, log, tail))
+            cancelled = asyncio.create_task(self._cancel[task_id].wait())
+            try:
+                while not reader.done():
+                    await asyncio.wait({reader, cancelled}, timeout=STORE_UPDATE_SECONDS,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    if reader.done():
+                        break
+                    if await asyncio.to_thread(self._cancel_requested, task_id):
+                        outcome = "cancelled"
+                    elif time.time() - started_at > self.timeout:
+                        outcome = "timeout"
+                    if outcome:
+                        logger.warning("Batch job %s: %s, terminating pid %d", task_id, outcome, process.pid)
+                        await self._terminate(process)
+                        break
+                    await asyncio.to_thread(self.store.update, task_id, log_tail=list(tail))
+                await reader
+            finally:
+                cancelled.cancel()
+        returncode = await process.wait()
+
+        fields = {"returncode": returncode, "log_tail": list(tail),
+                  "duration_s": round(time.time() - started_at, 3)}
+        if outcome == "cancelled":
+            await self._finish(task_id, "cancelled", **fields)
+        elif outcome == "timeout":
+            await self._finish(task_id, "failed", error=f"Timed out after {self.timeout}s",
+                               timed_out=True, **fields)
+        elif returncode == 0:
+            await self._finish(task_id, "completed", **fields)
+        else:
+            await self._finish(task_id, "failed", error=f"Batch processor exited with code {returncode}",
+                               **fields)
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, log, tail: deque):
+        async for raw in stream:
+            line = raw.decode("utf-8", "replace")
+            log.write(line)
+            log.flush()
+            tail.append(line.rstrip("\n"))
+
+    @staticmethod
+    async def _terminate(process: asyncio.subprocess.Process):
+        """SIGTERM to the process group (the batch and its children), SIGKILL after a grace period."""
+        def send(sig):
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, sig)
+                else:
+                    process.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+        send(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), KILL_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            send(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+    async def _finish(self, task_id: str, status: str, **fields) -> Dict[str, Any]:
+        record = await asyncio.to_thread(self.store.update, task_id, status=status,
+                                         finished_at=time.time(), **fields)
+        await asyncio.to_thread(self.store.delete, _CANCEL_PREFIX + task_id)
+        logger.info("Batch job %s %s", task_id, status)
+        return record
+
+
+_job_manager: Optional[PipelineJobManager] = None
+
+
+def get_pipeline_job_manager() -> PipelineJobManager:
+    """Ottieni istanza singleton del gestore dei job di pipeline."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = PipelineJobManager(get_task_store())
+    return _job_manager
@@ -0,0 +1,283 @@
+"""
+Durable store for background task status and results.
+
+Replaces the process-local ``_task_results`` dict of the parse API: records
+survive restarts, are visible to every uvicorn worker, and expire after
+``TASK_RESULT_TTL`` seconds. Records are stored compactly: the JSON payload is
+zlib-compressed and tracebacks are truncated.
+
+Backends (``TASK_STORE_URL``):
+    sqlite:///path.db, postgresql://...   SQLTaskStore (SQLAlchemy Core table)
+    redis://host:6379/0                   RedisTaskStore (needs ``redis``)
+    empty                                 SQLite file in the temp directory
+"""
+
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from sqlalchemy import (
+    Column,
+    Float,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    delete,
+    select,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_TRACEBACK_CHARS = 4000
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """Compact serialization: truncated traceback, compact JSON, zlib."""
+    record = dict(record)
+    traceback = record.get("traceback")
+    if isinstance(traceback, str) and len(traceback) > MAX_TRACEBACK_CHARS:
+        record["traceback"] = "...\n" + traceback[-MAX_TRACEBACK_CHARS:]
+    raw = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+    return zlib.compress(raw.encode("utf-8"), 6)
+
+
+def decode_record(payload: bytes) -> Dict[str, Any]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+# Tells this process apart from an earlier one that had the same pid (container restarts)
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+
+def task_owner() -> Dict[str, Any]:
+    """Identity of this process, recorded in the tasks it runs."""
+    return {"host": socket.gethostname(), "pid": os.getpid(), "token": _PROCESS_TOKEN}
+
+
+def owner_gone(owner: Optional[Dict[str, Any]]) -> bool:
+    """True if the process recorded by task_owner() has exited (only knowable on this host)."""
+    if not owner or owner.get("host") != socket.gethostname() or os.name == "nt":
+        return False
+    pid = owner.get("pid")
+    if pid == os.getpid():
+        return owner.get("token") != _PROCESS_TOKEN
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass  # alive, owned by another user
+    return False
+
+
+class TaskStore(ABC):
+    """Interface: task_id -> record dict (with a ``status`` key)."""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or settings.TASK_RESULT_TTL
+
+    @abstractmethod
+    def put(self, task_id: str, record: Dict[str, Any]):
+        """Create or replace the record."""
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """The record, or None if missing or expired."""
+
+    @abstractmethod
+    def delete(self, task_id: str):
+        """Remove the record (no-op if missing)."""
+
+    @abstractmethod
+    def put_if_absent(self, task_id: str, record: Dict[str, Any]) -> bool:
+        """Atomically create the record; False if one (not expired) already exists."""
+
+    @abstractmethod
+    def replace_if(self, task_id: str, expected: Dict[str, Any], record: Dict[str, Any]) -> bool:
+        """Atomically replace the record if it still equals ``expected`` (as returned by get)."""
+
+    def evict_expired(self) -> int:
+        return 0
+
+    def update(self, task_id: str, **fields) -> Dict[str, Any]:
+        """Merge fields into the record (created if missing)."""
+        record = self.get(task_id) or {}
+        record.update(fields)
+        self.put(task_id, record)
+        return record
+
+
+class SQLTaskStore(TaskStore):
+    """Task records in a SQL table (SQLite or Postgres)."""
+
+    _EVICT_EVERY = 200  # delete expired rows every N writes
+
+    def __init__(self, url: str, ttl_seconds: Optional[int] = None):
+        super().__init__(ttl_seconds)
+        self.url = url
+        if url.startswith("sqlite"):
+            self.engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 10})
+        else:
+            self.engine = create_engine(url, pool_pre_ping=True)
+
+        metadata = MetaData()
+        self.table = Table(
+            "parse_tasks",
+            metadata,
+            Column("task_id", String(64), primary_key=True),
+            Column("status", String(32), nullable=False),
+            Column("updated_at", Float, nullable=False),
+            Column("expires_at", Float, nullable=False, index=True),
+            Column("payload", LargeBinary, nullable=False),
+        )
+        metadata.create_all(self.engine)
+
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def put(self, task_id: str, record: Dict[str, Any]):
+        values = self._values(record)
+        with self.engine.begin() as conn:
+            result = conn.execute(update(self.table).where(self.table.c.task_id == task_id).values(**values))
+            if result.rowcount == 0:
+                try:
+                    conn.execute(self.table.insert().values(task_id=task_id, **values))
+                except IntegrityError:
+                    conn.execute(update(self.table).where(self.table.c.task_id == task_id).values(**values))
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self._EVICT_EVERY == 0
+        if evict:
+            self.evict_expired()
+
+    def update(self, task_id: str, **fields) -> Dict[str, Any]:
+        # read-modify-write from several threads of this process
+        with self._update_lock:
+            return super().update(task_id, **fields)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(self.table.c.payload).where(
+                    self.table.c.task_id == task_id, self.table.c.expires_at >= time.time()
+                )
+            ).first()
+        return decode_record(row[0]) if row else None
+
+    def delete(self, task_id: str):
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.task_id == task_id))
+
+    def _values(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "status": str(record.get("status", "unknown")),
+            "updated_at": now,
+            "expires_at": now + self.ttl_seconds,
+            "payload": encode_record(record),
+        }
+
+    def put_if_absent(self, task_id: str, record: Dict[str, Any]) -> bool:
+        # An expired row not evicted yet counts as absent
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(
+                self.table.c.task_id == task_id, self.table.c.expires_at < time.time()
+            ))
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert().values(task_id=task_id, **self._values(record)))
+        except IntegrityError:
+            return False
+        return True
+
+    def replace_if(self, task_id: str, expected: Dict[str, Any], record: Dict[str, Any]) -> bool:
+        # encode_record is deterministic: equal records have equal payloads
+        with self.engine.begin() as conn:
+            return conn.execute(update(self.table).where(
+                self.table.c.task_id == task_id,
+                self.table.c.payload == encode_record(expected),
+                self.table.c.expires_at >= time.time(),
+            ).values(**self._values(record))).rowcount == 1
+
+    def evict_expired(self) -> int:
+        with self.engine.begin() as conn:
+            removed = conn.execute(delete(self.table).where(self.table.c.expires_at < time.time())).rowcount
+        if removed:
+            logger.info("Evicted %d expired task records", removed)
+        return removed
+
+
+class RedisTaskStore(TaskStore):
+    """Task records as Redis keys with native TTL."""
+
+    def __init__(self, url: str, ttl_seconds: Optional[int] = None, prefix: str = "piazzati:task:"):
+        super().__init__(ttl_seconds)
+        import redis  # optional dependency
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._replace_if = self.client.register_script(
+            "if redis.call('GET', KEYS[1]) == ARGV[1] then "
+            "redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3]) return 1 end return 0"
+        )
+
+    def put(self, task_id: str, record: Dict[str, Any]):
+        self.client.setex(self.prefix + task_id, self.ttl_seconds, encode_record(record))
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        payload = self.client.get(self.prefix + task_id)
+        return decode_record(payload) if payload else None
+
+    def delete(self, task_id: str):
+        self.client.delete(self.prefix + task_id)
+
+    def put_if_absent(self, task_id: str, record: Dict[str, Any]) -> bool:
+        return bool(self.client.set(self.prefix + task_id, encode_record(record), ex=self.ttl_seconds, nx=True))
+
+    def replace_if(self, task_id: str, expected: Dict[str, Any], record: Dict[str, Any]) -> bool:
+        return bool(self._replace_if(
+            keys=[self.prefix + task_id],
+            args=[encode_record(expected), encode_record(record), self.ttl_seconds],
+        ))
+
+
+def create_task_store(url: Optional[str] = None) -> TaskStore:
+    url = url or settings.TASK_STORE_URL
+    if not url:
+        url = f"sqlite:///{Path(tempfile.gettempdir()) / 'piazzati_tasks.sqlite3'}"
+    if url.startswith(("redis://", "rediss://")):
+        return RedisTaskStore(url)
+    return SQLTaskStore(url)
+
+
+_task_store: Optional[TaskStore] = None
+_task_store_lock = threading.Lock()
+
+
+def get_task_store() -> TaskStore:
+    """Ottieni istanza singleton del task store."""
+    global _task_store
+    with _task_store_lock:
+        if _task_store is None:
+            _task_store = create_task_store()
+            logger.info("Task store: %s", type(_task_store).__name__)
+        return _task_store
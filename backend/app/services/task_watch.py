@@ -0,0 +1,113 @@
+"""
+Shared reads of task records for the task event streams.
+
+Each SSE client of ``/parse/task/{task_id}/events`` waits on a TaskWatcher
+instead of reading the task store itself: one poller per task_id reads the
+record and fans it out to every subscriber of that task. While the record
+does not change the poll interval doubles, up to ``max_interval``, and it
+drops back to ``interval`` as soon as the record changes. The poller stops
+when the task leaves "processing" (or disappears) or its last subscriber
+leaves.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .task_store import get_task_store
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 0.5
+MAX_POLL_SECONDS = 5.0
+
+
+class TaskWatch:
+    """Latest record of one task, shared by its subscribers."""
+
+    def __init__(self):
+        self.record: Optional[Dict[str, Any]] = None
+        self.version = 0
+        self.subscribers = 0
+        self.poller: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    def publish(self, record: Optional[Dict[str, Any]]):
+        self.record = record
+        self.version += 1
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def next(self, seen: int, timeout: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """Wait for a record newer than version ``seen`` (at most ``timeout`` seconds).
+
+        Returns ``(version, record)``; the version is unchanged on timeout.
+        """
+        if self.version <= seen:
+            try:
+                await asyncio.wait_for(self._updated.wait(), max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+        return self.version, self.record
+
+
+class TaskWatcher:
+    """One poll of the task store per watched task_id, whatever the number of clients."""
+
+    def __init__(self, get_record: Callable[[str], Optional[Dict[str, Any]]],
+                 interval: float = POLL_SECONDS, max_interval: float = MAX_POLL_SECONDS):
+        self.get_record = get_record
+        self.interval = interval
+        self.max_interval = max_interval
+        self._watches: Dict[str, TaskWatch] = {}
+
+    def watched(self) -> int:
+        return len(self._watches)
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[TaskWatch]:
+        watch = self._watches.get(task_id)
+        if watch is None:
+            watch = self._watches[task_id] = TaskWatch()
+            watch.poller = asyncio.create_task(self._poll(task_id, watch))
+        watch.subscribers += 1
+        try:
+            yield watch
+        finally:
+            watch.subscribers -= 1
+            if watch.subscribers == 0:
+                watch.poller.cancel()
+                if self._watches.get(task_id) is watch:
+                    del self._watches[task_id]
+
+    async def _poll(self, task_id: str, watch: TaskWatch):
+        interval = self.interval
+        while True:
+            try:
+                record = await run_in_threadpool(self.get_record, task_id)
+            except Exception:
+                logger.exception("Could not read task %s", task_id)
+                interval = min(interval * 2, self.max_interval)
+            else:
+                if watch.version == 0 or record != watch.record:
+                    watch.publish(record)
+                    interval = self.interval
+                else:
+                    interval = min(interval * 2, self.max_interval)
+                if record is None or record.get("status") != "processing":
+                    return
+            await asyncio.sleep(interval)
+
+
+_watcher: Optional[TaskWatcher] = None
+
+
+def get_task_watcher() -> TaskWatcher:
+    """Ottieni istanza singleton del watcher dei task."""
+    global _watcher
+    if _watcher is None:
+        _watcher = TaskWatcher(get_task_store().get)
+    return _watcher
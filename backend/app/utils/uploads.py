@@ -0,0 +1,161 @@
+"""
+Streaming of uploaded files to the parse spool directory.
+
+Uploads are copied in fixed-size chunks (never fully in memory); the SHA-256
+is computed during the copy and the size limit is enforced as bytes arrive.
+Files are uuid-named, so client filenames never reach the filesystem.
+
+The multipart body is parsed (and spooled) by Starlette before the endpoint
+runs, so UploadSizeLimit rejects oversized request bodies earlier, at the ASGI
+level: on Content-Length before any byte is read, or while a chunked body
+streams in.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# Request body allowed on top of the file limit: multipart boundaries and the other form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_DIR = Path(tempfile.gettempdir()) / "piazzati_parsing"
+
+
+class UploadTooLarge(ValueError):
+    """The upload exceeded the configured size limit."""
+
+
+@dataclass
+class SavedUpload:
+    path: Path
+    sha256: str
+    size: int
+
+
+def save_upload(src: BinaryIO, max_bytes: int, suffix: str = ".pdf", directory: Path = UPLOAD_DIR) -> SavedUpload:
+    """
+    Copy a file object to the spool directory, hashing on the fly.
+
+    Raises:
+        UploadTooLarge: more than max_bytes were received (partial file removed)
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    dest = directory / f"upload_{uuid.uuid4().hex}{suffix}"
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(dest, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+
+    return SavedUpload(path=dest, sha256=digest.hexdigest(), size=size)
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware answering 413 to upload requests whose body exceeds
+    max_bytes + FORM_OVERHEAD_BYTES, before the endpoint parses the form.
+    The exact per-file limit is still enforced by save_upload.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body = max_bytes + FORM_OVERHEAD_BYTES
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            await self._reject(send)
+            return
+
+        received = 0
+        too_large = started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Stop the body here: the app sees a client disconnect, the client gets 413
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if not too_large:
+                started = True
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not started:
+            await self._reject(send)
+
+    async def _reject(self, send):
+        body = f'{{"detail":"Upload exceeds {self.max_body} bytes"}}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def remove_upload(path) -> None:
+    """Delete a spooled upload (missing files are ignored)."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning("Could not remove upload %s: %s", path, e)
+
+
+def cleanup_stale_uploads(max_age_seconds: int, directory: Path = UPLOAD_DIR) -> int:
+    """Remove spooled uploads left behind by crashed jobs."""
+    if not directory.exists():
+        return 0
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for entry in os.scandir(directory):
+        try:
+            if entry.is_file() and entry.name.startswith("upload_") and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info("Removed %d stale uploads from %s", removed, directory)
+    return removed
@@ -14,18 +14,24 @@ project_root/
         Dataset/
         data/
 
-Questo script usa SUBPROCESS per eseguire gli script sotto NLP (modalità B).
+Gli stage NLP sono eseguiti IN-PROCESS come DAG (NLP/pipeline_dag.py): un solo
+interprete importa pandas/torch/sentence-transformers una volta, DataFrame ed
+embeddings passano in memoria tra gli stage, i rami CV e JD girano in parallelo
+e ogni stage e' eseguito una sola volta per run. Le durate degli stage sono
+registrate in NLP/logs/pipeline_runs.jsonl.
 """
 
 from __future__ import annotations
 
+import os
 import sys
+import json
 import argparse
 from pathlib import Path
 from datetime import datetime
 import logging
-import subprocess
-from typing import List
+from contextlib import contextmanager
+from typing import List, Sequence
 
 # -----------------------------
 # Logging
@@ -57,88 +63,130 @@ if not NLP_PATH.exists():
     logger.error("NLP folder non trovata: %s", NLP_PATH)
     # Non uscire subito: permettiamo all'utente di lanciare per testare
 
-# Utility to run python scripts under NLP/ with subprocess
+RUNS_LOG = NLP_PATH / "logs" / "pipeline_runs.jsonl"
+PIPELINE_LOCK = NLP_PATH / "logs" / "pipeline.lock"
 
-def run_nlp_script(script_name: str, args: List[str] | None = None) -> subprocess.CompletedProcess:
-    """Esegue lo script Python presente sotto NLP_PATH con lo stesso interprete.
-    Ritorna CompletedProcess.
+
+@contextmanager
+def pipeline_lock():
+    """Un solo run della pipeline alla volta sugli stessi file (cron, API, micro-batch)."""
+    try:
+        import fcntl
+    except ImportError:  # Windows: nessun lock tra processi
+        yield
+        return
+    PIPELINE_LOCK.parent.mkdir(parents=True, exist_ok=True)
+    with open(PIPELINE_LOCK, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("Un altro run della pipeline e' in corso, attendo che termini...")
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def use_nlp_path():
+    """Prepara l'import degli script NLP: usano path relativi (Dataset/...) e si importano tra loro."""
+    os.chdir(NLP_PATH)
+    if str(NLP_PATH) not in sys.path:
+        sys.path.insert(0, str(NLP_PATH))
+
+
+def run_pipeline(branches: Sequence[str] = ("cv", "jd"), force: bool = False):
+    """Esegue in-process il DAG NLP per i rami indicati e registra le durate degli stage.
+    Gli stage con input invariati rispetto al manifest dell'ultimo run sono
+    ricaricati invece che rieseguiti (force=True li riesegue tutti).
+    Ritorna il PipelineRun.
+    """
+    use_nlp_path()
+    from pipeline_dag import build_nlp_pipeline
+
+    with pipeline_lock():
+        logger.info("Eseguo pipeline NLP in-process (rami: %s)", ", ".join(branches))
+        run = build_nlp_pipeline(branches).run(force=force)
+
+    report = run.to_dict()
+    report["branches"] = list(branches)
+    report["force"] = force
+    for name, stage in report["stages"].items():
+        logger.info("  %-20s %-8s %8.2fs%s", name, stage["status"], stage["duration_s"],
+                    f"  ({stage['error']})" if stage["error"] else "")
+    logger.info("Pipeline %s in %.2fs", "completata" if run.ok else "terminata con errori", run.duration_s)
+    try:
+        RUNS_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with open(RUNS_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(report) + "\n")
+    except OSError as e:
+        logger.warning("Impossibile registrare le durate in %s: %s", RUNS_LOG, e)
+    return run
+
+def export_tables() -> List[Path]:
+    """
+    Export completo su richiesta (non a ogni run): dataset CV/JD in Parquet +
+    CSV e copie CSV delle tabelle partizionate di normalizzazione ed embeddings.
     """
-    script_path = NLP_PATH / script_name
-    if not script_path.exists():
-        raise FileNotFoundError(f"Script non trovato: {script_path}")
-
-    cmd = [sys.executable, str(script_path)]
-    if args:
-        cmd.extend(args)
-
-    logger.info("Eseguo: %s", " ".join(cmd))
-    result = subprocess.run(cmd, cwd=str(NLP_PATH), capture_output=True, text=True)
-    if result.returncode != 0:
-        logger.error("Script %s fallito (code %d). stderr:%s", script_name, result.returncode, result.stderr.strip())
-    else:
-        logger.info("Script %s completato. stdout len=%d", script_name, len(result.stdout))
-    return result
+    use_nlp_path()
+    import cv_json_to_dataset_processor as cvp
+    import embed_generator as eg
+    import jd_json_to_dataset_processor as jdp
+    import normalizzatore as nz
+    from columnar import export_csv, table_exists
+
+    with pipeline_lock():
+        paths = [cvp.export_dataset(), jdp.export_dataset()]
+        for base in (nz.OUTPUT_CV, nz.OUTPUT_JD, eg.CV_OUTPUT, eg.JD_OUTPUT):
+            if table_exists(base):
+                paths.append(export_csv(base))
+    for path in paths:
+        logger.info("Esportato: %s", path)
+    return paths
 
 # -----------------------------
 # JD Batch Processor
 # -----------------------------
 class JDBatchProcessor:
-    def __init__(self):
+    def __init__(self, force: bool = False):
+        self.force = force
         self.jds_path = NLP_PATH / "data" / "jds"
         self.dataset_path = NLP_PATH / "Dataset"
         self.output_path = self.dataset_path / "normalized"
-        self.csv_script = "jd_json_to_dataset_processor.py"
 
-    def process(self):
+    def process(self) -> bool:
         logger.info("%s", "=" * 80)
         logger.info("BATCH PROCESSING JD - PIPELINE NLP COMPLETA")
         logger.info("%s", "=" * 80)
 
-        # Step 1: JSON -> CSV
-        logger.info("Step 1: Conversione JSON → CSV JD")
+        # JSON -> dataset -> normalizzazione -> embeddings, solo ramo JD
         try:
-            run_nlp_script(self.csv_script)
+            run = run_pipeline(("jd",), force=self.force)
         except Exception as e:
-            logger.exception("Errore Step 1 JD: %s", e)
-            return
+            logger.exception("Errore pipeline JD: %s", e)
+            return False
 
-        # Step 2: Normalizzazione
-        logger.info("Step 2: Normalizzazione JD")
-        try:
-            run_nlp_script("normalizzatore.py")
-        except Exception as e:
-            logger.exception("Errore Step 2 JD: %s", e)
-
-        # Step 3: Embeddings
-        logger.info("Step 3: Generazione Embeddings JD")
-        try:
-            run_nlp_script("embed_generator.py")
-        except Exception as e:
-            logger.exception("Errore Step 3 JD: %s", e)
-
-        logger.info("Pipeline JD completata")
+        if run.ok:
+            logger.info("Pipeline JD completata")
+        else:
+            logger.error("Pipeline JD: stage falliti %s", run.failed)
+        return run.ok
 
 # -----------------------------
 # CV Batch Processor
 # -----------------------------
 class CVBatchProcessor:
-    def __init__(self):
-        self.cvs_path = NLP_PATH / "data" / "cvs"
+    def __init__(self, force: bool = False):
+        self.force = force
         self.dataset_path = NLP_PATH / "Dataset"
         self.output_path = self.dataset_path / "normalized"
-        self.cv_json_script = "cv_json_to_dataset_processor.py"
-        self.normalizer_script = "normalizzatore.py"
-        self.embed_script = "embed_generator.py"
 
         # ensure folders exist
         self.dataset_path.mkdir(parents=True, exist_ok=True)
         self.output_path.mkdir(parents=True, exist_ok=True)
 
-    def process_date_range(self, start_date: str | None = None, end_date: str | None = None):
-        logger.info("%s", "=" * 80)
-        logger.info("BATCH PROCESSING CV - PIPELINE NLP COMPLETA")
-        logger.info("%s", "=" * 80)
-
+    def process_date_range(self, start_date: str | None = None, end_date: str | None = None) -> bool:
+        """Valida il range ed esegue la pipeline; False se il run (o l'input) non e' valido.
+        Il range non filtra l'input: la pipeline e' incrementale e legge tutti i CV
+        in staging non ancora consumati (segmenti pendenti e JSON legacy).
+        """
         if start_date is None:
             start_date = datetime.now().date().isoformat()
         if end_date is None:
@@ -150,110 +198,62 @@ class CVBatchProcessor:
             ed = datetime.fromisoformat(end_date).date()
         except Exception as e:
             logger.error("Formato data non valido: %s", e)
-            return
+            return False
         if sd > ed:
             logger.error("start_date deve essere <= end_date")
-            return
-
-        logger.info("Processing range: %s -> %s", sd.isoformat(), ed.isoformat())
+            return False
 
-        date_folders = self._find_date_folders(sd, ed)
-        if not date_folders:
-            logger.warning("Nessun CV trovato per il range %s - %s", sd.isoformat(), ed.isoformat())
-            return
+        logger.info("Processing range: %s -> %s (la pipeline legge tutto lo staging pendente)",
+                    sd.isoformat(), ed.isoformat())
+        return self.process()
 
-        total_files = sum(len(list(folder.glob("*.json"))) for folder in date_folders)
-        logger.info("Trovati %d CV in %d cartelle", total_files, len(date_folders))
-        if total_files == 0:
-            logger.warning("Nessun file JSON da processare")
-            return
+    def process(self) -> bool:
+        """Esegue la pipeline sui CV in staging; gli stage con input invariati sono ricaricati dal manifest."""
+        logger.info("%s", "=" * 80)
+        logger.info("BATCH PROCESSING CV - PIPELINE NLP COMPLETA")
+        logger.info("%s", "=" * 80)
 
         try:
-            logger.info("Step 1: Conversione JSON -> CSV")
-            self._json_to_csv_pipeline(date_folders)
-
-            logger.info("Step 2: Normalizzazione")
-            self._normalization_pipeline()
-
-            logger.info("Step 3: Generazione embeddings")
-            self._embeddings_pipeline()
-
-            logger.info("Pipeline completata con successo")
-            self._print_summary()
+            pending = self._pending_cvs()
+            if pending:
+                logger.info("Trovati %d CV in staging da processare", pending)
+            else:
+                logger.info("Nessun CV nuovo in staging: la pipeline verifica comunque JD e cancellazioni")
 
-            # Step 4: Matching (una sola volta, se Matching.py presente)
-            matching_script = NLP_PATH / "Matching.py"
-            if matching_script.exists():
-                logger.info("Eseguo Matching CV-JD")
-                run_nlp_script("Matching.py")
+            # Rami CV e JD in parallelo, poi metadata embeddings e matching CV-JD
+            run = run_pipeline(("cv", "jd"), force=self.force)
+            if run.ok:
+                logger.info("Pipeline completata con successo")
             else:
-                logger.warning("Matching.py non trovato: %s", matching_script)
+                logger.error("Pipeline terminata con stage falliti: %s", run.failed)
+            self._print_summary()
+            return run.ok
 
         except Exception as e:
             logger.exception("Errore durante processing: %s", e)
+            return False
 
-    def _find_date_folders(self, start_date, end_date) -> List[Path]:
-        folders: List[Path] = []
-        if not self.cvs_path.exists():
-            logger.warning("cvs_path non esiste: %s", self.cvs_path)
-            return folders
-
-        for child in sorted(self.cvs_path.iterdir()):
-            if not child.is_dir():
-                continue
-            try:
-                d = datetime.fromisoformat(child.name).date()
-            except Exception:
-                continue
-            if start_date <= d <= end_date:
-                folders.append(child)
-        return folders
-
-    def _json_to_csv_pipeline(self, date_folders: List[Path]):
-        # In modalità B usiamo sempre lo script che si occupa di leggere data/cvs
-        script_name = self.cv_json_script
-        if not (NLP_PATH / script_name).exists():
-            raise FileNotFoundError(f"cv_json_to_dataset_processor.py non trovato sotto {NLP_PATH}")
-        # Possiamo passare opzionalmente il range a script
-        # Se lo script supporta args, potrebbe leggerli; qui non forziamo param
-        run_nlp_script(script_name)
-
-    def _normalization_pipeline(self):
-        # controlla esistenza input CSV (nome comune: cv_dataset.csv)
-        input_csv = self.dataset_path / "cv_dataset.csv"
-        if not input_csv.exists():
-            raise FileNotFoundError(f"CV dataset non trovato: {input_csv}")
-        logger.info("Input CSV: %s (%d KB)", input_csv, input_csv.stat().st_size // 1024)
-
-        # Esegui normalizzatore (script)
-        run_nlp_script(self.normalizer_script)
-
-        output_csv = self.output_path / "cv_dataset_normalized.csv"
-        if not output_csv.exists():
-            raise FileNotFoundError(f"Output normalizzazione non trovato: {output_csv}")
-        logger.info("CSV normalizzato: %s (%d KB)", output_csv, output_csv.stat().st_size // 1024)
-
-    def _embeddings_pipeline(self):
-        normalized_csv = self.output_path / "cv_dataset_normalized.csv"
-        if not normalized_csv.exists():
-            raise FileNotFoundError(f"CSV normalizzato non trovato: {normalized_csv}")
-        logger.info("Input normalizzato: %s", normalized_csv)
-
-        run_nlp_script(self.embed_script)
-
-        embeddings_file = NLP_PATH / "embeddings" / "cv_embeddings.csv"
-        if embeddings_file.exists():
-            logger.info("Embeddings generati: %s (%d KB)", embeddings_file, embeddings_file.stat().st_size // 1024)
-        else:
-            logger.warning("File embeddings non trovato: %s", embeddings_file)
+    def _pending_cvs(self) -> int:
+        """CV in staging non ancora consumati: record dei segmenti pendenti piu' JSON legacy."""
+        use_nlp_path()
+        import cv_json_to_dataset_processor as cvp
+        from cv_segments import SegmentCheckpoint, read_index
+
+        input_path = Path(cvp.INPUT_FOLDER)
+        checkpoint = SegmentCheckpoint(Path(cvp.OUTPUT_FOLDER) / cvp.CHECKPOINT_FILENAME)
+        segments = checkpoint.pending(input_path / cvp.SEGMENTS_SUBFOLDER)
+        return (sum(1 for segment in segments for _ in read_index(segment))
+                + len(cvp.staged_json_files(input_path)))
 
     def _print_summary(self):
         logger.info("--- RIEPILOGO ---")
         try:
-            norm = self.output_path / 'cv_dataset_normalized.csv'
-            emb = NLP_PATH / 'embeddings' / 'cv_embeddings.csv'
-            logger.info('CSV normalizzato: %s', norm if norm.exists() else 'MANCANTE')
-            logger.info('Embeddings: %s', emb if emb.exists() else 'MANCANTE')
+            from columnar import table_exists
+
+            norm = self.output_path / 'cv_dataset_normalized'
+            emb = NLP_PATH / 'embeddings' / 'cv_embeddings'
+            logger.info('Dataset normalizzato: %s', norm if table_exists(norm) else 'MANCANTE')
+            logger.info('Embeddings: %s', emb if table_exists(emb) else 'MANCANTE')
         except Exception:
             logger.exception('Errore durante riepilogo')
 
@@ -261,7 +261,7 @@ class CVBatchProcessor:
 # CLI
 # -----------------------------
 
-def main():
+def main() -> int:
     parser = argparse.ArgumentParser(description='Batch processor per CV con pipeline NLP')
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--process-today', action='store_true', help='Processa CV di oggi')
@@ -269,39 +269,35 @@ def main():
     group.add_argument('--process-range', nargs=2, metavar=('START', 'END'), help='Processa CV in un range di date')
     group.add_argument('--process-all', action='store_true', help='Processa tutti i CV disponibili')
     group.add_argument('--process-jd', action='store_true', help='Esegui pipeline JD')
+    group.add_argument('--export', action='store_true',
+                       help='Esporta dataset e tabelle derivate complete (Parquet/CSV) in NLP/')
+    parser.add_argument('--force', action='store_true',
+                        help='Riesegui tutti gli stage anche se input invariati (ignora i manifest)')
 
     args = parser.parse_args()
 
     if args.process_jd:
-        JDBatchProcessor().process()
-        return
+        return 0 if JDBatchProcessor(force=args.force).process() else 1
+    if args.export:
+        export_tables()
+        return 0
 
-    processor = CVBatchProcessor()
+    processor = CVBatchProcessor(force=args.force)
+    ok = True
 
     if args.process_today:
-        processor.process_date_range()
+        ok = processor.process_date_range()
     elif args.process_date:
-        processor.process_date_range(args.process_date, args.process_date)
+        ok = processor.process_date_range(args.process_date, args.process_date)
     elif args.process_range:
-        processor.process_date_range(args.process_range[0], args.process_range[1])
+        ok = processor.process_date_range(args.process_range[0], args.process_range[1])
     elif args.process_all:
-        # Trova tutte le date disponibili
-        all_dates = []
-        if processor.cvs_path.exists():
-            for date_folder in processor.cvs_path.iterdir():
-                if date_folder.is_dir():
-                    try:
-                        _ = datetime.fromisoformat(date_folder.name)
-                        all_dates.append(date_folder.name)
-                    except Exception:
-                        continue
-        if all_dates:
-            all_dates.sort()
-            processor.process_date_range(all_dates[0], all_dates[-1])
-        else:
-            logger.warning('Nessun CV trovato da processare')
+        ok = processor.process()
+
+    # Codice di uscita != 0 se la pipeline fallisce (stato dei job avviati dall'API)
+    return 0 if ok else 1
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
     # Nessun codice aggiuntivo necessario qui.
\ No newline at end of file
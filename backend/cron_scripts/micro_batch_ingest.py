@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Ingestione a micro-batch guidata da eventi, in alternativa al batch da cron.
+
+Processo di lunga durata che osserva le cartelle di staging lette dalla
+pipeline NLP e porta i nuovi CV/JD fino all'indice vettoriale in pochi secondi:
+
+    evento di staging -> micro-batch -> DAG NLP (dataset -> normalizzazione ->
+    embeddings) -> indicizzazione pgvector degli embeddings CV nuovi o cambiati
+    e disattivazione di quelli dei CV rimossi dal dataset
+
+Eventi (inotify via watchfiles; senza watchfiles polling ogni POLL_SECONDS):
+- <cvs>/segments/<giorno>/*.ndjson.commit   segmento sigillato dal backend (cv_segment_store);
+                                            i worker di parsing sono processi separati,
+                                            per questo il segnale e' il file e non una coda
+- <cvs>/<giorno>/*.json                     CV in formato legacy (un file per CV)
+- <jds>/*.json                              JD caricata, modificata o eliminata
+
+I file in <cvs>/segments e <cvs> senza partizione per giorno (layout precedente)
+sono riconosciuti allo stesso modo.
+
+Gli eventi sono accumulati e consegnati a blocchi: appena il blocco ha
+MAX_BATCH_SIZE elementi o il primo evento attende da MAX_WAIT_SECONDS. I run
+sono seriali; gli eventi che arrivano durante un run formano il blocco
+successivo. Ogni run riusa i meccanismi incrementali della pipeline:
+checkpoint dei segmenti (sono letti solo i CV nuovi), upsert per chiave nel
+DatasetStore, normalizzazione ed embeddings delle sole righe cambiate dal
+watermark dello stage (DatasetStore.pending) riscrivendo solo le partizioni
+delle tabelle che le contengono, cache degli embeddings per text_hash,
+indicizzazione pgvector dei soli embeddings nuovi o cambiati.
+
+Limite: restano proporzionali al dataset la lettura delle tabelle normalizzate
+e degli embeddings complete (risultato degli stage), la rilettura di tutte le
+JD in staging e il confronto con gli embeddings gia' indicizzati. Sono letture
+sequenziali di Parquet, senza parsing, normalizzazione ne' encode delle righe
+invariate.
+
+Il matching CV-JD completo gira solo quando il blocco contiene entrambi i rami;
+resta compito di batch_processor.py (cron o /api/parse/batch/process).
+
+Uso:
+    python cron_scripts/micro_batch_ingest.py [--max-size N] [--max-wait S] [--no-index]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set
+
+from batch_processor import BACKEND_PATH, logger, run_pipeline, use_nlp_path
+
+MAX_BATCH_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 50))
+MAX_WAIT_SECONDS = float(os.getenv("MICRO_BATCH_MAX_WAIT_SECONDS", 5))
+POLL_SECONDS = float(os.getenv("MICRO_BATCH_POLL_SECONDS", 2))
+
+PARTITION_FORMAT = "%Y-%m-%d"
+
+BRANCHES = ("cv", "jd")
+STARTUP = "startup"
+
+
+class MicroBatcher:
+    """
+    Accumula eventi (ramo, riferimento) e chiama flush({ramo: riferimenti})
+    da un thread dedicato, un blocco alla volta.
+    """
+
+    def __init__(self, flush: Callable[[Dict[str, Set[str]]], None],
+                 max_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT_SECONDS):
+        self.flush = flush
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._pending: Dict[str, Set[str]] = {}
+        self._count = 0
+        self._first_at: Optional[float] = None
+        self._stopped = False
+        self._thread = threading.Thread(target=self._loop, name="micro-batch", daemon=True)
+
+    def start(self) -> "MicroBatcher":
+        self._thread.start()
+        return self
+
+    def put(self, branch: str, ref: str):
+        with self._cond:
+            refs = self._pending.setdefault(branch, set())
+            if ref in refs:
+                return
+            refs.add(ref)
+            self._count += 1
+            if self._first_at is None:
+                self._first_at = time.monotonic()
+            self._cond.notify()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Consegna gli eventi in attesa e ferma il thread."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def _ready(self) -> bool:
+        if self._count >= self.max_size:
+            return True
+        return self._first_at is not None and time.monotonic() >= self._first_at + self.max_wait
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._ready() and not self._stopped:
+                    timeout = None if self._first_at is None else self._first_at + self.max_wait - time.monotonic()
+                    self._cond.wait(timeout)
+                if not self._count:
+                    return  # fermato senza eventi in attesa
+                batch, self._pending = self._pending, {}
+                self._count, self._first_at = 0, None
+            try:
+                self.flush(batch)
+            except Exception:
+                logger.exception("Micro-batch fallito (%s)", _describe(batch))
+
+
+def _is_day(name: str) -> bool:
+    try:
+        datetime.strptime(name, PARTITION_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def _describe(batch: Dict[str, Set[str]]) -> str:
+    return ", ".join(f"{len(refs)} {branch.upper()}" for branch, refs in batch.items() if refs)
+
+
+class StagingWatcher:
+    """Traduce i cambiamenti delle cartelle di staging in eventi del MicroBatcher."""
+
+    def __init__(self, batcher: MicroBatcher, cv_dir: Path, jd_dir: Path):
+        self.batcher = batcher
+        self.cv_dir = Path(cv_dir)
+        self.jd_dir = Path(jd_dir)
+        self.segments_dir = self.cv_dir / "segments"
+        self.stop_event = threading.Event()
+
+    @staticmethod
+    def _in(path: Path, directory: Path) -> bool:
+        """File nella cartella o in una sua partizione per giorno."""
+        return path.parent == directory or (path.parent.parent == directory and _is_day(path.parent.name))
+
+    def classify(self, path: Path, deleted: bool) -> Optional[str]:
+        """Ramo interessato dal cambiamento, None se non rilevante."""
+        if path.suffix == ".commit" and self._in(path, self.segments_dir):
+            return None if deleted else "cv"
+        if path.suffix != ".json":
+            return None
+        if self._in(path, self.cv_dir):
+            # I JSON dei CV spariscono quando la pipeline li archivia
+            return None if deleted else "cv"
+        if path.parent == self.jd_dir:
+            return "jd"
+        return None
+
+    def run(self):
+        """Blocca fino a stop(): eventi del filesystem, o polling senza watchfiles."""
+        dirs = [d for d in (self.cv_dir, self.jd_dir) if d.exists()]
+        if not dirs:
+            raise FileNotFoundError(f"Cartelle di staging non trovate: {self.cv_dir}, {self.jd_dir}")
+        try:
+            from watchfiles import Change, watch
+        except ImportError:
+            logger.warning("watchfiles non installato: polling ogni %.0fs", POLL_SECONDS)
+            self._poll()
+            return
+
+        logger.info("In ascolto su %s", ", ".join(str(d) for d in dirs))
+        for changes in watch(*dirs, stop_event=self.stop_event):
+            for change, path in changes:
+                branch = self.classify(Path(path), change == Change.deleted)
+                if branch:
+                    self.batcher.put(branch, path)
+
+    def _snapshot(self) -> Set[Path]:
+        files = set()
+        for directory, pattern in ((self.segments_dir, "*.commit"), (self.cv_dir, "*.json")):
+            if directory.exists():
+                files.update(directory.glob(pattern))
+                files.update(directory.glob(f"*/{pattern}"))
+        if self.jd_dir.exists():
+            files.update(self.jd_dir.glob("*.json"))
+        return files
+
+    def _poll(self):
+        seen = self._snapshot()
+        while not self.stop_event.wait(POLL_SECONDS):
+            current = self._snapshot()
+            changes = [(path, False) for path in current - seen] + [(path, True) for path in seen - current]
+            for path, deleted in changes:
+                branch = self.classify(path, deleted)
+                if branch:
+                    self.batcher.put(branch, str(path))
+            seen = current
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def _embedding_processor():
+    import sys
+
+    if str(BACKEND_PATH) not in sys.path:
+        sys.path.insert(0, str(BACKEND_PATH))
+    from app.services.csv_embedding_processor import CSVEmbeddingProcessor
+
+    return CSVEmbeddingProcessor()
+
+
+def index_cv_embeddings(cv_df):
+    """Scrive in pgvector gli embeddings CV (aggiornando quelli esistenti)."""
+    return _embedding_processor().process_dataframe(
+        cv_df,
+        validate_documents=False,
+        replace_existing=True,
+    )
+
+
+def deactivate_cv_embeddings(user_ids: Set[str]) -> int:
+    """Disattiva in pgvector gli embeddings dei CV rimossi dal dataset."""
+    return _embedding_processor().deactivate_user_embeddings(sorted(user_ids))
+
+
+class MicroBatchIngestor:
+    """Staging -> pipeline NLP -> indice, a micro-batch."""
+
+    def __init__(self, max_size: int = MAX_BATCH_SIZE, max_wait: float = MAX_WAIT_SECONDS,
+                 index: bool = True):
+        use_nlp_path()
+        import cv_json_to_dataset_processor as cvp
+        import jd_json_to_dataset_processor as jdp
+
+        self.index = index
+        self.batcher = MicroBatcher(self.flush, max_size, max_wait)
+        self.watcher = StagingWatcher(self.batcher, Path(cvp.INPUT_FOLDER), Path(jdp.INPUT_FOLDER))
+        # Righe non indicizzate e CV rimossi non disattivati per un errore (es. database non
+        # raggiungibile), ritentati al blocco successivo
+        self._unindexed = None
+        self._undeleted: Set[str] = set()
+
+    def flush(self, batch: Dict[str, Set[str]]):
+        branches = tuple(b for b in BRANCHES if batch.get(b))
+        logger.info("Micro-batch: %s", _describe(batch))
+        indexed = self._indexed_keys() if self.index and "cv" in branches else None
+
+        run = run_pipeline(branches)
+        if not run.ok:
+            logger.error("Micro-batch: stage falliti %s", run.failed)
+        if indexed is not None and "cv_embeddings" in run.results:
+            self._index_changed(run.results["cv_embeddings"][0], indexed)
+            self._deactivate_deleted(run.results["cv_embeddings"][0], indexed)
+
+    def _indexed_keys(self) -> Optional[Set[str]]:
+        """user_id + text_hash degli embeddings CV prima del run (None se non ancora generati)."""
+        import embed_generator as eg
+        from columnar import read_table, table_exists
+
+        if not table_exists(eg.CV_OUTPUT):
+            return None
+        previous = read_table(eg.CV_OUTPUT, ['user_id', 'text_hash'])
+        return set(previous['user_id'].astype(str) + ':' + previous['text_hash'].astype(str))
+
+    def _index_changed(self, cv_df, indexed: Optional[Set[str]]):
+        import pandas as pd
+
+        changed = cv_df
+        if indexed is not None:
+            keys = cv_df['user_id'].astype(str) + ':' + cv_df['text_hash'].astype(str)
+            changed = cv_df[~keys.isin(indexed)]
+        if self._unindexed is not None:
+            changed = pd.concat([self._unindexed, changed]).drop_duplicates('user_id', keep='last')
+        if changed.empty:
+            logger.info("Nessun embedding CV nuovo da indicizzare")
+            return
+
+        try:
+            results = index_cv_embeddings(changed)
+        except Exception:
+            logger.exception("Indicizzazione di %d embeddings CV fallita, ritento al prossimo blocco", len(changed))
+            self._unindexed = changed
+            return
+        self._unindexed = None
+        logger.info("Indicizzati %d embeddings CV (%d errori)", results['processed'], results['errors'])
+
+    def _deactivate_deleted(self, cv_df, indexed: Optional[Set[str]]):
+        """Disattiva gli embeddings dei CV che erano nella tabella prima del run e non ci sono piu'."""
+        current = set(cv_df['user_id'].astype(str))
+        deleted = {key.rpartition(':')[0] for key in indexed or ()} | self._undeleted
+        deleted -= current  # ricaricati nel frattempo: riattivati dall'indicizzazione
+        if not deleted:
+            return
+
+        try:
+            deactivated = deactivate_cv_embeddings(deleted)
+        except Exception:
+            logger.exception("Disattivazione di %d embeddings CV fallita, ritento al prossimo blocco", len(deleted))
+            self._undeleted = deleted
+            return
+        self._undeleted = set()
+        logger.info("Disattivati %d embeddings CV di %d CV rimossi", deactivated, len(deleted))
+
+    def run(self):
+        self.batcher.start()
+        # Documenti arrivati mentre il processo era fermo
+        for branch in BRANCHES:
+            self.batcher.put(branch, STARTUP)
+        try:
+            self.watcher.run()
+        except KeyboardInterrupt:
+            logger.info("Interruzione richiesta")
+        finally:
+            self.watcher.stop()
+            self.batcher.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ingestione a micro-batch di CV/JD guidata da eventi')
+    parser.add_argument('--max-size', type=int, default=MAX_BATCH_SIZE,
+                        help='Documenti per blocco prima di avviare la pipeline')
+    parser.add_argument('--max-wait', type=float, default=MAX_WAIT_SECONDS,
+                        help='Secondi massimi di attesa del primo documento di un blocco')
+    parser.add_argument('--no-index', action='store_true',
+                        help='Solo pipeline NLP, senza scrivere gli embeddings in pgvector')
+    args = parser.parse_args()
+
+    MicroBatchIngestor(args.max_size, args.max_wait, index=not args.no_index).run()
+
+
+if __name__ == '__main__':
+    main()
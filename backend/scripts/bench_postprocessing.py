@@ -0,0 +1,193 @@
+"""
+Micro-benchmark: regex-heavy post-processing per CV, inline vs precompiled.
+
+Runs the Europass extractors, language level validation, certification
+deduplication and date cleaning on synthetic CVs twice: with the precompiled
+``app.parsers.patterns`` registry, and with the registry swapped for shims
+that replay the former inline ``re.*`` calls (including one CEFR regex per
+level). No Ollama instance is needed.
+
+Usage (from backend/):
+    python scripts/bench_postprocessing.py --cvs 2000
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import types
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app.parsers.ollama_cv_parser as cv_parser_module  # noqa: E402
+from app.parsers import patterns  # noqa: E402
+from app.parsers.ollama_cv_parser import OllamaCVParser  # noqa: E402
+from app.parsers.text_index import TextIndexCache  # noqa: E402
+from app.schemas.parsed_document import (  # noqa: E402
+    Certification,
+    DocumentType,
+    Experience,
+    Language,
+    ParsedDocument,
+)
+
+EUROPASS_TEXT = """INFORMAZIONI PERSONALI
+Nome
+Mario Rossi
+Indirizzo
+Via Roma 1, 27036 - Mortara (PV)
+Telefono
++39 333 1234567
+E-mail
+mario.rossi@example.com
+
+ESPERIENZA LAVORATIVA
+* Date (da - a) 2018 - in corso
+* Nome e indirizzo del datore di lavoro
+Ospedale San Matteo - Pavia (PV)
+* Tipo di impiego
+Infermiere
+* Mansioni e responsabilita
+Assistenza ai pazienti in terapia intensiva; gestione CVC e PICC; monitoraggio emodinamico
+* Date (da - a) 2014 - 2018
+* Nome e indirizzo del datore di lavoro
+Clinica Città di Pavia - Pavia (PV)
+* Tipo di impiego
+Infermiere di reparto
+* Mansioni e responsabilita
+Somministrazione terapie, medicazioni avanzate, educazione sanitaria ai pazienti
+
+ISTRUZIONE E FORMAZIONE
+* Date (da - a) 2010 - 2013
+* Nome e tipo di istituto di istruzione
+Università degli Studi di Pavia
+* Qualifica conseguita
+Laurea in Infermieristica 110/110
+
+ALTRE LINGUA
+Inglese
+intermediate B2
+Francese
+basic A2 capacita di lettura
+
+CAPACITA E COMPETENZE
+"""
+
+
+def make_document() -> ParsedDocument:
+    doc = ParsedDocument(document_type=DocumentType.cv, full_text=EUROPASS_TEXT)
+    doc.languages = [
+        Language(name="Inglese", proficiency="Livello (B2) - ottimo"),
+        Language(name="Francese", proficiency="base, scolastico"),
+        Language(name="Spagnolo", proficiency="Fluent C1 certified"),
+    ]
+    doc.certifications = [
+        Certification(name="BLSD - Basic Life Support"),
+        Certification(name="BLSD", issuer="IRC"),
+        Certification(name="ACLS Provider", date_obtained="2021 (rinnovo 2023)"),
+        Certification(name="PALS"),
+    ]
+    doc.experience = [
+        Experience(title="Infermiere", start_date="03/2018 (full time)", end_date="presente"),
+        Experience(title="Infermiere di reparto", start_date="2014", end_date="2018 (fine contratto),"),
+    ]
+    return doc
+
+
+# ---------------------------------------------------------------------------
+# "Before": the same parser methods with every pattern compiled per call
+# ---------------------------------------------------------------------------
+
+class InlinePattern:
+    """Replays a registry pattern the way the former code did: re.<op>(str, ...)."""
+
+    def __init__(self, compiled):
+        self.pattern, self.flags = compiled.pattern, compiled.flags & ~re.UNICODE
+
+    def search(self, string):
+        return re.search(self.pattern, string, self.flags)
+
+    def match(self, string):
+        return re.match(self.pattern, string, self.flags)
+
+    def split(self, string):
+        return re.split(self.pattern, string, flags=self.flags)
+
+    def sub(self, repl, string):
+        return re.sub(self.pattern, repl, string, flags=self.flags)
+
+
+class InlineCEFR:
+    """Former level detection: one dynamically built regex per CEFR level."""
+
+    valid_cefr = {'C2', 'C1', 'B2', 'B1', 'A2', 'A1'}
+
+    def search(self, prof_lower):
+        for cefr in self.valid_cefr:
+            if re.search(rf'\b{cefr.lower()}\b|\({cefr.lower()}\)', prof_lower):
+                return re.match(r'(..)', cefr.lower())
+        return None
+
+
+def inline_patterns():
+    ns = types.SimpleNamespace()
+    for name in dir(patterns):
+        value = getattr(patterns, name)
+        if isinstance(value, re.Pattern):
+            setattr(ns, name, InlinePattern(value))
+    ns.CEFR_LEVEL = InlineCEFR()
+    return ns
+
+
+def run_postprocessing(parser, doc):
+    parser._extract_europass_personal_info(EUROPASS_TEXT)
+    parser._extract_europass_experience(EUROPASS_TEXT)
+    parser._extract_europass_education(EUROPASS_TEXT)
+    parser._extract_europass_languages(EUROPASS_TEXT)
+    parser._validate_and_enrich_language_levels(doc)
+    parser._deduplicate_certifications(doc)
+    parser._clean_date_fields(doc)
+
+
+def make_parser() -> OllamaCVParser:
+    parser = OllamaCVParser.__new__(OllamaCVParser)
+    parser.text_indexes = TextIndexCache()
+    parser._init_language_database()
+    parser._init_certification_database()
+    parser._init_skill_keywords()
+    return parser
+
+
+def bench(parser, n_cvs):
+    docs = [make_document() for _ in range(n_cvs)]
+    start = time.perf_counter()
+    for doc in docs:
+        run_postprocessing(parser, doc)
+    return (time.perf_counter() - start) / n_cvs * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--cvs", type=int, default=2000, help="synthetic CVs per run")
+    args = ap.parse_args()
+
+    parser = make_parser()
+    run_postprocessing(parser, make_document())  # warm-up
+    current_us = bench(parser, args.cvs)
+    cv_parser_module.patterns = inline_patterns()
+    try:
+        legacy_us = bench(parser, args.cvs)
+    finally:
+        cv_parser_module.patterns = patterns
+
+    print(f"CVs per run:          {args.cvs}")
+    print(f"inline re.* (before): {legacy_us:8.1f} µs/CV")
+    print(f"precompiled (after):  {current_us:8.1f} µs/CV")
+    print(f"speed-up:             {legacy_us / current_us:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
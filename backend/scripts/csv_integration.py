@@ -81,7 +81,7 @@ def start_csv_watcher():
     print(f"🚀 Starting CSV file watcher...")
     print(f"📁 Watching: {watch_directory}")
     print(f"🎯 Pattern: embeddings_*.csv")
-    print(f"⏰ Check interval: 30 seconds")
+    print(f"⚡ New files are processed on arrival (polling every 30 seconds without watchfiles)")
     print("\nPlace CSV files from external script in the watch directory.")
     print("Press Ctrl+C to stop...\n")
     
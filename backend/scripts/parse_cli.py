@@ -1,5 +1,6 @@
 import argparse
 
+from app.core.logging_config import configure_logging
 from app.parsers.ollama_cv_parser import (OllamaCVParser,
                                           display_parsing_results)
 
@@ -11,7 +12,9 @@ def main():
         "--sync", action="store_true", help="Run synchronously and print result"
     )
     p.add_argument("--model", default="llama3.1:8b")
+    p.add_argument("--log-level", default=None, help="DEBUG shows per-stage details")
     args = p.parse_args()
+    configure_logging(level=args.log_level)
 
     parser = OllamaCVParser(model=args.model)
     doc = parser.parse(args.file)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services import batch_stats_index  # noqa: E402
+from app.services.batch_stats_index import INDEX_FILENAME, BatchEntry, BatchStatsIndex  # noqa: E402
+from app.services.cv_batch_storage import CVBatchStorage  # noqa: E402
+from app.services.cv_segment_store import CVSegmentStore  # noqa: E402
+
+
+def doc(i, user):
+    return SimpleNamespace(document_id=f"doc{i:04d}-0000", user_id=user, skills=[{"name": "python"}] * i)
+
+
+def test_counters_follow_saves_and_removals(tmp_path):
+    index = BatchStatsIndex(tmp_path / INDEX_FILENAME)
+    for i, user in enumerate(["u1", "u2", "u1"]):
+        entry = BatchEntry(f"cv{i}.json", user, saved_at=100.0 + i, bytes=10, ready=True, skills_count=i)
+        assert index.add(entry)
+    assert not index.add(BatchEntry("cv0.json", "u1", 200.0, 10, True, 0))  # already counted
+
+    stats = index.stats(latest=2)
+    assert stats["total_files"] == 3 and stats["total_bytes"] == 30
+    assert stats["processing_ready"] == 3 and stats["users"] == 2
+    assert [f["filename"] for f in stats["latest_files"]] == ["cv2.json", "cv1.json"]
+    assert stats["files_by_user"] == {"u1": 2, "u2": 1}
+
+    assert index.remove(["cv1.json", "cv1.json", "missing.json"]) == 1
+    stats = index.stats()
+    assert stats["total_files"] == 2 and stats["users"] == 1
+    assert stats["files_by_user"] == {"u1": 2}
+
+
+def test_storage_stats_come_from_the_index(tmp_path):
+    for staging_format in ("json", "segments"):
+        base = tmp_path / staging_format
+        storage = CVBatchStorage(base, staging_format=staging_format)
+        for i, user in enumerate(["u1", "u2", "u1"], start=1):
+            storage.save_parsed_cv(doc(i, user), f"cv{i}.pdf")
+            time.sleep(0.01)
+
+        stats = storage.get_batch_stats()
+        assert stats["total_files"] == 3 and stats["processing_ready"] == 3
+        assert stats["files_by_user"] == {"u1": 2, "u2": 1}
+        assert [f["skills_count"] for f in stats["latest_files"]] == [3, 2, 1]
+        assert "segments" not in stats
+        if storage.segments is not None:
+            storage.segments.seal()
+            assert storage.get_batch_stats(detailed=True)["segments"]["committed_records"] == 3
+
+        # a new index next to existing CVs is built from them once
+        (base / INDEX_FILENAME).unlink()
+        for suffix in ("-wal", "-shm"):
+            (base / (INDEX_FILENAME + suffix)).unlink(missing_ok=True)
+        rebuilt = CVBatchStorage(base, staging_format=staging_format).get_batch_stats()
+        assert rebuilt["total_files"] == 3
+        assert [f["filename"] for f in rebuilt["latest_files"]] == [f["filename"] for f in stats["latest_files"]]
+
+
+def test_cleanup_uncounts_removed_files(tmp_path, monkeypatch):
+    storage = CVBatchStorage(tmp_path, staging_format="json")
+    # retention follows the saved_at recorded in the index, not the file mtime
+    saved_at = time.time() - 40 * 86400
+    monkeypatch.setattr(batch_stats_index, "time", SimpleNamespace(time=lambda: saved_at))
+    old = Path(storage.save_parsed_cv(doc(1, "u1"), "old.pdf"))
+    monkeypatch.undo()
+    new = Path(storage.save_parsed_cv(doc(2, "u2"), "new.pdf"))
+    assert old.parent.parent == tmp_path  # day partition
+
+    assert storage.cleanup_old_files(days_to_keep=30) == 1
+    assert not old.exists() and new.exists()
+    stats = storage.get_batch_stats()
+    assert stats["total_files"] == 1 and stats["files_by_user"] == {"u2": 1}
+
+
+def test_partitioned_segments(tmp_path):
+    store = CVSegmentStore(tmp_path, max_age_seconds=3600, partitioned=True)
+    store.append({"document_id": "d1", "user_id": "u1"})
+    segment = store.seal()
+    assert segment is not None
+    assert [s.name for s in store.committed_segments()] == [segment]
+    assert store.committed_segments()[0].parent.parent == tmp_path
+    assert store.stats()["committed_records"] == 1
@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.cv_segment_store import CVSegmentStore, committed_bytes, read_segment  # noqa: E402
+
+
+def record(i, **extra):
+    return dict({"document_id": f"doc{i}", "user_id": f"u{i}", "file_sha256": f"sha{i}"}, **extra)
+
+
+def test_segments_rotate_and_are_readable_once_sealed(tmp_path):
+    store = CVSegmentStore(tmp_path, max_records=2, max_age_seconds=3600)
+    store.append(record(1, Tags={"women_in_tech": True}))
+    store.append(record(2))
+    locator = store.append(record(3))
+
+    sealed, open_segment = sorted(tmp_path.glob("seg-*.ndjson"))
+    assert committed_bytes(sealed) is not None
+    assert committed_bytes(open_segment) is None
+    assert locator == f"{open_segment.name}:0"
+    assert [r["document_id"] for r in read_segment(sealed)] == ["doc1", "doc2"]
+
+    index = (tmp_path / (sealed.name + ".idx")).read_text().splitlines()
+    offset, length, doc_id, user_id, sha, tags = index[0].split("\t")
+    with open(sealed, "rb") as f:
+        f.seek(int(offset))
+        assert json.loads(f.read(int(length)))["user_id"] == user_id == "u1"
+    assert tags == "women_in_tech"
+
+    store.seal()
+    assert store.stats() == {"segments": 2, "committed_segments": 2, "committed_records": 3}
+
+
+def test_idle_segment_is_sealed_by_timer(tmp_path):
+    store = CVSegmentStore(tmp_path, max_age_seconds=0.05)
+    store.append(record(1))
+    time.sleep(0.3)
+    assert len(store.committed_segments()) == 1
+
+
+def test_orphan_segment_is_truncated_and_sealed(tmp_path):
+    orphan = tmp_path / "seg-00000000000000000001-deadhost1.ndjson"
+    orphan.write_bytes(b'{"document_id":"a"}\n{"document_id":"b"}\n{"docu')
+    os.utime(orphan, (0, 0))
+
+    store = CVSegmentStore(tmp_path)
+    assert store.recover_orphans() == 1
+    assert [r["document_id"] for r in read_segment(orphan)] == ["a", "b"]
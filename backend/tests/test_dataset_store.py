@@ -0,0 +1,128 @@
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+NLP = os.path.abspath(os.path.join(ROOT, "..", "NLP"))
+for path in (ROOT, NLP):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from columnar import partition_index, partition_of, read_table, write_partitions  # noqa: E402
+from dataset_store import ChangeSet, DatasetStore, apply_changes, merge_changes  # noqa: E402
+
+
+def key(row):
+    return row["id"]
+
+
+def test_upsert_versions_and_tombstones(tmp_path):
+    store = DatasetStore(tmp_path / "datasets.sqlite3", "cv_dataset")
+    assert store.version() == 0
+
+    store.upsert_many([("a", {"id": "a", "skills": "python"}), ("b", {"id": "b", "skills": "sql"})])
+    store.upsert_many([("b", {"id": "b", "skills": "sql, go", "tag_remote": True})])
+    assert store.delete_many(["a", "missing"]) == 1
+    assert store.version() == 3
+
+    assert store.get("a") is None
+    assert store.get("b") == {"id": "b", "skills": "sql, go", "tag_remote": True}
+    assert store.count() == 1 and store.keys() == ["b"]
+    assert store.columns() == ["id", "skills", "tag_remote"]
+    # the tombstone is visible to downstream stages, with its own version
+    assert list(store.changes_since(1)) == [
+        ("b", {"id": "b", "skills": "sql, go", "tag_remote": True}, 2),
+        ("a", None, 3),
+    ]
+
+    # re-inserting a deleted key revives it
+    store.upsert_many([("a", {"id": "a", "skills": "rust"})])
+    assert store.get("a") == {"id": "a", "skills": "rust"}
+    assert store.delete_missing({"a"}) == ["b"]
+    assert store.keys() == ["a"]
+
+
+def test_pending_changes_follow_the_consumer_watermark(tmp_path):
+    store = DatasetStore(tmp_path / "datasets.sqlite3", "cv_dataset")
+    store.upsert_many([("a", {"id": "a"}), ("b", {"id": "b"})])
+
+    first = store.pending("normalized")
+    assert (first.since, first.version) == (0, 1)
+    assert set(first.rows) == {"a", "b"} and not first.deleted
+    # the watermark only moves when the consumer commits it
+    assert len(store.pending("normalized")) == 2
+    store.set_watermark("normalized", first.version)
+    assert len(store.pending("normalized")) == 0
+
+    store.upsert_many([("b", {"id": "b", "skills": "go"}), ("c", {"id": "c"})])
+    store.delete_many(["a", "c"])
+    changes = store.pending("normalized")
+    assert changes.since == 1 and changes.version == 3
+    assert changes.rows == {"b": {"id": "b", "skills": "go"}}
+    assert changes.deleted == {"a", "c"}
+
+    # consumers are independent, and watermarks are persisted
+    assert len(store.pending("embeddings")) == 3
+    store.close()
+    reopened = DatasetStore(tmp_path / "datasets.sqlite3", "cv_dataset")
+    assert reopened.watermark("normalized") == 1 and reopened.watermark("embeddings") == 0
+
+
+def test_merge_changes_keeps_dataset_order_and_drops_deleted_rows():
+    previous = pd.DataFrame({"id": ["a", "b", "c"], "value": [1, 2, 3]})
+    changed = pd.DataFrame({"id": ["d", "b"], "value": [40, 20]})
+    changes = ChangeSet("normalized", 1, 2, rows={"b": {}, "d": {}}, deleted={"c"})
+
+    merged = merge_changes(previous, changed, changes, key, ["d", "a", "b", "c"])
+    assert merged.to_dict(orient="list") == {"id": ["d", "a", "b"], "value": [40, 1, 20]}
+
+    # only deletions
+    deleted = merge_changes(previous, changed.iloc[:0], ChangeSet("n", 1, 2, deleted={"a"}), key, ["a", "b", "c"])
+    assert deleted["id"].tolist() == ["b", "c"]
+
+
+def test_merge_changes_rejects_tables_not_matching_the_dataset():
+    changes = ChangeSet("normalized", 1, 2, rows={"b": {}})
+    changed = pd.DataFrame({"id": ["b"], "value": [20]})
+
+    # duplicate keys in the previous table
+    previous = pd.DataFrame({"id": ["a", "a"], "value": [1, 1]})
+    assert merge_changes(previous, changed, changes, key, ["a", "b"]) is None
+    # a key the dataset no longer has
+    previous = pd.DataFrame({"id": ["a", "z"], "value": [1, 9]})
+    assert merge_changes(previous, changed, changes, key, ["a", "b"]) is None
+
+
+def test_apply_changes_rewrites_only_touched_partitions(tmp_path):
+    base = tmp_path / "cv_dataset_normalized"
+    keys = [f"u{i}" for i in range(40)]
+    full = pd.DataFrame({"id": keys, "value": [str(i) for i in range(40)]})
+    write_partitions(full, base, key)
+    before = partition_index(base)["files"]
+
+    changes = ChangeSet("normalized", 1, 2, rows={"u3": {}}, deleted={"u7"})
+    changed = pd.DataFrame({"id": ["u3"], "value": ["changed"]})
+    assert apply_changes(base, changed, changes, key, keys)
+
+    after = partition_index(base)["files"]
+    touched = {partition_of("u3"), partition_of("u7")}
+    assert {p for p in before if before[p] != after.get(p)} == touched
+    table = read_table(base).set_index("id")["value"]
+    assert table["u3"] == "changed" and "u7" not in table and len(table) == 39
+
+    # a table that no longer matches the dataset is left untouched
+    assert not apply_changes(base, changed, ChangeSet("n", 2, 3, rows={"u3": {}}), key, ["u3"])
+    assert partition_index(base)["files"] == after
+
+
+def test_export_table_only_when_the_dataset_changed(tmp_path):
+    store = DatasetStore(tmp_path / "datasets.sqlite3", "cv_dataset")
+    store.upsert_many([("a", {"id": "a", "value": "1"})])
+    path = tmp_path / "cv_dataset.csv"
+
+    assert store.export_table(path, ["id", "value"])
+    assert not store.export_table(path, ["id", "value"])
+    store.upsert_many([("b", {"id": "b", "value": "2"})])
+    assert store.export_table(path, ["id", "value"])
+    assert read_table(path)["id"].tolist() == ["a", "b"]
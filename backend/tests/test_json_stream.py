@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.json_stream import IncrementalJSONObject, StreamingJSONError  # noqa: E402
+
+
+def test_object_closes_across_chunks_and_ignores_tail():
+    obj = IncrementalJSONObject()
+    chunks = ['Here is the JSON:\n```json\n{"a": {"b": [1, ', '2]}, "s": "x}', '{"}', '\n```\nExtra text']
+    done = [obj.feed(c) for c in chunks]
+    assert done == [False, False, True, True]
+    assert obj.result() == {"a": {"b": [1, 2]}, "s": "x}{"}
+
+
+def test_escaped_quotes_inside_strings():
+    obj = IncrementalJSONObject()
+    assert obj.feed('{"name": "say \\"hi\\" }"}')
+    assert obj.result() == {"name": 'say "hi" }'}
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"a": [1, 2}', '{"a": 1, oops}', "x" * 300],
+)
+def test_malformed_output_aborts_early(text):
+    obj = IncrementalJSONObject()
+    with pytest.raises(StreamingJSONError):
+        obj.feed(text)
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.llm_cache import LLMResponseCache  # noqa: E402
+
+OPTIONS = {"temperature": 0.0, "num_predict": 100}
+
+
+def test_hit_after_set_and_key_depends_on_model_and_options(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.db"))
+    assert cache.get("llama", OPTIONS, "prompt") is None
+
+    cache.set("llama", OPTIONS, "prompt", "answer")
+
+    assert cache.get("llama", OPTIONS, "prompt") == "answer"
+    assert cache.get("other", OPTIONS, "prompt") is None
+    assert cache.get("llama", {**OPTIONS, "top_k": 5}, "prompt") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 3
+
+
+def test_entries_are_shared_through_the_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    LLMResponseCache(path=path).set("llama", OPTIONS, "p", "r")
+    assert LLMResponseCache(path=path).get("llama", OPTIONS, "p") == "r"
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.db"), ttl_seconds=60, max_entries=2)
+    for i in range(3):
+        cache.set("llama", OPTIONS, f"p{i}", f"r{i}")
+        time.sleep(0.01)
+
+    cache.evict()
+
+    assert cache.get("llama", OPTIONS, "p0") is None
+    assert cache.get("llama", OPTIONS, "p2") == "r2"
+
+    cache.ttl_seconds = 0.001
+    time.sleep(0.01)
+    assert cache.get("llama", OPTIONS, "p2") is None
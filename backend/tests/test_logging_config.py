@@ -0,0 +1,24 @@
+import json
+import logging
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.core.logging_config import JsonFormatter  # noqa: E402
+
+
+def test_json_formatter_includes_extra_fields():
+    record = logging.LogRecord(
+        "app.parsers.pipeline", logging.INFO, __file__, 1, "Stage %s took %.1f ms", ("ocr", 12.34), None
+    )
+    record.stage = "ocr"
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload["message"] == "Stage ocr took 12.3 ms"
+    assert payload["level"] == "INFO"
+    assert payload["logger"] == "app.parsers.pipeline"
+    assert payload["stage"] == "ocr"
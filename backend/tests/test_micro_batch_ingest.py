@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CRON = os.path.join(ROOT, "cron_scripts")
+for path in (ROOT, CRON):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import micro_batch_ingest  # noqa: E402
+from micro_batch_ingest import MicroBatcher, MicroBatchIngestor, StagingWatcher  # noqa: E402
+
+
+class Flushes:
+    def __init__(self):
+        self.batches = []
+        self.event = threading.Event()
+
+    def __call__(self, batch):
+        self.batches.append(batch)
+        self.event.set()
+
+    def wait(self, timeout=5):
+        assert self.event.wait(timeout), "no flush"
+        self.event.clear()
+
+
+def test_batch_is_flushed_when_full_with_duplicates_counted_once():
+    flushes = Flushes()
+    batcher = MicroBatcher(flushes, max_size=3, max_wait=60).start()
+    try:
+        batcher.put("cv", "a.commit")
+        batcher.put("cv", "a.commit")
+        batcher.put("jd", "j1.json")
+        time.sleep(0.2)
+        assert flushes.batches == []
+
+        batcher.put("cv", "b.commit")
+        flushes.wait()
+        assert flushes.batches == [{"cv": {"a.commit", "b.commit"}, "jd": {"j1.json"}}]
+    finally:
+        batcher.stop(timeout=5)
+
+
+def test_batch_is_flushed_after_max_wait_and_survives_a_failed_flush():
+    calls = []
+
+    def flush(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("pipeline down")
+
+    batcher = MicroBatcher(flush, max_size=100, max_wait=0.2).start()
+    try:
+        started = time.monotonic()
+        batcher.put("cv", "a.commit")
+        while not calls and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        assert calls == [{"cv": {"a.commit"}}]
+        assert time.monotonic() - started >= 0.2
+
+        batcher.put("jd", "j1.json")
+        while len(calls) < 2 and time.monotonic() - started < 5:
+            time.sleep(0.01)
+        assert calls[1] == {"jd": {"j1.json"}}
+    finally:
+        batcher.stop(timeout=5)
+
+
+def test_stop_drains_pending_events():
+    flushes = Flushes()
+    batcher = MicroBatcher(flushes, max_size=100, max_wait=60).start()
+    batcher.put("cv", "a.commit")
+    batcher.stop(timeout=5)
+    assert flushes.batches == [{"cv": {"a.commit"}}]
+    assert not batcher._thread.is_alive()
+
+    idle = MicroBatcher(flushes, max_size=100, max_wait=60).start()
+    idle.stop(timeout=5)
+    assert not idle._thread.is_alive() and len(flushes.batches) == 1
+
+
+def test_classify_staging_changes(tmp_path):
+    cvs, jds = tmp_path / "cvs", tmp_path / "jds"
+    watcher = StagingWatcher(None, cvs, jds)
+    segment = cvs / "segments" / "2026-10-19" / "seg-1-w.ndjson.commit"
+
+    assert watcher.classify(segment, deleted=False) == "cv"
+    assert watcher.classify(cvs / "segments" / "seg-1-w.ndjson.commit", deleted=False) == "cv"
+    assert watcher.classify(segment, deleted=True) is None
+    assert watcher.classify(segment.with_suffix(""), deleted=False) is None  # data still being written
+    assert watcher.classify(cvs / "2026-10-19" / "cv.json", deleted=False) == "cv"
+    assert watcher.classify(cvs / "cv.json", deleted=True) is None  # archived by the pipeline
+    assert watcher.classify(cvs / "notes" / "cv.json", deleted=False) is None
+    assert watcher.classify(jds / "jd.json", deleted=False) == "jd"
+    assert watcher.classify(jds / "jd.json", deleted=True) == "jd"
+    assert watcher.classify(jds / "jd.txt", deleted=False) is None
+
+
+def test_removed_cvs_are_deactivated_in_the_index(monkeypatch):
+    calls = []
+
+    def deactivate(user_ids):
+        calls.append(set(user_ids))
+        if len(calls) == 1:
+            raise ConnectionError("database down")
+        return len(user_ids)
+
+    monkeypatch.setattr(micro_batch_ingest, "deactivate_cv_embeddings", deactivate)
+    ingestor = MicroBatchIngestor.__new__(MicroBatchIngestor)
+    ingestor._undeleted = set()
+
+    after = pd.DataFrame({"user_id": ["u1", "u3"], "text_hash": ["h1", "h3"]})
+    ingestor._deactivate_deleted(after, {"u1:h1", "u2:h2"})
+    assert calls == [{"u2"}] and ingestor._undeleted == {"u2"}
+
+    # retried on the next block, except for CVs uploaded again in the meantime
+    ingestor._undeleted = {"u2", "u3"}
+    ingestor._deactivate_deleted(after, {"u1:h1", "u3:h3", "u4:h4"})
+    assert calls[1] == {"u2", "u4"} and ingestor._undeleted == set()
+
+    ingestor._deactivate_deleted(after, {"u1:h1", "u3:h3"})
+    assert len(calls) == 2
@@ -0,0 +1,185 @@
+import json
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.ollama_cv_parser import OllamaCVParser  # noqa: E402
+from app.parsers.text_index import TextIndexCache  # noqa: E402
+from app.schemas.parsed_document import (  # noqa: E402
+    DocumentType,
+    Experience,
+    Language,
+    ParsedDocument,
+)
+
+GOOD_DESCRIPTION = (
+    "Developed backend services in Python and managed deployments on "
+    "Kubernetes for the payments platform team."
+)
+
+
+class FakeLLM:
+    """Minimal stand-in for the LangChain Ollama client."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return self.responder(prompt)
+
+
+class FakeAsyncLLM:
+    """Stand-in for AsyncOllamaClient recording each concurrent round."""
+
+    def __init__(self, responder):
+        self.responder = responder
+        self.rounds = []
+
+    def generate_many(self, prompts, timeout=None):
+        self.rounds.append(list(prompts))
+        return [self.responder(p) for p in prompts]
+
+
+def make_parser(llm=None, async_llm=None):
+    parser = OllamaCVParser.__new__(OllamaCVParser)
+    parser.llm = llm
+    parser.async_llm = async_llm
+    parser.llm_cache = None
+    parser.model = "test-model"
+    parser.llm_options = {"temperature": 0.0}
+    parser.text_indexes = TextIndexCache()
+    parser.profile = "full"
+    parser._init_language_database()
+    parser._init_certification_database()
+    parser._init_skill_keywords()
+    return parser
+
+
+def test_descriptions_are_batched_with_per_item_fallback():
+    def responder(prompt):
+        if "EACH job" in prompt:
+            return json.dumps([
+                {"id": 0, "description": GOOD_DESCRIPTION},
+                {"id": 1, "description": "too short"},
+                {"id": 2, "description": GOOD_DESCRIPTION},
+            ])
+        return GOOD_DESCRIPTION.replace("Python", "Java")
+
+    llm = FakeLLM(responder)
+    parser = make_parser(llm)
+    doc = ParsedDocument(document_type=DocumentType.cv, full_text="")
+    doc.experience = [
+        Experience(title="Backend Developer", company="Acme"),
+        Experience(title="Platform Engineer", company="Globex"),
+        Experience(title="SRE", company="Initech"),
+    ]
+
+    parser._enrich_experience_descriptions_enhanced(doc)
+
+    # one batched call + one fallback for the invalid entry
+    assert len(llm.prompts) == 2
+    assert doc.experience[0].description == GOOD_DESCRIPTION
+    assert "Java" in doc.experience[1].description
+    assert doc.experience[2].description == GOOD_DESCRIPTION
+
+
+def test_concurrent_fallback_moves_failed_items_to_next_strategy():
+    def responder(prompt):
+        # responsibilities prompts fail validation, minimal ones succeed
+        if "KEY RESPONSIBILITIES" in prompt:
+            return "performed duties as assigned " * 3
+        return GOOD_DESCRIPTION
+
+    async_llm = FakeAsyncLLM(responder)
+    parser = make_parser(async_llm=async_llm)
+    doc = ParsedDocument(document_type=DocumentType.cv, full_text="")
+    items = [
+        (0, Experience(title="Nurse", company="Hospital", responsibilities=["Patient care"])),
+        (1, Experience(title="Cook", company="Trattoria")),
+    ]
+
+    results = parser._generate_descriptions_concurrent(doc, items)
+
+    assert results == {0: GOOD_DESCRIPTION, 1: GOOD_DESCRIPTION}
+    # round 1: both items concurrently, round 2: only the failed one
+    assert [len(r) for r in async_llm.rounds] == [2, 1]
+
+
+def test_heuristic_skills_single_scan_respects_counts_and_negation():
+    parser = make_parser()
+    text = (
+        "Docker docker DOCKER in production. "
+        "Non conosco kubernetes, kubernetes, kubernetes. "
+        "Python once."
+    )
+    doc = ParsedDocument(document_type=DocumentType.cv, full_text=text)
+
+    added = parser._add_heuristic_skills(doc)
+
+    assert added == 1
+    assert [s.name for s in doc.skills] == ["Docker"]
+
+
+def test_keyword_matcher_whole_word_aliases():
+    from app.parsers.keyword_matcher import SkillKeywordMatcher
+
+    matcher = SkillKeywordMatcher({"ts", "java"}, whole_word_keywords={"ts"})
+    hits = matcher.scan("results in ts and java; javascript; no java")
+
+    assert hits["ts"].count == 1
+    # substring semantics for built-in keywords, as with str.count
+    assert hits["java"].count == 3
+    assert hits["java"].negated
+
+
+def test_language_levels_use_combined_cefr_pattern():
+    parser = make_parser()
+    doc = ParsedDocument(document_type=DocumentType.cv, full_text="")
+    doc.languages = [
+        Language(name="English", proficiency="Livello (B2) - ottimo"),
+        Language(name="French", proficiency="fluent, C1 certified"),
+        Language(name="Spanish", proficiency="scolastico, base"),
+        Language(name="German", proficiency="tab2 notes"),
+    ]
+
+    parser._validate_and_enrich_language_levels(doc)
+
+    assert [lang.level for lang in doc.languages] == ["B2", "C1", "A2", None]
+
+
+def _stage(stats, name):
+    return next(s for s in stats["stages"] if s["name"] == name)
+
+
+def test_pipeline_profiles_record_stage_stats():
+    def make_doc():
+        doc = ParsedDocument(document_type=DocumentType.cv, full_text="Backend Developer at Acme")
+        doc.experience = [Experience(title="Backend Developer", company="Acme")]
+        return doc
+
+    llm = FakeLLM(lambda prompt: GOOD_DESCRIPTION)
+    parser = make_parser(llm)
+
+    fast = make_doc()
+    parser.profile = "fast"
+    parser._run_postprocessing(fast)
+    assert fast.pipeline_stats["profile"] == "fast"
+    assert _stage(fast.pipeline_stats, "descriptions")["status"] == "skipped"
+    assert fast.pipeline_stats["llm_calls"] == 0
+    assert fast.experience[0].description is None
+
+    full = make_doc()
+    parser.profile = "full"
+    parser._run_postprocessing(full)
+    descriptions = _stage(full.pipeline_stats, "descriptions")
+    assert descriptions["status"] == "ok"
+    assert descriptions["llm_calls"] == len(llm.prompts) >= 1
+    assert full.experience[0].description == GOOD_DESCRIPTION
+    # conditional stage: education is empty, so the fallback ran
+    assert _stage(full.pipeline_stats, "education_fallback")["status"] == "ok"
+    assert _stage(full.pipeline_stats, "summary_fallback")["status"] == "ok"
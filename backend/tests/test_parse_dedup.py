@@ -0,0 +1,120 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import Future
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import pytest  # noqa: E402
+
+from app.services.parse_dedup import ParseDeduplicator, dedup_key  # noqa: E402
+from app.services.task_store import SQLTaskStore  # noqa: E402
+
+
+def make_dedup(tmp_path, reuse_seconds=600):
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+    return ParseDeduplicator(store, reuse_seconds=reuse_seconds)
+
+
+def test_dedup_key_depends_on_profile_user_and_tags():
+    base = dedup_key("abc", "full", "u1", {"a": 1, "b": 2})
+    assert base == dedup_key("abc", "full", "u1", {"b": 2, "a": 1})
+    assert base != dedup_key("abc", "fast", "u1", {"a": 1, "b": 2})
+    assert base != dedup_key("abc", "full", "u2", {"a": 1, "b": 2})
+    assert base != dedup_key("abd", "full", "u1", {"a": 1, "b": 2})
+
+
+def test_in_flight_upload_attaches_to_running_job(tmp_path):
+    dedup = make_dedup(tmp_path)
+    started = []
+
+    def start(task_id):
+        started.append(Future())
+        return started[-1]
+
+    first = dedup.submit("k", start, {"filename": "cv.pdf"})
+    second = dedup.submit("k", start, {"filename": "cv.pdf"})
+
+    assert len(started) == 1
+    assert second.deduplicated and second.task_id == first.task_id
+    assert second.future is first.future
+    assert dedup.store.get(first.task_id)["status"] == "processing"
+
+
+def test_completed_result_is_reused_within_window(tmp_path):
+    dedup = make_dedup(tmp_path)
+    future = Future()
+
+    def on_done(task_id, f):
+        dedup.store.put(task_id, {"status": "completed", "completed_at": time.time(), "result": f.result()})
+
+    first = dedup.submit("k", lambda task_id: future, {}, on_done)
+    future.set_result({"name": "Mario"})
+    assert dedup.in_flight() == 0
+
+    reused = dedup.submit("k", lambda task_id: Future(), {})
+    assert reused.deduplicated and reused.task_id == first.task_id
+    assert reused.record["result"] == {"name": "Mario"}
+
+
+def test_expired_or_failed_results_start_a_new_job(tmp_path):
+    dedup = make_dedup(tmp_path, reuse_seconds=0)
+    future = Future()
+    first = dedup.submit(
+        "k", lambda task_id: future, {},
+        lambda task_id, f: dedup.store.put(task_id, {"status": "completed", "completed_at": time.time() - 5}),
+    )
+    future.set_result({})
+
+    second = dedup.submit("k", lambda task_id: Future(), {})
+    assert not second.deduplicated and second.task_id != first.task_id
+
+    dedup.store.put(second.task_id, {"status": "failed"})
+    second.future.set_result({})
+    third = dedup.submit("k", lambda task_id: Future(), {})
+    assert not third.deduplicated
+
+
+def test_alias_fits_task_id_column_and_is_removed_if_start_fails(tmp_path):
+    dedup = make_dedup(tmp_path)
+    key = dedup_key("abc", "full", "u1")
+    handle = dedup.submit(key, lambda task_id: Future(), {})
+    alias_id = "dedup:" + key[:48]
+    assert len(alias_id) <= 64  # parse_tasks.task_id is String(64)
+    assert dedup.store.get(alias_id)["task_id"] == handle.task_id
+
+    def failing_start(task_id):
+        raise RuntimeError("pool down")
+
+    other = dedup_key("def")
+    with pytest.raises(RuntimeError):
+        dedup.submit(other, failing_start, {})
+    assert dedup.store.get("dedup:" + other[:48]) is None
+
+
+def test_abandoned_processing_record_starts_a_new_job(tmp_path):
+    # a job registered by another worker process that has since exited
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    dedup = make_dedup(tmp_path)
+    dedup.store.put("old", {"status": "processing", "started_at": time.time(),
+                            "owner": {"host": socket.gethostname(), "pid": dead.pid}})
+    dedup.store.put("dedup:" + "k", {"status": "alias", "task_id": "old"})
+
+    handle = dedup.submit("k", lambda task_id: Future(), {})
+    assert not handle.deduplicated and handle.task_id != "old"
+    assert dedup.store.get("old")["status"] == "failed"
+
+    # a live owner on another host: stale only once older than any job can run
+    dedup = make_dedup(tmp_path)
+    dedup.stale_seconds = 60
+    dedup.store.put("remote", {"status": "processing", "started_at": time.time() - 30,
+                               "owner": {"host": "elsewhere", "pid": 1}})
+    dedup.store.put("dedup:" + "r", {"status": "alias", "task_id": "remote"})
+    assert dedup.submit("r", lambda task_id: Future(), {}).task_id == "remote"
+    dedup.store.update("remote", started_at=time.time() - 120)
+    assert dedup.submit("r", lambda task_id: Future(), {}).task_id != "remote"
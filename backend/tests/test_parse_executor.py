@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.parse_executor import (  # noqa: E402
+    ExecutorSaturated,
+    ParseExecutor,
+    ParseTimeout,
+)
+from app.services.task_store import SQLTaskStore  # noqa: E402
+
+
+class SlowLLM:
+    def invoke(self, prompt):
+        time.sleep(30)
+        return "{}"
+
+
+def import_parser():
+    import app.parsers.ollama_cv_parser  # noqa: F401
+
+
+def slow_extraction():
+    """LLM extraction (with its except-Exception fallback) stuck on a slow model; runs in the worker."""
+    from app.parsers.ollama_cv_parser import OllamaCVParser
+    from app.parsers.prompt_budget import PromptBudgeter
+    from app.parsers.text_index import TextIndexCache
+
+    parser = OllamaCVParser.__new__(OllamaCVParser)
+    parser.llm, parser.llm_cache, parser.stream_extraction = SlowLLM(), None, False
+    parser.prompt_budgeter, parser.text_indexes = PromptBudgeter(), TextIndexCache()
+    doc = parser._extract_with_robust_llm("Mario Rossi\nPython developer")
+    return {"result": doc.model_dump(), "summary": ""}
+
+
+def kill_worker():
+    os._exit(1)
+
+
+def test_admission_control_and_job_timeout():
+    executor = ParseExecutor(max_workers=1, queue_size=1, job_timeout=1)
+    try:
+        running = executor.submit_call(time.sleep, 3)
+        queued = executor.submit_call(time.sleep, 0)
+
+        # one running + one queued: the pool is saturated
+        with pytest.raises(ExecutorSaturated):
+            executor.submit_call(time.sleep, 0)
+        assert executor.stats()["saturated"]
+
+        # the running job exceeds its 1s budget inside the worker
+        with pytest.raises(ParseTimeout):
+            running.result(timeout=30)
+        assert queued.result(timeout=30) is None
+
+        deadline = time.time() + 5
+        while executor.stats()["in_flight"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert executor.stats()["in_flight"] == 0
+        assert executor.submit_call(time.sleep, 0).result(timeout=30) is None
+    finally:
+        executor.shutdown()
+
+
+def test_timeout_inside_parser_fails_the_task(tmp_path, monkeypatch):
+    from app.api import parse
+
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+    monkeypatch.setattr(parse, "get_task_store", lambda: store)
+    executor = ParseExecutor(max_workers=1, queue_size=0, job_timeout=1)
+    try:
+        # import the parser first, so that the 1s budget is spent in the LLM call
+        executor.submit_call(import_parser, timeout=120).result(timeout=120)
+        future = executor.submit_call(slow_extraction)
+        with pytest.raises(ParseTimeout):
+            future.result(timeout=30)
+    finally:
+        executor.shutdown(wait=False)
+
+    parse._store_task_result("t1", "cv.pdf", future)
+    record = store.get("t1")
+    assert record["status"] == "failed" and record["timed_out"]
+
+
+def test_dead_worker_fails_its_job_and_restarts_the_pool(tmp_path, monkeypatch):
+    from app.api import parse
+
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+    monkeypatch.setattr(parse, "get_task_store", lambda: store)
+    executor = ParseExecutor(max_workers=1, queue_size=1, job_timeout=30)
+    try:
+        future = executor.submit_call(kill_worker)
+        with pytest.raises(BrokenProcessPool):
+            future.result(timeout=60)
+        broken = future
+
+        deadline = time.time() + 5
+        while executor.stats()["in_flight"] and time.time() < deadline:
+            time.sleep(0.05)
+        assert executor.stats()["in_flight"] == 0
+
+        # the next job runs on a new pool
+        assert executor.submit_call(time.sleep, 0).result(timeout=60) is None
+    finally:
+        executor.shutdown()
+
+    parse._store_task_result("t1", "cv.pdf", broken)
+    record = store.get("t1")
+    assert record["status"] == "failed" and not record["timed_out"]
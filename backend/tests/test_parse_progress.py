@@ -0,0 +1,69 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.pipeline import PipelineStats, track_stage  # noqa: E402
+from app.services.parse_progress import (  # noqa: E402
+    FALLBACK_TOTAL_SECONDS,
+    StageDurationHistory,
+    TaskProgressReporter,
+    estimate_progress,
+)
+from app.services.task_store import SQLTaskStore  # noqa: E402
+
+PLAN = ["ocr", "extraction", "skills"]
+
+
+def make_store(tmp_path):
+    return SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+
+
+def test_history_ewma_and_fallback(tmp_path):
+    history = StageDurationHistory(make_store(tmp_path), alpha=0.5)
+    assert sum(history.expected("full", PLAN).values()) == FALLBACK_TOTAL_SECONDS
+
+    history.record({"profile": "full", "stages": [
+        {"name": "ocr", "status": "ok", "duration_ms": 10000},
+        {"name": "extraction", "status": "ok", "duration_ms": 60000},
+        {"name": "hash", "status": "skipped", "duration_ms": 0},
+    ]})
+    history.record({"profile": "full", "stages": [{"name": "ocr", "status": "ok", "duration_ms": 20000}]})
+
+    expected = history.expected("full", PLAN)
+    assert expected["ocr"] == 15.0
+    assert expected["extraction"] == 60.0
+    assert expected["skills"] == FALLBACK_TOTAL_SECONDS - 75.0
+
+
+def test_reporter_and_eta(tmp_path):
+    store = make_store(tmp_path)
+    history = StageDurationHistory(store)
+    history.record({"profile": "full", "stages": [
+        {"name": n, "status": "ok", "duration_ms": ms} for n, ms in (("ocr", 10000), ("extraction", 30000), ("skills", 10000))
+    ]})
+    store.put("t1", {"status": "processing", "started_at": 0})
+
+    stats = PipelineStats(profile="full", listener=TaskProgressReporter(store, "t1", "full", PLAN))
+    with track_stage(stats, "ocr"):
+        pass
+    with track_stage(stats, "extraction"):
+        record = store.get("t1")
+
+    assert record["progress"]["done"] == ["ocr"]
+    assert record["progress"]["current"] == "extraction"
+
+    started = record["progress"]["current_started_at"]
+    view = estimate_progress(record, history, now=started + 20)
+    assert view["stage"] == "extraction"
+    assert view["completed_stages"] == 1 and view["total_stages"] == 3
+    assert view["eta_seconds"] == 20.0  # 10s left in extraction + 10s of skills
+    assert view["percent"] == 60.0
+
+
+def test_estimate_queued_and_finished():
+    history = StageDurationHistory.__new__(StageDurationHistory)
+    assert estimate_progress({"status": "processing"}, history)["stage"] == "queued"
+    assert estimate_progress({"status": "completed"}, history)["percent"] == 100.0
@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+NLP = os.path.abspath(os.path.join(ROOT, "..", "NLP"))
+for path in (ROOT, NLP):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from pipeline_dag import DagRunner, ManifestStore  # noqa: E402
+
+
+def test_stages_run_in_dependency_order_with_their_inputs():
+    calls = []
+    lock = threading.Lock()
+
+    def stage(name, value):
+        def fn(**deps):
+            with lock:
+                calls.append(name)
+            return value + sum(deps.values())
+        return fn
+
+    dag = DagRunner(max_workers=4)
+    dag.add("matching", stage("matching", 100), ["cv", "jd"])
+    dag.add("cv", stage("cv", 10), ["dataset"])
+    dag.add("jd", stage("jd", 20), ["dataset"])
+    dag.add("dataset", stage("dataset", 1))
+
+    assert dag.order(["matching"]) == ["dataset", "cv", "jd", "matching"]
+    assert dag.order(["cv"]) == ["dataset", "cv"]
+    run = dag.run()
+    assert run.ok
+    assert calls[0] == "dataset" and calls[-1] == "matching"
+    assert run.results == {"dataset": 1, "cv": 11, "jd": 21, "matching": 132}
+
+
+def test_cycles_and_unknown_stages_are_rejected():
+    dag = DagRunner()
+    dag.add("a", lambda b: b, ["b"])
+    dag.add("b", lambda c: c, ["c"])
+    dag.add("c", lambda a: a, ["a"])
+    with pytest.raises(ValueError, match="Ciclo nel DAG: a -> b -> c -> a"):
+        dag.order()
+
+    dag = DagRunner()
+    dag.add("a", lambda missing: missing, ["missing"])
+    with pytest.raises(ValueError, match="Stage sconosciuto: 'missing'"):
+        dag.run()
+
+
+def test_shared_stage_runs_once():
+    calls = []
+
+    def embeddings():
+        calls.append("embeddings")
+        return 1
+
+    dag = DagRunner()
+    # registered by both the CV pipeline and the matching
+    dag.add("embeddings", embeddings)
+    dag.add("embeddings", embeddings)
+    dag.add("pipeline", lambda embeddings: embeddings, ["embeddings"])
+    dag.add("matching", lambda embeddings: embeddings, ["embeddings"])
+    assert dag.run().ok
+    assert calls == ["embeddings"]
+
+    with pytest.raises(ValueError, match="registrato due volte"):
+        dag.add("embeddings", lambda: 2)
+
+
+def test_failed_stage_skips_only_its_dependents():
+    def broken():
+        raise RuntimeError("boom")
+
+    dag = DagRunner()
+    dag.add("cv", broken)
+    dag.add("cv_embeddings", lambda cv: cv, ["cv"])
+    dag.add("matching", lambda cv_embeddings, jd: jd, ["cv_embeddings", "jd"])
+    dag.add("jd", lambda: "jd")
+
+    run = dag.run()
+    assert not run.ok and run.failed == ["cv"]
+    assert run.stages["cv"].error == "RuntimeError: boom"
+    assert run.stages["cv_embeddings"].status == "skipped"
+    assert run.stages["matching"].status == "skipped"
+    assert "cv_embeddings" in run.stages["matching"].error
+    assert run.stages["jd"].status == "ok" and run.results["jd"] == "jd"
+
+
+def _table_pipeline(tmp_path, calls, version="1"):
+    """dataset -> normalized, normalized writes a file and can be reloaded from it."""
+    output = tmp_path / "normalized.txt"
+
+    def normalized(dataset):
+        calls.append("normalized")
+        output.write_text(f"rows={dataset}")
+        return dataset * 2
+
+    dag = DagRunner(manifests=ManifestStore(tmp_path / "manifests"))
+    dag.add("dataset", lambda: 21)
+    dag.add("normalized", normalized, ["dataset"], version=version,
+            outputs=lambda: [output],
+            load=lambda summary: summary["value"],
+            summarize=lambda result: {"value": result})
+    return dag, output
+
+
+def test_manifest_reuses_unchanged_stages(tmp_path):
+    calls = []
+    dag, _ = _table_pipeline(tmp_path, calls)
+    first = dag.run()
+    assert first.stages["normalized"].status == "ok"
+
+    second = dag.run()
+    assert second.stages["normalized"].status == "cached"
+    assert second.results["normalized"] == 42
+    assert second.stages["normalized"].result == first.stages["normalized"].result
+    # stages without load always run
+    assert second.stages["dataset"].status == "ok"
+    assert calls == ["normalized"]
+
+    assert dag.run(force=True).stages["normalized"].status == "ok"
+    assert calls == ["normalized", "normalized"]
+
+
+def test_manifest_invalidated_by_changed_outputs_or_inputs(tmp_path):
+    calls = []
+    dag, output = _table_pipeline(tmp_path, calls)
+    dag.run()
+
+    output.write_text("edited by hand")
+    assert dag.run().stages["normalized"].status == "ok"
+    output.unlink()
+    assert dag.run().stages["normalized"].status == "ok"
+    assert dag.run().stages["normalized"].status == "cached"
+
+    # a new stage version changes the input fingerprint
+    dag, _ = _table_pipeline(tmp_path, calls, version="2")
+    assert dag.run().stages["normalized"].status == "ok"
+
+    # and so does a different result from a dependency
+    dag.stages["dataset"].fn = lambda: 22
+    run = dag.run()
+    assert run.stages["normalized"].status == "ok" and run.results["normalized"] == 44
+    assert calls == ["normalized"] * 5
+
+    manifest = ManifestStore(tmp_path / "manifests").read("normalized")
+    assert manifest["version"] == "2" and list(manifest["outputs"]) == [str(output)]
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services import pipeline_jobs  # noqa: E402
+from app.services.pipeline_jobs import PipelineJobManager  # noqa: E402
+from app.services.task_store import SQLTaskStore  # noqa: E402
+
+FAKE_BATCH = textwrap.dedent("""
+    import sys, time
+    print("args", " ".join(sys.argv[1:]))
+    start_date, end_date = sys.argv[2:4]
+    for i in range(int(end_date[-1])):  # as many 0.1s steps as the last digit of the end date
+        print("step", i)
+        time.sleep(0.1)
+    sys.exit(0 if start_date == "2024-01-01" else 3)
+""")
+
+
+def make_manager(tmp_path, **kwargs):
+    script = tmp_path / "batch_processor.py"
+    script.write_text(FAKE_BATCH)
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+    return PipelineJobManager(store, script=str(script), log_dir=str(tmp_path / "logs"), **kwargs)
+
+
+async def wait_finished(manager, task_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        record = manager.store.get(task_id)
+        if record["status"] not in pipeline_jobs.ACTIVE:
+            return record
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"job {task_id} still {record['status']}")
+
+
+def test_concurrent_triggers_share_one_job(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        first, second = await asyncio.gather(
+            manager.start("2024-01-01", "2024-01-03"),
+            manager.start("2024-01-01", "2024-01-03"),
+        )
+        assert first[0] == second[0]
+        assert sorted([first[1], second[1]]) == [False, True]
+
+        record = await wait_finished(manager, first[0])
+        assert record["status"] == "completed" and record["returncode"] == 0
+        assert record["log_tail"][0] == "args --process-range 2024-01-01 2024-01-03"
+        assert record["log_tail"][-1] == "step 2"
+
+        log = "".join([chunk async for chunk in manager.follow_log(first[0], lines=2)])
+        assert log == "step 1\nstep 2\n"
+
+        # a finished job is not reused
+        again, deduplicated = await manager.start("2024-01-01", "2024-01-03")
+        assert again != first[0] and not deduplicated
+        await wait_finished(manager, again)
+
+    asyncio.run(scenario())
+
+
+def test_failing_run_is_reported(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        task_id, _ = await manager.start("2024-02-01", "2024-02-01")
+        record = await wait_finished(manager, task_id)
+        assert record["status"] == "failed" and record["returncode"] == 3
+
+    asyncio.run(scenario())
+
+
+def test_cancel_running_and_queued_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_jobs, "STORE_UPDATE_SECONDS", 0.1)
+
+    async def scenario():
+        manager = make_manager(tmp_path, max_concurrent=1)
+        running, _ = await manager.start("2024-01-01", "2024-01-09")
+        queued, _ = await manager.start("2024-03-01", "2024-03-09")
+        while manager.store.get(running)["status"] != "running":
+            await asyncio.sleep(0.05)
+        assert manager.store.get(queued)["status"] == "queued"
+
+        await manager.cancel(queued)
+        await manager.cancel(running)
+        assert (await wait_finished(manager, running))["status"] == "cancelled"
+        assert (await wait_finished(manager, queued))["status"] == "cancelled"
+        assert "returncode" not in manager.store.get(queued)
+
+    asyncio.run(scenario())
+
+
+def test_workers_sharing_the_store_start_one_job(tmp_path):
+    async def scenario():
+        first, second = make_manager(tmp_path), make_manager(tmp_path)  # two uvicorn workers
+        (a, _), (b, _) = await asyncio.gather(
+            first.start("2024-01-01", "2024-01-02"),
+            second.start("2024-01-01", "2024-01-02"),
+        )
+        assert a == b
+        await wait_finished(first, a)
+
+    asyncio.run(scenario())
+
+
+def test_orphaned_job_is_reaped(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_jobs, "KILL_GRACE_SECONDS", 2)
+    dead_owner = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead_owner.wait()
+    # batch process left behind by the dead worker (own session, like the real ones)
+    orphan = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)", "batch_processor.py"],
+                              start_new_session=True)
+
+    async def scenario():
+        manager = make_manager(tmp_path)
+        owner = {"host": socket.gethostname(), "pid": dead_owner.pid}
+        manager.store.put("old", {"status": "running", "kind": "pipeline", "pid": orphan.pid,
+                                  "started_at": time.time(), "owner": owner})
+        manager.store.put("pipeline:2024-01-01:2024-01-02", {"status": "alias", "task_id": "old"})
+
+        task_id, deduplicated = await manager.start("2024-01-01", "2024-01-02")
+        assert task_id != "old" and not deduplicated
+        assert manager.store.get("old")["status"] == "failed"
+        assert orphan.wait(timeout=10) == -signal.SIGTERM
+        await wait_finished(manager, task_id)
+
+        manager.store.put("queued", {"status": "queued", "kind": "pipeline", "owner": owner})
+        assert (await manager.cancel("queued"))["status"] == "cancelled"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        orphan.kill()
@@ -0,0 +1,65 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.prompt_budget import PromptBudgeter, clean_ocr_noise  # noqa: E402
+
+
+def test_clean_ocr_noise_drops_page_artefacts_and_repeated_headers():
+    text = "\f\n\n".join([
+        "Mario Rossi - CV\nPython developer\nPage 1 of 3",
+        "Mario Rossi - CV\n- 2 -\n~~~\n\n\n",
+        "Mario Rossi - CV\nDocker   and   AWS\n3/3",
+    ])
+    assert clean_ocr_noise(text) == "Python developer\n\nDocker and AWS"
+
+
+def test_clean_ocr_noise_keeps_lines_repeated_on_two_pages():
+    text = "\f\n\n".join([
+        "Mario Rossi - CV\nEXPERIENCE\nAcme Corp\nBackend developer\nSKILLS\nPython",
+        "Mario Rossi - CV\nAcme Corp\nTeam lead\nPROJECTS\nPython",
+    ])
+    cleaned = clean_ocr_noise(text)
+    assert cleaned.count("Acme Corp") == 2
+    assert cleaned.count("Python") == 2
+    assert cleaned.count("Mario Rossi - CV") == 2
+
+
+def test_clean_ocr_noise_keeps_body_lines_repeated_on_every_page():
+    text = "\f".join(
+        f"Mario Rossi - CV\nRole {i}\nAcme Corp\nPython\nDetails {i}\n{i}/3" for i in range(1, 4)
+    )
+    cleaned = clean_ocr_noise(text)
+    assert "Mario Rossi" not in cleaned
+    assert cleaned.count("Acme Corp") == 3 and cleaned.count("Python") == 3
+
+
+def test_clean_ocr_noise_keeps_repeated_lines_of_a_single_page():
+    text = "\n".join([
+        "EXPERIENCE", "Developer", "Python", "", "Analyst", "Python", "", "Tester", "Python",
+    ])
+    assert clean_ocr_noise(text) == text
+
+
+def test_fit_keeps_high_priority_sections_within_budget():
+    experience = "EXPERIENCE\n" + "\n".join(f"Job {i} at Company {i}" for i in range(50))
+    text = f"Name Surname\n{experience}\nEDUCATION\nDegree\nSKILLS\nPython, SQL"
+    start = text.index("EXPERIENCE")
+    edu = text.index("EDUCATION")
+    skills = text.index("SKILLS")
+    sections = [
+        ("experience", start, edu),
+        ("education", edu, skills),
+        ("skills", skills, len(text)),
+    ]
+    budgeter = PromptBudgeter(budget_tokens=60, count_tokens=lambda t: len(t.split()))
+
+    fitted = budgeter.fit(text, sections)
+
+    assert len(fitted.split()) <= 60
+    assert fitted.startswith("Name Surname\nEXPERIENCE\nJob 0")
+    assert fitted.endswith("SKILLS\nPython, SQL")
+    assert "Job 49" not in fitted
@@ -0,0 +1,34 @@
+import json
+import os
+import sys
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+NLP = os.path.abspath(os.path.join(ROOT, "..", "NLP"))
+for path in (ROOT, NLP):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from normalizzatore import SkillOntology  # noqa: E402
+
+
+def test_unmapped_skills_counted_across_concurrent_branches(tmp_path):
+    path = tmp_path / "skill_ontology.json"
+    path.write_text(json.dumps({"skill_mappings": {"python": "Python"}}), encoding="utf-8")
+    ontology = SkillOntology(path)
+
+    def normalize():  # one per branch, as cv_normalized and jd_normalized do
+        for _ in range(20000):
+            assert ontology.normalize_skill("python") == "Python"
+            ontology.normalize_skill("Cobol")
+
+    threads = [threading.Thread(target=normalize) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert dict(ontology.unmapped_skills) == {"Cobol": 80000}
+
+    ontology.save_updated_ontology()
+    saved = json.loads(path.read_text(encoding="utf-8"))["unmapped_skills"]["skills"]
+    assert [(s["skill"], s["frequency"]) for s in saved] == [("Cobol", 80000)]
@@ -0,0 +1,131 @@
+import gzip
+import json
+import os
+import sys
+from datetime import date
+from pathlib import Path
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+NLP = os.path.abspath(os.path.join(ROOT, "..", "NLP"))
+for path in (ROOT, NLP):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from cv_segments import SegmentCheckpoint  # noqa: E402
+from staging_archive import ARCHIVE_FOLDER, MANIFEST_FILENAME, ArchiveManifest, apply_retention, compact  # noqa: E402
+
+TODAY = date(2026, 10, 19)
+
+
+def write_segment(directory: Path, day: str, n: int, records) -> Path:
+    """Sealed segment in the backend format: data, offset index and commit marker."""
+    segment = directory / "segments" / day / f"seg-{n:020d}-test.ndjson"
+    segment.parent.mkdir(parents=True, exist_ok=True)
+    data = b"".join(json.dumps(r).encode() + b"\n" for r in records)
+    segment.write_bytes(data)
+    segment.with_name(segment.name + ".idx").write_text("")
+    segment.with_name(segment.name + ".commit").write_text(json.dumps({"bytes": len(data)}))
+    return segment
+
+
+def write_processed(root: Path, day: str, name: str, record) -> Path:
+    path = root / "cvs_processed" / day / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(record))
+    return path
+
+
+def archived(root: Path, day: str):
+    [archive] = (root / ARCHIVE_FOLDER / day).glob("part-*.ndjson.gz")
+    with gzip.open(archive, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_compact_archives_consumed_sources_before_today(tmp_path):
+    cvs = tmp_path / "cvs"
+    checkpoint_path = tmp_path / "Dataset" / "checkpoint.json"
+    old = write_segment(cvs, "2026-10-17", 1, [{"user_id": "u1"}, {"user_id": "u2"}])
+    not_consumed = write_segment(cvs, "2026-10-17", 2, [{"user_id": "u3"}])
+    current = write_segment(cvs, "2026-10-19", 3, [{"user_id": "u4"}])
+    old_json = write_processed(tmp_path, "2026-10-18", "cv5.json", {"user_id": "u5"})
+    today_json = write_processed(tmp_path, "2026-10-19", "cv6.json", {"user_id": "u6"})
+    checkpoint = SegmentCheckpoint(checkpoint_path)
+    checkpoint.mark([old, current])
+    checkpoint.save()
+
+    summary = compact(str(cvs), checkpoint_path, today=TODAY)
+
+    assert summary == {"archives": 2, "records": 3, "segments": 1, "json_files": 1, "recovered": 0}
+    assert archived(tmp_path, "2026-10-17") == [{"user_id": "u1"}, {"user_id": "u2"}]
+    assert archived(tmp_path, "2026-10-18") == [{"user_id": "u5"}]
+    assert not old.exists() and not old.with_name(old.name + ".commit").exists()
+    assert not old_json.exists() and not old_json.parent.exists()
+    # today's files and segments not yet consumed stay in staging
+    assert current.exists() and today_json.exists() and not_consumed.exists()
+    assert SegmentCheckpoint(checkpoint_path).consumed == {current.name}
+
+    # nothing left to archive
+    assert compact(str(cvs), checkpoint_path, today=TODAY)["archives"] == 0
+
+
+def test_compact_recovers_an_interrupted_run(tmp_path):
+    cvs = tmp_path / "cvs"
+    checkpoint_path = tmp_path / "Dataset" / "checkpoint.json"
+    archive_root = tmp_path / ARCHIVE_FOLDER
+
+    # crash before the manifest: the archive (or its temporary file) is not recorded
+    orphan = archive_root / "2026-10-16" / "part-00000000000000000001.ndjson.gz"
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b"")
+    orphan.with_name(orphan.name + ".tmp").write_bytes(b"")
+
+    # crash after the manifest: sources recorded but not deleted, still in the checkpoint
+    segment = write_segment(cvs, "2026-10-17", 1, [{"user_id": "u1"}])
+    processed = write_processed(tmp_path, "2026-10-17", "cv2.json", {"user_id": "u2"})
+    recorded = archive_root / "2026-10-17" / "part-00000000000000000002.ndjson.gz"
+    recorded.parent.mkdir(parents=True)
+    recorded.write_bytes(b"")
+    sources = [segment.relative_to(tmp_path).as_posix(), processed.relative_to(tmp_path).as_posix()]
+    manifest = ArchiveManifest(archive_root / MANIFEST_FILENAME)
+    manifest.record(recorded.relative_to(tmp_path).as_posix(), "2026-10-17", 2, 10, sources)
+    manifest.close()
+    checkpoint = SegmentCheckpoint(checkpoint_path)
+    checkpoint.mark([segment])
+    checkpoint.save()
+
+    summary = compact(str(cvs), checkpoint_path, today=TODAY)
+
+    assert summary["recovered"] == 2 and summary["archives"] == 0
+    assert not orphan.exists() and not orphan.with_name(orphan.name + ".tmp").exists()
+    assert recorded.exists()
+    assert not segment.exists() and not segment.with_name(segment.name + ".idx").exists()
+    assert not processed.exists()
+    assert SegmentCheckpoint(checkpoint_path).consumed == set()
+    manifest = ArchiveManifest(archive_root / MANIFEST_FILENAME)
+    assert manifest.undeleted_sources() == []
+    manifest.close()
+
+
+def test_apply_retention_drops_archives_older_than_the_cutoff(tmp_path):
+    cvs = tmp_path / "cvs"
+    archive_root = tmp_path / ARCHIVE_FOLDER
+    manifest = ArchiveManifest(archive_root / MANIFEST_FILENAME)
+    archives = {}
+    for day in ("2026-10-01", "2026-10-12", "2026-10-18"):
+        archive = archive_root / day / "part-00000000000000000001.ndjson.gz"
+        archive.parent.mkdir(parents=True)
+        archive.write_bytes(b"")
+        manifest.record(archive.relative_to(tmp_path).as_posix(), day, 1, 1, [f"cvs_processed/{day}/cv.json"])
+        archives[day] = archive
+    manifest.close()
+
+    assert apply_retention(str(cvs), 0, today=TODAY) == 0
+    # cutoff 2026-10-12: that day is kept, older ones are removed
+    assert apply_retention(str(cvs), 7, today=TODAY) == 1
+    assert not archives["2026-10-01"].exists() and not archives["2026-10-01"].parent.exists()
+    assert archives["2026-10-12"].exists() and archives["2026-10-18"].exists()
+
+    manifest = ArchiveManifest(archive_root / MANIFEST_FILENAME)
+    assert sorted(manifest.archives()) == [archives[d].relative_to(tmp_path).as_posix()
+                                           for d in ("2026-10-12", "2026-10-18")]
+    manifest.close()
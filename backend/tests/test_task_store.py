@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.task_store import MAX_TRACEBACK_CHARS, SQLTaskStore  # noqa: E402
+
+
+def test_sql_task_store_roundtrip_update_and_ttl(tmp_path):
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+
+    store.put("t1", {"status": "processing", "started_at": 1.0})
+    store.update("t1", status="completed", result={"skills": ["Python"]})
+    assert store.get("t1") == {
+        "status": "completed",
+        "started_at": 1.0,
+        "result": {"skills": ["Python"]},
+    }
+    assert store.get("missing") is None
+
+    # another instance on the same file sees the record (multiple workers)
+    assert SQLTaskStore(store.url).get("t1")["status"] == "completed"
+
+    store.put("t2", {"status": "failed", "traceback": "x" * (MAX_TRACEBACK_CHARS * 3)})
+    assert len(store.get("t2")["traceback"]) < MAX_TRACEBACK_CHARS + 10
+
+    expired = SQLTaskStore(store.url, ttl_seconds=1)
+    expired.put("t3", {"status": "completed"})
+    time.sleep(1.1)
+    assert expired.get("t3") is None
+    assert expired.evict_expired() == 1
+
+
+def test_put_if_absent_and_replace_if(tmp_path):
+    store = SQLTaskStore(f"sqlite:///{tmp_path / 'tasks.db'}", ttl_seconds=60)
+
+    assert store.put_if_absent("alias", {"status": "alias", "task_id": "a"})
+    assert not store.put_if_absent("alias", {"status": "alias", "task_id": "b"})
+
+    current = store.get("alias")
+    assert store.replace_if("alias", current, {"status": "alias", "task_id": "c"})
+    # a second writer holding the old value loses
+    assert not store.replace_if("alias", current, {"status": "alias", "task_id": "d"})
+    assert store.get("alias")["task_id"] == "c"
+
+    expired = SQLTaskStore(store.url, ttl_seconds=1)
+    expired.put("old", {"status": "alias"})
+    time.sleep(1.1)
+    assert expired.put_if_absent("old", {"status": "alias", "task_id": "new"})
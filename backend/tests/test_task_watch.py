@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.task_watch import TaskWatcher  # noqa: E402
+
+
+class CountingStore:
+    def __init__(self, record):
+        self.record = record
+        self.reads = 0
+
+    def get(self, task_id):
+        self.reads += 1
+        return dict(self.record)
+
+
+async def follow(watcher, task_id, timeout=5):
+    """Records seen by one subscriber until the task leaves "processing"."""
+    seen, records = 0, []
+    async with watcher.subscribe(task_id) as watch:
+        while True:
+            seen, record = await watch.next(seen, timeout)
+            records.append(record)
+            if record["status"] != "processing":
+                return records
+
+
+def test_subscribers_of_a_task_share_one_backed_off_poll():
+    store = CountingStore({"status": "processing", "stage": "ocr"})
+    watcher = TaskWatcher(store.get, interval=0.01, max_interval=0.08)
+
+    async def scenario():
+        clients = [asyncio.create_task(follow(watcher, "t1")) for _ in range(5)]
+        await asyncio.sleep(0.6)
+        idle_reads = store.reads
+        store.record = {"status": "processing", "stage": "extraction"}
+        await asyncio.sleep(0.2)
+        store.record = {"status": "completed", "result": {"ok": True}}
+        return idle_reads, await asyncio.gather(*clients)
+
+    idle_reads, results = asyncio.run(scenario())
+
+    # one reader for five clients, and at most ~0.08s between reads once idle
+    assert idle_reads <= 12
+    for records in results:
+        assert records[0]["stage"] == "ocr"
+        assert {"status": "processing", "stage": "extraction"} in records
+        assert records[-1] == {"status": "completed", "result": {"ok": True}}
+    assert watcher.watched() == 0
+
+
+def test_poller_stops_with_its_last_subscriber():
+    store = CountingStore({"status": "processing"})
+    watcher = TaskWatcher(store.get, interval=0.01, max_interval=0.01)
+
+    async def scenario():
+        async with watcher.subscribe("t1") as watch:
+            assert (await watch.next(0, 5))[0] == 1
+            assert watcher.watched() == 1
+        reads = store.reads
+        await asyncio.sleep(0.1)
+        return reads, watch.poller
+
+    reads, poller = asyncio.run(scenario())
+    assert store.reads == reads and poller.cancelled()
+    assert watcher.watched() == 0
@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.parsers.text_index import DocumentTextIndex, TextIndexCache  # noqa: E402
+
+CV_TEXT = (
+    "Mario Rossi\nmario.rossi@example.com\n\n"
+    "ESPERIENZA\nBackend Developer - Acme S.p.A.\n2019 - 2023\n\n"
+    "FORMAZIONE\nLaurea in Informatica, Università di Bologna\n\n"
+    "COMPETENZE\nPython, Docker, Kubernetes\n"
+)
+
+
+def test_find_matches_str_find_on_lowercased_text():
+    rng = random.Random(7)
+    text = "".join(rng.choice("abcAB \n") for _ in range(3000))
+    index = DocumentTextIndex(text)
+    lower = text.lower()
+
+    for _ in range(300):
+        start = rng.randrange(len(text))
+        needle = text[start:start + rng.randint(1, 8)]
+        offset = rng.randrange(len(text))
+        assert index.find(needle, offset) == lower.find(needle.lower(), offset)
+
+    assert index.find("zzz") == -1
+
+
+def test_sections_and_lines():
+    index = DocumentTextIndex(CV_TEXT)
+
+    start, end = index.section_span(["formazione", "education"])
+    assert CV_TEXT[start:end].startswith("FORMAZIONE")
+    assert "COMPETENZE" not in CV_TEXT[start:end]
+    assert index.line_of(index.find("acme")) == 4
+
+    names = [name for name, _, _ in index.sections({"skills": ["competenze"], "projects": ["progetti"]})]
+    assert names == ["skills"]
+
+
+def test_cache_reuses_index_per_text():
+    cache = TextIndexCache(maxsize=1)
+    first = cache.get(CV_TEXT)
+    assert cache.get(CV_TEXT) is first
+    cache.get("other text")
+    assert cache.get(CV_TEXT) is not first
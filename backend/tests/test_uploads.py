@@ -0,0 +1,108 @@
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.utils import uploads  # noqa: E402
+from app.utils.uploads import UploadSizeLimit, UploadTooLarge, cleanup_stale_uploads, save_upload  # noqa: E402
+
+
+def test_save_upload_streams_and_hashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 7)
+    data = b"%PDF-1.4 " + b"x" * 100
+
+    saved = save_upload(io.BytesIO(data), max_bytes=1000, directory=tmp_path)
+
+    assert saved.size == len(data)
+    assert saved.sha256 == hashlib.sha256(data).hexdigest()
+    assert saved.path.read_bytes() == data
+    assert saved.path.parent == tmp_path
+
+
+def test_save_upload_rejects_oversized_and_removes_partial(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "CHUNK_SIZE", 10)
+
+    with pytest.raises(UploadTooLarge):
+        save_upload(io.BytesIO(b"a" * 50), max_bytes=25, directory=tmp_path)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cleanup_stale_uploads(tmp_path):
+    old = tmp_path / "upload_old.pdf"
+    new = tmp_path / "upload_new.pdf"
+    other = tmp_path / "notes.txt"
+    for f in (old, new, other):
+        f.write_bytes(b"x")
+    os.utime(old, (0, 0))
+    os.utime(other, (0, 0))
+
+    assert cleanup_stale_uploads(3600, directory=tmp_path) == 1
+    assert not old.exists() and new.exists() and other.exists()
+
+
+def _limited_app(max_bytes):
+    from fastapi import FastAPI, File, UploadFile
+
+    app = FastAPI()
+    calls = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    app.add_middleware(UploadSizeLimit, max_bytes=max_bytes, paths=("/upload",))
+    return app, calls
+
+
+def test_upload_size_limit_rejects_before_parsing_the_form(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    monkeypatch.setattr(uploads, "FORM_OVERHEAD_BYTES", 1024)
+    app, calls = _limited_app(max_bytes=4096)
+    client = TestClient(app)
+
+    small = client.post("/upload", files={"file": ("cv.pdf", b"x" * 1000, "application/pdf")})
+    assert small.status_code == 200 and small.json() == {"size": 1000}
+
+    declared = client.post("/upload", files={"file": ("cv.pdf", b"x" * 10000, "application/pdf")})
+    assert declared.status_code == 413
+
+    def chunks():  # no Content-Length: the body is counted as it arrives
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"cv.pdf\"\r\n\r\n"
+        for _ in range(20):
+            yield b"x" * 1000
+
+    streamed = client.post("/upload", content=chunks(),
+                           headers={"content-type": "multipart/form-data; boundary=b"})
+    assert streamed.status_code == 413
+    assert calls == ["cv.pdf"]
+
+
+
+def test_upload_is_removed_when_submitting_the_job_fails(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import parse
+
+    class FailingDeduplicator:
+        def submit(self, *args):
+            raise RuntimeError("task store unavailable")
+
+    monkeypatch.setattr(parse, "save_upload", lambda src, max_bytes: save_upload(src, max_bytes, directory=tmp_path))
+    monkeypatch.setattr(parse, "get_parse_deduplicator", lambda: FailingDeduplicator())
+    app = FastAPI()
+    app.include_router(parse.router)
+    client = TestClient(app, raise_server_exceptions=False)
+
+    response = client.post("/parse/upload", files={"file": ("cv.pdf", b"%PDF-1.4", "application/pdf")})
+    assert response.status_code == 500
+    assert list(tmp_path.iterdir()) == []
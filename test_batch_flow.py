@@ -109,9 +109,9 @@ def test_batch_processor():
             # Controlla output files
             nlp_path = Path(__file__).parent / "NLP"
             output_files = [
-                nlp_path / "Dataset" / "cv_dataset.csv",
-                nlp_path / "Dataset" / "normalized" / "cv_dataset_normalized.csv",
-                nlp_path / "embeddings" / "cv_embeddings.csv"
+                nlp_path / "Dataset" / "datasets.sqlite3",
+                nlp_path / "Dataset" / "normalized" / "cv_dataset_normalized" / "_partitions.json",
+                nlp_path / "embeddings" / "cv_embeddings" / "_partitions.json"
             ]
             
             print(f"\n📂 File generati:")